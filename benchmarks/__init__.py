@@ -0,0 +1,8 @@
+"""
+Shell-Gotchi ベンチマーク
+
+使い方:
+    sg bench                  # 計測して benchmarks/results/latest.json に保存
+    sg bench --compare        # ベースラインと比較して劣化を検出
+    sg bench --save-baseline  # 計測結果をベースラインとして保存
+"""
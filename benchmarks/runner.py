@@ -0,0 +1,282 @@
+"""
+Shell-Gotchi ベンチマーク実行
+計測はすべて一時的な HOME を設定した子プロセスで行い、実際のセーブデータには触れない
+
+計測項目:
+- hook.*: シェルフック1回分（Pythonの起動から終了まで）のレイテンシ
+- storage.*: load_data / save_data のスループット（小さい状態・大きい状態）
+- logic.*: process_command / pull_gacha / check_achievements のマイクロベンチマーク
+- import.*: サブコマンドごとのモジュール読み込み時間（-X importtime の合計）
+"""
+import copy
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+RESULTS_DIR = BENCH_DIR / "results"
+LATEST_FILE = RESULTS_DIR / "latest.json"
+
+# import.* で計測するサブコマンド
+IMPORT_COMMANDS = {
+    "hook": ["hook", "--trigger", "--command", "ls"],
+    "status": ["status"],
+    "stats": ["stats"],
+    "shop": ["shop", "list"],
+}
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """計測値（秒）の要約をミリ秒で返す"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 4),
+        "p95_ms": round(p95 * 1000, 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "samples": len(ordered),
+    }
+
+
+def _bench_env(home: str) -> Dict[str, str]:
+    """子プロセス用の環境変数（一時HOME・表示なし）"""
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["XDG_CONFIG_HOME"] = os.path.join(home, ".config")
+    env["SG_RENDERER"] = "plain"
+    env.pop("SG_CONFIG", None)
+    env.pop("SG_PROFILE", None)
+    return env
+
+
+def _run_sg(args: List[str], env: Dict[str, str], extra: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+    """sg コマンドを子プロセスとして実行する"""
+    return subprocess.run(
+        [sys.executable, *(extra or []), "-m", "src.main", *args],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True, check=False,
+    )
+
+
+# ===== フックのレイテンシ =====
+
+def bench_hook(repeat: int) -> Dict[str, Dict[str, float]]:
+    """シェルフック1回分を子プロセスで実行し、起動から終了までの時間を計測する"""
+    with tempfile.TemporaryDirectory() as home:
+        env = _bench_env(home)
+        # 初回起動（データ作成・設定キャッシュ作成）は計測しない
+        _run_sg(IMPORT_COMMANDS["hook"], env)
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _run_sg(IMPORT_COMMANDS["hook"], env)
+            samples.append(time.perf_counter() - start)
+
+        # 比較用: Python インタプリタだけの起動時間
+        baseline = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=False)
+            baseline.append(time.perf_counter() - start)
+
+    return {
+        "hook.cold": summarize(samples),
+        "hook.python_startup": summarize(baseline),
+    }
+
+
+# ===== 読み込み時間 =====
+
+def parse_importtime(stderr: str) -> float:
+    """-X importtime の出力から読み込み時間の合計（秒）を求める"""
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            total_us += int(fields[0])
+        except ValueError:
+            continue  # 見出し行
+    return total_us / 1_000_000
+
+
+def bench_imports(repeat: int) -> Dict[str, Dict[str, float]]:
+    """サブコマンドごとのモジュール読み込み時間を計測する"""
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        env = _bench_env(home)
+        _run_sg(IMPORT_COMMANDS["status"], env)
+        for name, args in IMPORT_COMMANDS.items():
+            samples = [
+                parse_importtime(_run_sg(args, env, extra=["-X", "importtime"]).stderr)
+                for _ in range(repeat)
+            ]
+            results[f"import.{name}"] = summarize(samples)
+    return results
+
+
+# ===== 子プロセス内で実行する計測 =====
+
+def make_large_state(data: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """大きな状態（コレクション・実績が多いデータ）を作る"""
+    large = copy.deepcopy(data)
+    large["collection"] += [f"item_{i:06d}" for i in range(size)]
+    large["achievements"] += [f"achievement_{i:05d}" for i in range(size // 10)]
+    large["stats"]["total_commands"] = 123456
+    return large
+
+
+def _time_calls(func: Callable[[], Any], repeat: int, number: int) -> List[float]:
+    """func を number 回呼ぶ時間を repeat 回計測し、1回あたりの時間を返す"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+def worker_storage(repeat: int) -> Dict[str, Dict[str, float]]:
+    """load_data / save_data のスループット（一時HOMEの子プロセス内で実行）"""
+    from src import storage
+    from src.config import DEFAULT_DATA
+
+    results = {}
+    small = storage.load_data()
+    states = {"small": small, "large": make_large_state(small, 20000)}
+    for label, state in states.items():
+        storage.save_data(state)
+        size = storage.DATA_FILE.stat().st_size
+        for op, func in (("save", lambda: storage.save_data(state)), ("load", storage.load_data)):
+            summary = summarize(_time_calls(func, repeat, 20))
+            summary["ops_per_sec"] = round(1000 / summary["median_ms"], 1) if summary["median_ms"] else 0
+            summary["bytes"] = size
+            results[f"storage.{op}.{label}"] = summary
+    storage.save_data(copy.deepcopy(DEFAULT_DATA))
+    return results
+
+
+def worker_logic(repeat: int) -> Dict[str, Dict[str, float]]:
+    """ゲームロジックのマイクロベンチマーク（ファイル入出力なし）"""
+    from src.config import DEFAULT_DATA
+    from src.game_logic import check_achievements, process_command, pull_gacha
+    from src.storage import migrate_data
+
+    data = migrate_data(copy.deepcopy(DEFAULT_DATA))
+    data["user"]["tickets"] = 10 ** 9
+
+    return {
+        "logic.process_command": summarize(_time_calls(lambda: process_command(data), repeat, 2000)),
+        "logic.pull_gacha": summarize(_time_calls(lambda: pull_gacha(data), repeat, 2000)),
+        "logic.check_achievements": summarize(_time_calls(lambda: check_achievements(data), repeat, 2000)),
+    }
+
+
+WORKERS = {
+    "storage": worker_storage,
+    "logic": worker_logic,
+}
+
+
+def run_worker(name: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    """計測を一時HOMEの子プロセスで実行し、結果のJSONを受け取る"""
+    with tempfile.TemporaryDirectory() as home:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.runner", "worker", name, str(repeat)],
+            cwd=ROOT_DIR, env=_bench_env(home), capture_output=True, text=True, check=False,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"ベンチマーク {name} が失敗しました:\n{proc.stderr}")
+    return json.loads(proc.stdout)
+
+
+# ===== 実行・保存・比較 =====
+
+def run_benchmarks(repeat: int = 20,
+                   progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """全ベンチマークを実行して結果を返す"""
+    results: Dict[str, Dict[str, float]] = {}
+    steps = [
+        ("hook", lambda: bench_hook(repeat)),
+        ("import", lambda: bench_imports(max(3, repeat // 4))),
+        ("storage", lambda: run_worker("storage", repeat)),
+        ("logic", lambda: run_worker("logic", repeat)),
+    ]
+    for name, step in steps:
+        if progress:
+            progress(name)
+        results.update(step())
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def save_results(report: Dict[str, Any], path: Path = LATEST_FILE) -> Path:
+    """結果をJSONで保存する"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_baseline(path: Path = BASELINE_FILE) -> Optional[Dict[str, Any]]:
+    """ベースラインを読み込む（なければNone）"""
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    中央値をベースラインと比較する
+
+    Returns:
+        計測項目ごとの比較結果（regression が True なら threshold% を超えて遅くなった）
+    """
+    rows = []
+    base_results = baseline.get("results", {})
+    for name, current in sorted(report["results"].items()):
+        base = base_results.get(name)
+        if not base or not base.get("median_ms"):
+            continue
+        change = (current["median_ms"] - base["median_ms"]) / base["median_ms"] * 100
+        rows.append({
+            "name": name,
+            "baseline_ms": base["median_ms"],
+            "current_ms": current["median_ms"],
+            "change_pct": round(change, 1),
+            "regression": change > threshold,
+        })
+    return rows
+
+
+def main() -> None:
+    """子プロセスとしての計測（python -m benchmarks.runner worker <名前> <回数>）"""
+    if len(sys.argv) == 4 and sys.argv[1] == "worker":
+        print(json.dumps(WORKERS[sys.argv[2]](int(sys.argv[3]))))
+        return
+    print("使い方: sg bench [--compare] [--save-baseline]", file=sys.stderr)
+    sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,32 @@ _SG_LAST_COMMAND=""
 _SG_EMPTY_COUNT=0
 _SG_MAX_EMPTY=3
 
+# コマンドを実行したディレクトリを記録するか（sg stats --by-dir。0 で記録しない）
+SG_TRACK_DIRS="${SG_TRACK_DIRS:-1}"
+
+# フックに渡すコマンドの最大文字数（config.py の COMMAND_MAX_LENGTH と合わせる）
+_SG_MAX_COMMAND_LENGTH="${SG_MAX_COMMAND_LENGTH:-512}"
+
+# コマンドの開始時刻（$EPOCHREALTIME。bash 5.0+ / zsh の zsh/datetime）
+_SG_CMD_START=""
+
+# フックの結果の通知キュー（config.py の NOTIFY_QUEUE_FILE と合わせる）
+_SG_NOTIFY_FILE="$HOME/.local/share/shell-gotchi/notify.jsonl"
+# ローカルキャッシュ（SG_LOCAL_CACHE=1）ではキャッシュディレクトリに置かれるので、起動時に1度だけ尋ねる
+if [[ "${SG_LOCAL_CACHE:-}" == "1" ]]; then
+    _SG_NOTIFY_FILE="$(cd "$SHELL_GOTCHI_DIR" && $PYTHON_CMD -m src.main notify --path 2>/dev/null)"
+    [[ -n "$_SG_NOTIFY_FILE" ]] || _SG_NOTIFY_FILE="$HOME/.local/share/shell-gotchi/notify.jsonl"
+fi
+
+# フックをバックグラウンドで実行するか（1 で実行。結果は次のプロンプトで表示される）
+SG_ASYNC_HOOK="${SG_ASYNC_HOOK:-0}"
+
 # Shell-Gotchi フック関数
+# 引数: コマンド, 終了コード, 実行時間（ミリ秒。計測できなければ空）
 _shell_gotchi_hook() {
     local last_cmd="$1"
+    local exit_code="$2"
+    local duration_ms="$3"
     
     # 空コマンドチェック
     if [[ -z "${last_cmd// }" ]]; then
@@ -42,17 +65,38 @@ _shell_gotchi_hook() {
     fi
     _SG_LAST_COMMAND="$last_cmd"
     
-    # Shell-Gotchi の sg コマンド自体は除外
-    if [[ "$last_cmd" == sg* ]] || [[ "$last_cmd" == "python"*"main.py"* ]]; then
-        return 0
+    # 長いコマンド（ヒアドキュメント・貼り付けたスクリプト）は1行目の先頭だけを渡す
+    # sg 自体などの除外は config.py の COMMAND_RULES で判定する
+    last_cmd="${last_cmd%%$'\n'*}"
+    if (( ${#last_cmd} > _SG_MAX_COMMAND_LENGTH )); then
+        last_cmd="${last_cmd:0:$_SG_MAX_COMMAND_LENGTH}"
     fi
     
-    # Shell-Gotchi フック呼び出し
-    # バックグラウンドで実行して遅延を最小化
-    (
-        cd "$SHELL_GOTCHI_DIR" && \
-        $PYTHON_CMD -m src.main hook --trigger --command "$last_cmd" 2>/dev/null
-    )
+    local -a timing=()
+    [[ -n "$exit_code" ]] && timing+=(--exit-code "$exit_code")
+    [[ -n "$duration_ms" ]] && timing+=(--duration-ms "$duration_ms")
+    # 作業ディレクトリ（フック呼び出しの中では cd するので、ここで渡す）
+    [[ "$SG_TRACK_DIRS" != "0" ]] && timing+=(--cwd "$PWD")
+    
+    # Shell-Gotchi フック呼び出し（結果は通知キューに積まれ、_sg_show_notices が表示する）
+    if [[ "$SG_ASYNC_HOOK" == "1" ]]; then
+        # サブシェルの中でバックグラウンドにするので、ジョブの開始・終了のメッセージは出ない
+        (
+            cd "$SHELL_GOTCHI_DIR" && \
+            $PYTHON_CMD -m src.main hook --trigger --command "$last_cmd" "${timing[@]}" >/dev/null 2>&1 &
+        )
+    else
+        (
+            cd "$SHELL_GOTCHI_DIR" && \
+            $PYTHON_CMD -m src.main hook --trigger --command "$last_cmd" "${timing[@]}" 2>/dev/null
+        )
+    fi
+}
+
+# 通知キューが空でなければ表示する（空ならファイルの大きさを見るだけで、プロセスを起動しない）
+_sg_show_notices() {
+    [[ -s "$_SG_NOTIFY_FILE" ]] || return 0
+    (cd "$SHELL_GOTCHI_DIR" && $PYTHON_CMD -m src.main notify 2>/dev/null)
 }
 
 # Bash用フック
@@ -61,7 +105,12 @@ if [[ -n "$BASH_VERSION" ]]; then
     _SG_OLD_PROMPT_COMMAND="${PROMPT_COMMAND:-}"
     
     # 最後のコマンドを取得するための DEBUG トラップ
+    # プロンプト表示後の最初のコマンドで開始時刻を記録する（変数の代入だけなのでフォークしない）
     _sg_save_command() {
+        [[ "$BASH_COMMAND" == "_sg_prompt_command" ]] && return
+        if [[ -z "$_SG_CMD_START" ]]; then
+            _SG_CMD_START="${EPOCHREALTIME:--}"
+        fi
         _SG_CURRENT_COMMAND="$(HISTTIMEFORMAT= history 1 | sed 's/^[ ]*[0-9]*[ ]*//')"
     }
     trap '_sg_save_command' DEBUG
@@ -70,8 +119,18 @@ if [[ -n "$BASH_VERSION" ]]; then
     _sg_prompt_command() {
         local exit_code=$?
         
-        # 前のコマンドをフックに渡す
-        _shell_gotchi_hook "$_SG_CURRENT_COMMAND"
+        # 前のコマンドをフックに渡す（Enter のみでコマンドを実行していなければ渡さない）
+        if [[ -n "$_SG_CMD_START" ]]; then
+            local duration_ms=""
+            if [[ "$_SG_CMD_START" != "-" && -n "$EPOCHREALTIME" ]]; then
+                # 小数点（ロケールによっては ","）を除くとマイクロ秒の整数になる
+                local start_us="${_SG_CMD_START/[.,]/}" end_us="${EPOCHREALTIME/[.,]/}"
+                duration_ms=$(( (10#$end_us - 10#$start_us) / 1000 ))
+            fi
+            _SG_CMD_START=""
+            _shell_gotchi_hook "$_SG_CURRENT_COMMAND" "$exit_code" "$duration_ms"
+        fi
+        _sg_show_notices
         
         # 既存の PROMPT_COMMAND を実行
         if [[ -n "$_SG_OLD_PROMPT_COMMAND" ]]; then
@@ -86,18 +145,55 @@ fi
 
 # Zsh用フック
 if [[ -n "$ZSH_VERSION" ]]; then
+    zmodload zsh/datetime 2>/dev/null
+    
+    # preexec フックでコマンドの開始時刻を記録する
+    _sg_preexec() {
+        _SG_CMD_START="${EPOCHREALTIME:--}"
+    }
+    
     # precmd フックを追加
     _sg_precmd() {
-        local last_cmd="$(fc -ln -1 2>/dev/null | sed 's/^[ ]*//')"
-        _shell_gotchi_hook "$last_cmd"
+        local exit_code=$?
+        # Enter のみでコマンドを実行していなければ渡さない
+        if [[ -n "$_SG_CMD_START" ]]; then
+            local duration_ms=""
+            if [[ "$_SG_CMD_START" != "-" && -n "$EPOCHREALTIME" ]]; then
+                # int() は zsh/mathfunc が必要なので、浮動小数点で計算して小数部を切り捨てる
+                duration_ms=$(( (EPOCHREALTIME - _SG_CMD_START) * 1000 ))
+                duration_ms="${duration_ms%.*}"
+            fi
+            _SG_CMD_START=""
+            local last_cmd="$(fc -ln -1 2>/dev/null | sed 's/^[ ]*//')"
+            _shell_gotchi_hook "$last_cmd" "$exit_code" "$duration_ms"
+        fi
+        _sg_show_notices
     }
     
-    # precmd_functions 配列にフックを追加
+    # preexec_functions / precmd_functions 配列にフックを追加
+    if [[ -z "${preexec_functions[(r)_sg_preexec]}" ]]; then
+        preexec_functions+=(_sg_preexec)
+    fi
     if [[ -z "${precmd_functions[(r)_sg_precmd]}" ]]; then
         precmd_functions+=(_sg_precmd)
     fi
 fi
 
+# ログアウト時に、同期ディレクトリ（SG_SYNC_DIR）へ差分を書き出し、
+# ローカルキャッシュ（SG_LOCAL_CACHE=1。$HOME が NFS のとき）の変更をホームへ書き戻す
+_sg_logout() {
+    (cd "$SHELL_GOTCHI_DIR" && $PYTHON_CMD -m src.main sync flush --quiet 2>/dev/null)
+}
+if [[ "${SG_LOCAL_CACHE:-}" == "1" || -n "${SG_SYNC_DIR:-}" ]]; then
+    if [[ -n "$ZSH_VERSION" ]]; then
+        if [[ -z "${zshexit_functions[(r)_sg_logout]}" ]]; then
+            zshexit_functions+=(_sg_logout)
+        fi
+    else
+        trap '_sg_logout' EXIT
+    fi
+fi
+
 # sg コマンドのエイリアス
 sg() {
     cd "$SHELL_GOTCHI_DIR" && $PYTHON_CMD -m src.main "$@"
@@ -1,6 +1,7 @@
 """
 Shell-Gotchi - ターミナルでペットを育成しよう！
 """
+from . import profiler  # 起動時間の計測の基準にするため最初に読み込む
 from .config import APP_NAME, VERSION
 
 __version__ = VERSION
@@ -0,0 +1,197 @@
+"""
+Shell-Gotchi 活動の時系列
+コマンド実行・エサやり・ガチャの回数を、時間ごと・日ごと・週ごとのバケットに数える
+
+- 保存先は固定長のバイナリファイル（ACTIVITY_FILE）。ヘッダと3段のリングバッファからなる
+  - 時間: 直近 ACTIVITY_HOURS 時間
+  - 日:   直近 ACTIVITY_DAYS 日
+  - 週:   直近 ACTIVITY_WEEKS 週（月曜始まり）
+  1件の記録は3段それぞれのバケットに加算するだけなので O(1)。古い時間のバケットは日・週のバケットに
+  集約済みなので、リングバッファから押し出されても日・週の値は残る（ダウンサンプリング）
+- ファイルの大きさは段の長さだけで決まり、何年使っても増えない（既定で約20KB）
+- 更新は mmap で該当するバケットだけを書き換える。同時に動くフックどうしは flock で排他する
+- 時刻はローカル時間で区切る（ヒートマップの「何曜日の何時」がそのまま読めるように）
+"""
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import ACTIVITY_FILE, ACTIVITY_HOURS, ACTIVITY_DAYS, ACTIVITY_WEEKS
+from .storage import ensure_data_dir, side_file
+
+# 記録する系列（バケットごとに系列ぶんの u32 を並べる）
+SERIES = ("commands", "feeds", "gacha")
+
+# 段: (名前, バケット数)
+TIERS: Tuple[Tuple[str, int], ...] = (
+    ("hour", ACTIVITY_HOURS),
+    ("day", ACTIVITY_DAYS),
+    ("week", ACTIVITY_WEEKS),
+)
+
+MAGIC = b"SGA1"
+# ヘッダ: マジック, 系列数, 各段の最新バケットの番号（未使用は -1）
+_HEADER = struct.Struct("<4sI" + "q" * len(TIERS))
+_SLOT = struct.Struct("<" + "I" * len(SERIES))
+_U32_MAX = 0xFFFFFFFF
+
+# 各段のデータの開始位置
+_OFFSETS: Dict[str, int] = {}
+_offset = _HEADER.size
+for _name, _size in TIERS:
+    _OFFSETS[_name] = _offset
+    _offset += _size * _SLOT.size
+FILE_SIZE = _offset
+
+
+def hour_index(ts: float) -> int:
+    """ローカル時間での、1970-01-01 からの通算時間"""
+    return int(ts + time.localtime(ts).tm_gmtoff) // 3600
+
+
+def tier_indexes(hour: int) -> Tuple[int, int, int]:
+    """通算時間から (時間, 日, 週) のバケット番号を求める（1970-01-01 は木曜なので週は3日ずらす）"""
+    day = hour // 24
+    return hour, day, (day + 3) // 7
+
+
+def weekday_of_day(day: int) -> int:
+    """通算日の曜日（0 = 月曜）"""
+    return (day + 3) % 7
+
+
+class ActivityStore:
+    """
+    活動の時系列ファイルの中身
+    buffer には書き込み可能な mmap（記録用）か bytes（表示用）を渡す
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, series, *latest = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or series != len(SERIES):
+            raise ValueError("activity file format mismatch")
+        self.latest: List[int] = latest
+
+    @staticmethod
+    def initial_header() -> bytes:
+        return _HEADER.pack(MAGIC, len(SERIES), *([-1] * len(TIERS)))
+
+    def _slot_offset(self, tier: int, index: int) -> int:
+        name, size = TIERS[tier]
+        return _OFFSETS[name] + (index % size) * _SLOT.size
+
+    def _advance(self, tier: int, index: int) -> None:
+        """段の最新バケットを index まで進め、押し出されたバケットを0にする（進めた数ぶんだけ）"""
+        size = TIERS[tier][1]
+        latest = self.latest[tier]
+        start = latest + 1 if latest >= 0 and index - latest < size else index - size + 1
+        for i in range(start, index + 1):
+            offset = self._slot_offset(tier, i)
+            self.buffer[offset:offset + _SLOT.size] = bytes(_SLOT.size)
+        self.latest[tier] = index
+
+    def record(self, series: str, count: int = 1, ts: Optional[float] = None) -> None:
+        """系列に count を加える"""
+        column = SERIES.index(series)
+        indexes = tier_indexes(hour_index(time.time() if ts is None else ts))
+        for tier, index in enumerate(indexes):
+            latest = self.latest[tier]
+            if index > latest:
+                self._advance(tier, index)
+            elif index <= latest - TIERS[tier][1]:
+                continue  # リングバッファより古い
+            offset = self._slot_offset(tier, index)
+            values = list(_SLOT.unpack_from(self.buffer, offset))
+            values[column] = min(values[column] + count, _U32_MAX)
+            _SLOT.pack_into(self.buffer, offset, *values)
+        _HEADER.pack_into(self.buffer, 0, MAGIC, len(SERIES), *self.latest)
+
+    def values(self, tier_name: str, series: str, count: int,
+               now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """
+        現在を含む直近 count 個のバケットの (バケット番号, 値) を古い順に返す
+        記録のないバケット・リングバッファから押し出されたバケットは 0
+        """
+        tier = [name for name, _ in TIERS].index(tier_name)
+        size = TIERS[tier][1]
+        column = SERIES.index(series)
+        current = tier_indexes(hour_index(time.time() if now is None else now))[tier]
+        latest = self.latest[tier]
+        result = []
+        for index in range(current - count + 1, current + 1):
+            if latest - size < index <= latest:
+                value = _SLOT.unpack_from(self.buffer, self._slot_offset(tier, index))[column]
+            else:
+                value = 0
+            result.append((index, value))
+        return result
+
+
+def _open_locked(path: Path, exclusive: bool) -> int:
+    """ファイルを開いてロックする（なければ・大きさが違えば作り直す）"""
+    import fcntl
+    ensure_data_dir(path.parent)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        if os.fstat(fd).st_size != FILE_SIZE or os.pread(fd, 4, 0) != MAGIC:
+            if not exclusive:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, FILE_SIZE)
+            os.pwrite(fd, ActivityStore.initial_header(), 0)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def record(series: str, count: int = 1, ts: Optional[float] = None,
+           path: Optional[Path] = None) -> None:
+    """系列に count を加えてファイルに書き込む（失敗しても本体の処理を妨げない）"""
+    import mmap
+    path = path or side_file(ACTIVITY_FILE)
+    try:
+        fd = _open_locked(path, exclusive=True)
+        try:
+            with mmap.mmap(fd, FILE_SIZE) as buffer:
+                ActivityStore(buffer).record(series, count, ts)
+        finally:
+            os.close(fd)
+    except (OSError, ValueError):
+        return
+
+
+def load(path: Optional[Path] = None) -> ActivityStore:
+    """表示用にファイル全体を読み込む"""
+    path = path or side_file(ACTIVITY_FILE)
+    fd = _open_locked(path, exclusive=False)
+    try:
+        return ActivityStore(os.pread(fd, FILE_SIZE, 0))
+    finally:
+        os.close(fd)
+
+
+# sg stats --trend で表示する期間: (段, バケット数)
+TREND_SPANS: Tuple[Tuple[str, int], ...] = (("hour", 24), ("day", 30), ("week", 52))
+
+
+def trend(store: ActivityStore, now: Optional[float] = None) -> Dict[str, Dict[str, List[int]]]:
+    """TREND_SPANS の期間ごとに、系列の値を古い順に並べる: {段: {系列: [値, ...]}}"""
+    return {
+        tier: {series: [value for _, value in store.values(tier, series, span, now)] for series in SERIES}
+        for tier, span in TREND_SPANS
+    }
+
+
+def heatmap(store: ActivityStore, series: str = "commands",
+            now: Optional[float] = None) -> List[List[int]]:
+    """時間の段（直近 ACTIVITY_HOURS 時間）を 曜日 × 時 の 7x24 に集計する"""
+    grid = [[0] * 24 for _ in range(7)]
+    for hour, value in store.values("hour", series, ACTIVITY_HOURS, now):
+        if value:
+            grid[weekday_of_day(hour // 24)][hour % 24] += value
+    return grid
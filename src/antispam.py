@@ -0,0 +1,94 @@
+"""
+Shell-Gotchi スパム対策
+Enter の押しっぱなしやループによる大量のコマンドで報酬を稼げないようにする
+
+- 直近 SPAM_RING_SIZE 件の (時刻, コマンドのCRC32) をリングバッファに保持する
+  リングバッファはセーブデータに base64 で保存する（64件で約700文字）
+- 時間窓ごとの上限: 上限 N 件の窓について N 件前の記録の時刻だけを見るので、1回の判定は O(窓の数)
+- 同じコマンドの連続実行は SPAM_REPEAT_FREE 回を超えると1回ごとにドロップ確率を減衰させる
+  （確定ドロップと10コマンドごとのコインも、減衰した確率でしか出さない）
+  （間が SPAM_REPEAT_RESET 秒以上空いた実行は、ビルドのやり直しなどとして数え直す）
+"""
+import base64
+import struct
+import time
+import zlib
+from typing import Any, Dict, NamedTuple, Optional
+
+from .command_rules import normalize
+from .config import SPAM_RING_SIZE, SPAM_WINDOW_CAPS, SPAM_REPEAT_FREE, SPAM_REPEAT_DECAY, SPAM_REPEAT_RESET
+
+# リングバッファの1件: (UNIX時刻（秒）, コマンドのCRC32)
+_ENTRY = struct.Struct("<II")
+
+
+class SpamVerdict(NamedTuple):
+    """判定結果"""
+    allowed: bool  # False なら報酬の対象にしない
+    factor: float  # ドロップ確率・確定ドロップ・コインに掛ける倍率（連続実行の減衰）
+    reason: Optional[str]  # 制限した理由（"window:<秒>" / "repeat"）
+
+
+def _load_ring(state: Dict[str, Any]) -> bytearray:
+    """保存されたリングバッファを復元する（大きさが変わっていたら作り直す）"""
+    try:
+        ring = bytearray(base64.b64decode(state.get("ring") or ""))
+    except ValueError:
+        ring = bytearray()
+    if len(ring) != SPAM_RING_SIZE * _ENTRY.size:
+        ring = bytearray(SPAM_RING_SIZE * _ENTRY.size)
+        state["head"] = state["count"] = 0
+    return ring
+
+
+def command_hash(command: str) -> int:
+    """判定用のコマンドのハッシュ（判定規則と同じく1行目の先頭だけを使う）"""
+    return zlib.crc32(normalize(command).encode("utf-8", errors="replace"))
+
+
+def check_and_record(data: Dict[str, Any], command: str, now: Optional[float] = None) -> SpamVerdict:
+    """
+    コマンドの実行を記録し、報酬の対象にするかを判定する
+    制限された実行も記録するので、連打が続く間は制限が続く
+    """
+    state = data.setdefault("antispam", {})
+    ring = _load_ring(state)
+    now_s = int(time.time() if now is None else now)
+    head = state.get("head", 0)
+    count = state.get("count", 0)
+    digest = command_hash(command)
+
+    # 時間窓ごとの上限: 上限件数ぶん前の記録が窓の中にあれば超過
+    verdict = None
+    for window, cap in SPAM_WINDOW_CAPS:
+        cap = min(cap, SPAM_RING_SIZE)
+        if count >= cap:
+            ts, _ = _ENTRY.unpack_from(ring, ((head - cap) % SPAM_RING_SIZE) * _ENTRY.size)
+            if now_s - ts < window:
+                verdict = SpamVerdict(False, 0.0, f"window:{window}")
+                break
+
+    # 同じコマンドの連続実行
+    previous, _ = _ENTRY.unpack_from(ring, ((head - 1) % SPAM_RING_SIZE) * _ENTRY.size)
+    if count and state.get("last_hash") == digest and now_s - previous < SPAM_REPEAT_RESET:
+        repeat = state.get("repeat", 1) + 1
+    else:
+        repeat = 1
+    if verdict is None:
+        excess = repeat - SPAM_REPEAT_FREE
+        if excess > 0:
+            verdict = SpamVerdict(True, SPAM_REPEAT_DECAY ** excess, "repeat")
+        else:
+            verdict = SpamVerdict(True, 1.0, None)
+
+    _ENTRY.pack_into(ring, head * _ENTRY.size, now_s & 0xFFFFFFFF, digest)
+    state["ring"] = base64.b64encode(bytes(ring)).decode("ascii")
+    state["head"] = (head + 1) % SPAM_RING_SIZE
+    state["count"] = min(count + 1, SPAM_RING_SIZE)
+    state["last_hash"] = digest
+    state["repeat"] = repeat
+    if not verdict.allowed:
+        state["blocked"] = state.get("blocked", 0) + 1
+    elif verdict.factor < 1:
+        state["decayed"] = state.get("decayed", 0) + 1
+    return verdict
@@ -0,0 +1,269 @@
+"""
+Shell-Gotchi ASCIIアートのアセットパック
+ペットのアートをオフセット索引付きのバイナリファイルにまとめ、mmapで必要なフレームだけを読む
+
+パック形式（リトルエンディアン）:
+    ヘッダ:   magic(6) "SGART\\0" / version(u16) / entry_count(u32)
+    索引:     entry_count 個の (key_len(u16), key(utf-8), offset(u32), length(u32))
+              key は "<スキンID>/<表情>/<フレーム番号>"
+    データ:   各フレームのutf-8文字列を連結したもの（offset はファイル先頭からの位置）
+
+パックの再生成:
+    python -m src.asset_pack
+"""
+import mmap
+import re
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+ART_DIR = Path(__file__).parent / "art"
+ART_SOURCE = ART_DIR / "pets.txt"
+ART_PACK = ART_DIR / "pets.pack"
+
+PACK_MAGIC = b"SGART\0"
+PACK_VERSION = 1
+_HEADER = struct.Struct("<6sHI")
+_KEY_LEN = struct.Struct("<H")
+_ENTRY = struct.Struct("<II")
+
+# ===== 検証ルール =====
+ART_MOODS = ("art", "happy", "hungry")  # 使用できる表情
+MAX_ART_WIDTH = 40  # アート1行の最大表示幅
+MAX_ART_HEIGHT = 16  # アートの最大行数
+
+_SECTION_HEADER = re.compile(r"^@@\s+(\S+)\s+(\S+)(?:\s+(\d+))?\s*$")
+
+
+class AssetPackError(Exception):
+    """アセットパックの構築・読み込みエラー"""
+
+
+# ===== 構築 =====
+
+def parse_source(path: Path = ART_SOURCE) -> Dict[Tuple[str, str, int], str]:
+    """
+    アート定義ファイルを読み込む
+
+    Returns:
+        {(スキンID, 表情, フレーム番号): アート文字列} の辞書
+    """
+    frames: Dict[Tuple[str, str, int], str] = {}
+    key: Optional[Tuple[str, str, int]] = None
+    body: List[str] = []
+
+    def flush() -> None:
+        if key is not None:
+            # 前後の空行を除き、従来のアートと同じく改行で囲む
+            frames[key] = "\n" + "\n".join(body).strip("\n") + "\n"
+
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            match = _SECTION_HEADER.match(line)
+            if match:
+                flush()
+                skin_id, mood, frame = match.group(1), match.group(2), int(match.group(3) or 0)
+                key = (skin_id, mood, frame)
+                if key in frames:
+                    raise AssetPackError(f"{path}:{lineno}: {skin_id} {mood} {frame} が重複しています")
+                body = []
+            elif key is not None:
+                body.append(line)
+            elif line.strip() and not line.startswith("#"):
+                raise AssetPackError(f"{path}:{lineno}: '@@' 行より前にアートがあります")
+    flush()
+    return frames
+
+
+def _display_width(text: str) -> int:
+    """全角文字を2として表示幅を数える"""
+    import unicodedata
+    return sum(2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in text)
+
+
+def validate_frames(frames: Dict[Tuple[str, str, int], str]) -> None:
+    """
+    アートの整合性をチェックする（パック構築時のみ実行）
+
+    チェック内容:
+    - PET_SKINS の全スキンに通常アート（art フレーム0）がある
+    - 未知のスキンID・表情がない
+    - フレーム番号が0から連番になっている
+    - タブ文字を含まず、サイズが上限以内
+    """
+    from .assets import PET_SKINS
+
+    errors = []
+    for skin_id in PET_SKINS:
+        if (skin_id, "art", 0) not in frames:
+            errors.append(f"{skin_id}: 通常アート（art）がありません")
+
+    counts: Dict[Tuple[str, str], int] = {}
+    for (skin_id, mood, frame), art in frames.items():
+        name = f"{skin_id} {mood} {frame}"
+        if skin_id not in PET_SKINS:
+            errors.append(f"{name}: PET_SKINS に存在しないスキンです")
+        if mood not in ART_MOODS:
+            errors.append(f"{name}: 不明な表情です（{', '.join(ART_MOODS)}）")
+        if "\t" in art:
+            errors.append(f"{name}: タブ文字は使用できません")
+        lines = art.strip("\n").split("\n")
+        if len(lines) > MAX_ART_HEIGHT:
+            errors.append(f"{name}: {len(lines)}行（上限 {MAX_ART_HEIGHT}行）")
+        width = max(_display_width(line) for line in lines)
+        if width > MAX_ART_WIDTH:
+            errors.append(f"{name}: 幅 {width}（上限 {MAX_ART_WIDTH}）")
+        counts[(skin_id, mood)] = counts.get((skin_id, mood), 0) + 1
+
+    for (skin_id, mood), count in counts.items():
+        for frame in range(count):
+            if (skin_id, mood, frame) not in frames:
+                errors.append(f"{skin_id} {mood}: フレーム番号が連番ではありません")
+                break
+
+    if errors:
+        raise AssetPackError("アートの検証に失敗しました:\n  " + "\n  ".join(errors))
+
+
+def build_pack(source: Path = ART_SOURCE, pack: Path = ART_PACK) -> int:
+    """
+    アート定義ファイルを検証してパックファイルを生成する
+
+    Returns:
+        パックに含めたフレーム数
+    """
+    frames = parse_source(source)
+    validate_frames(frames)
+
+    keys = sorted(frames)
+    encoded_keys = [f"{s}/{m}/{f}".encode("utf-8") for s, m, f in keys]
+    payloads = [frames[k].encode("utf-8") for k in keys]
+
+    index_size = sum(_KEY_LEN.size + len(k) + _ENTRY.size for k in encoded_keys)
+    offset = _HEADER.size + index_size
+
+    index = bytearray()
+    for key, payload in zip(encoded_keys, payloads):
+        index += _KEY_LEN.pack(len(key)) + key + _ENTRY.pack(offset, len(payload))
+        offset += len(payload)
+
+    # 書き込み途中のファイルを読まれないように一時ファイルから置き換える
+    tmp = pack.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(keys)))
+        f.write(index)
+        for payload in payloads:
+            f.write(payload)
+    tmp.replace(pack)
+    return len(keys)
+
+
+# ===== 読み込み =====
+
+class AssetPack:
+    """mmapしたパックファイルから必要なフレームだけを読み出す"""
+
+    def __init__(self, path: Path = ART_PACK):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise AssetPackError(f"{path}: 対応していないパック形式です")
+
+        # 索引だけを読む（アート本体は get_frame で必要になるまで読まない）
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._frame_counts: Dict[str, int] = {}
+        pos = _HEADER.size
+        for _ in range(count):
+            (key_len,) = _KEY_LEN.unpack_from(self._mm, pos)
+            pos += _KEY_LEN.size
+            key = self._mm[pos:pos + key_len].decode("utf-8")
+            pos += key_len
+            self._index[key] = _ENTRY.unpack_from(self._mm, pos)
+            pos += _ENTRY.size
+
+            skin_mood = key.rsplit("/", 1)[0]
+            self._frame_counts[skin_mood] = self._frame_counts.get(skin_mood, 0) + 1
+
+    def frame_count(self, skin_id: str, mood: str) -> int:
+        """指定した表情のフレーム数を返す（存在しなければ0）"""
+        return self._frame_counts.get(f"{skin_id}/{mood}", 0)
+
+    def get_frame(self, skin_id: str, mood: str, frame: int = 0) -> Optional[str]:
+        """1フレーム分のアートを返す（存在しなければNone）"""
+        count = self.frame_count(skin_id, mood)
+        if count == 0:
+            return None
+        offset, length = self._index[f"{skin_id}/{mood}/{frame % count}"]
+        return self._mm[offset:offset + length].decode("utf-8")
+
+
+class SourceArt:
+    """
+    定義ファイルから直接読んだアート（パックを作れず、既存のパックもない場合の代わり）
+    AssetPack と同じ frame_count / get_frame を持つ。検証はしない
+    """
+
+    def __init__(self, path: Path = ART_SOURCE):
+        self._frames = parse_source(path)
+        self._frame_counts: Dict[str, int] = {}
+        for skin_id, mood, _ in self._frames:
+            skin_mood = f"{skin_id}/{mood}"
+            self._frame_counts[skin_mood] = self._frame_counts.get(skin_mood, 0) + 1
+
+    def frame_count(self, skin_id: str, mood: str) -> int:
+        """指定した表情のフレーム数を返す（存在しなければ0）"""
+        return self._frame_counts.get(f"{skin_id}/{mood}", 0)
+
+    def get_frame(self, skin_id: str, mood: str, frame: int = 0) -> Optional[str]:
+        """1フレーム分のアートを返す（存在しなければNone）"""
+        count = self.frame_count(skin_id, mood)
+        if count == 0:
+            return None
+        return self._frames.get((skin_id, mood, frame % count))
+
+
+_pack: Optional[Union[AssetPack, SourceArt]] = None
+
+
+def get_pack() -> Union[AssetPack, SourceArt]:
+    """
+    パックを開いて返す（初回呼び出し時のみ）
+    パックがない、または定義ファイルより古い場合はその場で再生成する
+
+    実行時の再生成に失敗しても（書き込めない・編集中の定義ファイルが検証を通らない）表示は止めない。
+    既存のパックがあればそれを、なければ定義ファイルを検証せずに直接使う
+    （厳密な検証は 'python -m src.asset_pack' で行う）
+    """
+    global _pack
+    if _pack is None:
+        try:
+            stale = ART_SOURCE.stat().st_mtime > ART_PACK.stat().st_mtime
+        except FileNotFoundError:
+            stale = ART_SOURCE.exists()
+        if stale:
+            try:
+                build_pack()
+            except (OSError, AssetPackError):
+                if not ART_PACK.exists():
+                    _pack = SourceArt()
+                    return _pack
+        _pack = AssetPack()
+    return _pack
+
+
+def main() -> None:
+    """パックを再生成する"""
+    try:
+        count = build_pack()
+    except AssetPackError as e:
+        print(f"[SG] {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[SG] {ART_PACK} を生成しました（{count} フレーム）")
+
+
+if __name__ == "__main__":
+    main()
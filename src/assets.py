@@ -1,6 +1,7 @@
 """
 Shell-Gotchi ASCIIアート定義
 """
+from .asset_pack import get_pack
 
 # ===== ログインボーナス用ロゴ =====
 LOGO = r"""
@@ -19,120 +20,47 @@ WELCOME_BANNER = r"""
 """
 
 # ===== ペットスキン =====
+# スキンのメタデータのみ（アート本体は art/pets.txt に定義し、
+# asset_pack でパックしたファイルから必要なフレームだけを読み込む）
 PET_SKINS = {
     # デフォルトの猫
     "default_cat": {
         "name": "ターミナルキャット",
-        "art": r"""
-    /\_____/\
-   /  o   o  \
-  ( ==  ^  == )
-   )         (
-  (           )
- ( (  )   (  ) )
-(__(__)___(__)__)
-""",
-        "happy": r"""
-    /\_____/\
-   /  ^   ^  \
-  ( ==  w  == )
-   )  ~~~~~  (
-  (           )
- ( (  )   (  ) )
-(__(__)___(__)__)
-""",
-        "hungry": r"""
-    /\_____/\
-   /  T   T  \
-  ( ==  n  == )
-   )  .....  (
-  (           )
- ( (  )   (  ) )
-(__(__)___(__)__)
-""",
     },
     
     # SSR: 黄金龍
     "skin_golden_dragon": {
         "name": "黄金龍",
-        "art": r"""
-        ____ 
-       /    \
-      | ^  ^ |
-       \  ∞ /
-    ~~~|    |~~~
-   /   |    |   \
-  <____|    |____>
-       |    |
-      /|    |\
-     (_|    |_)
-""",
         "rarity": "SSR",
     },
     
     # SSR: サイバーキャット
     "skin_cyber_cat": {
         "name": "サイバーキャット",
-        "art": r"""
-    ╔═══════╗
-   ╔╝ ◉   ◉ ╚╗
-  ╔╝ ══ ▼ ══ ╚╗
-  ║  ░░░░░░░  ║
-  ║ ╔═╗   ╔═╗ ║
-  ╚═╝ ╚═══╝ ╚═╝
-""",
         "rarity": "SSR",
     },
     
     # SR: 色違いスキン
     "skin_blue_cat": {
         "name": "青色キャット",
-        "art": r"""
-    /\_____/\
-   /  o   o  \
-  ( ==  ^  == )  [BLUE]
-   )         (
-  (__(__)___(__)__)
-""",
         "rarity": "SR",
         "color": "blue",
     },
     
     "skin_red_cat": {
         "name": "赤色キャット",
-        "art": r"""
-    /\_____/\
-   /  o   o  \
-  ( ==  ^  == )  [RED]
-   )         (
-  (__(__)___(__)__)
-""",
         "rarity": "SR",
         "color": "red",
     },
     
     "skin_green_cat": {
         "name": "緑色キャット",
-        "art": r"""
-    /\_____/\
-   /  o   o  \
-  ( ==  ^  == )  [GREEN]
-   )         (
-  (__(__)___(__)__)
-""",
         "rarity": "SR",
         "color": "green",
     },
     
     "skin_purple_cat": {
         "name": "紫色キャット",
-        "art": r"""
-    /\_____/\
-   /  o   o  \
-  ( ==  ^  == )  [PURPLE]
-   )         (
-  (__(__)___(__)__)
-""",
         "rarity": "SR",
         "color": "magenta",
     },
@@ -209,19 +137,44 @@ HUNGER_LOW = "░"
 HUNGER_EMPTY = "·"
 
 
-def get_pet_art(skin_id: str, hunger: float = 100) -> str:
+def get_pet_mood(hunger: float) -> str:
+    """満腹度から表情（art / happy / hungry）を判定する"""
+    if hunger <= 20:
+        return "hungry"
+    elif hunger >= 80:
+        return "happy"
+    return "art"
+
+
+def get_pet_art(skin_id: str, hunger: float = 100, frame: int = 0) -> str:
     """
     ペットのASCIIアートを取得する
     満腹度に応じて表情を変える
+
+    Args:
+        skin_id: スキンID
+        hunger: 満腹度
+        frame: アニメーションのフレーム番号（フレーム数で循環する）
+
+    アートはパックファイルから該当する1フレームだけを読み込む。
+    表情のアートがない場合は通常アート、スキンがない場合はデフォルトの猫を使う
     """
-    skin = PET_SKINS.get(skin_id, PET_SKINS["default_cat"])
+    pack = get_pack()
+    if skin_id not in PET_SKINS:
+        skin_id = "default_cat"
     
-    if hunger <= 20 and "hungry" in skin:
-        return skin["hungry"]
-    elif hunger >= 80 and "happy" in skin:
-        return skin["happy"]
-    else:
-        return skin.get("art", PET_SKINS["default_cat"]["art"])
+    art = pack.get_frame(skin_id, get_pet_mood(hunger), frame)
+    if art is None:
+        art = pack.get_frame(skin_id, "art", frame)
+    if art is None:
+        art = pack.get_frame("default_cat", "art", frame)
+    return art
+
+
+def get_pet_frame_count(skin_id: str, hunger: float = 100) -> int:
+    """現在の表情のアニメーションフレーム数を返す"""
+    pack = get_pack()
+    return pack.frame_count(skin_id, get_pet_mood(hunger)) or pack.frame_count(skin_id, "art") or 1
 
 
 def get_skin_name(skin_id: str) -> str:
@@ -0,0 +1,136 @@
+"""
+Shell-Gotchi コマンドの判定規則
+シェルフックから渡されたコマンドを、除外・ボーナス倍率・ツール名に分類する
+
+- 規則（config.COMMAND_RULES）は設定のコンパイル時に1度だけ変換する
+  - "prefix": 空白区切りのトークン列の前方一致 → トークン単位のトライ木
+  - "pattern": 正規表現（トライ木で表せないものだけ。少数を想定）
+- 判定はトークン数ぶんトライ木をたどるだけなので、規則の数によらず数マイクロ秒
+- 長いコマンド（ヒアドキュメント・貼り付けたスクリプト）は1行目の先頭
+  COMMAND_MAX_LENGTH 文字だけを判定に使う
+"""
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from .config import COMMAND_MAX_LENGTH, COMMAND_WRAPPERS
+
+ACTIONS = ("ignore", "bonus")
+
+# トライ木の節で、そこまでの前方一致にかかる規則を置くキー（トークンは空文字列にならない）
+RULE_KEY = ""
+
+
+class CommandRule(NamedTuple):
+    """コンパイル済みの規則"""
+    rule_id: str
+    action: str  # "ignore" / "bonus"
+    multiplier: float  # ボーナス時のドロップ確率の倍率
+
+
+class CommandInfo(NamedTuple):
+    """コマンドの判定結果"""
+    ignored: bool
+    multiplier: float
+    tool: Optional[str]  # 実行したプログラム名（sudo などを除いた最初のトークン）
+    rule_id: Optional[str]
+
+
+def validate_rules(rules: Dict[str, Any]) -> List[str]:
+    """規則テーブルを検証してエラーメッセージのリストを返す"""
+    errors = []
+    for rule_id, rule in rules.items():
+        if rule.get("action") not in ACTIONS:
+            errors.append(f"command_rules.{rule_id}: action は {' / '.join(ACTIONS)} で指定してください")
+        if ("prefix" in rule) == ("pattern" in rule):
+            errors.append(f"command_rules.{rule_id}: prefix と pattern のどちらか一方を指定してください")
+        elif "prefix" in rule and not str(rule["prefix"]).split():
+            errors.append(f"command_rules.{rule_id}: prefix が空です")
+        elif "pattern" in rule:
+            try:
+                re.compile(rule["pattern"])
+            except re.error as e:
+                errors.append(f"command_rules.{rule_id}: 正規表現が不正です（{e}）")
+        if rule.get("action") == "bonus" and not rule.get("multiplier", 0) > 0:
+            errors.append(f"command_rules.{rule_id}: multiplier は正の数で指定してください")
+    return errors
+
+
+def compile_rules(rules: Dict[str, Any]) -> Tuple[Dict[str, Any], Tuple[Tuple[Pattern, CommandRule], ...]]:
+    """
+    規則テーブルをトライ木と正規表現の組に変換する
+
+    Returns:
+        (トライ木, ((正規表現, 規則), ...))
+        トライ木は {トークン: 子の節, RULE_KEY: 規則} の入れ子の辞書
+    """
+    trie: Dict[str, Any] = {}
+    patterns = []
+    for rule_id, rule in rules.items():
+        compiled = CommandRule(rule_id, rule["action"], float(rule.get("multiplier", 1)))
+        if "pattern" in rule:
+            patterns.append((re.compile(rule["pattern"]), compiled))
+            continue
+        node = trie
+        for token in str(rule["prefix"]).split():
+            node = node.setdefault(token, {})
+        node[RULE_KEY] = compiled
+    return trie, tuple(patterns)
+
+
+def normalize(command: str) -> str:
+    """判定に使う部分（1行目の先頭 COMMAND_MAX_LENGTH 文字）"""
+    return command.split("\n", 1)[0][:COMMAND_MAX_LENGTH].strip()
+
+
+def _command_tokens(tokens: List[str]) -> List[str]:
+    """先頭の環境変数の代入と sudo などのラッパー（とそのオプション）を飛ばす"""
+    start = 0
+    while start < len(tokens):
+        token = tokens[start]
+        if token in COMMAND_WRAPPERS or ("=" in token and not token.startswith("-")):
+            start += 1
+        elif start and token.startswith("-") and tokens[start - 1] in COMMAND_WRAPPERS:
+            start += 1
+        else:
+            break
+    return tokens[start:]
+
+
+def classify(command: str, trie: Dict[str, Any],
+             patterns: Tuple[Tuple[Pattern, CommandRule], ...]) -> CommandInfo:
+    """
+    コマンドを分類する
+    トライ木で最長一致した規則を使い、正規表現の除外規則はそれより優先する
+    """
+    line = normalize(command)
+    if not line:
+        return CommandInfo(True, 0.0, None, None)
+
+    # 規則は入力どおりのトークン列と、ラッパーを除いたトークン列の両方で探す
+    raw = line.split()
+    tokens = _command_tokens(raw)
+    rule: Optional[CommandRule] = None
+    candidates = (raw,) if len(tokens) == len(raw) else (raw, tokens)
+    for candidate in candidates:
+        node = trie
+        for token in candidate:
+            node = node.get(token)
+            if node is None:
+                break
+            rule = node.get(RULE_KEY, rule)
+        if rule is not None:
+            break
+
+    for pattern, pattern_rule in patterns:
+        if (rule is None or pattern_rule.action == "ignore") and pattern.search(line):
+            rule = pattern_rule
+            if rule.action == "ignore":
+                break
+
+    tool = os.path.basename(tokens[0]) if tokens else None
+    if rule is None:
+        return CommandInfo(False, 1.0, tool, None)
+    if rule.action == "ignore":
+        return CommandInfo(True, 0.0, tool, rule.rule_id)
+    return CommandInfo(False, rule.multiplier, tool, rule.rule_id)
@@ -7,6 +7,13 @@ from pathlib import Path
 # ===== データ保存パス =====
 DATA_DIR = Path.home() / ".local" / "share" / "shell-gotchi"
 DATA_FILE = DATA_DIR / "data.json"
+DATA_LOCK_FILE = DATA_DIR / "data.lock"  # data.json の読み込み〜保存の間に flock するファイル
+
+# ===== ユーザー設定ファイル =====
+# config.py のテーブルを上書きするTOMLファイル（環境変数 SG_CONFIG で変更可能）
+CONFIG_DIR = Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config") / "shell-gotchi"
+CONFIG_FILE = Path(os.environ.get("SG_CONFIG") or CONFIG_DIR / "config.toml")
+CONFIG_CACHE_FILE = DATA_DIR / "config.cache"  # コンパイル済み設定のキャッシュ
 
 # ===== ゲームパラメータ =====
 # ドロップ関連
@@ -22,6 +29,9 @@ MIN_HUNGER = 0
 FEED_HUNGER_GAIN = 20  # 満腹度回復量
 FEED_EXP_GAIN = 10  # 経験値獲得量
 
+# コイン
+COMMANDS_PER_COIN = 10  # N回コマンドごとに1コイン
+
 # ログインボーナス
 TICKET_FRAGMENTS_FOR_TICKET = 7  # チケット1枚に必要な破片数
 LOGIN_STREAK_FOR_TICKET = 7  # 連続ログイン日数でチケット獲得
@@ -66,6 +76,18 @@ GACHA_RATES = {
     "R": 0.90,    # 90%
 }
 
+# ガチャ演出
+GACHA_ANIMATION_BUDGET = 1.2  # 演出全体の時間予算（秒）。0以下で演出なし
+GACHA_DRUMROLL_FRAMES = 6  # ドラムロール演出のフレーム数
+GACHA_MAX_PULLS = 10  # 1回のコマンドで回せるガチャの最大数
+
+# ガチャの履歴（sg gacha history / rates）
+GACHA_HISTORY_FILE = DATA_DIR / "gacha.bin"  # 固定長のバイナリファイル
+GACHA_HISTORY_CAPACITY = 1000  # 残す直近の記録の数（1件8バイト。変えるとファイルを作り直す）
+GACHA_HISTORY_SHOW = 20  # sg gacha history で表示する件数の既定値
+GACHA_HISTORY_RARITY_SLOTS = 8  # 履歴に登録できるレアリティの数（GACHA_RATES もこの数まで）
+GACHA_HISTORY_RARITY_NAME_BYTES = 8  # レアリティの名前の長さの上限（UTF-8のバイト数。GACHA_RATES のキーも）
+
 # ガチャアイテムプール
 GACHA_ITEMS = {
     "SSR": [
@@ -146,7 +168,50 @@ DAILY_MISSIONS = {
         "type": "gacha",
         "reward": {"ticket_fragments": 2},
     },
+    "git_10": {
+        "name": "git を 10回",
+        "description": "git コマンドを10回実行する",
+        "target": 10,
+        "type": "tool",
+        "tool": "git",
+        "reward": {"coins": 20},
+    },
+}
+
+# ===== コマンドの判定規則 =====
+# シェルフックから渡されたコマンドの扱い（ID → 規則）
+# - "prefix": 空白区切りのトークン列の前方一致（"git commit" は git commit -m ... などに一致）
+# - "pattern": 正規表現（prefix で表せない場合のみ）
+# - "action": "ignore"（数えない）/ "bonus"（エサのドロップ確率を multiplier 倍）
+COMMAND_RULES = {
+    "sg": {"prefix": "sg", "action": "ignore"},
+    "sg_direct": {"pattern": r"^python\S*\s.*main\.py", "action": "ignore"},
+    "git_commit": {"prefix": "git commit", "action": "bonus", "multiplier": 3},
+    "make": {"prefix": "make", "action": "bonus", "multiplier": 2},
+    "pytest": {"prefix": "pytest", "action": "bonus", "multiplier": 2},
+    "python_pytest": {"prefix": "python -m pytest", "action": "bonus", "multiplier": 2},
 }
+COMMAND_MAX_LENGTH = 512  # 判定に使うコマンドの最大文字数（1行目の先頭のみ）
+COMMAND_WRAPPERS = ("sudo", "env", "time", "nohup", "nice", "command", "exec")  # ツール名の判定で飛ばすコマンド
+
+# ===== スパム対策 =====
+SPAM_RING_SIZE = 64  # 記録する直近のコマンド数（時間窓の上限件数はこれ以下）
+SPAM_WINDOW_CAPS = ((10, 15), (60, 40))  # (秒, 上限件数): 窓の中で上限を超えた分は報酬なし
+SPAM_REPEAT_FREE = 3  # 同じコマンドの連続実行で減衰なしとする回数
+SPAM_REPEAT_DECAY = 0.5  # それを超えた1回ごとのドロップ確率の減衰率
+SPAM_REPEAT_RESET = 30  # 直前のコマンドからこの秒数以上空いたら連続実行とみなさない
+
+# ===== コマンドの実行時間（sg stats --slow / --failing） =====
+LATENCY_SKETCH_ACCURACY = 0.02  # 分位点の相対誤差（DDSketch）
+LATENCY_SKETCH_MAX_BINS = 64  # 1コマンドあたりのバケット数の上限
+LATENCY_MAX_COMMANDS = 100  # 集計するコマンド名の数の上限
+LATENCY_REPORT_MIN_RUNS = 3  # 一覧に出す最少の実行回数
+LATENCY_BUILD_TOOLS = ("make", "pytest", "cargo", "go", "npm", "yarn", "gradle", "mvn", "tsc")  # ビルド・テストとみなすコマンド
+LATENCY_FAST_MIN_SAMPLES = 20  # 「いつもより速い」と判定するのに必要な記録数
+LATENCY_FAST_QUANTILE = 0.25  # この分位点より短く終わったら「いつもより速い」
+LATENCY_FAST_MIN_MS = 2000  # これより短いビルド・テストは報酬の対象外（何もしない make の連打を防ぐ）
+LATENCY_FAST_BUILD_COINS = 3  # 成功したビルドがいつもより速く終わったときのコイン
+LATENCY_FAST_BUILD_DAILY_MAX = 5  # 1日に報酬を受け取れる回数
 
 # ===== 実績 =====
 ACHIEVEMENTS = {
@@ -265,6 +330,7 @@ DEFAULT_DATA = {
         "total_gacha": 0,  # 累計ガチャ回数
         "ssr_count": 0,  # SSR獲得回数
         "max_login_streak": 0,  # 最大連続ログイン
+        "fast_builds": 0,  # いつもより速く成功したビルド・テストの回数
     },
     "pet": {
         "name": "Termi",
@@ -279,9 +345,139 @@ DEFAULT_DATA = {
         "date": None,  # ミッションの日付
         "progress": {},  # ミッションごとの進捗
         "completed": [],  # 完了済みミッションID
+        "fast_builds": 0,  # 今日、速く成功したビルドの報酬を受け取った回数
+    },
+    "history_import": {},  # 取り込み済みのシェル履歴（ファイルごとの読み込み位置）
+    "antispam": {
+        "ring": "",  # 直近のコマンドの (時刻, CRC32) のリングバッファ（base64）
+        "head": 0,  # 次に書き込む位置
+        "count": 0,  # 記録済みの件数
+        "last_hash": None,  # 直前のコマンドのCRC32
+        "repeat": 0,  # 同じコマンドの連続実行回数
+        "blocked": 0,  # 時間窓の上限で報酬なしにした回数
+        "decayed": 0,  # 連続実行で確率を減衰させた回数
+    },
+    "latency": {},  # コマンド名ごとの実行時間のスケッチと失敗回数
+    "leaderboard": {
+        "published_at": 0,  # 最後にランキングへ公開したUNIX時刻
+        "scores": {},  # 最後に公開したスコア
+    },
+    "sync": {  # 複数マシンでの同期（src/replica.py）
+        "base": {},  # 前回書き出した・取り込んだときの値
+        "stamps": {},  # last 規則の項目を最後に変更した時刻
+        "seen": {},  # 他のマシンのファイル → [ログID, 読んだ位置]
+        "exported_at": 0
+    },
+    "slo": {  # フックの遅延予算（src/slo.py）
+        "over_budget": {"startup": 0, "load": 0, "logic": 0, "save": 0, "rollup": 0},  # 段階ごとの予算超過
+        "replayed": 0,  # 後回しにして後で処理した件数
+        "io_ms": 0.0  # data.json の読み込み時間の移動平均（ミリ秒。保存時間の見込みに使う）
+    },
+    "rng": {
+        "seed": None,  # 抽選用の乱数の種（初回の抽選時に生成）
+        "position": 0,  # 次に使う乱数の番号
     },
 }
 
+# ===== 実行時間の計測（SG_PROFILE=1 でも有効化） =====
+PROFILE_ENABLED = False  # Trueで毎回の実行時間をログに記録
+PROFILE_LOG = DATA_DIR / "profile.log"  # 1実行1行のログ
+PROFILE_LOG_MAX_BYTES = 1_000_000  # これを超えたら profile.log.1 にローテーション
+PROFILE_REPORT_RUNS = 500  # sg profile report で集計する直近の実行数
+
+# ===== メトリクス（環境変数 SG_METRICS_TEXTFILE でも有効化） =====
+METRICS_TEXTFILE = None  # node_exporter の textfile collector 用 .prom ファイルのパス（Noneで無効）
+METRICS_STATE_FILE = DATA_DIR / "metrics.json"  # プロセス間で合算する集計ファイル
+METRICS_EXPORT_INTERVAL = 15  # .prom ファイルを書き出す最短間隔（秒）
+
+# ===== 活動の時系列（sg stats --heatmap / --trend） =====
+ACTIVITY_FILE = DATA_DIR / "activity.bin"  # 固定長のバイナリファイル
+ACTIVITY_HOURS = 720  # 時間ごとのバケットを残す数（30日）
+ACTIVITY_DAYS = 365  # 日ごとのバケットを残す数（1年）
+ACTIVITY_WEEKS = 520  # 週ごとのバケットを残す数（10年）
+
+# ===== ディレクトリごとの集計（sg stats --by-dir） =====
+DIRS_FILE = DATA_DIR / "dirs.json"  # ディレクトリのトライ木
+DIRS_LOG_FILE = DATA_DIR / "dirs.jsonl"  # フックが追記する作業ディレクトリのログ（sg stats --by-dir でトライ木に畳み込む）
+DIRS_LOG_MAX_BYTES = 64 * 1024  # ログがこの大きさを超えたら、フックがその場で畳み込む
+DIR_TRIE_DEPTH = 4  # git リポジトリ外のディレクトリを丸める階層（ホームの下はホームから数える）
+DIR_TRIE_MAX_NODES = 1000  # トライ木の節の数の上限（超えたら古い葉を親にまとめる）
+DIR_GIT_CACHE_MAX = 200  # git のルートを探した結果をキャッシュするディレクトリ数
+DIR_GIT_CACHE_TTL = 86400  # キャッシュの有効期間（秒）
+
+# ===== フックの遅延予算（SLO） =====
+HOOK_LATENCY_BUDGET_MS = 200  # プロセス開始からこの時間を超えそうなら処理を後回しにする（0で無効。環境変数 SG_HOOK_BUDGET_MS が優先）
+HOOK_LOGIC_RESERVE_MS = 2.0  # 読み込みの後、ロジックのために残しておく時間（ミリ秒。これに保存時間の見込みを足す）
+HOOK_DEFER_MAX_BYTES = 256 * 1024  # 後回しキューがこの大きさを超えたら、予算に関係なくその場で処理する
+DEFERRED_QUEUE_FILE = DATA_DIR / "deferred.jsonl"  # 後回しキュー
+
+# ===== 通知キュー（sg notify） =====
+NOTIFY_QUEUE_FILE = DATA_DIR / "notify.jsonl"  # フックの結果の通知（hooks/shell_hook.sh の _SG_NOTIFY_FILE と合わせる）
+
+# ===== ライブ表示（sg watch） =====
+WATCH_POLL_INTERVAL = 1.0  # inotify が使えないとき、データファイルを stat する間隔（秒）
+WATCH_DEBOUNCE_SECONDS = 0.05  # この間に続けて起きた書き込みは1回の変更とする（秒）
+WATCH_FRAME_INTERVAL = 0.3  # 表情が変わったときのアニメーションの1フレームの時間（秒）
+
+# ===== イベントバス・プラグイン（sg plugins） =====
+PLUGIN_DIR = CONFIG_DIR / "plugins"  # プラグイン（*.py）を置くディレクトリ
+PLUGIN_STATE_FILE = DATA_DIR / "plugins.json"  # 止めたプラグインのハンドラの記録
+EVENT_PLUGIN_BUDGET_MS = 5.0  # プラグインのハンドラ1回あたりの持ち時間（ミリ秒）
+EVENT_BUDGET_STRIKES = 3  # フックの処理中に続けてこの回数持ち時間を超えたハンドラを止める
+EVENT_DISABLE_SECONDS = 86400  # 止める時間（秒）
+
+# ===== ホスト共有サービス（sg serve） =====
+SERVE_SOCKET = None  # サービスの Unix ソケットのパス（環境変数 SG_SERVE_SOCKET でも指定。Noneで使わない）
+SERVE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # キャッシュするセーブデータの上限（JSONのバイト数。実際のメモリはその数倍）
+SERVE_WRITEBACK_SECONDS = 2.0  # 変更したセーブデータを書き戻すまでの秒数
+SERVE_CLIENT_TIMEOUT = 0.2  # フックがサービスの応答を待つ秒数（超えたら自分で処理する）
+
+# ===== ホスト内ランキング（sg leaderboard） =====
+LEADERBOARD_DIR = None  # スコアを公開する共有ディレクトリ（環境変数 SG_LEADERBOARD_DIR でも指定。Noneで使わない）
+LEADERBOARD_PUBLISH_INTERVAL = 300  # コマンド数の変化を公開する最短間隔（秒。レベル・SSRはすぐ公開）
+LEADERBOARD_EXPIRE_DAYS = 30  # この日数公開のないプレイヤーはランキングから外す
+
+# ===== シェル履歴の取り込み（sg import-history） =====
+IMPORT_CHUNK_BYTES = 1 << 20  # 履歴ファイルを一度に読むバイト数
+IMPORT_BATCH_COMMANDS = 10000  # まとめて処理するコマンド数
+
+# ===== 経済シミュレーター（sg simulate） =====
+SIM_PLAYERS = 1000  # 合成プレイヤー数
+SIM_DAYS = 365  # シミュレーションする日数
+SIM_COMMANDS_PER_DAY = 80  # シェルを使った日の平均コマンド数
+SIM_ACTIVITY_SPREAD = 0.5  # プレイヤーごとの平均コマンド数のばらつき（対数正規分布の標準偏差）
+SIM_ACTIVE_DAY_RATE = 0.8  # シェルを使う日の割合
+SIM_SHOP_ITEM = "ticket_single"  # コインで買い続ける商品（Noneで買わない）
+SIM_TARGET_LEVEL = 10  # 到達日数を集計するレベル
+SIM_CHUNK_PLAYERS = 2500  # プロセスプールに渡す1ジョブあたりのプレイヤー数
+SIM_PYTHON_CHUNK_PLAYERS = 250  # NumPy がないとき（純Pythonで計算）の1ジョブあたりのプレイヤー数（全コアに分ける）
+
+# ===== ローカル書き戻しキャッシュ（$HOME が NFS のとき） =====
+LOCAL_CACHE = False  # data.json をローカルのコピーで読み書きする（環境変数 SG_LOCAL_CACHE=1/0 が優先）
+LOCAL_CACHE_DIR = None  # コピーの置き場所（Noneなら $XDG_RUNTIME_DIR/shell-gotchi か /tmp/shell-gotchi-<uid>）
+LOCAL_CACHE_FLUSH_SECONDS = 300  # 最初の未反映の書き込みからこの秒数でホームに書き戻す
+LOCAL_CACHE_FLUSH_WRITES = 200  # 未反映の書き込みがこの回数になったらホームに書き戻す
+LOCAL_CACHE_REVALIDATE_SECONDS = 60  # 未反映の書き込みがないとき、ホームの変更を確かめる間隔（秒）
+# data.json と一緒にローカルに置き、書き戻すときにホームにも書き戻すファイル
+LOCAL_CACHE_MIRRORED_FILES = (ACTIVITY_FILE.name, DIRS_FILE.name, DIRS_LOG_FILE.name, DEFERRED_QUEUE_FILE.name)
+# ローカルにだけ置くファイル（ロック・次のプロンプトで表示する通知）
+LOCAL_CACHE_LOCAL_FILES = (DATA_LOCK_FILE.name, NOTIFY_QUEUE_FILE.name)
+
+# ===== 複数マシンでの同期（SG_SYNC_DIR） =====
+SYNC_DIR = None  # 差分ファイルを置く共有ディレクトリ（Noneで同期しない。環境変数 SG_SYNC_DIR が優先）
+SYNC_MACHINE_ID = None  # このマシンの名前（Noneならホスト名。環境変数 SG_MACHINE_ID が優先）
+SYNC_EXPORT_INTERVAL = 60  # 差分を書き出す最短の間隔（秒）
+
+# ===== 利用状況レポート（sg admin report） =====
+REPORT_GLOB = "/home/*/.local/share/shell-gotchi/data.json"  # 既定で集計するセーブデータ
+REPORT_CHUNK_FILES = 256  # プロセスプールに渡す1ジョブあたりのファイル数
+REPORT_ACTIVE_DAYS = 7  # この日数以内にログインしたプレイヤーを「アクティブ」と数える
+
+# ===== ベンチマーク =====
+BENCH_REPEAT = 20  # 各計測の繰り返し回数
+BENCH_REGRESSION_THRESHOLD = 10.0  # ベースラインからの劣化とみなす割合（%）
+
 # ===== 表示設定 =====
 APP_NAME = "Shell-Gotchi"
 VERSION = "2.0.0"
+RENDERER = "auto"  # 表示バックエンド: "auto" / "rich" / "plain"（環境変数 SG_RENDERER が優先）
@@ -0,0 +1,444 @@
+"""
+Shell-Gotchi 設定テーブルのコンパイル
+config.py の生の辞書（とユーザー設定ファイルの上書き）を検証し、
+ゲームロジックがそのまま使える凍結済み・索引付きの構造に変換する
+
+- 累積確率の配列（レアリティ判定を二分探索で行う）
+- レアリティ別アイテム、ミッション種別・実績条件種別ごとの索引
+- アイテムID → 通し番号の対応表
+- コマンドの判定規則のトライ木と正規表現（command_rules.py）
+
+コンパイル結果は DATA_DIR にキャッシュし、config.py と設定ファイルの
+更新時刻が変わらない限り次回以降の起動では検証をやり直さない
+"""
+import math
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from . import command_rules, config
+from .command_rules import compile_rules, validate_rules
+from .config import (
+    CONFIG_FILE, CONFIG_CACHE_FILE, VERSION, GACHA_HISTORY_RARITY_SLOTS, GACHA_HISTORY_RARITY_NAME_BYTES,
+)
+
+# 設定ファイルで上書きできるテーブル（TOMLのキー → config.py の定数名）
+OVERRIDABLE_TABLES = {
+    "drop_chance": "DROP_CHANCE",
+    "guaranteed_drop_commands": "GUARANTEED_DROP_COMMANDS",
+    "gacha_rates": "GACHA_RATES",
+    "gacha_items": "GACHA_ITEMS",
+    "shop_items": "SHOP_ITEMS",
+    "daily_missions": "DAILY_MISSIONS",
+    "achievements": "ACHIEVEMENTS",
+    "level_thresholds": "LEVEL_THRESHOLDS",
+    "level_up_ticket_rewards": "LEVEL_UP_TICKET_REWARDS",
+    "command_rules": "COMMAND_RULES",
+}
+
+# 既知のミッション種別・実績条件種別
+MISSION_TYPES = ("commands", "feed", "gacha", "tool")
+ACHIEVEMENT_TYPES = (
+    "total_commands", "level", "total_gacha", "ssr_count",
+    "login_streak", "collection_count",
+)
+
+# キャッシュ形式のバージョン（CompiledConfig の構造を変えたら上げる）
+CACHE_FORMAT = 2
+
+
+class ConfigError(ValueError):
+    """設定テーブルの検証エラー"""
+
+
+class FrozenDict(dict):
+    """変更できない辞書（pickle可能）"""
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("コンパイル済みの設定は変更できません")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __hash__(self) -> int:  # type: ignore[override]
+        return hash(tuple(self.items()))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """辞書・リストを再帰的に FrozenDict・タプルに変換する"""
+    if isinstance(value, dict):
+        return FrozenDict({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)) and not hasattr(value, "_fields"):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class CompiledConfig(NamedTuple):
+    """コンパイル済みの設定テーブル"""
+    drop_chance: float
+    guaranteed_drop_commands: int
+    rarities: Tuple[str, ...]  # GACHA_RATES の順序
+    cumulative_rates: Tuple[float, ...]  # rarities と同じ順序の累積確率
+    gacha_items: FrozenDict  # レアリティ → アイテムのタプル
+    items: Tuple[FrozenDict, ...]  # 全ガチャアイテム（通し番号順）
+    item_index: FrozenDict  # アイテムID → items の通し番号
+    item_rarity: FrozenDict  # アイテムID → レアリティ
+    shop_items: FrozenDict
+    daily_missions: FrozenDict
+    missions_by_type: FrozenDict  # ミッション種別 → ミッションIDのタプル
+    achievements: FrozenDict
+    achievements_by_type: FrozenDict  # 条件種別 → 実績IDのタプル
+    level_thresholds: Tuple[int, ...]  # level_thresholds[lv - 1] = Lv.lv の累積経験値
+    level_up_ticket_rewards: FrozenDict
+    command_trie: FrozenDict  # トークン → 子の節（"" に規則）の入れ子
+    command_patterns: Tuple[Tuple[Any, Any], ...]  # (正規表現, 規則) のタプル
+
+
+# ===== 上書き設定の読み込み =====
+
+def _load_toml(path: Path) -> Dict[str, Any]:
+    """TOMLファイルを読み込む（tomllib / tomli がない環境では空の辞書）"""
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib  # type: ignore[no-redef]
+        except ImportError:
+            print(f"[SG] Warning: TOMLを読み込めないため {path} を無視します", file=sys.stderr)
+            return {}
+
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def _merge_table(base: Dict[Any, Any], override: Dict[Any, Any]) -> Dict[Any, Any]:
+    """
+    テーブルを上書きする
+    既存エントリが辞書の場合は項目単位で上書きし、それ以外は置き換える
+    """
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_sources(config_file: Optional[Path] = None, use_overrides: bool = True) -> Dict[str, Any]:
+    """
+    config.py の値に設定ファイルの上書きを適用した生のテーブルを返す
+    use_overrides が False の場合は config.py の値だけを使う
+
+    設定ファイルの例（~/.config/shell-gotchi/config.toml）:
+        drop_chance = 0.08
+
+        [gacha_rates]
+        SSR = 0.02
+        SR = 0.08
+        R = 0.90
+
+        [shop_items.ticket_single]
+        price = 80
+    """
+    sources = {key: getattr(config, name) for key, name in OVERRIDABLE_TABLES.items()}
+
+    path = config_file or CONFIG_FILE
+    if not use_overrides or not path.exists():
+        return sources
+
+    overrides = _load_toml(path)
+    unknown = sorted(set(overrides) - set(OVERRIDABLE_TABLES))
+    if unknown:
+        raise ConfigError(f"{path}: 不明な設定項目があります: {', '.join(unknown)}")
+
+    for key, value in overrides.items():
+        if isinstance(sources[key], dict) and isinstance(value, dict):
+            if key in ("level_thresholds", "level_up_ticket_rewards"):
+                # TOMLのキーは文字列なのでレベル番号に変換する
+                try:
+                    value = {int(k): v for k, v in value.items()}
+                except ValueError:
+                    raise ConfigError(f"{path}: {key} のキーはレベル番号（整数）で指定してください") from None
+            sources[key] = _merge_table(sources[key], value)
+        else:
+            sources[key] = value
+    return sources
+
+
+# ===== 検証 =====
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _table_errors(name: str, table: Any, check_value: Callable[[Any], bool], expected: str,
+                  check_key: Callable[[Any], bool] = lambda key: isinstance(key, str)) -> List[str]:
+    """テーブル（辞書）とその値の型を確かめる"""
+    if not isinstance(table, dict):
+        return [f"{name} はテーブルで指定してください"]
+    return [f"{name}.{key}: {expected}で指定してください"
+            for key, value in table.items() if not check_key(key) or not check_value(value)]
+
+
+def validate_types(sources: Dict[str, Any]) -> List[str]:
+    """
+    各テーブル・値の型を確かめてエラーメッセージのリストを返す
+    （型が違うと値の範囲の検証やコンパイルが TypeError などで止まるので、先に確かめる）
+    """
+    errors: List[str] = []
+    if not _is_number(sources["drop_chance"]):
+        errors.append("drop_chance は数値で指定してください")
+    if not _is_int(sources["guaranteed_drop_commands"]):
+        errors.append("guaranteed_drop_commands は整数で指定してください")
+    errors += _table_errors("gacha_rates", sources["gacha_rates"], _is_number, "数値")
+    errors += _table_errors(
+        "gacha_items", sources["gacha_items"],
+        lambda items: isinstance(items, (list, tuple)) and all(
+            isinstance(item, dict) and isinstance(item.get("id", ""), str) for item in items),
+        "アイテム（id は文字列）の配列")
+    for name in ("shop_items", "daily_missions", "achievements"):
+        errors += _table_errors(name, sources[name], lambda value: isinstance(value, dict), "テーブル")
+    if isinstance(sources["achievements"], dict):
+        errors += [f"achievements.{ach_id}: condition はテーブルで指定してください"
+                   for ach_id, ach in sources["achievements"].items()
+                   if isinstance(ach, dict) and not isinstance(ach.get("condition", {}), dict)]
+    for name in ("level_thresholds", "level_up_ticket_rewards"):
+        errors += _table_errors(name, sources[name], _is_int, "整数", check_key=_is_int)
+
+    rules = sources["command_rules"]
+    errors += _table_errors("command_rules", rules, lambda value: isinstance(value, dict), "テーブル")
+    if isinstance(rules, dict):
+        for rule_id, rule in rules.items():
+            if not isinstance(rule, dict):
+                continue
+            for key in ("prefix", "pattern"):
+                if key in rule and not isinstance(rule[key], str):
+                    errors.append(f"command_rules.{rule_id}: {key} は文字列で指定してください")
+            if "multiplier" in rule and not _is_number(rule["multiplier"]):
+                errors.append(f"command_rules.{rule_id}: multiplier は数値で指定してください")
+    return errors
+
+
+def validate_sources(sources: Dict[str, Any]) -> None:
+    """生のテーブルを検証する（問題があれば ConfigError）"""
+    errors = validate_types(sources)
+    if errors:
+        raise ConfigError("設定の検証に失敗しました:\n  " + "\n  ".join(errors))
+
+    if not 0 <= sources["drop_chance"] <= 1:
+        errors.append("drop_chance は 0〜1 で指定してください")
+    if int(sources["guaranteed_drop_commands"]) < 1:
+        errors.append("guaranteed_drop_commands は 1 以上で指定してください")
+
+    # ガチャ確率
+    rates = sources["gacha_rates"]
+    if not rates:
+        errors.append("gacha_rates が空です")
+    if len(rates) > GACHA_HISTORY_RARITY_SLOTS:
+        errors.append(f"gacha_rates: レアリティは{GACHA_HISTORY_RARITY_SLOTS}個までにしてください（ガチャの履歴の欄の数）")
+    for rarity, rate in rates.items():
+        if len(rarity.encode("utf-8")) > GACHA_HISTORY_RARITY_NAME_BYTES:
+            errors.append(f"gacha_rates.{rarity}: レアリティの名前はUTF-8で"
+                          f"{GACHA_HISTORY_RARITY_NAME_BYTES}バイトまでにしてください（ガチャの履歴に名前で残すため）")
+        if not 0 <= rate <= 1:
+            errors.append(f"gacha_rates.{rarity}: 確率は 0〜1 で指定してください")
+        if not sources["gacha_items"].get(rarity):
+            errors.append(f"gacha_items.{rarity}: アイテムがありません")
+    if rates and not math.isclose(sum(rates.values()), 1.0, abs_tol=1e-9):
+        errors.append(f"gacha_rates の合計が 1 になりません（{sum(rates.values())}）")
+
+    # ガチャアイテム
+    seen = set()
+    for rarity, items in sources["gacha_items"].items():
+        for item in items:
+            missing = {"id", "name", "type"} - set(item)
+            if missing:
+                errors.append(f"gacha_items.{rarity}: {', '.join(sorted(missing))} がありません")
+                continue
+            if item["id"] in seen:
+                errors.append(f"gacha_items: アイテムID {item['id']} が重複しています")
+            seen.add(item["id"])
+
+    # ショップ
+    for item_id, item in sources["shop_items"].items():
+        if not isinstance(item.get("price"), int) or item["price"] < 0:
+            errors.append(f"shop_items.{item_id}: price は 0 以上の整数で指定してください")
+        if not item.get("reward"):
+            errors.append(f"shop_items.{item_id}: reward がありません")
+
+    # デイリーミッション
+    for mission_id, mission in sources["daily_missions"].items():
+        if mission.get("type") not in MISSION_TYPES:
+            errors.append(f"daily_missions.{mission_id}: 不明な種別 {mission.get('type')}")
+        if not isinstance(mission.get("target"), int) or mission["target"] < 1:
+            errors.append(f"daily_missions.{mission_id}: target は 1 以上の整数で指定してください")
+        if mission.get("type") == "tool" and not mission.get("tool"):
+            errors.append(f"daily_missions.{mission_id}: 種別 tool には tool（コマンド名）が必要です")
+
+    # 実績
+    for ach_id, ach in sources["achievements"].items():
+        condition = ach.get("condition", {})
+        if condition.get("type") not in ACHIEVEMENT_TYPES:
+            errors.append(f"achievements.{ach_id}: 不明な条件 {condition.get('type')}")
+        if not isinstance(condition.get("target"), int):
+            errors.append(f"achievements.{ach_id}: condition.target は整数で指定してください")
+
+    # コマンドの判定規則
+    errors += validate_rules(sources["command_rules"])
+
+    # レベル閾値（Lv.1 から連番で、経験値は単調増加）
+    thresholds = sources["level_thresholds"]
+    levels = sorted(thresholds)
+    if levels != list(range(1, len(levels) + 1)):
+        errors.append("level_thresholds はLv.1から連番で指定してください")
+    elif thresholds[1] != 0:
+        errors.append("level_thresholds の Lv.1 は 0 にしてください")
+    elif any(thresholds[lv] >= thresholds[lv + 1] for lv in levels[:-1]):
+        errors.append("level_thresholds の経験値は単調増加にしてください")
+
+    if errors:
+        raise ConfigError("設定の検証に失敗しました:\n  " + "\n  ".join(errors))
+
+
+# ===== コンパイル =====
+
+def compile_sources(sources: Dict[str, Any]) -> CompiledConfig:
+    """検証済みのテーブルから索引付きの構造を作る"""
+    rarities = tuple(sources["gacha_rates"])
+    cumulative = []
+    total = 0.0
+    for rarity in rarities:
+        total += sources["gacha_rates"][rarity]
+        cumulative.append(total)
+
+    items = []
+    item_rarity = {}
+    for rarity in rarities:
+        for item in sources["gacha_items"][rarity]:
+            items.append(item)
+            item_rarity[item["id"]] = rarity
+
+    missions_by_type: Dict[str, List[str]] = {}
+    for mission_id, mission in sources["daily_missions"].items():
+        # ツール別ミッションは "tool:<コマンド名>" で索引する
+        mission_type = f"tool:{mission['tool']}" if mission["type"] == "tool" else mission["type"]
+        missions_by_type.setdefault(mission_type, []).append(mission_id)
+
+    achievements_by_type: Dict[str, List[str]] = {}
+    for ach_id, ach in sources["achievements"].items():
+        achievements_by_type.setdefault(ach["condition"]["type"], []).append(ach_id)
+
+    thresholds = sources["level_thresholds"]
+    command_trie, command_patterns = compile_rules(sources["command_rules"])
+    return CompiledConfig(
+        drop_chance=float(sources["drop_chance"]),
+        guaranteed_drop_commands=int(sources["guaranteed_drop_commands"]),
+        rarities=rarities,
+        cumulative_rates=tuple(cumulative),
+        gacha_items=freeze({r: sources["gacha_items"][r] for r in rarities}),
+        items=freeze(items),
+        item_index=FrozenDict({item["id"]: i for i, item in enumerate(items)}),
+        item_rarity=FrozenDict(item_rarity),
+        shop_items=freeze(sources["shop_items"]),
+        daily_missions=freeze(sources["daily_missions"]),
+        missions_by_type=freeze(missions_by_type),
+        achievements=freeze(sources["achievements"]),
+        achievements_by_type=freeze(achievements_by_type),
+        level_thresholds=tuple(thresholds[lv] for lv in sorted(thresholds)),
+        level_up_ticket_rewards=freeze(sources["level_up_ticket_rewards"]),
+        command_trie=freeze(command_trie),
+        command_patterns=command_patterns,
+    )
+
+
+def compile_config(config_file: Optional[Path] = None, use_overrides: bool = True) -> CompiledConfig:
+    """設定を読み込み・検証・コンパイルする"""
+    sources = load_sources(config_file, use_overrides)
+    validate_sources(sources)
+    return compile_sources(sources)
+
+
+# ===== キャッシュ =====
+
+def _mtime(path: Path) -> Optional[int]:
+    """ファイルの更新時刻（ナノ秒）。存在しなければNone"""
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _cache_key() -> Tuple[Any, ...]:
+    """キャッシュの有効性を判定するキー（ソースの更新時刻）"""
+    return (
+        CACHE_FORMAT,
+        VERSION,
+        _mtime(Path(config.__file__)),
+        _mtime(Path(__file__)),
+        _mtime(Path(command_rules.__file__)),  # コマンドの判定規則のトライ木もキャッシュに入る
+        str(CONFIG_FILE),
+        _mtime(CONFIG_FILE),
+    )
+
+
+def _read_cache(key: Tuple[Any, ...]) -> Optional[CompiledConfig]:
+    """キャッシュが有効ならコンパイル済みの設定を返す"""
+    try:
+        with open(CONFIG_CACHE_FILE, "rb") as f:
+            cached_key, compiled = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError, TypeError):
+        return None
+    return compiled if cached_key == key else None
+
+
+def _write_cache(key: Tuple[Any, ...], compiled: CompiledConfig) -> None:
+    """コンパイル結果をキャッシュに保存する（失敗しても無視）"""
+    try:
+        CONFIG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CONFIG_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((key, compiled), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, CONFIG_CACHE_FILE)
+    except OSError:
+        pass
+
+
+_compiled: Optional[CompiledConfig] = None
+
+
+def get_compiled_config() -> CompiledConfig:
+    """
+    コンパイル済みの設定を返す
+
+    1. プロセス内で一度コンパイルしたものがあればそれを返す
+    2. キャッシュファイルのキーが一致すればそれを読み込む（検証なし）
+    3. それ以外はコンパイルしてキャッシュに保存する
+       ユーザー設定ファイルに問題がある場合は警告を出して config.py の値を使う
+    """
+    global _compiled
+    if _compiled is not None:
+        return _compiled
+
+    key = _cache_key()
+    compiled = _read_cache(key)
+    if compiled is None:
+        try:
+            compiled = compile_config()
+            _write_cache(key, compiled)
+        except (ConfigError, OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            # 問題のある設定はキャッシュせず、修正されるまで毎回警告する
+            print(f"[SG] Warning: 設定ファイルを無視します ({e})", file=sys.stderr)
+            compiled = compile_config(use_overrides=False)
+
+    _compiled = compiled
+    return compiled
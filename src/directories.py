@@ -0,0 +1,243 @@
+"""
+Shell-Gotchi ディレクトリごとの集計
+シェルフックから渡された作業ディレクトリ（$PWD）ごとにコマンド数を数える
+
+- 集計先はパスの構成要素ごとのトライ木。作業ディレクトリはそのまま数えず、
+  git リポジトリの中ならリポジトリのルート、そうでなければ DIR_TRIE_DEPTH 階層までに丸める
+  （ホームディレクトリの下はホームからの階層で数える）
+- git のルートは親ディレクトリを順に調べて探し、結果を DIR_GIT_CACHE_TTL 秒キャッシュする
+- 節の数が DIR_TRIE_MAX_NODES を超えたら、最後に使われたのが古い葉から親にまとめる
+  （数は親に移るので、上の階層の合計は変わらない）
+- 保存先は DIRS_FILE（JSON）。節の数に上限があるので、読み書きの時間も一定以下
+- フックはトライ木を読み書きせず、DIRS_LOG_FILE に1行 [UNIXタイム, 作業ディレクトリ] を追記するだけ。
+  sg stats --by-dir（と sg serve の読み込み）がログをトライ木に畳み込んでからログを空にする。
+  ログが DIRS_LOG_MAX_BYTES を超えたら、フックがその場で畳み込む（git のルートも畳み込むときに探す）
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    DIRS_FILE, DIRS_LOG_FILE, DIRS_LOG_MAX_BYTES, DIR_TRIE_DEPTH, DIR_TRIE_MAX_NODES, DIR_GIT_CACHE_MAX, DIR_GIT_CACHE_TTL,
+)
+from .storage import ensure_data_dir, side_file
+
+# 節: {"c": この節に丸められたコマンド数, "t": 最後に使われたUNIX時刻, "k": {構成要素: 子の節}}
+
+
+def _new_node(now: int) -> Dict[str, Any]:
+    return {"c": 0, "t": now, "k": {}}
+
+
+def _empty() -> Dict[str, Any]:
+    return {"root": _new_node(0), "nodes": 1, "git": {}}
+
+
+def load(path: Optional[Path] = None) -> Dict[str, Any]:
+    """集計を読み込む（なければ・壊れていれば空）"""
+    path = path or side_file(DIRS_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if "root" in state:
+            return state
+    except (OSError, ValueError):
+        pass
+    return _empty()
+
+
+def save(state: Dict[str, Any], path: Optional[Path] = None) -> None:
+    """集計を保存する（一時ファイルに書いてから置き換える）"""
+    path = path or side_file(DIRS_FILE)
+    ensure_data_dir(path.parent)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(state, ensure_ascii=False, separators=(",", ":")))
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def find_git_root(state: Dict[str, Any], cwd: str, now: float) -> Optional[str]:
+    """cwd を含む git リポジトリのルート（キャッシュを使う。見つからなければNone）"""
+    cache = state.setdefault("git", {})
+    cached = cache.get(cwd)
+    if cached is not None and now - cached[1] < DIR_GIT_CACHE_TTL:
+        return cached[0] or None
+
+    root = None
+    current = cwd
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            root = current
+            break
+        parent = os.path.dirname(current)
+        if parent == current:
+            break
+        current = parent
+
+    # 古いものから捨てる（辞書は挿入順なので、入れ直すと最新になる）
+    cache.pop(cwd, None)
+    cache[cwd] = [root or "", int(now)]
+    while len(cache) > DIR_GIT_CACHE_MAX:
+        del cache[next(iter(cache))]
+    return root
+
+
+def collapse(cwd: str, git_root: Optional[str], home: str) -> List[str]:
+    """作業ディレクトリを集計する単位（パスの構成要素のリスト）に丸める"""
+    path = git_root or cwd
+    parts = [p for p in path.split(os.sep) if p]
+    if git_root:
+        return parts
+    base = len([p for p in home.split(os.sep) if p]) if (path + os.sep).startswith(home + os.sep) else 0
+    return parts[:base + DIR_TRIE_DEPTH]
+
+
+def record_cwd(cwd: str, ts: Optional[float] = None, log: Optional[Path] = None) -> None:
+    """フック用: 作業ディレクトリをログに追記する（失敗しても本体の処理を妨げない）"""
+    import fcntl
+    log = log or side_file(DIRS_LOG_FILE)
+    line = json.dumps([int(time.time() if ts is None else ts), cwd], ensure_ascii=False) + "\n"
+    try:
+        ensure_data_dir(log.parent)
+        fd = os.open(log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, line.encode("utf-8"))
+            full = os.fstat(fd).st_size >= DIRS_LOG_MAX_BYTES
+        finally:
+            os.close(fd)
+        if full:
+            fold(log=log)
+    except (OSError, ValueError):
+        return
+
+
+def fold(path: Optional[Path] = None, log: Optional[Path] = None, home: Optional[str] = None) -> Dict[str, Any]:
+    """ログに追記された作業ディレクトリをトライ木に畳み込んで保存し、ログを空にする。集計を返す"""
+    import fcntl
+    path = path or side_file(DIRS_FILE)
+    log = log or side_file(DIRS_LOG_FILE)
+    try:
+        fd = os.open(log, os.O_RDWR)
+    except FileNotFoundError:
+        return load(path)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd), "rb") as f:
+            raw = f.read()
+        state = load(path)
+        if raw:
+            for line in raw.splitlines():
+                try:
+                    ts, cwd = json.loads(line)
+                    record(state, cwd, now=float(ts), home=home)
+                except (ValueError, TypeError):
+                    continue
+            save(state, path)
+            os.ftruncate(fd, 0)
+    finally:
+        os.close(fd)
+    return state
+
+
+def _evict(state: Dict[str, Any]) -> None:
+    """節の数が上限の9割になるまで、最後に使われたのが古い葉を親にまとめる"""
+    target = DIR_TRIE_MAX_NODES * 9 // 10
+    while state["nodes"] > target:
+        leaves: List[Tuple[int, Dict[str, Any], str]] = []
+        stack = [state["root"]]
+        while stack:
+            node = stack.pop()
+            for name, child in node["k"].items():
+                if child["k"]:
+                    stack.append(child)
+                else:
+                    leaves.append((child["t"], node, name))
+        if not leaves:
+            break
+        leaves.sort(key=lambda leaf: leaf[0])
+        for _, parent, name in leaves[:state["nodes"] - target]:
+            parent["c"] += parent["k"].pop(name)["c"]
+            state["nodes"] -= 1
+
+
+def record(state: Dict[str, Any], cwd: str, count: int = 1, now: Optional[float] = None,
+           home: Optional[str] = None) -> List[str]:
+    """作業ディレクトリでのコマンドを数える。丸めた集計単位を返す"""
+    now = time.time() if now is None else now
+    cwd = os.path.normpath(cwd)
+    parts = collapse(cwd, find_git_root(state, cwd, now), home or str(Path.home()))
+    stamp = int(now)
+    node = state["root"]
+    node["t"] = stamp
+    for part in parts:
+        child = node["k"].get(part)
+        if child is None:
+            child = node["k"][part] = _new_node(stamp)
+            state["nodes"] += 1
+        child["t"] = stamp
+        node = child
+    node["c"] += count
+    if state["nodes"] > DIR_TRIE_MAX_NODES:
+        _evict(state)
+    return parts
+
+
+def top_subtrees(state: Dict[str, Any], limit: int, home: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    コマンド数の多い部分木を、木の形のまま上から limit 行ぶん返す
+    子が1つだけで自身に数のない階層はまとめて1行にする（/home/user/src → ~/src）
+
+    Returns:
+        [{"depth", "path", "label", "total", "own", "last"}, ...]
+    """
+    home = home or str(Path.home())
+    root = state["root"]
+    rows: List[Dict[str, Any]] = []
+
+    def walk(node: Dict[str, Any], path: str, label: str, depth: int) -> None:
+        # 1本道の階層をまとめる
+        while len(node["k"]) == 1 and not node["c"]:
+            name, node = next(iter(node["k"].items()))
+            path = f"{path.rstrip(os.sep)}{os.sep}{name}"
+            label = f"{label.rstrip(os.sep)}{os.sep}{name}" if label else name
+        if len(rows) >= limit:
+            return
+        display = "~" + path[len(home):] if (path + os.sep).startswith(home + os.sep) else path
+        rows.append({
+            "depth": depth,
+            "path": display,
+            "label": display if depth == 0 else label,
+            "total": totals[id(node)],
+            "own": node["c"],
+            "last": node["t"],
+        })
+        for name, child in sorted(node["k"].items(), key=lambda item: totals[id(item[1])], reverse=True):
+            if len(rows) >= limit:
+                return
+            walk(child, f"{path.rstrip(os.sep)}{os.sep}{name}", name, depth + 1)
+
+    # 部分木の合計は1回だけ計算しておく
+    totals: Dict[int, int] = {}
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            totals[id(node)] = node["c"] + sum(totals[id(child)] for child in node["k"].values())
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node["k"].values())
+
+    grand_total = totals[id(root)]
+    if grand_total:
+        for name, child in sorted(root["k"].items(), key=lambda item: totals[id(item[1])], reverse=True):
+            walk(child, os.sep + name, "", 0)
+    for row in rows:
+        row["share"] = row["total"] / grand_total if grand_total else 0.0
+    return rows
@@ -0,0 +1,284 @@
+"""
+Shell-Gotchi イベントバス
+コマンド・エサやり・ガチャ・ログイン・購入の後に続く処理（デイリーミッション・統計・実績・プラグイン）を
+イベントの種類ごとに購読する
+
+- ハンドラはイベントの種類ごとのリストに登録するので、発行したイベントを購読していないハンドラは呼ばれない
+- ハンドラは handler(data, event) の形で、戻り値（Noneでなければ）は発行元にハンドラ名ごとに返る
+- 全てのハンドラの実行時間を計測する（Handler の calls / total_ms / max_ms / over）
+- プラグインは PLUGIN_DIR の *.py。register(bus) 関数で bus.subscribe / bus.on を呼んで購読する
+  - プラグインのハンドラの例外は握りつぶし、持ち時間を超えたのと同じに数える
+  - シェルフックの処理中（hook_path）に EVENT_BUDGET_STRIKES 回続けて持ち時間を超えたハンドラは
+    EVENT_DISABLE_SECONDS 秒止める（状態は PLUGIN_STATE_FILE に保存し、他のプロセスでも止まる）
+- 後回しにできる（deferrable）ハンドラは、フックの遅延予算の期限（deadline_ms）を過ぎていれば呼ばずに
+  deferred に積む。積んだものは slo モジュールが後で replay する
+"""
+import importlib.util
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import profiler
+from .config import (
+    PLUGIN_DIR, PLUGIN_STATE_FILE, EVENT_PLUGIN_BUDGET_MS, EVENT_BUDGET_STRIKES, EVENT_DISABLE_SECONDS,
+)
+
+# イベントの種類
+EVENT_TYPES = ("command", "feed", "gacha", "login", "purchase")
+
+
+class Event(NamedTuple):
+    type: str
+    payload: Dict[str, Any]
+
+
+HandlerFunc = Callable[[Dict[str, Any], Event], Any]
+
+
+class Handler:
+    """購読しているハンドラ1つと、その実行時間の集計"""
+
+    __slots__ = ("name", "func", "budget_ms", "plugin", "deferrable", "calls", "total_ms", "max_ms", "over")
+
+    def __init__(self, name: str, func: HandlerFunc, budget_ms: Optional[float], plugin: bool,
+                 deferrable: bool):
+        self.name = name
+        self.func = func
+        self.budget_ms = budget_ms
+        self.plugin = plugin
+        self.deferrable = deferrable
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.over = 0  # 持ち時間を超えた回数
+
+
+class EventBus:
+    def __init__(self, plugin_dir: Optional[Path] = PLUGIN_DIR, state_file: Path = PLUGIN_STATE_FILE):
+        self.handlers: Dict[str, List[Handler]] = {event_type: [] for event_type in EVENT_TYPES}
+        self.plugin_dir = plugin_dir
+        self.state_file = state_file
+        self.hook_path = False
+        self.deadline_ms: Optional[float] = None  # プロセス開始からのミリ秒。過ぎたら後回しにする
+        self.deferred: List[Tuple[str, Dict[str, Any], List[str]]] = []  # (種類, 内容, ハンドラ名)
+        self.load_errors: Dict[str, str] = {}
+        self._plugins_loaded = plugin_dir is None
+        self._loading: Optional[str] = None
+        self._state: Optional[Dict[str, Dict[str, float]]] = None
+
+    # ===== 購読 =====
+
+    def subscribe(self, event_type: str, func: HandlerFunc, name: Optional[str] = None,
+                  budget_ms: Optional[float] = None, deferrable: Optional[bool] = None) -> Handler:
+        """
+        イベントを購読する（登録順に呼ばれる）
+        プラグインの register() の中から呼んだ場合は、名前に「プラグイン名.」が付き、
+        budget_ms を省略すると EVENT_PLUGIN_BUDGET_MS、deferrable を省略すると True になる
+        deferrable なハンドラの戻り値は、後回しにしたときは発行元に返らない
+        """
+        if event_type not in self.handlers:
+            raise ValueError(f"unknown event type: {event_type}")
+        name = name or func.__name__
+        plugin = self._loading is not None
+        if plugin:
+            name = f"{self._loading}.{name}"
+            budget_ms = EVENT_PLUGIN_BUDGET_MS if budget_ms is None else budget_ms
+        if deferrable is None:
+            deferrable = plugin
+        handler = Handler(name, func, budget_ms, plugin, deferrable)
+        self.handlers[event_type].append(handler)
+        return handler
+
+    def on(self, event_type: str, **kwargs: Any) -> Callable[[HandlerFunc], HandlerFunc]:
+        """subscribe のデコレーター版"""
+        def decorator(func: HandlerFunc) -> HandlerFunc:
+            self.subscribe(event_type, func, **kwargs)
+            return func
+        return decorator
+
+    def load_plugins(self) -> None:
+        """PLUGIN_DIR のプラグインを読み込む（1プロセスにつき1度だけ）"""
+        self._plugins_loaded = True
+        try:
+            paths = sorted(Path(entry.path) for entry in os.scandir(self.plugin_dir)
+                           if entry.name.endswith(".py") and not entry.name.startswith("_"))
+        except OSError:
+            return
+        for path in paths:
+            self._loading = path.stem
+            try:
+                spec = importlib.util.spec_from_file_location(f"shell_gotchi_plugin_{path.stem}", path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                module.register(self)
+            except Exception as e:  # プラグインの不具合で本体を止めない
+                self.load_errors[path.stem] = f"{type(e).__name__}: {e}"
+            finally:
+                self._loading = None
+
+    # ===== 発行 =====
+
+    def emit(self, event_type: str, data: Dict[str, Any], **payload: Any) -> Dict[str, Any]:
+        """
+        イベントを発行して購読しているハンドラを順に呼ぶ
+
+        Returns:
+            {ハンドラ名: 戻り値}（戻り値がNoneのハンドラは含まない）
+        """
+        if not self._plugins_loaded:
+            self.load_plugins()
+        handlers = self.handlers[event_type]
+        if not handlers:
+            return {}
+        event = Event(event_type, payload)
+        results: Dict[str, Any] = {}
+        clock = time.perf_counter
+        deferred: List[str] = []
+        for handler in handlers:
+            if handler.plugin and self._disabled(handler):
+                continue
+            if (handler.deferrable and self.deadline_ms is not None
+                    and profiler.elapsed() * 1000 >= self.deadline_ms):
+                deferred.append(handler.name)
+                continue
+            start = clock()
+            failed = False
+            try:
+                value = handler.func(data, event)
+            except Exception:
+                if not handler.plugin:
+                    raise
+                value, failed = None, True
+            ms = (clock() - start) * 1000
+            handler.calls += 1
+            handler.total_ms += ms
+            if ms > handler.max_ms:
+                handler.max_ms = ms
+            budget = handler.budget_ms
+            over = failed or (budget is not None and ms > budget)
+            if over:
+                handler.over += 1
+            if handler.plugin and self.hook_path:
+                self._judge(handler, over)
+            if value is not None:
+                results[handler.name] = value
+        if deferred:
+            self.deferred.append((event_type, payload, deferred))
+        return results
+
+    def replay(self, data: Dict[str, Any], event_type: str, payload: Dict[str, Any],
+               names: List[str]) -> Dict[str, Any]:
+        """後回しにしたハンドラだけを呼ぶ（emit と同じく {ハンドラ名: 戻り値} を返す）"""
+        if not self._plugins_loaded:
+            self.load_plugins()
+        event = Event(event_type, payload)
+        results: Dict[str, Any] = {}
+        for handler in self.handlers.get(event_type, []):
+            if handler.name in names and not (handler.plugin and self._disabled(handler)):
+                try:
+                    value = handler.func(data, event)
+                except Exception:
+                    if not handler.plugin:
+                        raise
+                    continue
+                if value is not None:
+                    results[handler.name] = value
+        return results
+
+    # ===== 持ち時間を超えたプラグインの停止 =====
+
+    def _load_state(self) -> Dict[str, Dict[str, float]]:
+        if self._state is None:
+            try:
+                with open(self.state_file, "r", encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+        return self._state
+
+    def _save_state(self) -> None:
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_file.with_name(f"{self.state_file.name}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(self._state, ensure_ascii=False, indent=2))
+            os.replace(tmp, self.state_file)
+        except OSError:
+            pass
+
+    def _disabled(self, handler: Handler) -> bool:
+        until = self._load_state().get(handler.name, {}).get("disabled_until", 0)
+        return until > time.time()
+
+    def _judge(self, handler: Handler, over: bool) -> None:
+        """フックの処理中の1回分を記録する（続けて持ち時間を超えたら止める）"""
+        state = self._load_state()
+        entry = state.get(handler.name)
+        if not over:
+            if entry and entry.get("strikes"):
+                entry["strikes"] = 0
+                self._save_state()
+            return
+        entry = state.setdefault(handler.name, {"strikes": 0, "disabled_until": 0})
+        entry["strikes"] += 1
+        if entry["strikes"] >= EVENT_BUDGET_STRIKES:
+            entry["strikes"] = 0
+            entry["disabled_until"] = time.time() + EVENT_DISABLE_SECONDS
+        self._save_state()
+
+    def plugin_status(self) -> List[Dict[str, Any]]:
+        """
+        プラグインのハンドラの一覧（sg plugins 用）
+
+        Returns:
+            [{"name", "events", "budget_ms", "strikes", "disabled_until"}, ...]
+        """
+        if not self._plugins_loaded:
+            self.load_plugins()
+        state = self._load_state()
+        rows: Dict[str, Dict[str, Any]] = {}
+        for event_type, handlers in self.handlers.items():
+            for handler in handlers:
+                if not handler.plugin:
+                    continue
+                entry = state.get(handler.name, {})
+                row = rows.setdefault(handler.name, {
+                    "name": handler.name,
+                    "events": [],
+                    "budget_ms": handler.budget_ms,
+                    "strikes": entry.get("strikes", 0),
+                    "disabled_until": entry.get("disabled_until", 0),
+                })
+                row["events"].append(event_type)
+        return list(rows.values())
+
+    def enable(self, name: str) -> bool:
+        """止めたハンドラを再開する（止まっていなければFalse）"""
+        state = self._load_state()
+        if name not in state:
+            return False
+        del state[name]
+        self._save_state()
+        return True
+
+
+# プロセス全体で1つのバス（組み込みのハンドラは game_logic が登録する）
+bus = EventBus()
+
+
+@contextmanager
+def hook_path() -> Iterator[None]:
+    """シェルフックの処理中（プラグインの持ち時間を守らせる）"""
+    previous = bus.hook_path
+    bus.hook_path = True
+    try:
+        yield
+    finally:
+        bus.hook_path = previous
+
+
+def emit(event_type: str, data: Dict[str, Any], **payload: Any) -> Dict[str, Any]:
+    return bus.emit(event_type, data, **payload)
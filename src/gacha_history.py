@@ -0,0 +1,253 @@
+"""
+Shell-Gotchi ガチャの履歴（sg gacha history / rates）
+ガチャ1回ごとの (時刻, アイテム, レアリティ) を固定長のリングバッファに残し、レアリティごとの通算回数を数える
+
+- 保存先は固定長のバイナリファイル（GACHA_HISTORY_FILE）。ヘッダと GACHA_HISTORY_CAPACITY 件の記録からなる
+  - ヘッダ: 通算回数・最高レアリティが出ていない連続回数（現在・最長）・レアリティごとの通算回数
+  - 記録: 8バイト（UNIX時刻 u32, アイテムの通し番号 u16, レアリティの欄 u8）。古い記録から上書きする
+- 1回の追加は記録1件とヘッダを書き換えるだけなので O(1)。直近 k 件の読み出しは O(k)
+  （mmap で開くので、読まない記録のページには触れない）
+- レアリティはヘッダの欄に名前で登録するので、GACHA_RATES の順序を変えても通算回数はずれない。
+  アイテムの通し番号は config_compiler の items の順序（アイテムを入れ替えると古い記録の名前はずれる）
+- レアリティの欄は GACHA_HISTORY_RARITY_SLOTS 個、名前は GACHA_HISTORY_RARITY_NAME_BYTES バイトまで
+  （設定の検証で確かめる。設定を変えて欄が足りなくなったら HistoryLimitError で知らせる）
+- 容量（GACHA_HISTORY_CAPACITY）を変えた場合は、次に記録するときにファイルを作り直す（通算回数もやり直し）。
+  表示（load）ではファイルに書き込まず、空の履歴として扱う
+- この機能を入れる前のガチャは記録されていない（通算回数は stats の total_gacha / ssr_count と一致しない）
+"""
+import math
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .config import (
+    GACHA_HISTORY_FILE, GACHA_HISTORY_CAPACITY, GACHA_HISTORY_RARITY_SLOTS, GACHA_HISTORY_RARITY_NAME_BYTES,
+)
+from .storage import ensure_data_dir
+
+MAGIC = b"SGG1"
+RARITY_SLOTS = GACHA_HISTORY_RARITY_SLOTS  # 登録できるレアリティの数
+UNKNOWN_ITEM = 0xFFFF  # 通し番号が分からないアイテム
+
+# ヘッダ: マジック, 容量, 通算回数, 最高レアリティが出ていない連続回数, その最長
+_HEADER = struct.Struct("<4sIQQQ")
+# レアリティの欄: 名前（UTF-8で GACHA_HISTORY_RARITY_NAME_BYTES バイトまで。空ならNUL）, 通算回数
+_RARITY = struct.Struct(f"<{GACHA_HISTORY_RARITY_NAME_BYTES}sQ")
+# 記録: UNIX時刻, アイテムの通し番号, レアリティの欄
+_RECORD = struct.Struct("<IHBx")
+
+_RECORDS_OFFSET = _HEADER.size + _RARITY.size * RARITY_SLOTS
+
+
+def file_size(capacity: int = GACHA_HISTORY_CAPACITY) -> int:
+    return _RECORDS_OFFSET + capacity * _RECORD.size
+
+
+class HistoryLimitError(ValueError):
+    """レアリティを履歴の欄に登録できない（欄が足りない・名前が長すぎる）"""
+
+
+class Pull(NamedTuple):
+    ts: int
+    item_index: int
+    rarity: str
+
+
+class GachaHistory:
+    """
+    ガチャの履歴ファイルの中身
+    buffer には書き込み可能な mmap（記録用）か読み取り専用の mmap（表示用）を渡す
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, capacity, total, dry, longest_dry = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or len(buffer) != file_size(capacity):
+            raise ValueError("gacha history file format mismatch")
+        self.capacity = capacity
+        self.total = total  # 通算回数
+        self.dry = dry  # 最高レアリティが出ていない現在の連続回数
+        self.longest_dry = longest_dry
+        self.rarities: List[str] = []  # 欄の順
+        self.counts: Dict[str, int] = {}
+        for slot in range(RARITY_SLOTS):
+            name, count = _RARITY.unpack_from(buffer, _HEADER.size + slot * _RARITY.size)
+            name = name.rstrip(b"\0").decode("utf-8", "replace")
+            if not name:
+                break
+            self.rarities.append(name)
+            self.counts[name] = count
+
+    @staticmethod
+    def initial_header(capacity: int) -> bytes:
+        return _HEADER.pack(MAGIC, capacity, 0, 0, 0)
+
+    def check(self, rarities: List[str]) -> None:
+        """rarities を全て登録できるか確かめる（できなければ HistoryLimitError。何も書き込まない）"""
+        new = [name for name in dict.fromkeys(rarities) if name not in self.counts]
+        for name in new:
+            if len(name.encode("utf-8")) > GACHA_HISTORY_RARITY_NAME_BYTES:
+                raise HistoryLimitError(
+                    f"レアリティの名前 {name} が長すぎます（UTF-8で{GACHA_HISTORY_RARITY_NAME_BYTES}バイトまで）")
+        if len(self.rarities) + len(new) > RARITY_SLOTS:
+            raise HistoryLimitError(
+                f"ガチャの履歴に登録できるレアリティは{RARITY_SLOTS}個までです"
+                f"（登録済み: {', '.join(self.rarities)}。新しいレアリティ: {', '.join(new)}）")
+
+    def _slot(self, rarity: str) -> int:
+        """レアリティの欄の番号（なければ登録する）"""
+        if rarity in self.counts:
+            return self.rarities.index(rarity)
+        self.check([rarity])
+        self.rarities.append(rarity)
+        self.counts[rarity] = 0
+        return len(self.rarities) - 1
+
+    def append(self, rarity: str, item_index: int, top: bool, ts: Optional[float] = None) -> None:
+        """1回分を追加する（top: 最高レアリティだったか）"""
+        slot = self._slot(rarity)
+        ts = int(time.time() if ts is None else ts)
+        offset = _RECORDS_OFFSET + (self.total % self.capacity) * _RECORD.size
+        _RECORD.pack_into(self.buffer, offset, ts, item_index if 0 <= item_index < UNKNOWN_ITEM else UNKNOWN_ITEM,
+                          slot)
+        self.total += 1
+        self.counts[rarity] += 1
+        self.dry = 0 if top else self.dry + 1
+        self.longest_dry = max(self.longest_dry, self.dry)
+        _RARITY.pack_into(self.buffer, _HEADER.size + slot * _RARITY.size,
+                          rarity.encode("utf-8"), self.counts[rarity])
+        _HEADER.pack_into(self.buffer, 0, MAGIC, self.capacity, self.total, self.dry, self.longest_dry)
+
+    def recent(self, count: int) -> List[Pull]:
+        """直近 count 件を新しい順に返す（残っている件数まで）"""
+        count = min(count, self.total, self.capacity)
+        pulls = []
+        for i in range(1, count + 1):
+            offset = _RECORDS_OFFSET + ((self.total - i) % self.capacity) * _RECORD.size
+            ts, item_index, slot = _RECORD.unpack_from(self.buffer, offset)
+            rarity = self.rarities[slot] if slot < len(self.rarities) else "?"
+            pulls.append(Pull(ts, item_index, rarity))
+        return pulls
+
+
+def _valid(fd: int) -> bool:
+    """今の形式（大きさ・マジック・容量）のファイルか"""
+    header = os.pread(fd, _HEADER.size, 0)
+    return (os.fstat(fd).st_size == file_size() and len(header) == _HEADER.size
+            and _HEADER.unpack(header)[:2] == (MAGIC, GACHA_HISTORY_CAPACITY))
+
+
+def _open_locked(path: Path) -> int:
+    """記録用にファイルを開いて排他ロックする（なければ・形式が違えば作り直す）"""
+    import fcntl
+    ensure_data_dir(path.parent)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        if not _valid(fd):
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, file_size())
+            os.pwrite(fd, GachaHistory.initial_header(GACHA_HISTORY_CAPACITY), 0)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def empty() -> GachaHistory:
+    """記録のない履歴（ファイルに書き込まない）"""
+    buffer = bytearray(file_size())
+    buffer[:_HEADER.size] = GachaHistory.initial_header(GACHA_HISTORY_CAPACITY)
+    return GachaHistory(buffer)
+
+
+def record(results: List[Dict[str, Any]], ts: Optional[float] = None, path: Path = GACHA_HISTORY_FILE) -> None:
+    """
+    ガチャの結果（pull_gacha の戻り値のリスト）を順に追加する（ファイルの読み書きの失敗は本体の処理を妨げない）
+    レアリティを登録できなければ何も記録せず HistoryLimitError を送出する（呼び出し側で知らせる）
+    """
+    import mmap
+    from .config_compiler import get_compiled_config
+    from .game_logic import configured_gacha_rates
+    item_index = get_compiled_config().item_index
+    top = top_rarity(configured_gacha_rates())
+    try:
+        fd = _open_locked(path)
+        try:
+            with mmap.mmap(fd, file_size()) as buffer:
+                history = GachaHistory(buffer)
+                history.check([result["rarity"] for result in results])
+                for result in results:
+                    rarity = result["rarity"]
+                    index = item_index.get(result["item"]["id"], UNKNOWN_ITEM)
+                    history.append(rarity, index, rarity == top, ts)
+        finally:
+            os.close(fd)
+    except HistoryLimitError:
+        raise
+    except (OSError, ValueError):
+        return
+
+
+def load(path: Path = GACHA_HISTORY_FILE) -> GachaHistory:
+    """
+    表示用に開く（読み取り専用の mmap。読んだ記録のページだけを読み込む）
+    ファイルがない・形式が違うときは空の履歴（作り直すのは次に記録するとき）
+    """
+    import fcntl
+    import mmap
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return empty()
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        if not _valid(fd):
+            return empty()
+        return GachaHistory(mmap.mmap(fd, file_size(), access=mmap.ACCESS_READ))
+    finally:
+        os.close(fd)
+
+
+def top_rarity(configured: Dict[str, float]) -> str:
+    """最高レアリティ（設定の確率が最も低いもの）"""
+    return min(configured, key=configured.get)
+
+
+def wilson_interval(successes: int, trials: int, z: float = 1.96) -> Tuple[float, float]:
+    """二項比率のウィルソンスコア区間（既定で95%）。試行が0回なら (0, 1)"""
+    if trials <= 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def rates(history: GachaHistory, configured: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    レアリティごとの実際の確率と設定の確率の比較（設定の順。設定にないレアリティは後ろ）
+
+    Returns:
+        [{"rarity", "count", "observed", "low", "high", "configured", "within"}, ...]
+        within は設定の確率が95%区間に入っているか
+    """
+    names = list(configured) + [name for name in history.rarities if name not in configured]
+    rows = []
+    for name in names:
+        count = history.counts.get(name, 0)
+        low, high = wilson_interval(count, history.total)
+        rate = configured.get(name)
+        rows.append({
+            "rarity": name,
+            "count": count,
+            "observed": count / history.total if history.total else 0.0,
+            "low": low,
+            "high": high,
+            "configured": rate,
+            "within": rate is not None and low <= rate <= high,
+        })
+    return rows
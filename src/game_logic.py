@@ -2,31 +2,47 @@
 Shell-Gotchi ゲームロジック
 ドロップ判定、レベル計算、ガチャ抽選など
 """
-import random
-from datetime import datetime, date
-from typing import Any, Dict, List, Optional
+from bisect import bisect_right
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
 
 from .config import (
-    DROP_CHANCE, GUARANTEED_DROP_COMMANDS,
     HUNGER_DECREASE_PER_COMMAND, MAX_HUNGER, MIN_HUNGER,
-    FEED_HUNGER_GAIN, FEED_EXP_GAIN,
-    LEVEL_THRESHOLDS, LEVEL_UP_TICKET_REWARDS,
-    GACHA_RATES, GACHA_ITEMS,
+    FEED_HUNGER_GAIN, FEED_EXP_GAIN, COMMANDS_PER_COIN,
     TICKET_FRAGMENTS_FOR_TICKET, LOGIN_STREAK_FOR_TICKET,
-    SHOP_ITEMS, DAILY_MISSIONS, ACHIEVEMENTS
+    LATENCY_FAST_BUILD_COINS, LATENCY_FAST_BUILD_DAILY_MAX,
 )
+from . import antispam, events, latency
+from .command_rules import CommandInfo, classify
+from .config_compiler import CompiledConfig, get_compiled_config
+from .rng import GameRNG, default_rng, get_rng
 
 
 # ===== Step 2: コマンド処理・ドロップロジック =====
 
-def process_command(data: Dict[str, Any]) -> Dict[str, Any]:
+def classify_command(command: str) -> CommandInfo:
+    """コマンドを判定規則（COMMAND_RULES）で分類する"""
+    cfg = get_compiled_config()
+    return classify(command, cfg.command_trie, cfg.command_patterns)
+
+
+def should_count_command(command: str) -> bool:
+    """コマンドをゲームに数えるか（空白だけのコマンドと除外規則に一致するものは数えない）"""
+    return not classify_command(command).ignored
+
+
+def process_command(data: Dict[str, Any], rng: Optional[GameRNG] = None,
+                    info: Optional[CommandInfo] = None, credit: float = 1.0) -> Dict[str, Any]:
     """
     コマンド実行時の処理
     - カウンター増加
     - 満腹度減少
-    - ドロップ判定
-    - デイリーミッション進捗
-    - コイン獲得（10コマンドごとに1コイン）
+    - ドロップ判定（rng を省略した場合はセーブデータの乱数ストリーム）
+      info（classify_command の結果）があればボーナス倍率を掛ける
+    - コイン獲得（COMMANDS_PER_COIN コマンドごとに1コイン）
+    - command イベント（デイリーミッション進捗など）
+    credit（スパム判定の減衰。1未満）を渡すと、確定ドロップとコインもその確率でしか出さない
+    （確定ドロップが出なければ次の回に持ち越す）
     
     Returns:
         Dict with keys: dropped (bool), drop_count (int), coins_earned (int)
@@ -43,20 +59,21 @@ def process_command(data: Dict[str, Any]) -> Dict[str, Any]:
     pet["hunger"] = max(MIN_HUNGER, pet["hunger"] - HUNGER_DECREASE_PER_COMMAND)
     
     # ドロップ判定
-    dropped = calculate_drop(stats["commands_since_drop"])
+    rng = rng or get_rng(data)
+    multiplier = info.multiplier if info else 1.0
+    dropped = calculate_drop(stats["commands_since_drop"], rng, multiplier, credit)
     
     if dropped:
         user["food"] += 1
         stats["commands_since_drop"] = 0
     
-    # コイン獲得（10コマンドごとに1コイン）
+    # コイン獲得（COMMANDS_PER_COIN コマンドごとに1コイン）
     coins_earned = 0
-    if stats["total_commands"] % 10 == 0:
+    if coins_for_commands(stats["total_commands"] - 1) and (credit >= 1 or rng.random() < credit):
         coins_earned = 1
         user["coins"] = user.get("coins", 0) + coins_earned
     
-    # デイリーミッション進捗更新
-    update_daily_progress(data, "commands", 1)
+    events.emit("command", data, count=1, tool=info.tool if info else None, daily=True)
     
     return {
         "dropped": dropped,
@@ -65,18 +82,161 @@ def process_command(data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def calculate_drop(commands_since_drop: int) -> bool:
+def handle_hook_event(data: Dict[str, Any], info: CommandInfo, command: str,
+                      exit_code: Optional[int] = None,
+                      duration_ms: Optional[float] = None,
+                      now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    シェルフック1回分の処理（sg hook と sg serve で共有する）
+    - ログインボーナス
+    - 実行時間・終了コードの記録（いつもより速く成功したビルドは報酬の対象）
+    - スパム判定（時間窓の上限を超えた分は報酬なし、同じコマンドの連続はドロップ・コインの確率を減衰）
+    - コマンド処理
+    now を渡すとその時刻の出来事として処理する（後回しにしたフックの再処理）
+    
+    Returns:
+        Dict with keys: login (check_login_bonus の結果), rewarded (bool), dropped (bool), food_count (int)
+    """
+    with events.hook_path():
+        return _handle_hook_event(data, info, command, exit_code, duration_ms, now)
+
+
+def _handle_hook_event(data: Dict[str, Any], info: CommandInfo, command: str,
+                       exit_code: Optional[int], duration_ms: Optional[float],
+                       now: Optional[float]) -> Dict[str, Any]:
+    login_result = check_login_bonus(data)
+    
+    fast_build = False
+    if info.tool and (exit_code is not None or duration_ms is not None):
+        fast_build = latency.is_fast_build(data, info.tool, exit_code, duration_ms)
+        latency.record(data, info.tool, exit_code, duration_ms, now)
+    
+    verdict = antispam.check_and_record(data, command, now)
+    if not verdict.allowed:
+        return {
+            "login": login_result,
+            "rewarded": False,
+            "dropped": False,
+            "food_count": data["user"]["food"],
+        }
+    # 同じコマンドの連続（減衰中）では速いビルドの報酬も出さない
+    if fast_build and verdict.factor >= 1:
+        reward_fast_build(data)
+    if verdict.factor < 1:
+        info = info._replace(multiplier=info.multiplier * verdict.factor)
+    
+    result = process_command(data, info=info, credit=verdict.factor)
+    return {
+        "login": login_result,
+        "rewarded": True,
+        "dropped": result["dropped"],
+        "food_count": result["food_count"],
+    }
+
+
+def reward_fast_build(data: Dict[str, Any]) -> int:
+    """
+    成功したビルド・テストがいつもより速く終わったときの報酬。獲得したコインを返す
+    1日に LATENCY_FAST_BUILD_DAILY_MAX 回まで（超えたら0）
+    """
+    reset_daily_missions(data)
+    daily = data["daily"]
+    if daily.get("fast_builds", 0) >= LATENCY_FAST_BUILD_DAILY_MAX:
+        return 0
+    daily["fast_builds"] = daily.get("fast_builds", 0) + 1
+    data["user"]["coins"] = data["user"].get("coins", 0) + LATENCY_FAST_BUILD_COINS
+    data["stats"]["fast_builds"] = data["stats"].get("fast_builds", 0) + 1
+    return LATENCY_FAST_BUILD_COINS
+
+
+def process_commands(data: Dict[str, Any], count: int, rng: Optional[GameRNG] = None,
+                     update_daily: bool = True) -> Dict[str, Any]:
+    """
+    コマンド count 回分をまとめて処理する（履歴の取り込みなど）
+    process_command を count 回呼んだ場合と同じ結果・同じ乱数の消費になる
+    update_daily が False の場合は今日のデイリーミッションに数えない
+    
+    Returns:
+        Dict with keys: drop_count (int), food_count (int), coins_earned (int)
+    """
+    stats = data["stats"]
+    pet = data["pet"]
+    user = data["user"]
+    rng = rng or get_rng(data)
+    cfg = get_compiled_config()
+    
+    # 確定ドロップでない回だけ乱数を使うので、多めに引いて未使用分は位置を戻す
+    start = rng.position
+    rolls = rng.random_block(count)
+    used = 0
+    since = stats["commands_since_drop"]
+    drops = 0
+    for _ in range(count):
+        since += 1
+        if since < cfg.guaranteed_drop_commands:
+            roll = rolls[used]
+            used += 1
+            if roll >= cfg.drop_chance:
+                continue
+        drops += 1
+        since = 0
+    rng.seek(start + used)
+    
+    coins_earned = coins_for_commands(stats["total_commands"], count)
+    stats["total_commands"] += count
+    stats["commands_since_drop"] = since
+    pet["hunger"] = max(MIN_HUNGER, pet["hunger"] - HUNGER_DECREASE_PER_COMMAND * count)
+    user["food"] += drops
+    user["coins"] = user.get("coins", 0) + coins_earned
+    
+    events.emit("command", data, count=count, tool=None, daily=update_daily)
+    
+    return {
+        "drop_count": drops,
+        "food_count": user["food"],
+        "coins_earned": coins_earned
+    }
+
+
+def calculate_drop(commands_since_drop: int, rng: Optional[GameRNG] = None,
+                   multiplier: float = 1.0, credit: float = 1.0) -> bool:
     """
     ドロップ判定ロジック
-    - N回ごとに確定ドロップ
-    - または確率でドロップ
+    - N回ごとに確定ドロップ（乱数は引かない。credit が1未満ならその確率で、乱数を1つ使う）
+    - または確率でドロップ（ボーナス対象のコマンドは multiplier 倍）
     """
+    cfg = get_compiled_config()
+    
     # 確定ドロップ
-    if commands_since_drop >= GUARANTEED_DROP_COMMANDS:
-        return True
+    if commands_since_drop >= cfg.guaranteed_drop_commands:
+        return credit >= 1 or (rng or default_rng()).random() < credit
     
     # 確率ドロップ
-    return random.random() < DROP_CHANCE
+    return (rng or default_rng()).random() < min(1.0, cfg.drop_chance * multiplier)
+
+
+def drop_gaps(count: int, rng: Any, cfg: Optional[CompiledConfig] = None) -> List[int]:
+    """
+    ドロップの間隔（前のドロップから次のドロップまでのコマンド数）を count 個引く（経済シミュレーター用）
+    calculate_drop をコマンドごとに呼んだ場合と同じ分布（ボーナス倍率・スパムの減衰はなし）:
+    確率ドロップまでの回数を幾何分布から引き、確定ドロップの回数で打ち切る
+    rng は random() を持つ乱数（random.Random / GameRNG）
+    """
+    cfg = cfg or get_compiled_config()
+    guaranteed = max(1, cfg.guaranteed_drop_commands)
+    chance = min(1.0, cfg.drop_chance)
+    if chance <= 0:
+        return [guaranteed] * count
+    
+    # 間隔が k 回以下になる確率 1 - (1 - p)^k（k < 確定ドロップの回数）を二分探索する
+    cdf = [1.0 - (1.0 - chance) ** k for k in range(1, guaranteed)]
+    random = rng.random
+    return [bisect_right(cdf, random()) + 1 for _ in range(count)]
+
+
+def coins_for_commands(total_commands: int, count: int = 1) -> int:
+    """累計 total_commands 回の後に count 回コマンドを実行して獲得するコイン（COMMANDS_PER_COIN 回ごとに1コイン）"""
+    return (total_commands + count) // COMMANDS_PER_COIN - total_commands // COMMANDS_PER_COIN
 
 
 # ===== Step 3: 育成ロジック =====
@@ -88,14 +248,13 @@ def feed_pet(data: Dict[str, Any]) -> Dict[str, Any]:
     - 満腹度回復
     - 経験値獲得（ブースト対応）
     - レベルアップ判定
-    - デイリーミッション進捗
+    - feed イベント（統計・デイリーミッション進捗・実績）
     
     Returns:
-        Dict with keys: exp_gained, level_up, tickets_earned
+        Dict with keys: exp_gained, level_up, tickets_earned, unlocked（新しく達成した実績）
     """
     pet = data["pet"]
     user = data["user"]
-    stats = data["stats"]
     
     # エサ消費
     user["food"] -= 1
@@ -115,9 +274,6 @@ def feed_pet(data: Dict[str, Any]) -> Dict[str, Any]:
     if pet["hunger"] > 0:
         pet["exp"] += exp_gained
     
-    # 統計更新
-    stats["total_feed"] = stats.get("total_feed", 0) + 1
-    
     # レベルアップ判定
     old_level = pet["level"]
     level_up, new_level = check_level_up(pet)
@@ -129,15 +285,15 @@ def feed_pet(data: Dict[str, Any]) -> Dict[str, Any]:
         tickets_earned = calculate_level_up_reward(old_level, new_level)
         user["tickets"] += tickets_earned
     
-    # デイリーミッション進捗更新
-    update_daily_progress(data, "feed", 1)
+    results = events.emit("feed", data, exp_gained=exp_gained, level_up=level_up)
     
     return {
         "exp_gained": exp_gained,
         "level_up": level_up,
         "new_level": new_level,
         "tickets_earned": tickets_earned,
-        "boosted": exp_boost > 0
+        "boosted": exp_boost > 0,
+        "unlocked": results.get("achievements", [])
     }
 
 
@@ -150,104 +306,147 @@ def check_level_up(pet: Dict[str, Any]) -> tuple:
     """
     current_level = pet["level"]
     current_exp = pet["exp"]
+    thresholds = get_compiled_config().level_thresholds
     
-    # 次のレベルの閾値をチェック
+    # 次のレベルの閾値をチェック（thresholds[lv - 1] が Lv.lv の閾値）
     next_level = current_level + 1
-    if next_level in LEVEL_THRESHOLDS:
-        if current_exp >= LEVEL_THRESHOLDS[next_level]:
+    if next_level <= len(thresholds):
+        if current_exp >= thresholds[next_level - 1]:
             return True, next_level
     
     return False, current_level
 
 
-def calculate_level_up_reward(old_level: int, new_level: int) -> int:
+def level_for_exp(exp: int, cfg: Optional[CompiledConfig] = None) -> int:
+    """累計経験値で到達しているレベル（閾値の表の最大レベルまで）"""
+    thresholds = (cfg or get_compiled_config()).level_thresholds
+    return max(1, bisect_right(thresholds, exp))
+
+
+def calculate_level_up_reward(old_level: int, new_level: int,
+                              cfg: Optional[CompiledConfig] = None) -> int:
     """
     レベルアップ報酬（チケット）を計算
     特定レベルでボーナスチケット付与
     """
+    rewards = (cfg or get_compiled_config()).level_up_ticket_rewards
     tickets = 0
     for level in range(old_level + 1, new_level + 1):
-        if level in LEVEL_UP_TICKET_REWARDS:
-            tickets += LEVEL_UP_TICKET_REWARDS[level]
+        tickets += rewards.get(level, 0)
     return tickets
 
 
+def get_level_threshold(level: int) -> int:
+    """指定レベルに必要な累積経験値（最大レベルを超える場合は500ずつ増える）"""
+    thresholds = get_compiled_config().level_thresholds
+    if level < 1:
+        return 0
+    if level <= len(thresholds):
+        return thresholds[level - 1]
+    return thresholds[-1] + 500 * (level - len(thresholds))
+
+
 def calculate_exp_for_level(level: int) -> int:
     """次のレベルまでに必要な経験値を計算"""
-    current_threshold = LEVEL_THRESHOLDS.get(level, 0)
-    next_threshold = LEVEL_THRESHOLDS.get(level + 1, current_threshold + 500)
-    return next_threshold - current_threshold
+    return get_level_threshold(level + 1) - get_level_threshold(level)
 
 
 # ===== Step 4: ガチャロジック =====
 
-def pull_gacha(data: Dict[str, Any]) -> Dict[str, Any]:
+def pull_gacha(data: Dict[str, Any], rng: Optional[GameRNG] = None) -> Dict[str, Any]:
     """
     ガチャを引く
     - チケット消費
-    - 確率に基づいて抽選
+    - 確率に基づいて抽選（1回につき乱数を2つ: レアリティ・アイテム）
     - コレクションに追加
-    - 統計・デイリーミッション更新
+    - gacha イベント（統計・デイリーミッション進捗・実績）
     
     Returns:
-        Dict with keys: rarity, item, is_new
+        Dict with keys: rarity, item, is_new, unlocked（新しく達成した実績）
     """
+    rarity_roll, item_roll = (rng or get_rng(data)).random_block(2)
+    return _apply_gacha_pull(data, rarity_roll, item_roll)
+
+
+def pull_gacha_many(data: Dict[str, Any], count: int,
+                    rng: Optional[GameRNG] = None) -> List[Dict[str, Any]]:
+    """
+    ガチャを count 回引く
+    乱数をまとめて引くだけで、結果は pull_gacha を count 回呼んだ場合と同じ
+    """
+    rolls = (rng or get_rng(data)).random_block(2 * count)
+    return [_apply_gacha_pull(data, rolls[i], rolls[i + 1]) for i in range(0, 2 * count, 2)]
+
+
+def _apply_gacha_pull(data: Dict[str, Any], rarity_roll: float, item_roll: float) -> Dict[str, Any]:
+    """引いた乱数でガチャ1回分の結果を決め、データに反映する"""
     user = data["user"]
-    stats = data["stats"]
     collection = data["collection"]
     
     # チケット消費
     user["tickets"] -= 1
     
-    # 統計更新
-    stats["total_gacha"] = stats.get("total_gacha", 0) + 1
-    
     # レアリティ抽選
-    rarity = determine_rarity()
-    
-    # SSRカウント
-    if rarity == "SSR":
-        stats["ssr_count"] = stats.get("ssr_count", 0) + 1
+    rarity = rarity_for_roll(rarity_roll)
     
     # アイテム抽選
-    item = select_item(rarity)
+    item = item_for_roll(rarity, item_roll)
     
     # コレクションに追加（重複しない場合のみ）
     is_new = item["id"] not in collection
     if is_new:
         collection.append(item["id"])
     
-    # デイリーミッション進捗更新
-    update_daily_progress(data, "gacha", 1)
+    results = events.emit("gacha", data, rarity=rarity, item=item, is_new=is_new)
     
     return {
         "rarity": rarity,
         "item": item,
-        "is_new": is_new
+        "is_new": is_new,
+        "unlocked": results.get("achievements", [])
     }
 
 
-def determine_rarity() -> str:
+def configured_gacha_rates() -> Dict[str, float]:
+    """設定（上書きを含む）のレアリティごとの確率（GACHA_RATES の順序）"""
+    cfg = get_compiled_config()
+    rates = {}
+    previous = 0.0
+    for rarity, cumulative in zip(cfg.rarities, cfg.cumulative_rates):
+        rates[rarity] = cumulative - previous
+        previous = cumulative
+    return rates
+
+
+def determine_rarity(rng: Optional[GameRNG] = None) -> str:
+    """ガチャのレアリティを決定"""
+    return rarity_for_roll((rng or default_rng()).random())
+
+
+def rarity_for_roll(roll: float, cfg: Optional[CompiledConfig] = None) -> str:
     """
-    ガチャのレアリティを決定
+    [0, 1) の乱数からレアリティを決める
+    累積確率の配列を二分探索する（roll < 累積確率 となる最初のレアリティ）
     """
-    roll = random.random()
-    
-    cumulative = 0
-    for rarity, rate in GACHA_RATES.items():
-        cumulative += rate
-        if roll < cumulative:
-            return rarity
+    cfg = cfg or get_compiled_config()
+    index = bisect_right(cfg.cumulative_rates, roll)
     
-    return "R"  # フォールバック
+    # 浮動小数点の誤差で合計が1に届かない場合は最後のレアリティ
+    return cfg.rarities[min(index, len(cfg.rarities) - 1)]
 
 
-def select_item(rarity: str) -> Dict[str, Any]:
+def select_item(rarity: str, rng: Optional[GameRNG] = None) -> Dict[str, Any]:
     """
     指定されたレアリティからアイテムを選択
     """
-    items = GACHA_ITEMS.get(rarity, GACHA_ITEMS["R"])
-    return random.choice(items)
+    return item_for_roll(rarity, (rng or default_rng()).random())
+
+
+def item_for_roll(rarity: str, roll: float, cfg: Optional[CompiledConfig] = None) -> Dict[str, Any]:
+    """[0, 1) の乱数から指定されたレアリティのアイテムを決める"""
+    gacha_items = (cfg or get_compiled_config()).gacha_items
+    items = gacha_items.get(rarity, gacha_items["R"])
+    return items[min(int(roll * len(items)), len(items) - 1)]
 
 
 # ===== ログインボーナス =====
@@ -257,10 +456,9 @@ def check_login_bonus(data: Dict[str, Any]) -> Dict[str, Any]:
     ログインボーナスをチェック
     
     Returns:
-        Dict with keys: is_new_day, reward_type, streak
+        Dict with keys: is_new_day, reward_type, streak, unlocked（新しく達成した実績）
     """
     user = data["user"]
-    stats = data["stats"]
     today = date.today().isoformat()
     last_login = user.get("last_login")
     
@@ -269,7 +467,8 @@ def check_login_bonus(data: Dict[str, Any]) -> Dict[str, Any]:
         return {
             "is_new_day": False,
             "reward_type": None,
-            "streak": user["login_streak"]
+            "streak": user["login_streak"],
+            "unlocked": []
         }
     
     # 連続ログイン判定
@@ -291,12 +490,6 @@ def check_login_bonus(data: Dict[str, Any]) -> Dict[str, Any]:
         # 初回ログイン
         user["login_streak"] = 1
     
-    # 最大ログインストリーク更新
-    stats["max_login_streak"] = max(
-        stats.get("max_login_streak", 0),
-        user["login_streak"]
-    )
-    
     # 最終ログイン日を更新
     user["last_login"] = today
     
@@ -304,28 +497,83 @@ def check_login_bonus(data: Dict[str, Any]) -> Dict[str, Any]:
     reset_daily_missions(data)
     
     # 報酬付与
-    reward_type = "fragment"
+    reward_type = grant_login_reward(user)
     
-    if user["login_streak"] >= LOGIN_STREAK_FOR_TICKET and user["login_streak"] % LOGIN_STREAK_FOR_TICKET == 0:
-        # 7日連続でチケット
-        user["tickets"] += 1
-        reward_type = "ticket"
-    else:
-        # 通常は破片
-        user["ticket_fragments"] += 1
-        
-        # 破片が7個溜まったらチケットに変換
-        if user["ticket_fragments"] >= TICKET_FRAGMENTS_FOR_TICKET:
-            user["ticket_fragments"] -= TICKET_FRAGMENTS_FOR_TICKET
-            user["tickets"] += 1
+    results = events.emit("login", data, streak=user["login_streak"], reward_type=reward_type)
     
     return {
         "is_new_day": True,
         "reward_type": reward_type,
-        "streak": user["login_streak"]
+        "streak": user["login_streak"],
+        "unlocked": results.get("achievements", [])
     }
 
 
+def grant_login_reward(user: Dict[str, Any]) -> str:
+    """
+    連続ログイン日数（user["login_streak"]）に応じたログイン報酬を付与し、報酬の種類を返す
+    
+    Returns:
+        "ticket" または "fragment"
+    """
+    if user["login_streak"] >= LOGIN_STREAK_FOR_TICKET and user["login_streak"] % LOGIN_STREAK_FOR_TICKET == 0:
+        # 7日連続でチケット
+        user["tickets"] += 1
+        return "ticket"
+    
+    # 通常は破片
+    user["ticket_fragments"] += 1
+    
+    # 破片が7個溜まったらチケットに変換
+    if user["ticket_fragments"] >= TICKET_FRAGMENTS_FOR_TICKET:
+        user["ticket_fragments"] -= TICKET_FRAGMENTS_FOR_TICKET
+        user["tickets"] += 1
+    return "fragment"
+
+
+def apply_login_history(data: Dict[str, Any], days: Iterable[date]) -> Dict[str, int]:
+    """
+    過去にシェルを使った日付から連続ログイン日数を求めて反映する（履歴の取り込み用）
+    - 最大連続ログインは最長の連続日数で更新
+    - 昨日または今日まで続いている場合は現在の連続ログインも引き継ぐ
+      （今日の分は次回の check_login_bonus で加算・ボーナス付与される）
+    
+    Returns:
+        Dict with keys: longest, current
+    """
+    user = data["user"]
+    stats = data["stats"]
+    longest = current = 0
+    previous = None
+    for day in sorted(set(days)):
+        current = current + 1 if previous is not None and (day - previous).days == 1 else 1
+        longest = max(longest, current)
+        previous = day
+    
+    stats["max_login_streak"] = max(stats.get("max_login_streak", 0), longest)
+    if previous is None:
+        return {"longest": 0, "current": 0}
+    
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    if previous == today:
+        through_yesterday = current - 1
+    elif previous == yesterday:
+        through_yesterday = current
+    else:
+        return {"longest": longest, "current": 0}  # 連続が途切れている
+    
+    if user.get("last_login") == today.isoformat():
+        # 今日のログインボーナスは受け取り済み
+        user["login_streak"] = max(user["login_streak"], through_yesterday + 1)
+    elif through_yesterday > 0 and through_yesterday >= user.get("login_streak", 0):
+        user["login_streak"] = through_yesterday
+        user["last_login"] = yesterday.isoformat()
+    
+    stats["max_login_streak"] = max(stats["max_login_streak"], user["login_streak"])
+    return {"longest": longest, "current": current}
+
+
 # ===== スキン変更 =====
 
 def change_skin(data: Dict[str, Any], skin_id: str) -> Dict[str, Any]:
@@ -363,17 +611,18 @@ def buy_item(data: Dict[str, Any], item_id: str) -> Dict[str, Any]:
     ショップでアイテムを購入
     
     Returns:
-        Dict with keys: success, message, item
+        Dict with keys: success, message, item, unlocked（新しく達成した実績）
     """
     user = data["user"]
+    shop_items = get_compiled_config().shop_items
     
-    if item_id not in SHOP_ITEMS:
+    if item_id not in shop_items:
         return {
             "success": False,
             "message": "アイテムが見つかりません"
         }
     
-    item = SHOP_ITEMS[item_id]
+    item = shop_items[item_id]
     price = item["price"]
     coins = user.get("coins", 0)
     
@@ -391,10 +640,13 @@ def buy_item(data: Dict[str, Any], item_id: str) -> Dict[str, Any]:
     for key, value in reward.items():
         user[key] = user.get(key, 0) + value
     
+    results = events.emit("purchase", data, item_id=item_id, item=item)
+    
     return {
         "success": True,
         "message": f"{item['name']}を購入しました！",
-        "item": item
+        "item": item,
+        "unlocked": results.get("achievements", [])
     }
 
 
@@ -412,8 +664,9 @@ def reset_daily_missions(data: Dict[str, Any]) -> None:
     # 日付が変わっていたらリセット
     if daily.get("date") != today:
         daily["date"] = today
-        daily["progress"] = {mission_id: 0 for mission_id in DAILY_MISSIONS}
+        daily["progress"] = {mission_id: 0 for mission_id in get_compiled_config().daily_missions}
         daily["completed"] = []
+        daily["fast_builds"] = 0
 
 
 def update_daily_progress(data: Dict[str, Any], mission_type: str, amount: int) -> List[str]:
@@ -435,18 +688,21 @@ def update_daily_progress(data: Dict[str, Any], mission_type: str, amount: int)
         daily = data["daily"]
     
     newly_completed = []
+    cfg = get_compiled_config()
     
-    for mission_id, mission in DAILY_MISSIONS.items():
-        if mission["type"] == mission_type:
-            # 進捗更新
-            current = daily["progress"].get(mission_id, 0)
-            daily["progress"][mission_id] = current + amount
-            
-            # 完了チェック
-            if (mission_id not in daily["completed"] and 
-                daily["progress"][mission_id] >= mission["target"]):
-                daily["completed"].append(mission_id)
-                newly_completed.append(mission_id)
+    # 種別ごとの索引から該当ミッションだけを更新
+    for mission_id in cfg.missions_by_type.get(mission_type, ()):
+        mission = cfg.daily_missions[mission_id]
+        
+        # 進捗更新
+        current = daily["progress"].get(mission_id, 0)
+        daily["progress"][mission_id] = current + amount
+        
+        # 完了チェック
+        if (mission_id not in daily["completed"] and 
+            daily["progress"][mission_id] >= mission["target"]):
+            daily["completed"].append(mission_id)
+            newly_completed.append(mission_id)
     
     return newly_completed
 
@@ -463,8 +719,9 @@ def claim_daily_reward(data: Dict[str, Any], mission_id: str) -> Dict[str, Any]:
     
     daily = data["daily"]
     user = data["user"]
+    daily_missions = get_compiled_config().daily_missions
     
-    if mission_id not in DAILY_MISSIONS:
+    if mission_id not in daily_missions:
         return {
             "success": False,
             "message": "ミッションが見つかりません"
@@ -476,7 +733,7 @@ def claim_daily_reward(data: Dict[str, Any], mission_id: str) -> Dict[str, Any]:
             "message": "ミッションがまだ完了していません"
         }
     
-    mission = DAILY_MISSIONS[mission_id]
+    mission = daily_missions[mission_id]
     
     # 報酬がすでに受け取り済みかチェック（completedリストから削除で管理）
     if f"claimed_{mission_id}" in daily.get("claimed", []):
@@ -515,7 +772,7 @@ def get_daily_status(data: Dict[str, Any]) -> Dict[str, Any]:
         daily = data["daily"]
     
     missions = []
-    for mission_id, mission in DAILY_MISSIONS.items():
+    for mission_id, mission in get_compiled_config().daily_missions.items():
         progress = daily["progress"].get(mission_id, 0)
         is_completed = mission_id in daily["completed"]
         is_claimed = f"claimed_{mission_id}" in daily.get("claimed", [])
@@ -539,6 +796,19 @@ def get_daily_status(data: Dict[str, Any]) -> Dict[str, Any]:
 
 # ===== 実績システム =====
 
+def get_achievement_progress(data: Dict[str, Any]) -> Dict[str, int]:
+    """実績の条件種別ごとの現在値を返す"""
+    stats = data["stats"]
+    return {
+        "total_commands": stats.get("total_commands", 0),
+        "level": data["pet"].get("level", 1),
+        "total_gacha": stats.get("total_gacha", 0),
+        "ssr_count": stats.get("ssr_count", 0),
+        "login_streak": stats.get("max_login_streak", 0),
+        "collection_count": len(data["collection"]),
+    }
+
+
 def check_achievements(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     実績の達成状況をチェックし、新規達成した実績を返す
@@ -550,35 +820,21 @@ def check_achievements(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         data["achievements"] = []
     
     achieved = data["achievements"]
-    stats = data["stats"]
-    pet = data["pet"]
     user = data["user"]
-    collection = data["collection"]
+    cfg = get_compiled_config()
     
     newly_achieved = []
     
-    for ach_id, ach in ACHIEVEMENTS.items():
-        if ach_id in achieved:
-            continue
-        
-        condition = ach["condition"]
-        target = condition["target"]
-        achieved_flag = False
-        
-        if condition["type"] == "total_commands":
-            achieved_flag = stats.get("total_commands", 0) >= target
-        elif condition["type"] == "level":
-            achieved_flag = pet.get("level", 1) >= target
-        elif condition["type"] == "total_gacha":
-            achieved_flag = stats.get("total_gacha", 0) >= target
-        elif condition["type"] == "ssr_count":
-            achieved_flag = stats.get("ssr_count", 0) >= target
-        elif condition["type"] == "login_streak":
-            achieved_flag = stats.get("max_login_streak", 0) >= target
-        elif condition["type"] == "collection_count":
-            achieved_flag = len(collection) >= target
-        
-        if achieved_flag:
+    # 条件種別ごとに現在値を1回だけ求め、その種別の実績だけを判定
+    for condition_type, current in get_achievement_progress(data).items():
+        for ach_id in cfg.achievements_by_type.get(condition_type, ()):
+            if ach_id in achieved:
+                continue
+            
+            ach = cfg.achievements[ach_id]
+            if current < ach["condition"]["target"]:
+                continue
+            
             achieved.append(ach_id)
             
             # 報酬付与
@@ -601,30 +857,16 @@ def get_achievements_status(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         data["achievements"] = []
     
     achieved = data["achievements"]
-    stats = data["stats"]
-    pet = data["pet"]
-    collection = data["collection"]
+    progress = get_achievement_progress(data)
     
     result = []
     
-    for ach_id, ach in ACHIEVEMENTS.items():
+    for ach_id, ach in get_compiled_config().achievements.items():
         condition = ach["condition"]
         target = condition["target"]
         
         # 現在の進捗を取得
-        current = 0
-        if condition["type"] == "total_commands":
-            current = stats.get("total_commands", 0)
-        elif condition["type"] == "level":
-            current = pet.get("level", 1)
-        elif condition["type"] == "total_gacha":
-            current = stats.get("total_gacha", 0)
-        elif condition["type"] == "ssr_count":
-            current = stats.get("ssr_count", 0)
-        elif condition["type"] == "login_streak":
-            current = stats.get("max_login_streak", 0)
-        elif condition["type"] == "collection_count":
-            current = len(collection)
+        current = progress.get(condition["type"], 0)
         
         result.append({
             "id": ach_id,
@@ -637,3 +879,54 @@ def get_achievements_status(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         })
     
     return result
+
+
+# ===== イベントの購読（登録順に呼ばれる: 統計 → デイリーミッション → 実績） =====
+
+def _stats_on_feed(data: Dict[str, Any], event: events.Event) -> None:
+    stats = data["stats"]
+    stats["total_feed"] = stats.get("total_feed", 0) + 1
+
+
+def _stats_on_gacha(data: Dict[str, Any], event: events.Event) -> None:
+    stats = data["stats"]
+    stats["total_gacha"] = stats.get("total_gacha", 0) + 1
+    if event.payload["rarity"] == "SSR":
+        stats["ssr_count"] = stats.get("ssr_count", 0) + 1
+
+
+def _stats_on_login(data: Dict[str, Any], event: events.Event) -> None:
+    stats = data["stats"]
+    stats["max_login_streak"] = max(stats.get("max_login_streak", 0), event.payload["streak"])
+
+
+def _daily_on_command(data: Dict[str, Any], event: events.Event) -> Optional[List[str]]:
+    if not event.payload["daily"]:
+        return None
+    completed = update_daily_progress(data, "commands", event.payload["count"])
+    if event.payload["tool"]:
+        completed += update_daily_progress(data, f"tool:{event.payload['tool']}", event.payload["count"])
+    return completed or None
+
+
+def _daily_on_feed(data: Dict[str, Any], event: events.Event) -> Optional[List[str]]:
+    return update_daily_progress(data, "feed", 1) or None
+
+
+def _daily_on_gacha(data: Dict[str, Any], event: events.Event) -> Optional[List[str]]:
+    return update_daily_progress(data, "gacha", 1) or None
+
+
+def _achievements(data: Dict[str, Any], event: events.Event) -> Optional[List[Dict[str, Any]]]:
+    return check_achievements(data) or None
+
+
+# どれもフックの遅延予算を超えそうなときは後回しにできる（slo モジュールが次の sg の実行で済ませる）
+events.bus.subscribe("feed", _stats_on_feed, "stats", deferrable=True)
+events.bus.subscribe("gacha", _stats_on_gacha, "stats", deferrable=True)
+events.bus.subscribe("login", _stats_on_login, "stats", deferrable=True)
+events.bus.subscribe("command", _daily_on_command, "daily", deferrable=True)
+events.bus.subscribe("feed", _daily_on_feed, "daily", deferrable=True)
+events.bus.subscribe("gacha", _daily_on_gacha, "daily", deferrable=True)
+for _event_type in ("feed", "gacha", "login", "purchase"):
+    events.bus.subscribe(_event_type, _achievements, "achievements", deferrable=True)
@@ -0,0 +1,261 @@
+"""
+Shell-Gotchi シェル履歴の取り込み
+~/.bash_history / ~/.zsh_history を少しずつ読み、過去のコマンドをゲームに反映する
+
+- ファイルはバイナリで一定サイズずつ読むので、数百MBの履歴でもメモリ使用量は一定
+  （保持するのは読みかけの1行と、コマンドを実行した日付の集合だけ）
+- bash: HISTTIMEFORMAT による "#<UNIX時刻>" 行に対応。時刻行がある場合は次の時刻行までを1つのコマンドとみなす
+- zsh: 拡張形式 ": <開始時刻>:<経過秒>;<コマンド>" と、行末の "\\" による複数行コマンドに対応
+  zsh が特殊なバイトを 0x83 + (バイト ^ 0x20) で保存する「メタ化」も元に戻す
+- コマンドは IMPORT_BATCH_COMMANDS 件ごとに process_commands でまとめて処理する
+- ファイルごとに読み込んだ位置を保存し、次回は続きから取り込む
+"""
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .config import IMPORT_CHUNK_BYTES, IMPORT_BATCH_COMMANDS
+from .game_logic import apply_login_history, process_commands, should_count_command
+
+# zsh のメタ化の目印（この次のバイトは 0x20 との排他的論理和で保存されている）
+ZSH_META = 0x83
+
+_BASH_TIMESTAMP = re.compile(rb"#(\d{9,11})")
+_ZSH_EXTENDED = re.compile(rb": *(\d+):(\d+);(.*)", re.DOTALL)
+
+
+class HistoryEntry(NamedTuple):
+    """履歴の1コマンド"""
+    timestamp: Optional[int]  # UNIX時刻（記録されていなければNone）
+    command: str
+    end: int  # ファイル中でこのコマンドが終わる位置（次回の読み込み開始位置）
+
+
+class HistoryImportError(Exception):
+    """履歴の取り込みに失敗した（ファイルが読めないなど）"""
+
+
+def default_history_files() -> List[Path]:
+    """既定で取り込む履歴ファイル（存在するものだけ）"""
+    home = Path.home()
+    candidates = [
+        Path(os.environ["HISTFILE"]) if os.environ.get("HISTFILE") else None,
+        home / ".bash_history",
+        home / ".zsh_history",
+        home / ".histfile",
+    ]
+    seen = []
+    for path in candidates:
+        if path and path.is_file() and path not in seen:
+            seen.append(path)
+    return seen
+
+
+def detect_format(path: Path, head: bytes) -> str:
+    """ファイル名と先頭の内容から形式を判定する"""
+    for line in head.split(b"\n")[:20]:
+        if _ZSH_EXTENDED.fullmatch(line):
+            return "zsh"
+        if _BASH_TIMESTAMP.fullmatch(line):
+            return "bash"
+    return "zsh" if "zsh" in path.name or path.name == ".histfile" else "bash"
+
+
+def unmetafy(raw: bytes) -> bytes:
+    """zsh のメタ化されたバイト列を元に戻す"""
+    if ZSH_META not in raw:
+        return raw
+    parts = raw.split(bytes((ZSH_META,)))
+    out = bytearray(parts[0])
+    for part in parts[1:]:
+        if part:
+            out.append(part[0] ^ 0x20)
+            out += part[1:]
+    return bytes(out)
+
+
+def iter_lines(f: BinaryIO, start: int = 0,
+               chunk_size: int = IMPORT_CHUNK_BYTES) -> Iterator[Tuple[bytes, int]]:
+    """
+    ファイルを chunk_size ずつ読み、(改行を除いた1行, その行の終わりの位置) を返す
+    最後の行に改行がない場合もその行を返す
+    """
+    f.seek(start)
+    offset = start
+    tail = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            offset += len(line) + 1
+            yield line, offset
+    if tail:
+        yield tail, offset + len(tail)
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="replace")
+
+
+def parse_bash(lines: Iterator[Tuple[bytes, int]]) -> Iterator[HistoryEntry]:
+    """bash の履歴を解析する"""
+    timestamp: Optional[int] = None
+    timed = False  # 時刻行のある形式か（時刻行の間の複数行を1コマンドとみなす）
+    buffer: List[bytes] = []
+    end = 0
+    for line, line_end in lines:
+        match = _BASH_TIMESTAMP.fullmatch(line)
+        if match:
+            if buffer:
+                yield HistoryEntry(timestamp, _decode(b"\n".join(buffer)), end)
+                buffer = []
+            timestamp = int(match.group(1))
+            timed = True
+            continue
+        if timed:
+            buffer.append(line)
+            end = line_end
+        else:
+            yield HistoryEntry(None, _decode(line), line_end)
+    if buffer:
+        yield HistoryEntry(timestamp, _decode(b"\n".join(buffer)), end)
+
+
+def parse_zsh(lines: Iterator[Tuple[bytes, int]]) -> Iterator[HistoryEntry]:
+    """zsh の履歴（拡張形式・通常形式）を解析する"""
+    timestamp: Optional[int] = None
+    buffer: Optional[bytearray] = None  # 複数行コマンドの読みかけ
+    for line, line_end in lines:
+        line = unmetafy(line)
+        if buffer is None:
+            match = _ZSH_EXTENDED.fullmatch(line)
+            if match:
+                timestamp = int(match.group(1))
+                line = match.group(3)
+            else:
+                timestamp = None
+            buffer = bytearray(line)
+        else:
+            buffer += b"\n" + line
+
+        # 行末の "\" は次の行に続く（"\\" は続かない）
+        trailing = len(line) - len(line.rstrip(b"\\"))
+        if trailing % 2 == 1:
+            del buffer[-1]
+            continue
+
+        yield HistoryEntry(timestamp, _decode(bytes(buffer)), line_end)
+        buffer = None
+    if buffer is not None:
+        yield HistoryEntry(timestamp, _decode(bytes(buffer)), line_end)
+
+
+PARSERS: Dict[str, Callable[[Iterator[Tuple[bytes, int]]], Iterator[HistoryEntry]]] = {
+    "bash": parse_bash,
+    "zsh": parse_zsh,
+}
+
+
+def import_file(data: Dict[str, Any], path: Path, fmt: Optional[str] = None, full: bool = False,
+                progress: Optional[Callable[[int], None]] = None,
+                dry_run: bool = False) -> Dict[str, Any]:
+    """
+    履歴ファイル1つを取り込む
+
+    Args:
+        fmt: "bash" / "zsh"（Noneなら自動判定）
+        full: 保存済みの読み込み位置を無視して先頭から読む
+        progress: 読み進めたバイト数を受け取る関数
+        dry_run: 数えるだけでデータに反映しない
+
+    Returns:
+        Dict with keys: path, format, commands, skipped, drops, coins, days, start, end
+    """
+    key = str(path.resolve())
+    record = data["history_import"].get(key, {})
+    try:
+        size = path.stat().st_size
+        f = open(path, "rb")
+    except OSError as e:
+        raise HistoryImportError(f"{path}: {e.strerror}") from e
+
+    with f:
+        fmt = fmt or record.get("format") or detect_format(path, f.read(4096))
+        start = 0 if full else record.get("offset", 0)
+        after = None
+        if start > size:
+            # 履歴ファイルが切り詰められた（HISTFILESIZE など）場合は先頭から読み、
+            # 取り込み済みの時刻までのコマンドは飛ばす。時刻がなければ新しい分を判別できないので読まない
+            after = record.get("last_timestamp")
+            start = 0 if after is not None else size
+
+        counted = skipped = drops = coins = 0
+        pending = 0
+        days: Set[date] = set()
+        last_timestamp = record.get("last_timestamp")
+        end = start
+        reported = start
+        day_start = day_end = 0.0
+        if progress:
+            progress(start)
+
+        def flush() -> None:
+            nonlocal pending, drops, coins
+            if pending and not dry_run:
+                result = process_commands(data, pending, update_daily=False)
+                drops += result["drop_count"]
+                coins += result["coins_earned"]
+            pending = 0
+
+        for entry in PARSERS[fmt](iter_lines(f, start)):
+            end = entry.end
+            if entry.timestamp is not None:
+                if after is not None and entry.timestamp <= after:
+                    continue
+                last_timestamp = max(last_timestamp or 0, entry.timestamp)
+            if not should_count_command(entry.command):
+                skipped += 1
+                continue
+
+            counted += 1
+            pending += 1
+            if entry.timestamp is not None and not day_start <= entry.timestamp < day_end:
+                # 日付の変換は日が変わったときだけ行う（履歴は概ね時刻順）
+                day = datetime.fromtimestamp(entry.timestamp).date()
+                days.add(day)
+                day_start = time.mktime(day.timetuple())
+                day_end = time.mktime((day + timedelta(days=1)).timetuple())
+            if pending >= IMPORT_BATCH_COMMANDS:
+                flush()
+                if progress:
+                    progress(end - reported)
+                    reported = end
+        flush()
+        if progress:
+            progress(size - reported)
+
+    if not dry_run:
+        apply_login_history(data, days)
+        data["history_import"][key] = {
+            "format": fmt,
+            "offset": end,
+            "last_timestamp": last_timestamp,
+        }
+
+    return {
+        "path": str(path),
+        "format": fmt,
+        "commands": counted,
+        "skipped": skipped,
+        "drops": drops,
+        "coins": coins,
+        "days": len(days),
+        "start": start,
+        "end": end,
+    }
@@ -0,0 +1,149 @@
+"""
+Shell-Gotchi コマンドの実行時間と終了コードの統計
+シェルフックから渡された実行時間（ミリ秒）と終了コードを、コマンド名ごとに集計する
+
+- 実行時間は DDSketch で数える: 相対誤差 LATENCY_SKETCH_ACCURACY の対数バケットに入れるので、
+  p50 でも p99 でもその誤差以内で求められる
+- バケットが LATENCY_SKETCH_MAX_BINS を超えたら小さい側からまとめる（遅い側の分位点の精度は保たれる）
+- 集計するコマンドは LATENCY_MAX_COMMANDS まで。超えたら最後の実行が最も古いものを捨てる
+  → コマンドを何回・何種類実行してもセーブデータの大きさは一定以下
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    LATENCY_SKETCH_ACCURACY, LATENCY_SKETCH_MAX_BINS, LATENCY_MAX_COMMANDS,
+    LATENCY_BUILD_TOOLS, LATENCY_FAST_MIN_SAMPLES, LATENCY_FAST_QUANTILE, LATENCY_FAST_MIN_MS,
+    LATENCY_REPORT_MIN_RUNS,
+)
+
+GAMMA = (1 + LATENCY_SKETCH_ACCURACY) / (1 - LATENCY_SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+# これ未満の実行時間（ミリ秒）はバケットに入れず 0 として数える
+MIN_MS = 1.0
+
+
+def _new_sketch() -> Dict[str, Any]:
+    return {
+        "runs": 0,  # 実行回数（実行時間が渡されなかった分も含む）
+        "failures": 0,  # 終了コードが0以外だった回数
+        "count": 0,  # 実行時間を記録した回数
+        "zero": 0,  # MIN_MS 未満だった回数
+        "bins": {},  # {バケット番号: 回数}
+        "sum": 0.0,
+        "max": 0.0,
+        "last": 0,  # 最後に実行したUNIX時刻
+    }
+
+
+def bucket_index(ms: float) -> int:
+    """実行時間が入るバケットの番号"""
+    return math.ceil(math.log(ms) / _LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """バケットの代表値（バケットの範囲内のどの値とも相対誤差 LATENCY_SKETCH_ACCURACY 以内）"""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def add(sketch: Dict[str, Any], ms: float) -> None:
+    """実行時間を1つ加える"""
+    sketch["count"] += 1
+    sketch["sum"] += ms
+    sketch["max"] = max(sketch["max"], ms)
+    if ms < MIN_MS:
+        sketch["zero"] += 1
+        return
+    bins = sketch["bins"]
+    key = str(bucket_index(ms))
+    bins[key] = bins.get(key, 0) + 1
+    if len(bins) > LATENCY_SKETCH_MAX_BINS:
+        # 最も小さい2つのバケットをまとめる
+        lowest, second = sorted(bins, key=int)[:2]
+        bins[second] += bins.pop(lowest)
+
+
+def quantile(sketch: Dict[str, Any], q: float) -> Optional[float]:
+    """分位点（ミリ秒）。実行時間の記録がなければNone"""
+    count = sketch["count"]
+    if not count:
+        return None
+    rank = q * (count - 1)
+    seen = sketch["zero"]
+    if rank < seen:
+        return 0.0
+    for key in sorted(sketch["bins"], key=int):
+        seen += sketch["bins"][key]
+        if rank < seen:
+            return bucket_value(int(key))
+    return sketch["max"]
+
+
+def is_fast_build(data: Dict[str, Any], tool: Optional[str], exit_code: Optional[int],
+                  duration_ms: Optional[float]) -> bool:
+    """
+    成功したビルド・テストが、そのコマンドのいつもの実行時間より速く終わったか
+    （記録が LATENCY_FAST_MIN_SAMPLES 件以上あり、LATENCY_FAST_MIN_MS 以上かかり、
+    LATENCY_FAST_QUANTILE の分位点より短い）
+    """
+    if tool not in LATENCY_BUILD_TOOLS or exit_code != 0 or duration_ms is None:
+        return False
+    if duration_ms < LATENCY_FAST_MIN_MS:
+        return False
+    sketch = data.get("latency", {}).get(tool)
+    if sketch is None or sketch["count"] < LATENCY_FAST_MIN_SAMPLES:
+        return False
+    return duration_ms < quantile(sketch, LATENCY_FAST_QUANTILE)
+
+
+def record(data: Dict[str, Any], tool: str, exit_code: Optional[int],
+           duration_ms: Optional[float], now: Optional[float] = None) -> None:
+    """コマンドの実行を記録する"""
+    sketches = data.setdefault("latency", {})
+    sketch = sketches.get(tool)
+    if sketch is None:
+        if len(sketches) >= LATENCY_MAX_COMMANDS:
+            oldest = min(sketches, key=lambda name: sketches[name]["last"])
+            del sketches[oldest]
+        sketch = sketches[tool] = _new_sketch()
+    sketch["runs"] += 1
+    sketch["last"] = int(time.time() if now is None else now)
+    if exit_code:
+        sketch["failures"] += 1
+    if duration_ms is not None and duration_ms >= 0:
+        add(sketch, duration_ms)
+
+
+def summarize(data: Dict[str, Any], sort: str = "slow", limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    コマンドごとの集計を返す
+
+    Args:
+        sort: "slow"（p95 の降順）/ "failing"（失敗率の降順）
+        limit: 返す件数
+    """
+    rows = []
+    for tool, sketch in data.get("latency", {}).items():
+        if sketch["runs"] < LATENCY_REPORT_MIN_RUNS:
+            continue
+        if sort == "slow" and not sketch["count"]:
+            continue
+        if sort == "failing" and not sketch["failures"]:
+            continue
+        rows.append({
+            "tool": tool,
+            "runs": sketch["runs"],
+            "failures": sketch["failures"],
+            "failure_rate": sketch["failures"] / sketch["runs"],
+            "p50": quantile(sketch, 0.5),
+            "p95": quantile(sketch, 0.95),
+            "p99": quantile(sketch, 0.99),
+            "max": sketch["max"] if sketch["count"] else None,
+        })
+    if sort == "failing":
+        rows.sort(key=lambda row: (row["failure_rate"], row["failures"]), reverse=True)
+    else:
+        rows.sort(key=lambda row: row["p95"], reverse=True)
+    return rows[:limit]
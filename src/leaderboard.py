@@ -0,0 +1,365 @@
+"""
+Shell-Gotchi ホスト内ランキング（sg leaderboard）
+同じホストのプレイヤーを、レベル・総コマンド数・SSR獲得数・今週のコマンド数で順位付けする
+
+- 共有ディレクトリ（LEADERBOARD_DIR / SG_LEADERBOARD_DIR、グループで書き込めるもの）の players/ に、
+  各プレイヤーが自分のスコアの小さな記録（<ユーザー名>.json）を書き込む（公開する）。
+  フックで行うのはこの1ファイルの書き込みだけ（ロックも索引の読み書きもしない）
+- index.json には指標ごとにソート済みの [-スコア, -同点時の比較値, ユーザー名] の列を持つ。
+  sg leaderboard の実行時に、前回から更新された記録の分だけ bisect で取り除いて挿入する
+- 順位は同じ列を bisect で探すので O(log n)（今週の指標は今週公開した人だけを数えるため上位を順にたどる）
+- 書き込みは一時ファイル（mkstemp）→ os.replace。読み手はロックなしで常に完全なファイルを読める
+- 共有ディレクトリのファイルは他のメンバーも書き換えられるので、読むときは形を確かめ、
+  おかしな記録は飛ばす（索引がおかしければ作り直す）。記録はファイルの所有者と名前が一致するものだけを数える
+- LEADERBOARD_EXPIRE_DAYS 日公開のないプレイヤーは、1時間に1度の掃除で取り除く
+- 公開はスコアが変わったときだけ。レベルと SSR はすぐ、コマンド数は LEADERBOARD_PUBLISH_INTERVAL 秒ごと
+"""
+import json
+import os
+import time
+from bisect import bisect_left, insort
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import LEADERBOARD_DIR, LEADERBOARD_PUBLISH_INTERVAL, LEADERBOARD_EXPIRE_DAYS
+
+INDEX_NAME = "index.json"
+PLAYERS_DIR = "players"  # 各プレイヤーの記録を置くサブディレクトリ
+SWEEP_INTERVAL = 3600  # 期限切れのプレイヤーを掃除する間隔（秒）
+
+
+def _level_score(data: Dict[str, Any], weekly: int) -> Tuple[int, int]:
+    return data["pet"]["level"], data["pet"]["exp"]
+
+
+def _commands_score(data: Dict[str, Any], weekly: int) -> Tuple[int, int]:
+    return data["stats"].get("total_commands", 0), 0
+
+
+def _ssr_score(data: Dict[str, Any], weekly: int) -> Tuple[int, int]:
+    return data["stats"].get("ssr_count", 0), 0
+
+
+def _weekly_score(data: Dict[str, Any], weekly: int) -> Tuple[int, int]:
+    return weekly, 0
+
+
+# 指標: 名前 → (表示名, スコアを求める関数)。スコアは (主な値, 同点時の比較値)
+METRICS: Dict[str, Tuple[str, Callable[[Dict[str, Any], int], Tuple[int, int]]]] = {
+    "level": ("レベル", _level_score),
+    "commands": ("総コマンド数", _commands_score),
+    "ssr": ("SSR獲得数", _ssr_score),
+    "weekly": ("今週のコマンド数", _weekly_score),
+}
+
+# 公開の間隔を待たずにすぐ公開する指標
+IMMEDIATE_METRICS = ("level", "ssr")
+
+
+def leaderboard_dir() -> Optional[Path]:
+    """共有ディレクトリ（未設定ならNone = ランキングを使わない）"""
+    path = os.environ.get("SG_LEADERBOARD_DIR", "").strip()
+    if path:
+        return Path(path)
+    return Path(LEADERBOARD_DIR) if LEADERBOARD_DIR else None
+
+
+def current_user() -> str:
+    import pwd
+    return pwd.getpwuid(os.getuid()).pw_name
+
+
+def _current_week(now: float) -> int:
+    from .activity import hour_index, tier_indexes
+    return tier_indexes(hour_index(now))[2]
+
+
+def _weekly_commands(activity_file: Optional[Path], now: float) -> int:
+    from . import activity
+    try:
+        return activity.load(activity_file).values("week", "commands", 1, now)[0][1]
+    except (OSError, ValueError):
+        return 0
+
+
+def _empty_index() -> Dict[str, Any]:
+    return {"players": {}, "ranks": {metric: [] for metric in METRICS}, "swept_at": 0, "seen": {}}
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def valid_record(record: Any) -> bool:
+    """公開された記録の形が正しいか"""
+    if not isinstance(record, dict) or not isinstance(record.get("name"), str):
+        return False
+    if not isinstance(record.get("updated"), (int, float)) or not _is_int(record.get("week", 0)):
+        return False
+    scores = record.get("scores")
+    if not isinstance(scores, dict):
+        return False
+    return all(metric in scores and isinstance(scores[metric], list) and len(scores[metric]) == 2
+               and all(_is_int(v) for v in scores[metric]) for metric in METRICS)
+
+
+def _rebuild_ranks(index: Dict[str, Any]) -> None:
+    index["ranks"] = {metric: sorted(_rank_key(record["scores"][metric], user)
+                                     for user, record in index["players"].items())
+                      for metric in METRICS}
+
+
+def load_index(directory: Path) -> Dict[str, Any]:
+    """
+    index.json を読む（なければ空）
+    形の正しくない索引は空として扱い、形の正しくない記録は飛ばす（順位の列は記録から作り直す）
+    """
+    try:
+        with open(directory / INDEX_NAME, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return _empty_index()
+    if not isinstance(raw, dict) or not isinstance(raw.get("players"), dict):
+        return _empty_index()
+
+    index = _empty_index()
+    index["players"] = {user: record for user, record in raw["players"].items() if valid_record(record)}
+    if isinstance(raw.get("swept_at"), (int, float)):
+        index["swept_at"] = raw["swept_at"]
+    if isinstance(raw.get("seen"), dict):
+        index["seen"] = {user: mtime for user, mtime in raw["seen"].items() if _is_int(mtime)}
+
+    ranks = raw.get("ranks")
+    if (isinstance(ranks, dict)
+            and all(isinstance(ranks.get(metric), list) and len(ranks[metric]) == len(index["players"])
+                    and all(_valid_rank_key(index, metric, key) for key in ranks[metric])
+                    for metric in METRICS)):
+        index["ranks"] = {metric: ranks[metric] for metric in METRICS}
+    else:
+        _rebuild_ranks(index)
+    return index
+
+
+def _valid_rank_key(index: Dict[str, Any], metric: str, key: Any) -> bool:
+    if not isinstance(key, list) or len(key) != 3 or not isinstance(key[2], str):
+        return False
+    record = index["players"].get(key[2])
+    return record is not None and key == _rank_key(record["scores"][metric], key[2])
+
+
+def _rank_key(score: List[int], user: str) -> List[Any]:
+    return [-score[0], -score[1], user]
+
+
+def _remove(ranks: List[List[Any]], key: List[Any]) -> None:
+    i = bisect_left(ranks, key)
+    if i < len(ranks) and ranks[i] == key:
+        del ranks[i]
+
+
+def _drop_player(index: Dict[str, Any], user: str) -> None:
+    record = index["players"].pop(user, None)
+    if record is None:
+        return
+    for metric, score in record["scores"].items():
+        if metric in index["ranks"]:
+            _remove(index["ranks"][metric], _rank_key(score, user))
+
+
+def update_index(index: Dict[str, Any], user: str, record: Dict[str, Any], now: float) -> None:
+    """1人分のスコアを差し替え、期限切れのプレイヤーを掃除する"""
+    _drop_player(index, user)
+    index["players"][user] = record
+    for metric in METRICS:
+        insort(index["ranks"][metric], _rank_key(record["scores"][metric], user))
+
+    if now - index.get("swept_at", 0) >= SWEEP_INTERVAL:
+        cutoff = now - LEADERBOARD_EXPIRE_DAYS * 86400
+        for stale in [name for name, rec in index["players"].items() if rec["updated"] < cutoff]:
+            _drop_player(index, stale)
+        index["swept_at"] = now
+
+
+def _write_json(directory: Path, name: str, value: Any, mode: int) -> None:
+    """directory/name を一時ファイル（mkstemp。名前を予測されない）から置き換える"""
+    import tempfile
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            os.fchmod(f.fileno(), mode)  # umask に関係なく決まったモードにする
+            f.write(json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+        os.replace(tmp, directory / name)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _players_dir(directory: Path) -> Path:
+    """記録を置くディレクトリ（なければ作る。自分が作ったらグループで書き込めて、他人の記録は消せないモードに）"""
+    players = directory / PLAYERS_DIR
+    try:
+        os.mkdir(players)
+    except FileExistsError:
+        return players
+    os.chmod(players, 0o3775)  # setgid + sticky
+    return players
+
+
+def publish(directory: Path, user: str, record: Dict[str, Any], now: float) -> None:
+    """スコアを共有ディレクトリの players/<ユーザー名>.json に書き込む"""
+    _write_json(_players_dir(directory), f"{user}.json", record, 0o644)
+
+
+def _owner_uid(user: str) -> Optional[int]:
+    import pwd
+    try:
+        return pwd.getpwnam(user).pw_uid
+    except KeyError:
+        return None
+
+
+def refresh_index(directory: Path, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    players/ の記録のうち前回から更新されたものだけを index.json に取り込んで返す（sg leaderboard 用）
+    取り込む記録は、ファイルの所有者が名前のユーザーで、形が正しいものだけ
+    """
+    import fcntl
+    now = time.time() if now is None else now
+    players = directory / PLAYERS_DIR
+    fd = os.open(directory / "index.lock", os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o664)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        index = load_index(directory)
+        changed = False
+        present = set()
+        try:
+            entries = list(os.scandir(players))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.name.endswith(".json") or entry.name.startswith("."):
+                continue
+            user = entry.name[:-len(".json")]
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if not entry.is_file(follow_symlinks=False) or st.st_uid != _owner_uid(user):
+                continue
+            present.add(user)
+            if index["seen"].get(user) == st.st_mtime_ns:
+                continue  # 前回から変わっていない（取り込まなかった記録も読み直さない）
+            index["seen"][user] = st.st_mtime_ns
+            changed = True
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if valid_record(record) and record["updated"] >= now - LEADERBOARD_EXPIRE_DAYS * 86400:
+                update_index(index, user, record, now)
+            else:
+                _drop_player(index, user)
+        for user in [name for name in index["seen"] if name not in present]:
+            # 記録が消えた
+            del index["seen"][user]
+            _drop_player(index, user)
+            changed = True
+        if changed:
+            _write_json(directory, INDEX_NAME, index, 0o664)
+    finally:
+        os.close(fd)
+    return index
+
+
+def build_record(data: Dict[str, Any], weekly: int, now: float) -> Dict[str, Any]:
+    """公開するスコアの記録"""
+    return {
+        "name": data["pet"]["name"],
+        "skin": data["pet"]["skin_id"],
+        "updated": int(now),
+        "week": _current_week(now),
+        "scores": {metric: list(func(data, weekly)) for metric, (_, func) in METRICS.items()},
+    }
+
+
+def maybe_publish(data: Dict[str, Any], user: Optional[str] = None,
+                  activity_file: Optional[Path] = None, now: Optional[float] = None,
+                  force: bool = False) -> bool:
+    """
+    スコアが変わっていれば公開する（失敗しても本体の処理を妨げない）
+    公開したら data["leaderboard"] を更新するので、呼び出し側で保存すること
+
+    Returns:
+        公開したか
+    """
+    directory = leaderboard_dir()
+    if directory is None:
+        return False
+    now = time.time() if now is None else now
+    state = data.setdefault("leaderboard", {"published_at": 0, "scores": {}})
+    weekly = _weekly_commands(activity_file, now)
+    record = build_record(data, weekly, now)
+    previous = state.get("scores", {})
+    if not force:
+        if record["scores"] == previous:
+            return False
+        immediate = any(record["scores"][m] != previous.get(m) for m in IMMEDIATE_METRICS)
+        if not immediate and now - state.get("published_at", 0) < LEADERBOARD_PUBLISH_INTERVAL:
+            return False
+    try:
+        publish(directory, user or current_user(), record, now)
+    except (OSError, ValueError, TypeError, KeyError):
+        return False
+    state["published_at"] = int(now)
+    state["scores"] = record["scores"]
+    return True
+
+
+def _is_current(index: Dict[str, Any], metric: str, user: str, now: float, week: int) -> bool:
+    """順位に数えるか（期限切れでなく、今週の指標なら今週 week に公開している）"""
+    record = index["players"].get(user)
+    if record is None or record["updated"] < now - LEADERBOARD_EXPIRE_DAYS * 86400:
+        return False
+    return metric != "weekly" or record.get("week") == week
+
+
+def top(index: Dict[str, Any], metric: str, limit: int,
+        now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """上位 limit 人（同じスコアは同じ順位）"""
+    now = time.time() if now is None else now
+    week = _current_week(now)
+    rows: List[Dict[str, Any]] = []
+    rank = 0
+    previous = None
+    for key in index["ranks"].get(metric, []):
+        if len(rows) >= limit:
+            break
+        user = key[2]
+        if not _is_current(index, metric, user, now, week):
+            continue
+        score = (-key[0], -key[1])
+        if score != previous:
+            rank = len(rows) + 1
+            previous = score
+        record = index["players"][user]
+        rows.append({"rank": rank, "user": user, "name": record["name"], "score": score[0]})
+    return rows
+
+
+def rank_of(index: Dict[str, Any], metric: str, user: str,
+            now: Optional[float] = None) -> Optional[Tuple[int, int]]:
+    """(順位, 順位に数える人数)。公開していなければNone"""
+    now = time.time() if now is None else now
+    week = _current_week(now)
+    ranks = index["ranks"].get(metric, [])
+    if not _is_current(index, metric, user, now, week):
+        return None
+    score = index["players"][user]["scores"][metric]
+    position = bisect_left(ranks, [-score[0], -score[1]])
+    if metric != "weekly":
+        return position + 1, len(ranks)
+    # 今週の指標は今週公開した人だけを数える
+    above = sum(1 for key in ranks[:position] if _is_current(index, metric, key[2], now, week))
+    total = sum(1 for key in ranks if _is_current(index, metric, key[2], now, week))
+    return above + 1, total
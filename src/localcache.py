@@ -0,0 +1,306 @@
+"""
+Shell-Gotchi ローカル書き戻しキャッシュ
+$HOME が NFS 上にあるとき、data.json の読み書きをローカルのコピーで済ませる
+
+- コピーの置き場所は $XDG_RUNTIME_DIR/shell-gotchi（なければ /tmp/shell-gotchi-<uid>）。
+  ホームの data.json のパスごとにサブディレクトリを分ける
+- 書き込みはローカルのコピーだけ。ホームへの書き戻し（フラッシュ）は次のとき
+  - 最初の未反映の書き込みから LOCAL_CACHE_FLUSH_SECONDS 秒たった
+  - 未反映の書き込みが LOCAL_CACHE_FLUSH_WRITES 回になった
+  - ログアウト（シェルフックの EXIT トラップ）・sg sync flush
+- 未反映の書き込みがないときだけ、LOCAL_CACHE_REVALIDATE_SECONDS 秒ごとにホームのファイルを stat し、
+  変わっていれば読み直す（別のホストでの変更を取り込む）
+- フラッシュ時、ホームのファイルの (mtime, size) が最後に同期したときと違えば別のホストが書き込んだとみなし、
+  ホームの版を data.conflict-<時刻>.json に退避してからローカルの版を書き込む
+- 同じホストのプロセスどうしはキャッシュディレクトリの lock ファイルを flock して排他する
+- キャッシュディレクトリ（と既定の置き場所 shell-gotchi / shell-gotchi-<uid>）は、自分が所有する
+  モード 0700 のディレクトリ（シンボリックリンクではない）でなければ使わない。/tmp に他のユーザーが
+  先に作っていた場合などは OSError になり、storage はホームを直接読み書きする
+- フックが毎回触るほかのファイルも同じディレクトリに置く（storage.side_file）
+  - LOCAL_CACHE_MIRRORED_FILES（活動の時系列・ディレクトリの集計・後回しキュー）: ローカルになければ
+    ホームの版を取り込み、data.json と同じときに（ログアウト時は変更がなくても）ホームに書き戻す。
+    中身が前回の書き戻し・取り込みと同じなら書かない。別のホストの版とは合わせず、後に書き戻した版が残る
+  - LOCAL_CACHE_LOCAL_FILES（data.json のロックファイル・通知キュー）: ローカルにだけ置く
+"""
+import json
+import os
+import stat
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from .config import (
+    LOCAL_CACHE, LOCAL_CACHE_DIR, LOCAL_CACHE_FLUSH_SECONDS, LOCAL_CACHE_FLUSH_WRITES,
+    LOCAL_CACHE_REVALIDATE_SECONDS, LOCAL_CACHE_MIRRORED_FILES,
+)
+
+
+def enabled() -> bool:
+    """ローカルキャッシュを使うか（環境変数 SG_LOCAL_CACHE=1/0 が config.LOCAL_CACHE より優先）"""
+    value = os.environ.get("SG_LOCAL_CACHE", "").strip()
+    if value:
+        return value not in ("0", "false", "no")
+    return bool(LOCAL_CACHE)
+
+
+def cache_dir(home: Path) -> Path:
+    """home（ホームの data.json）のコピーを置くディレクトリ"""
+    if LOCAL_CACHE_DIR:
+        base = Path(LOCAL_CACHE_DIR)
+    elif os.environ.get("XDG_RUNTIME_DIR"):
+        base = Path(os.environ["XDG_RUNTIME_DIR"]) / "shell-gotchi"
+    else:
+        base = Path("/tmp") / f"shell-gotchi-{os.getuid()}"
+    return base / format(zlib.crc32(str(home).encode("utf-8")), "08x")
+
+
+def copy_path(home: Path) -> Path:
+    """home のローカルのコピー（sg watch が監視する）"""
+    return cache_dir(home) / "copy.json"
+
+
+def _signature(path: Path) -> Optional[List[int]]:
+    """ファイルの (mtime_ns, size)。なければNone"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _atomic_write(path: Path, content: Union[str, bytes], mode: int = 0o644) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        if isinstance(content, bytes):
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class _Cache:
+    """1つのキャッシュディレクトリ（copy.json = ローカルのコピー, meta.json = 同期の状態）"""
+
+    def __init__(self, home: Path):
+        self.home = home
+        self.dir = cache_dir(home)
+        self.copy = copy_path(home)
+        self.meta_file = self.dir / "meta.json"
+
+    def load_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            return meta if meta.get("source") == str(self.home) else None
+        except (OSError, ValueError):
+            return None
+
+    def save_meta(self, meta: Dict[str, Any]) -> None:
+        _atomic_write(self.meta_file, json.dumps(meta), 0o600)
+
+    def new_meta(self, signature: Optional[List[int]], now: float) -> Dict[str, Any]:
+        return {"source": str(self.home), "home": signature, "writes": 0,
+                "dirty_since": 0, "checked_at": now, "flushed_at": 0}
+
+    def fetch(self, now: float) -> Optional[str]:
+        """ホームのファイルをコピーに取り込む（ホームにもなければNone）"""
+        try:
+            with open(self.home, "r", encoding="utf-8") as f:
+                text = f.read()
+                st = os.fstat(f.fileno())
+            signature = [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            text, signature = None, None
+        if text is not None:
+            _atomic_write(self.copy, text, 0o600)
+        meta = self.new_meta(signature, now)
+        meta["sides"] = (self.load_meta() or {}).get("sides", {})
+        self.save_meta(meta)
+        return text
+
+
+_prepared: set = set()
+
+
+def _private_dir(path: Path) -> None:
+    """
+    自分だけが使えるディレクトリを用意する
+    シンボリックリンクは開かずに（O_NOFOLLOW）確かめ、自分の所有でない・他のユーザーが書き込めるなら OSError。
+    自分のディレクトリでモードが広いだけなら 0700 に狭める
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    try:
+        st = os.fstat(fd)
+        if st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"キャッシュディレクトリを安全に使えません: {path}")
+        if stat.S_IMODE(st.st_mode) != 0o700:
+            os.fchmod(fd, 0o700)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _locked(home: Path) -> Iterator[_Cache]:
+    import fcntl
+    cache = _Cache(home)
+    if cache.dir not in _prepared:
+        if LOCAL_CACHE_DIR:
+            os.makedirs(cache.dir.parent, exist_ok=True)  # 設定した置き場所はそのまま使う
+        else:
+            _private_dir(cache.dir.parent)
+        _private_dir(cache.dir)
+        _prepared.add(cache.dir)
+    fd = os.open(cache.dir / "lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield cache
+    finally:
+        os.close(fd)
+
+
+def side_path(home: Path, name: str) -> Path:
+    """
+    home（ホームの data.json）と同じディレクトリにあるファイル name のローカルの置き場所
+    書き戻すファイル（LOCAL_CACHE_MIRRORED_FILES）がローカルになければ、ホームの版を取り込んでおく
+    """
+    path = cache_dir(home) / name
+    if path.parent in _prepared and (name not in LOCAL_CACHE_MIRRORED_FILES or path.exists()):
+        return path
+    with _locked(home) as cache:
+        if name in LOCAL_CACHE_MIRRORED_FILES and not path.exists():
+            _fetch_side(cache, name)
+    return path
+
+
+def _fetch_side(cache: _Cache, name: str) -> None:
+    try:
+        with open(cache.home.with_name(name), "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return
+    _atomic_write(cache.dir / name, content, 0o600)
+    meta = cache.load_meta() or cache.new_meta(_signature(cache.home), time.time())
+    meta.setdefault("sides", {})[name] = zlib.crc32(content)
+    cache.save_meta(meta)
+
+
+def _flush_sides(cache: _Cache, meta: Dict[str, Any]) -> int:
+    """
+    ローカルで変わったファイル（LOCAL_CACHE_MIRRORED_FILES）をホームに書き戻す。書き戻した数を返す
+    書き込み中のファイルは写さず次に回す（後回しキューを処理しているプロセスを待つと、
+    そのプロセスがこのロックを待っていることがあるため）
+    """
+    import fcntl
+    sides = meta.setdefault("sides", {})
+    count = 0
+    for name in LOCAL_CACHE_MIRRORED_FILES:
+        try:
+            fd = os.open(cache.dir / name, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            with os.fdopen(os.dup(fd), "rb") as f:
+                content = f.read()
+        finally:
+            os.close(fd)
+        checksum = zlib.crc32(content)
+        if sides.get(name) == checksum:
+            continue
+        cache.home.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(cache.home.with_name(name), content)
+        sides[name] = checksum
+        count += 1
+    return count
+
+
+def read(home: Path, now: Optional[float] = None) -> Optional[str]:
+    """data.json の中身をローカルのコピーから読む（コピーがなければホームから取り込む。どちらにもなければNone）"""
+    now = time.time() if now is None else now
+    with _locked(home) as cache:
+        meta = cache.load_meta()
+        if meta is not None and not meta["writes"] and now - meta["checked_at"] >= LOCAL_CACHE_REVALIDATE_SECONDS:
+            if _signature(home) != meta["home"]:
+                meta = None  # 別のホストで変更された
+            else:
+                meta["checked_at"] = now
+                cache.save_meta(meta)
+        if meta is not None:
+            try:
+                with open(cache.copy, "r", encoding="utf-8") as f:
+                    return f.read()
+            except FileNotFoundError:
+                if meta["home"] is None:
+                    return None
+        return cache.fetch(now)
+
+
+def write(home: Path, text: str, now: Optional[float] = None) -> None:
+    """data.json の中身をローカルのコピーに書き込む（書き戻しの条件を満たしていればホームにも書き戻す）"""
+    now = time.time() if now is None else now
+    with _locked(home) as cache:
+        _atomic_write(cache.copy, text, 0o600)
+        meta = cache.load_meta() or cache.new_meta(_signature(home), now)
+        if not meta["writes"]:
+            meta["dirty_since"] = now
+        meta["writes"] += 1
+        if (meta["writes"] >= LOCAL_CACHE_FLUSH_WRITES
+                or now - meta["dirty_since"] >= LOCAL_CACHE_FLUSH_SECONDS):
+            _flush(cache, meta, now)
+        else:
+            cache.save_meta(meta)
+
+
+def _flush(cache: _Cache, meta: Dict[str, Any], now: float) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"writes": meta["writes"], "conflict": None, "files": 0}
+    with open(cache.copy, "r", encoding="utf-8") as f:
+        text = f.read()
+    home = cache.home
+    home.parent.mkdir(parents=True, exist_ok=True)
+    current = _signature(home)
+    if current is not None and current != meta["home"]:
+        # 最後に同期してから別のホストが書き込んだ: ホームの版を退避する
+        conflict = home.with_name(f"{home.stem}.conflict-{int(now)}{home.suffix}")
+        os.replace(home, conflict)
+        result["conflict"] = conflict
+    _atomic_write(home, text)
+    result["files"] = _flush_sides(cache, meta)
+    meta.update(home=_signature(home), writes=0, dirty_since=0, checked_at=now, flushed_at=now)
+    cache.save_meta(meta)
+    return result
+
+
+def flush(home: Path, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    未反映の書き込みと、ローカルで変わったファイル（LOCAL_CACHE_MIRRORED_FILES）をホームに書き戻す
+
+    Returns:
+        {"writes": 書き戻した書き込みの数（0なら data.json は書いていない）,
+         "conflict": 退避したホームの版のパス or None, "files": 書き戻したほかのファイルの数}
+    """
+    now = time.time() if now is None else now
+    with _locked(home) as cache:
+        meta = cache.load_meta()
+        if meta is not None and meta["writes"]:
+            return _flush(cache, meta, now)
+        # data.json を読む前に後回しにしたフックだけのときは、まだ同期の状態がない
+        meta = meta or cache.new_meta(_signature(home), now)
+        files = _flush_sides(cache, meta)
+        if files:
+            cache.save_meta(meta)
+        return {"writes": 0, "conflict": None, "files": files}
@@ -2,30 +2,51 @@
 Shell-Gotchi CLIエントリーポイント
 """
 import click
-from typing import Optional
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional
 
+from . import (
+    activity, directories, events, latency, leaderboard, localcache, metrics, notify, profiler, replica,
+    server, slo, storage
+)
 from .storage import load_data, save_data, reset_data
 from .ui import (
-    display_status, display_drop_message, display_login_bonus,
-    display_feed_result, display_no_food, display_hunger_full,
+    display_status, display_feed_result, display_no_food, display_hunger_full,
     display_gacha_animation, display_gacha_result, display_no_tickets,
     display_collection, display_ticket_reward, display_name_changed,
     display_skin_changed, display_skin_list, display_skin_not_owned,
     display_stats, display_shop, display_shop_purchase, display_shop_error,
     display_daily_missions, display_daily_reward_claimed,
     display_achievements, display_achievement_unlocked,
-    console
+    display_error, display_message, display_bench_results,
+    display_profile_report, display_simulation, display_history_import,
+    display_latency_report, display_activity_heatmap, display_activity_trend,
+    display_directory_report, display_serve_summary, display_leaderboard,
+    display_plugins, display_notices, display_status_live, display_gacha_history, display_gacha_rates
 )
 from .game_logic import (
-    process_command, feed_pet, pull_gacha, check_login_bonus,
+    feed_pet, pull_gacha_many,
     change_skin, buy_item, get_daily_status, claim_daily_reward,
-    check_achievements, get_achievements_status
+    check_achievements, get_achievements_status, classify_command,
+    handle_hook_event, configured_gacha_rates
+)
+from .config import (
+    APP_NAME, VERSION, GACHA_MAX_PULLS, GACHA_HISTORY_CAPACITY, GACHA_HISTORY_SHOW, GACHA_HISTORY_FILE,
+    BENCH_REPEAT, BENCH_REGRESSION_THRESHOLD, PROFILE_REPORT_RUNS,
+    SIM_PLAYERS, SIM_DAYS, SIM_TARGET_LEVEL, SERVE_CACHE_MAX_BYTES,
+    REPORT_GLOB, REPORT_CHUNK_FILES, DATA_FILE
 )
-from .config import APP_NAME, VERSION
 from .assets import PET_SKINS
-from rich.table import Table
-from rich.panel import Panel
-from rich import box
+from .renderer import renderer
+
+profiler.mark("imports")
+
+# 読み込みから保存まで data.json のロックを持つコマンド（グループはサブコマンドに関係なく）
+DATA_WRITING_COMMANDS = (
+    "feed", "gacha", "rename", "reset", "skin", "shop", "daily", "achievement", "import-history",
+    "leaderboard", "sync",
+)
 
 
 @click.group()
@@ -36,7 +57,29 @@ def cli():
     
     コマンドを実行してエサを集め、ペットを育て、ガチャを回そう！
     """
-    pass
+    ctx = click.get_current_context()
+    command_name = ctx.invoked_subcommand
+    profiler.set_command(command_name)
+    
+    # データファイルを読まないコマンド（notify はプロンプトのたびに呼ばれるので軽く保つ）
+    if command_name in ("hook", "serve", "help", "notify"):
+        return
+    
+    # 共有サービス（sg serve）が保持している変更を書き戻させてから、データファイルを読む
+    if server.socket_path():
+        server.release()
+    
+    # データを書き換えるコマンドは、終わるまで他のプロセス（バックグラウンドのフックなど）の書き込みを待たせる
+    if command_name in DATA_WRITING_COMMANDS:
+        ctx.with_resource(storage.data_lock())
+    
+    # フックが遅延予算を超えそうで後回しにした処理を済ませる
+    if slo.pending():
+        with storage.data_lock():
+            data = load_data()
+            done = slo.drain(data)
+            save_data(data)
+        display_notices(notify.coalesce(notify.from_replayed(done)))
 
 
 @cli.command()
@@ -46,6 +89,25 @@ def status():
     display_status(data)
 
 
+@cli.command()
+@click.option("--poll", is_flag=True, help="inotify を使わず定期的に確かめる（NFS で別のホストの変更を見るとき）")
+def watch(poll: bool):
+    """ステータスを表示し続け、変化したときだけ描き直す（Ctrl-C で終了）"""
+    from . import watcher
+    load_data()  # 監視するファイルとディレクトリを作っておく
+    files = [DATA_FILE]
+    if localcache.enabled():
+        files.append(localcache.copy_path(DATA_FILE))
+    directory = replica.sync_dir()
+    dirs = [directory] if directory is not None and directory.is_dir() else []
+    
+    file_watcher = watcher.open_watcher(files, dirs, poll=poll)
+    try:
+        display_status_live(load_data, file_watcher.wait)
+    finally:
+        file_watcher.close()
+
+
 @cli.command()
 def feed():
     """ペットにエサをあげる"""
@@ -63,7 +125,10 @@ def feed():
     
     # エサやり実行
     result = feed_pet(data)
+    leaderboard.maybe_publish(data)
     save_data(data)
+    metrics.inc("feeds_total")
+    activity.record("feeds")
     
     display_feed_result(
         pet_name=data["pet"]["name"],
@@ -77,17 +142,21 @@ def feed():
     if result["tickets_earned"] > 0:
         display_ticket_reward(result["tickets_earned"])
     
-    # 実績チェック
-    new_achievements = check_achievements(data)
-    if new_achievements:
-        save_data(data)
-        for ach in new_achievements:
-            display_achievement_unlocked(ach)
+    # 新しく達成した実績
+    for ach in result["unlocked"]:
+        display_achievement_unlocked(ach)
 
 
-@cli.command()
-def gacha():
-    """ガチャを回す"""
+@cli.group(invoke_without_command=True)
+@click.option("--count", "-n", default=1, type=click.IntRange(1, GACHA_MAX_PULLS),
+              help=f"まとめて回す回数（最大{GACHA_MAX_PULLS}回）")
+@click.option("--fast", is_flag=True, help="ガチャ演出をスキップする")
+@click.pass_context
+def gacha(ctx: click.Context, count: int, fast: bool):
+    """ガチャを回す（history / rates で記録を見る）"""
+    if ctx.invoked_subcommand is not None:
+        return
+    from . import gacha_history
     data = load_data()
     
     # チケットチェック
@@ -95,24 +164,52 @@ def gacha():
         display_no_tickets()
         return
     
-    # ガチャ演出
-    display_gacha_animation()
+    # 所持チケット数を超えて回さない
+    count = min(count, data["user"]["tickets"])
+    
+    # ガチャ演出（回数に関係なく1回だけ）
+    display_gacha_animation(fast=fast)
     
     # ガチャ実行
-    result = pull_gacha(data)
+    results = pull_gacha_many(data, count)
+    leaderboard.maybe_publish(data)
     save_data(data)
+    for result in results:
+        metrics.inc("gacha_pulls_total", rarity=result["rarity"])
+    activity.record("gacha", len(results))
+    try:
+        gacha_history.record(results)
+    except gacha_history.HistoryLimitError as e:
+        display_error(f"ガチャの履歴に記録できませんでした: {e}（{GACHA_HISTORY_FILE} を消すと記録し直せます）")
     
     # 結果表示
-    display_gacha_result(result["rarity"], result["item"])
+    for result in results:
+        display_gacha_result(result["rarity"], result["item"])
     
-    # 実績チェック
-    new_achievements = check_achievements(data)
-    if new_achievements:
-        save_data(data)
-        for ach in new_achievements:
+    # 新しく達成した実績
+    for result in results:
+        for ach in result["unlocked"]:
             display_achievement_unlocked(ach)
 
 
+@gacha.command("history")
+@click.option("--limit", "-n", default=GACHA_HISTORY_SHOW, type=click.IntRange(1, GACHA_HISTORY_CAPACITY),
+              help="表示する件数")
+def gacha_recent(limit: int):
+    """直近のガチャの結果と、最高レアリティが出ていない連続回数を表示する"""
+    from . import gacha_history
+    display_gacha_history(gacha_history.load(), limit, gacha_history.top_rarity(configured_gacha_rates()))
+
+
+@gacha.command("rates")
+def gacha_rates():
+    """記録したガチャの実際の確率を、設定の確率と95%区間で比べる"""
+    from . import gacha_history
+    configured = configured_gacha_rates()
+    history = gacha_history.load()
+    display_gacha_rates(history, gacha_history.rates(history, configured), gacha_history.top_rarity(configured))
+
+
 @cli.command()
 def collection():
     """コレクション一覧を表示する"""
@@ -120,34 +217,118 @@ def collection():
     display_collection(data["collection"])
 
 
+def _hook_locally(info, cmd: str, exit_code: Optional[int], duration_ms: Optional[float],
+                  cwd: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    フック1回分をこのプロセスで処理する（遅延予算を超えそうな処理は後回しキューに積む）
+    
+    Returns:
+        handle_hook_event の結果に replayed（済ませた後回しの処理）を加えたもの。
+        フック1回分をそのまま積んだときは None
+    """
+    guard = slo.HookGuard()
+    raw = [slo.hook_entry(cmd, exit_code, duration_ms, cwd)]
+    if guard.over("startup") and slo.defer(guard.tag(raw)):
+        return None
+    
+    # 別のプロセスが data.json を書き換えている間に予算を使い切ったら、読み込みの段階で予算を超えたことにする
+    if not storage.acquire_lock(max(guard.remaining_ms(), 0) / 1000):
+        if guard.over("load", float("inf")) and slo.defer(guard.tag(raw)):
+            return None
+        storage.acquire_lock()
+    try:
+        return _hook_locked(guard, raw, info, cmd, exit_code, duration_ms, cwd)
+    finally:
+        storage.release_lock()
+
+
+def _hook_locked(guard: slo.HookGuard, raw: List[Dict[str, Any]], info, cmd: str, exit_code: Optional[int],
+                 duration_ms: Optional[float], cwd: Optional[str]) -> Optional[Dict[str, Any]]:
+    """_hook_locally の読み込みから保存まで（data.json のロックを持って呼ぶ）"""
+    start = time.perf_counter()
+    data = load_data()
+    guard.record_load(data, (time.perf_counter() - start) * 1000)
+    if guard.over("load", guard.need_after_load(data)) and slo.defer(guard.tag(raw)):
+        return None
+    
+    guard.begin_logic(data)
+    try:
+        result = handle_hook_event(data, info, cmd, exit_code, duration_ms)
+    finally:
+        later = guard.end_logic()
+    # 保存が間に合わなければ、処理した結果は捨ててフック1回分を積む
+    if guard.over("save", guard.need_save(data)) and slo.defer(guard.tag(raw)):
+        return None
+    
+    # 予算が残っていれば、前に後回しにした処理を続けて済ませる
+    result["replayed"] = {"replayed": 0, "logins": [], "unlocked": []}
+    if not later and slo.pending() and guard.remaining_ms() >= guard.need_after_load(data):
+        result["replayed"] = slo.drain(data, guard.save_deadline_ms(data))
+    
+    rollup = guard.over("rollup", guard.need_after_load(data))
+    if not rollup:
+        leaderboard.maybe_publish(data)
+    save_data(data)
+    
+    if rollup:
+        later.append({"k": "rollup", "rewarded": result["rewarded"], "cwd": cwd, "t": time.time()})
+    elif result["rewarded"]:
+        activity.record("commands")
+        if cwd:
+            directories.record_cwd(cwd)
+    
+    if later and not slo.defer(guard.tag(later)):
+        # 積めなければその場で済ませる
+        done = slo.replay(data, later)
+        save_data(data)
+        result["replayed"]["unlocked"].extend(done["unlocked"])
+    return result
+
+
 @cli.command()
 @click.option("--trigger", is_flag=True, help="シェルフックからのトリガー")
 @click.option("--command", "cmd", default="", help="実行されたコマンド（スパム検出用）")
-def hook(trigger: bool, cmd: str):
+@click.option("--exit-code", type=int, default=None, help="コマンドの終了コード")
+@click.option("--duration-ms", type=float, default=None, help="コマンドの実行時間（ミリ秒）")
+@click.option("--cwd", default=None, help="コマンドを実行したディレクトリ")
+def hook(trigger: bool, cmd: str, exit_code: Optional[int], duration_ms: Optional[float],
+         cwd: Optional[str]):
     """シェルフック用コマンド（通常は直接使用しない）"""
     if not trigger:
-        console.print("[yellow][SG][/yellow] このコマンドはシェルフックから自動的に呼び出されます。")
+        display_message("[yellow][SG][/yellow] このコマンドはシェルフックから自動的に呼び出されます。")
         return
     
-    # 空コマンドはスキップ
-    if not cmd or cmd.strip() == "":
+    # 空コマンド・除外規則（sg 自体など）に一致するコマンドはスキップ
+    info = classify_command(cmd)
+    if info.ignored:
         return
     
-    data = load_data()
-    
-    # ログインボーナスチェック
-    login_result = check_login_bonus(data)
-    if login_result["is_new_day"]:
-        save_data(data)
-        display_login_bonus(login_result["reward_type"], data["user"]["login_streak"])
+    # 共有サービス（sg serve）が動いていれば処理を任せる。応答がなければこのプロセスで処理する
+    result = server.send_hook(cmd, exit_code, duration_ms, cwd)
+    if result is None:
+        result = _hook_locally(info, cmd, exit_code, duration_ms, cwd)
+        if result is None:
+            return
     
-    # コマンド処理
-    result = process_command(data)
-    save_data(data)
-    
-    # ドロップした場合のみ表示
+    if result["rewarded"]:
+        metrics.inc("commands_total")
     if result["dropped"]:
-        display_drop_message(data["user"]["food"])
+        metrics.inc("drops_total")
+    
+    # ログインボーナス・実績・ドロップは次のプロンプトで表示する（sg notify）。積めなければここで表示する
+    notices = notify.from_hook(result)
+    if notices and not notify.push(notices):
+        display_notices(notify.coalesce(notices))
+
+
+@cli.command("notify")
+@click.option("--path", "show_path", is_flag=True, help="通知キューのパスを表示する（シェルフックが起動時に使う）")
+def notify_command(show_path: bool):
+    """溜まった通知を表示する（通常はシェルフックが次のプロンプトで呼び出す）"""
+    if show_path:
+        click.echo(notify.queue_file())
+        return
+    display_notices(notify.coalesce(notify.take()))
 
 
 @cli.command()
@@ -155,7 +336,7 @@ def hook(trigger: bool, cmd: str):
 def rename(new_name: str):
     """ペットの名前を変更する"""
     if not new_name or len(new_name) > 20:
-        console.print("[red][SG][/red] 名前は1〜20文字で指定してください。")
+        display_error("名前は1〜20文字で指定してください。")
         return
     
     data = load_data()
@@ -171,7 +352,7 @@ def rename(new_name: str):
 def reset():
     """ゲームデータをリセットする"""
     reset_data()
-    console.print("[green][SG][/green] データをリセットしました。")
+    display_message("[green][SG][/green] データをリセットしました。")
 
 
 @cli.command()
@@ -196,10 +377,28 @@ def skin(skin_id: Optional[str]):
 
 
 @cli.command()
-def stats():
+@click.option("--slow", is_flag=True, help="実行時間の長いコマンドを表示する")
+@click.option("--failing", is_flag=True, help="失敗の多いコマンドを表示する")
+@click.option("--heatmap", is_flag=True, help="曜日×時間帯ごとのコマンド数を表示する（直近30日）")
+@click.option("--trend", is_flag=True, help="時間・日・週ごとの活動の推移を表示する")
+@click.option("--by-dir", is_flag=True, help="ディレクトリ（git リポジトリ）ごとのコマンド数を表示する")
+@click.option("--limit", "-n", default=10, type=click.IntRange(1), help="表示する行数")
+def stats(slow: bool, failing: bool, heatmap: bool, trend: bool, by_dir: bool, limit: int):
     """詳細な統計情報を表示する"""
-    data = load_data()
-    display_stats(data)
+    if heatmap or trend:
+        store = activity.load()
+        if heatmap:
+            display_activity_heatmap(activity.heatmap(store))
+        if trend:
+            display_activity_trend(activity.trend(store))
+    if slow or failing:
+        data = load_data()
+        for kind in [k for k, on in (("slow", slow), ("failing", failing)) if on]:
+            display_latency_report(latency.summarize(data, kind, limit), kind)
+    if by_dir:
+        display_directory_report(directories.top_subtrees(directories.fold(), limit))
+    if not (slow or failing or heatmap or trend or by_dir):
+        display_stats(load_data())
 
 
 @cli.group()
@@ -226,12 +425,9 @@ def shop_buy(item_id: str):
         save_data(data)
         display_shop_purchase(result["item"]["name"], data["user"]["coins"])
         
-        # 実績チェック
-        new_achievements = check_achievements(data)
-        if new_achievements:
-            save_data(data)
-            for ach in new_achievements:
-                display_achievement_unlocked(ach)
+        # 新しく達成した実績
+        for ach in result["unlocked"]:
+            display_achievement_unlocked(ach)
     else:
         display_shop_error(result["message"])
 
@@ -268,7 +464,7 @@ def daily_claim(mission_id: str):
             for ach in new_achievements:
                 display_achievement_unlocked(ach)
     else:
-        console.print(f"[red][SG][/red] {result['message']}")
+        display_error(result["message"])
 
 
 @cli.command()
@@ -288,6 +484,291 @@ def achievement():
     display_achievements(achievements)
 
 
+@cli.command()
+@click.option("--compare", is_flag=True, help="ベースラインと比較して劣化を検出する")
+@click.option("--threshold", default=BENCH_REGRESSION_THRESHOLD, type=float,
+              help="劣化とみなす割合（%）")
+@click.option("--save-baseline", is_flag=True, help="今回の結果をベースラインとして保存する")
+@click.option("--repeat", default=BENCH_REPEAT, type=click.IntRange(1), help="各計測の繰り返し回数")
+def bench(compare: bool, threshold: float, save_baseline: bool, repeat: int):
+    """ベンチマークを実行する（開発用）"""
+    from benchmarks.runner import (
+        BASELINE_FILE, run_benchmarks, save_results, load_baseline, compare as compare_results
+    )
+    
+    report = run_benchmarks(repeat, progress=lambda name: display_message(f"[dim]計測中: {name}[/dim]"))
+    path = save_results(report)
+    
+    comparison = None
+    if compare:
+        baseline = load_baseline()
+        if baseline is None:
+            display_error(f"ベースラインがありません: {BASELINE_FILE}")
+        else:
+            comparison = compare_results(report, baseline, threshold)
+    
+    display_bench_results(report, comparison, threshold)
+    display_message(f"[dim]結果を保存しました: {path}[/dim]")
+    
+    if save_baseline:
+        save_results(report, BASELINE_FILE)
+        display_message(f"[green][SG][/green] ベースラインを更新しました: {BASELINE_FILE}")
+    
+    # 劣化があれば終了コード1（CIで検出できるように）
+    if comparison and any(row["regression"] for row in comparison):
+        raise SystemExit(1)
+
+
+@cli.command("import-history")
+@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--format", "fmt", type=click.Choice(["bash", "zsh"]), default=None,
+              help="履歴の形式（省略時は自動判定）")
+@click.option("--full", is_flag=True, help="取り込み済みの位置を無視して先頭から読み直す（重複して数えます）")
+@click.option("--dry-run", is_flag=True, help="数えるだけでデータに反映しない")
+def import_history(files: tuple, fmt: Optional[str], full: bool, dry_run: bool):
+    """シェル履歴（~/.bash_history / ~/.zsh_history）を取り込む"""
+    from . import history
+    
+    paths = list(files) or history.default_history_files()
+    if not paths:
+        display_error("履歴ファイルが見つかりません。ファイルを指定してください。")
+        return
+    
+    data = load_data()
+    results = []
+    total = sum(path.stat().st_size for path in paths)
+    try:
+        with renderer.progress(total, "履歴を取り込み中") as advance:
+            for path in paths:
+                results.append(history.import_file(data, path, fmt, full, advance, dry_run))
+    except history.HistoryImportError as e:
+        display_error(str(e))
+        return
+    
+    display_history_import(results, dry_run)
+    if dry_run:
+        return
+    
+    new_achievements = check_achievements(data)
+    save_data(data)
+    for ach in new_achievements:
+        display_achievement_unlocked(ach)
+
+
+@cli.command()
+@click.option("--players", "-p", default=SIM_PLAYERS, type=click.IntRange(1), help="合成プレイヤー数")
+@click.option("--days", "-d", default=SIM_DAYS, type=click.IntRange(1), help="シミュレーションする日数")
+@click.option("--level", "target_level", default=SIM_TARGET_LEVEL, type=click.IntRange(2),
+              help="到達日数を集計するレベル")
+@click.option("--set", "settings", multiple=True, metavar="KEY=VALUE",
+              help="パラメータを変更する（例: drop_chance=0.08）")
+@click.option("--sweep", "sweeps", multiple=True, metavar="KEY=V1,V2,...",
+              help="パラメータを振って比較する（複数指定で全組み合わせ）")
+@click.option("--seed", default=0, type=int, help="乱数の種")
+@click.option("--workers", "-j", default=None, type=click.IntRange(1), help="並列実行するプロセス数")
+@click.option("--json", "as_json", is_flag=True, help="結果をJSONで出力する")
+def simulate(players: int, days: int, target_level: int, settings: tuple, sweeps: tuple,
+             seed: int, workers: Optional[int], as_json: bool):
+    """合成プレイヤーでゲーム内経済をシミュレーションする"""
+    import json
+    import time
+    from . import simulator
+    from .config_compiler import ConfigError
+    
+    try:
+        # --set は値が1つのスイープとして扱う
+        assignments = simulator.parse_assignments(settings) + simulator.parse_assignments(sweeps)
+        base = simulator.SimParams(players=players, days=days, target_level=target_level, seed=seed)
+        scenarios = simulator.build_scenarios(assignments, base)
+    except ConfigError as e:
+        display_error(str(e))
+        raise SystemExit(2)
+    
+    start = time.perf_counter()
+    summaries = simulator.run(scenarios, workers)
+    elapsed = time.perf_counter() - start
+    
+    if as_json:
+        click.echo(json.dumps(summaries, ensure_ascii=False, indent=2))
+        return
+    
+    display_simulation(summaries, simulator.backend_name(), elapsed)
+
+
+@cli.group()
+def profile():
+    """実行時間の計測結果を確認する（SG_PROFILE=1 で記録）"""
+    pass
+
+
+@profile.command("report")
+@click.option("--last", "-n", default=PROFILE_REPORT_RUNS, type=click.IntRange(1),
+              help="集計する直近の実行数")
+@click.option("--command", "-c", "command_name", default=None, help="集計するサブコマンド")
+def profile_report(last: int, command_name: Optional[str]):
+    """フェーズ・サブコマンドごとの p50 / p95 / p99 を表示する"""
+    records = profiler.read_records(last)
+    if not records:
+        display_error("計測記録がありません。SG_PROFILE=1 を設定して sg を実行してください。")
+        return
+    
+    rows = profiler.build_report(records, command_name)
+    display_profile_report(rows, len(records))
+
+
+@cli.command("metrics")
+@click.option("--export", "do_export", is_flag=True, help=".prom ファイルを今すぐ書き出す")
+def metrics_command(do_export: bool):
+    """Prometheus 形式のメトリクスを表示する（SG_METRICS_TEXTFILE で有効化）"""
+    if not metrics.get_textfile():
+        display_error("メトリクスが無効です。SG_METRICS_TEXTFILE に書き出し先を設定してください。")
+        return
+    
+    if do_export:
+        path = metrics.export()
+        display_message(f"[green][SG][/green] {path} に書き出しました。")
+        return
+    
+    metrics.flush()
+    click.echo(metrics.render(metrics.load_aggregate()), nl=False)
+
+
+@cli.command("leaderboard")
+@click.option("--by", "metric", type=click.Choice(list(leaderboard.METRICS)), default="level",
+              help="順位付けの指標")
+@click.option("--limit", "-n", default=10, type=click.IntRange(1), help="表示する人数")
+def leaderboard_command(metric: str, limit: int):
+    """同じホストのプレイヤーのランキングを表示する"""
+    directory = leaderboard.leaderboard_dir()
+    if directory is None:
+        display_error("ランキングが無効です。SG_LEADERBOARD_DIR に共有ディレクトリを設定してください。")
+        return
+    
+    # 自分のスコアが変わっていれば先に公開する
+    data = load_data()
+    if leaderboard.maybe_publish(data):
+        save_data(data)
+    
+    try:
+        index = leaderboard.refresh_index(directory)
+    except OSError:
+        index = leaderboard.load_index(directory)  # 索引を書き換えられなければ前回の索引で表示する
+    user = leaderboard.current_user()
+    display_leaderboard(
+        leaderboard.METRICS[metric][0],
+        leaderboard.top(index, metric, limit),
+        leaderboard.rank_of(index, metric, user),
+        user
+    )
+
+
+@cli.command()
+@click.option("--enable", "enable_name", default=None, metavar="NAME", help="止まっているハンドラを再開する")
+def plugins(enable_name: Optional[str]):
+    """プラグインのハンドラと、持ち時間を超えて止まったものを表示する"""
+    if enable_name:
+        if events.bus.enable(enable_name):
+            display_message(f"[green][SG][/green] {enable_name} を再開しました。")
+        else:
+            display_error(f"{enable_name} は止まっていません。")
+        return
+    
+    display_plugins(events.bus.plugin_status(), events.bus.load_errors, str(events.bus.plugin_dir))
+
+
+@cli.command()
+@click.option("--socket", "socket_file", default=None, type=click.Path(dir_okay=False),
+              help="待ち受ける Unix ソケット（省略時は SG_SERVE_SOCKET / config.SERVE_SOCKET）")
+@click.option("--cache-mb", default=SERVE_CACHE_MAX_BYTES // (1024 * 1024), type=click.IntRange(1),
+              help="キャッシュするセーブデータの上限（MB、JSONのサイズで数える）")
+def serve(socket_file: Optional[str], cache_mb: int):
+    """ホスト上の全ユーザーのシェルフックを処理する共有サービスを起動する"""
+    path = socket_file or server.socket_path()
+    if not path:
+        display_error("ソケットのパスを --socket か SG_SERVE_SOCKET で指定してください。")
+        return
+    
+    cache = server.PlayerCache(cache_mb * 1024 * 1024)
+    try:
+        server.serve(path, cache, on_ready=lambda: display_message(
+            f"[green][SG][/green] {path} で待ち受けています（Ctrl+C で終了）"))
+    except OSError as e:
+        display_error(f"サービスを起動できませんでした: {e}")
+        return
+    display_serve_summary(cache.stats, len(cache.entries))
+
+
+@cli.group()
+def sync():
+    """セーブデータの同期（複数マシンでの同期・$HOME が NFS のときのローカルキャッシュ）"""
+
+
+@sync.command("flush")
+@click.option("--quiet", "-q", is_flag=True, help="書き戻した内容を表示しない（ログアウト時のフック用）")
+def sync_flush(quiet: bool):
+    """同期ディレクトリへの差分の書き出しと、ローカルキャッシュの書き戻しを今すぐ行う"""
+    if not replica.enabled() and not localcache.enabled():
+        if not quiet:
+            display_error("同期が無効です。SG_SYNC_DIR か SG_LOCAL_CACHE=1 を設定してください。")
+        return
+    
+    messages = []
+    if replica.enabled():
+        data = load_data()
+        if replica.push(data, force=True):
+            messages.append(f"[green][SG][/green] {replica.sync_dir()} に差分を書き出しました。")
+        save_data(data)
+    
+    if localcache.enabled():
+        try:
+            result = localcache.flush(DATA_FILE)
+        except OSError as e:
+            display_error(f"書き戻せませんでした: {e}")
+            return
+        if result["conflict"]:
+            messages.append(
+                f"[yellow][SG][/yellow] 別のホストでの変更がありました。その版は {result['conflict']} に退避しました。"
+            )
+        if result["writes"]:
+            messages.append(f"[green][SG][/green] {result['writes']} 回分の変更をホームに書き戻しました。")
+        if result["files"]:
+            messages.append(f"[green][SG][/green] 活動の記録など {result['files']} 個のファイルをホームに書き戻しました。")
+    
+    if quiet:
+        return
+    for message in messages or ["[SG] 書き出す変更はありません。"]:
+        display_message(message)
+
+
+@cli.group()
+def admin():
+    """ホスト管理者向けのコマンド"""
+
+
+@admin.command("report")
+@click.option("--glob", "patterns", multiple=True, metavar="PATTERN",
+              help=f"集計するセーブデータの glob（複数指定可。既定: {REPORT_GLOB}）")
+@click.option("--format", "fmt", type=click.Choice(["json", "csv"]), default="json", help="出力形式")
+@click.option("--output", "-o", default=None, type=click.Path(dir_okay=False), help="書き出し先（省略時は標準出力）")
+@click.option("--workers", "-j", default=None, type=click.IntRange(1), help="並列実行するプロセス数")
+@click.option("--chunk", default=REPORT_CHUNK_FILES, type=click.IntRange(1), help="1ジョブあたりのファイル数")
+def admin_report(patterns: tuple, fmt: str, output: Optional[str], workers: Optional[int], chunk: int):
+    """全プレイヤーのセーブデータからレベル・SSR・連続ログインの分布を集計する"""
+    from . import report
+    result = report.build_report(patterns or (REPORT_GLOB,), workers, chunk)
+    text = report.to_json(result) + "\n" if fmt == "json" else report.to_csv(result)
+    if output is None:
+        click.echo(text, nl=False)
+        return
+    
+    Path(output).write_text(text, encoding="utf-8")
+    counts = result["counts"]
+    display_message(
+        f"[green][SG][/green] {counts['valid']}/{counts['files']} 件を集計して {output} に書き出しました。"
+        f"（壊れていた: {counts['corrupt']} / 読めなかった: {counts['unreadable']}）"
+    )
+
+
 @cli.command("help")
 @click.argument("command_name", required=False)
 def help_command(command_name: Optional[str]):
@@ -314,13 +795,24 @@ def help_command(command_name: Optional[str]):
             ]
         },
         "gacha": {
-            "usage": "sg gacha",
+            "usage": "sg gacha [-n 回数] [--fast] / sg gacha history [-n 件数] / sg gacha rates",
             "description": "ガチャを回してアイテムを獲得します",
             "details": [
-                "チケットを1枚消費",
+                "チケットを1枚消費（-n で最大10回まとめて回せる）",
+                "--fast で演出をスキップ（演出中も任意のキーでスキップ可能）",
                 "SSR (1%): 特殊スキン、レア称号",
                 "SR (9%): 色違いスキン",
-                "R (90%): 豆知識、ハズレの石"
+                "R (90%): 豆知識、ハズレの石",
+                "sg gacha history: 直近の結果と、最高レアリティが出ていない連続回数",
+                "sg gacha rates: 実際の確率を設定の確率と95%区間で比較"
+            ]
+        },
+        "watch": {
+            "usage": "sg watch [--poll]",
+            "description": "ステータスを表示し続けます",
+            "details": [
+                "データが変化したときだけ描き直す（Ctrl-C で終了）",
+                "--poll: inotify を使わず定期的に確かめる（NFS で別のホストの変更を見るとき）"
             ]
         },
         "collection": {
@@ -342,13 +834,16 @@ def help_command(command_name: Optional[str]):
             ]
         },
         "stats": {
-            "usage": "sg stats",
+            "usage": "sg stats [--slow] [--failing] [--heatmap] [--trend] [--by-dir] [-n 行数]",
             "description": "詳細な統計情報を表示します",
             "details": [
                 "コマンド統計（総数、次のドロップまで）",
                 "ペット統計（レベル、経験値、エサやり回数）",
                 "ガチャ統計（回数、SSR獲得数）",
-                "ログイン統計（連続日数、最大記録）"
+                "ログイン統計（連続日数、最大記録）",
+                "--slow / --failing: 実行時間の長いコマンド / 失敗の多いコマンド",
+                "--heatmap / --trend: 曜日×時間帯のヒートマップ / 活動の推移",
+                "--by-dir: ディレクトリ（git リポジトリ）ごとのコマンド数"
             ]
         },
         "shop": {
@@ -378,6 +873,99 @@ def help_command(command_name: Optional[str]):
                 "達成時に自動で報酬を獲得"
             ]
         },
+        "notify": {
+            "usage": "sg notify [--path]",
+            "description": "溜まった通知を表示します",
+            "details": [
+                "ドロップ・ログインボーナス・実績解除をまとめて表示",
+                "通常はシェルフックが次のプロンプトで呼び出す",
+                "--path: 通知キューのパスを表示（ローカルキャッシュではキャッシュディレクトリ）"
+            ]
+        },
+        "import-history": {
+            "usage": "sg import-history [ファイル...] [--format bash|zsh] [--full] [--dry-run]",
+            "description": "シェル履歴を取り込みます",
+            "details": [
+                "引数なし: ~/.bash_history / ~/.zsh_history を読む",
+                "取り込み済みの位置を覚えていて、次回は続きから読む（--full で先頭から）",
+                "--dry-run: 数えるだけでデータに反映しない"
+            ]
+        },
+        "leaderboard": {
+            "usage": "sg leaderboard [--by 指標] [-n 人数]",
+            "description": "同じホストのプレイヤーのランキングを表示します",
+            "details": [
+                "SG_LEADERBOARD_DIR に共有ディレクトリを設定して有効化",
+                "--by で順位付けの指標を選ぶ（既定: level）"
+            ]
+        },
+        "sync": {
+            "usage": "sg sync flush [-q]",
+            "description": "セーブデータの同期を今すぐ行います",
+            "details": [
+                "SG_SYNC_DIR: 同期ディレクトリへ差分を書き出す",
+                "SG_LOCAL_CACHE=1: ローカルキャッシュをホームに書き戻す",
+                "-q: 表示しない（ログアウト時のフック用）"
+            ]
+        },
+        "plugins": {
+            "usage": "sg plugins [--enable NAME]",
+            "description": "プラグインのハンドラを表示します",
+            "details": [
+                "読み込んだハンドラと、持ち時間を超えて止まったものを表示",
+                "--enable: 止まっているハンドラを再開"
+            ]
+        },
+        "bench": {
+            "usage": "sg bench [--compare] [--threshold %] [--save-baseline] [--repeat 回数]",
+            "description": "ベンチマークを実行します（開発用）",
+            "details": [
+                "--compare: ベースラインと比較し、劣化があれば終了コード1",
+                "--save-baseline: 今回の結果をベースラインとして保存"
+            ]
+        },
+        "simulate": {
+            "usage": "sg simulate [-p 人数] [-d 日数] [--set KEY=VALUE] [--sweep KEY=V1,V2,...] [--json]",
+            "description": "合成プレイヤーでゲーム内経済をシミュレーションします（開発用）",
+            "details": [
+                "--set: パラメータを変更（例: drop_chance=0.08）",
+                "--sweep: パラメータを振って比較（複数指定で全組み合わせ）",
+                "-j: 並列実行するプロセス数"
+            ]
+        },
+        "profile": {
+            "usage": "sg profile report [-n 実行数] [-c サブコマンド]",
+            "description": "実行時間の計測結果を表示します（開発用）",
+            "details": [
+                "SG_PROFILE=1 を設定して sg を実行すると記録される",
+                "フェーズ・サブコマンドごとの p50 / p95 / p99 を表示"
+            ]
+        },
+        "metrics": {
+            "usage": "sg metrics [--export]",
+            "description": "Prometheus 形式のメトリクスを表示します",
+            "details": [
+                "SG_METRICS_TEXTFILE に書き出し先を設定して有効化",
+                "--export: .prom ファイルを今すぐ書き出す"
+            ]
+        },
+        "serve": {
+            "usage": "sg serve [--socket パス] [--cache-mb MB]",
+            "description": "全ユーザーのシェルフックを処理する共有サービスを起動します（管理者向け）",
+            "details": [
+                "ソケットは --socket か SG_SERVE_SOCKET で指定",
+                "各ユーザーは SG_SERVE_SOCKET を設定するとフックをサービスに送る"
+            ]
+        },
+        "admin": {
+            "usage": "sg admin report [--glob PATTERN] [--format json|csv] [-o ファイル]",
+            "description": "全プレイヤーのセーブデータを集計します（管理者向け）",
+            "details": [
+                "レベル・SSR・連続ログインの分布を集計",
+                "--glob: 集計するセーブデータ（複数指定可）",
+                "-j / --chunk: 並列実行するプロセス数 / 1ジョブあたりのファイル数"
+            ]
+        },
         "rename": {
             "usage": "sg rename <新しい名前>",
             "description": "ペットの名前を変更します",
@@ -408,86 +996,91 @@ def help_command(command_name: Optional[str]):
         # 特定のコマンドの詳細表示
         if command_name in commands:
             cmd = commands[command_name]
-            console.print()
-            console.print(Panel(
+            renderer.print()
+            renderer.print(renderer.panel(
                 f"[bold cyan]{cmd['usage']}[/bold cyan]",
                 title=f"📖 {command_name}",
                 border_style="cyan"
             ))
-            console.print(f"\n[bold]説明:[/bold] {cmd['description']}\n")
-            console.print("[bold]詳細:[/bold]")
+            renderer.print(f"\n[bold]説明:[/bold] {cmd['description']}\n")
+            renderer.print("[bold]詳細:[/bold]")
             for detail in cmd["details"]:
-                console.print(f"  • {detail}")
-            console.print()
+                renderer.print(f"  • {detail}")
+            renderer.print()
         else:
-            console.print(f"[red][SG][/red] コマンド '{command_name}' が見つかりません。")
-            console.print("     'sg help' で全コマンド一覧を確認してください。")
+            display_error(f"コマンド '{command_name}' が見つかりません。")
+            renderer.print("     'sg help' で全コマンド一覧を確認してください。")
     else:
         # 全コマンド一覧表示
-        console.print()
-        console.print(Panel(
+        renderer.print()
+        renderer.print(renderer.panel(
             "[bold]Shell-Gotchi コマンドヘルプ[/bold]\n"
             "[dim]ターミナルでペットを育成しよう！[/dim]",
             border_style="blue"
         ))
         
-        # 基本コマンド
-        console.print("\n[bold yellow]🎮 基本コマンド[/bold yellow]")
-        table1 = Table(box=box.SIMPLE)
-        table1.add_column("コマンド", style="cyan")
-        table1.add_column("説明")
-        table1.add_row("sg status", "ペットのステータスを表示")
-        table1.add_row("sg feed", "ペットにエサをあげる")
-        table1.add_row("sg gacha", "ガチャを回す")
-        table1.add_row("sg collection", "コレクション一覧")
-        console.print(table1)
-        
-        # カスタマイズ
-        console.print("\n[bold yellow]🎨 カスタマイズ[/bold yellow]")
-        table2 = Table(box=box.SIMPLE)
-        table2.add_column("コマンド", style="cyan")
-        table2.add_column("説明")
-        table2.add_row("sg skin [ID]", "スキン変更・一覧表示")
-        table2.add_row("sg rename <名前>", "ペットの名前を変更")
-        console.print(table2)
-        
-        # 情報・統計
-        console.print("\n[bold yellow]📊 情報・統計[/bold yellow]")
-        table3 = Table(box=box.SIMPLE)
-        table3.add_column("コマンド", style="cyan")
-        table3.add_column("説明")
-        table3.add_row("sg stats", "詳細な統計情報")
-        table3.add_row("sg achievement", "実績一覧")
-        console.print(table3)
-        
-        # ショップ・ミッション
-        console.print("\n[bold yellow]🏪 ショップ・ミッション[/bold yellow]")
-        table4 = Table(box=box.SIMPLE)
-        table4.add_column("コマンド", style="cyan")
-        table4.add_column("説明")
-        table4.add_row("sg shop list", "ショップ商品一覧")
-        table4.add_row("sg shop buy <ID>", "商品を購入")
-        table4.add_row("sg daily list", "デイリーミッション一覧")
-        table4.add_row("sg daily claim <ID>", "報酬を受け取る")
-        console.print(table4)
-        
-        # その他
-        console.print("\n[bold yellow]⚙️ その他[/bold yellow]")
-        table5 = Table(box=box.SIMPLE)
-        table5.add_column("コマンド", style="cyan")
-        table5.add_column("説明")
-        table5.add_row("sg help [コマンド]", "ヘルプを表示")
-        table5.add_row("sg reset", "データをリセット")
-        table5.add_row("sg --version", "バージョン表示")
-        console.print(table5)
+        sections = [
+            ("🎮 基本コマンド", [
+                ("sg status", "ペットのステータスを表示"),
+                ("sg feed", "ペットにエサをあげる"),
+                ("sg gacha", "ガチャを回す"),
+                ("sg collection", "コレクション一覧"),
+                ("sg watch", "ステータスを表示し続ける"),
+                ("sg notify", "溜まった通知を表示"),
+            ]),
+            ("🎨 カスタマイズ", [
+                ("sg skin [ID]", "スキン変更・一覧表示"),
+                ("sg rename <名前>", "ペットの名前を変更"),
+            ]),
+            ("📊 情報・統計", [
+                ("sg stats", "詳細な統計情報"),
+                ("sg achievement", "実績一覧"),
+                ("sg gacha history", "ガチャの履歴"),
+                ("sg gacha rates", "ガチャの実際の確率"),
+                ("sg leaderboard", "ホスト内のランキング"),
+                ("sg import-history", "シェル履歴を取り込む"),
+            ]),
+            ("🏪 ショップ・ミッション", [
+                ("sg shop list", "ショップ商品一覧"),
+                ("sg shop buy <ID>", "商品を購入"),
+                ("sg daily list", "デイリーミッション一覧"),
+                ("sg daily claim <ID>", "報酬を受け取る"),
+            ]),
+            ("🛠️ 開発・管理", [
+                ("sg bench", "ベンチマーク"),
+                ("sg simulate", "経済シミュレーション"),
+                ("sg profile report", "実行時間の計測結果"),
+                ("sg metrics", "Prometheus 形式のメトリクス"),
+                ("sg plugins", "プラグインのハンドラ"),
+                ("sg sync flush", "同期・キャッシュの書き戻し"),
+                ("sg serve", "共有サービスを起動"),
+                ("sg admin report", "全プレイヤーの集計"),
+            ]),
+            ("⚙️ その他", [
+                ("sg help [コマンド]", "ヘルプを表示"),
+                ("sg reset", "データをリセット"),
+                ("sg --version", "バージョン表示"),
+            ]),
+        ]
+        for title, rows in sections:
+            renderer.print(f"\n[bold yellow]{title}[/bold yellow]")
+            renderer.print(renderer.table(
+                [{"header": "コマンド", "style": "cyan"}, "説明"],
+                rows,
+                box="simple"
+            ))
         
-        console.print("\n[dim]詳細を見るには: sg help <コマンド名>[/dim]")
-        console.print()
+        renderer.print("\n[dim]詳細を見るには: sg help <コマンド名>[/dim]")
+        renderer.print()
 
 
 def main():
     """エントリーポイント"""
-    cli()
+    try:
+        cli()
+    finally:
+        profiler.finish()
+        metrics.flush()
 
 
 if __name__ == "__main__":
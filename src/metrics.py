@@ -0,0 +1,222 @@
+"""
+Shell-Gotchi メトリクス
+node_exporter の textfile collector 向けに、レイテンシのヒストグラムとゲーム内カウンタを
+Prometheus のテキスト形式で書き出す
+
+- 実行中のプロセスは増分（カウンタの加算・ヒストグラムへの観測）をメモリに貯めるだけ
+- 終了時に集計ファイル（metrics.json）へ flock の下で合算するため、同時に動くプロセスの値も失われない
+- .prom ファイルは METRICS_EXPORT_INTERVAL 秒ごとに一時ファイル → os.replace で置き換える
+- SG_METRICS_TEXTFILE または config.METRICS_TEXTFILE が設定されていなければ何もしない
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import profiler
+
+# メトリクス名の接頭辞
+PREFIX = "shell_gotchi_"
+
+# ヒストグラムのバケット境界（秒）
+# HDR Histogram と同様の対数線形: 2の累乗ごとの区間を SUB_BUCKETS 個に等分する
+# 2^-14 秒（約61µs）から 2^2 秒（4秒）までを相対誤差25%以内で表す
+MIN_EXPONENT = -14
+MAX_EXPONENT = 2
+SUB_BUCKETS = 4
+BUCKET_BOUNDS: Tuple[float, ...] = tuple(
+    2.0 ** e * (1 + s / SUB_BUCKETS)
+    for e in range(MIN_EXPONENT, MAX_EXPONENT)
+    for s in range(SUB_BUCKETS)
+) + (2.0 ** MAX_EXPONENT,)
+
+# メトリクス定義: 名前 → (種類, 説明)
+METRICS: Dict[str, Tuple[str, str]] = {
+    "hook_duration_seconds": ("histogram", "シェルフック1回の実行時間（プロセス起動から終了まで）"),
+    "storage_read_duration_seconds": ("histogram", "1プロセス内の load_data の合計時間"),
+    "storage_write_duration_seconds": ("histogram", "1プロセス内の save_data の合計時間"),
+    "commands_total": ("counter", "フックで処理したコマンド数"),
+    "drops_total": ("counter", "エサのドロップ数"),
+    "gacha_pulls_total": ("counter", "ガチャを回した回数（レアリティ別）"),
+    "feeds_total": ("counter", "エサやりの回数"),
+}
+
+# プロセスごとの増分（終了時に集計ファイルへ合算する）
+_counters: Dict[str, Dict[str, float]] = {}
+_observations: Dict[str, List[float]] = {}
+
+
+def get_textfile() -> Optional[str]:
+    """書き出し先の .prom ファイル（未設定ならNone = メトリクス無効）"""
+    path = os.environ.get("SG_METRICS_TEXTFILE", "").strip()
+    if path:
+        return path
+    from .config import METRICS_TEXTFILE
+    return str(METRICS_TEXTFILE) if METRICS_TEXTFILE else None
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    """ラベルを Prometheus の表記（ソート済み）にする"""
+    if not labels:
+        return ""
+    return ",".join(f'{k}="{labels[k]}"' for k in sorted(labels))
+
+
+def inc(name: str, amount: float = 1, **labels: str) -> None:
+    """カウンタを加算する"""
+    series = _counters.setdefault(name, {})
+    key = _label_key(labels)
+    series[key] = series.get(key, 0) + amount
+
+
+def observe(name: str, seconds: float) -> None:
+    """ヒストグラムに値（秒）を記録する"""
+    _observations.setdefault(name, []).append(seconds)
+
+
+def bucket_index(seconds: float) -> int:
+    """値が入るバケットの番号（最後の番号は +Inf）"""
+    return bisect_left(BUCKET_BOUNDS, seconds)
+
+
+# ===== 集計ファイルへの合算 =====
+
+def _empty_histogram() -> Dict[str, Any]:
+    return {"buckets": [0] * (len(BUCKET_BOUNDS) + 1), "sum": 0.0, "count": 0}
+
+
+def merge(aggregate: Dict[str, Any], counters: Dict[str, Dict[str, float]],
+          observations: Dict[str, List[float]]) -> Dict[str, Any]:
+    """増分を集計データに合算する（バケット定義が変わっていたらヒストグラムを作り直す）"""
+    agg_counters = aggregate.setdefault("counters", {})
+    for name, series in counters.items():
+        target = agg_counters.setdefault(name, {})
+        for key, value in series.items():
+            target[key] = target.get(key, 0) + value
+
+    histograms = aggregate.setdefault("histograms", {})
+    for name, values in observations.items():
+        hist = histograms.get(name)
+        if not hist or len(hist.get("buckets", ())) != len(BUCKET_BOUNDS) + 1:
+            hist = histograms[name] = _empty_histogram()
+        for value in values:
+            hist["buckets"][bucket_index(value)] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+    return aggregate
+
+
+def _collect_timings() -> None:
+    """プロファイラの計測値から、このプロセスのレイテンシを記録する"""
+    timings = profiler.get_timings()
+    if profiler.get_command() == "hook":
+        observe("hook_duration_seconds", timings["total"])
+    if "load_data" in timings:
+        observe("storage_read_duration_seconds", timings["load_data"])
+    if "save_data" in timings:
+        observe("storage_write_duration_seconds", timings["save_data"])
+
+
+def _write_atomic(path: str, text: str) -> None:
+    """同じディレクトリの一時ファイルに書いてから置き換える（読み手が書きかけを見ない）"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def flush() -> None:
+    """実行終了時に呼ぶ。増分を集計ファイルに合算し、間隔が空いていれば .prom を書き出す"""
+    textfile = get_textfile()
+    if not textfile:
+        return
+
+    import fcntl
+    import json
+    from .config import DATA_DIR, METRICS_EXPORT_INTERVAL, METRICS_STATE_FILE
+
+    _collect_timings()
+    try:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        with open(METRICS_STATE_FILE.with_suffix(".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(METRICS_STATE_FILE, "r", encoding="utf-8") as f:
+                    aggregate = json.load(f)
+            except (OSError, ValueError):
+                aggregate = {}
+
+            merge(aggregate, _counters, _observations)
+            now = time.time()
+            if now - aggregate.get("exported_at", 0) >= METRICS_EXPORT_INTERVAL:
+                _write_atomic(textfile, render(aggregate))
+                aggregate["exported_at"] = now
+            _write_atomic(str(METRICS_STATE_FILE), json.dumps(aggregate, separators=(",", ":")))
+    except OSError:
+        return  # メトリクスの失敗で本体の処理を妨げない
+    _counters.clear()
+    _observations.clear()
+
+
+def export() -> Optional[str]:
+    """集計ファイルから .prom を今すぐ書き出す（sg metrics --export 用）"""
+    textfile = get_textfile()
+    if not textfile:
+        return None
+    flush()
+    _write_atomic(textfile, render(load_aggregate()))
+    return textfile
+
+
+def load_aggregate() -> Dict[str, Any]:
+    """集計ファイルを読む（なければ空）"""
+    import json
+    from .config import METRICS_STATE_FILE
+    try:
+        with open(METRICS_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# ===== Prometheus テキスト形式 =====
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(aggregate: Dict[str, Any]) -> str:
+    """集計データを Prometheus のテキスト形式にする"""
+    import getpass
+
+    user = f'user="{getpass.getuser()}"'
+    lines = []
+    counters = aggregate.get("counters", {})
+    histograms = aggregate.get("histograms", {})
+
+    for name, (kind, help_text) in METRICS.items():
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+
+        if kind == "counter":
+            series = counters.get(name) or {"": 0}
+            for key in sorted(series):
+                labels = f"{user},{key}" if key else user
+                lines.append(f"{full}{{{labels}}} {_format_value(series[key])}")
+            continue
+
+        hist = histograms.get(name) or _empty_histogram()
+        cumulative = 0
+        for bound, count in zip(BUCKET_BOUNDS + (None,), hist["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound is None else f"{bound:.9g}"
+            lines.append(f'{full}_bucket{{{user},le="{le}"}} {cumulative}')
+        lines.append(f"{full}_sum{{{user}}} {hist['sum']:.9g}")
+        lines.append(f"{full}_count{{{user}}} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,114 @@
+"""
+Shell-Gotchi 通知キュー
+シェルフックの結果（ドロップ・ログインボーナス・実績解除）はその場で表示せず、NOTIFY_QUEUE_FILE に積んで
+次のプロンプトで表示する
+
+- フックは1行1件の JSON を追記するだけ（rich を読み込まず、端末にも書かない）
+- シェル側はプロンプトのたびにファイルの大きさだけを確かめ（[[ -s ... ]]）、空でなければ sg notify を実行する
+- sg notify はキューを読んで空にし、まとめて表示する
+  （ドロップは「前回のプロンプトから3回」のように1行に、同じ実績は1回にまとめる）
+- 結果を次のプロンプトで表示するので、フックをバックグラウンドで実行しても（SG_ASYNC_HOOK=1）通知は失われない
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import NOTIFY_QUEUE_FILE
+
+
+def from_replayed(done: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """後回しにした処理（slo.drain / slo.replay の結果）の通知"""
+    notices: List[Dict[str, Any]] = []
+    for login in done["logins"]:
+        notices.extend(_login(login))
+    notices.extend({"k": "achievement", "achievement": ach} for ach in done["unlocked"])
+    return notices
+
+
+def from_hook(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """フック1回分の結果（handle_hook_event の結果）の通知"""
+    notices = from_replayed(result["replayed"]) if result.get("replayed") else []
+    if result["login"]["is_new_day"]:
+        notices.extend(_login(result["login"]))
+    if result["dropped"]:
+        notices.append({"k": "drop", "count": 1, "food_count": result["food_count"]})
+    return notices
+
+
+def _login(login: Dict[str, Any]) -> List[Dict[str, Any]]:
+    notices = [{"k": "login", "reward_type": login["reward_type"], "streak": login["streak"]}]
+    notices.extend({"k": "achievement", "achievement": ach} for ach in login.get("unlocked", []))
+    return notices
+
+
+def queue_file() -> Path:
+    """キューの置き場所（ローカルキャッシュが有効ならキャッシュディレクトリ。シェルフックが起動時に尋ねる）"""
+    from .storage import side_file
+    return side_file(NOTIFY_QUEUE_FILE)
+
+
+def push(notices: List[Dict[str, Any]], path: Optional[Path] = None) -> bool:
+    """キューに追記する（1回の write で書くので、同時に書き込んでも行が混ざらない。失敗したら False）"""
+    from .storage import ensure_data_dir
+    path = path or queue_file()
+    lines = "".join(json.dumps(notice, ensure_ascii=False, separators=(",", ":")) + "\n" for notice in notices)
+    try:
+        ensure_data_dir(path.parent)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+    return True
+
+
+def take(path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """キューを読んで空にする（壊れた行は飛ばす）"""
+    import fcntl
+    path = path or queue_file()
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except OSError:
+        return []
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd), "rb") as f:
+            raw = f.read()
+        os.ftruncate(fd, 0)
+    finally:
+        os.close(fd)
+    notices = []
+    for line in raw.splitlines():
+        try:
+            notices.append(json.loads(line))
+        except ValueError:
+            continue
+    return notices
+
+
+def coalesce(notices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    表示する形にまとめる
+    - ドロップは1件に（回数を足し、エサの数は最後の値）
+    - 同じ実績は1回だけ
+    - ログインボーナス → 実績 → ドロップ の順
+    """
+    logins: List[Dict[str, Any]] = []
+    achievements: Dict[str, Dict[str, Any]] = {}
+    drop = None
+    for notice in notices:
+        kind = notice.get("k")
+        if kind == "login":
+            logins.append(notice)
+        elif kind == "achievement":
+            achievements.setdefault(notice["achievement"].get("id", notice["achievement"]["name"]), notice)
+        elif kind == "drop":
+            if drop is None:
+                drop = dict(notice)
+            else:
+                drop["count"] += notice.get("count", 1)
+                drop["food_count"] = notice["food_count"]
+    return logins + list(achievements.values()) + ([drop] if drop else [])
@@ -0,0 +1,197 @@
+"""
+Shell-Gotchi 実行時間の計測
+sg の各実行について、フェーズ（起動・読み込み・データ読み書き・ロジック・表示）ごとの時間を記録する
+
+- 計測自体は常に行う（time.perf_counter の呼び出しのみで十分に軽い）
+- SG_PROFILE=1 または config.PROFILE_ENABLED のときだけ、1実行1行のログに追記する
+- ログは PROFILE_LOG_MAX_BYTES を超えるとローテーションする
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# このモジュールが読み込まれた時刻（src パッケージの読み込み開始とほぼ同じ）
+_T0 = time.perf_counter()
+
+# 表示順のフェーズ名（logic は全体から他のフェーズを引いた残り）
+PHASES = ("startup", "imports", "load_data", "migrate_data", "logic", "save_data", "render")
+
+_durations: Dict[str, float] = {}
+_marks: Dict[str, float] = {}
+_command: Optional[str] = None
+
+
+def _process_startup() -> Optional[float]:
+    """
+    プロセス開始からこのモジュールの読み込みまでの秒数（インタプリタの起動時間）
+    Linux の /proc から求める（分解能はカーネルのクロックティック、通常10ms）
+    """
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            stat = f.read()
+        # 2番目のフィールド（コマンド名）は括弧内に空白を含み得るので、閉じ括弧の後から数える
+        fields = stat[stat.rindex(b")") + 2:].split()
+        start_ticks = int(fields[19])  # 22番目のフィールド starttime
+        boot_now = time.clock_gettime(time.CLOCK_BOOTTIME)
+        elapsed = boot_now - start_ticks / os.sysconf("SC_CLK_TCK")
+        return max(0.0, elapsed - (time.perf_counter() - _T0))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+_startup = _process_startup()
+
+
+def is_enabled() -> bool:
+    """ログへの記録が有効か"""
+    if os.environ.get("SG_PROFILE", "") not in ("", "0"):
+        return True
+    from .config import PROFILE_ENABLED
+    return PROFILE_ENABLED
+
+
+def set_command(name: Optional[str]) -> None:
+    """実行中のサブコマンド名を設定する"""
+    global _command
+    if name and _command is None:
+        _command = name
+
+
+def get_command() -> Optional[str]:
+    """実行中のサブコマンド名（未設定ならNone）"""
+    return _command
+
+
+def mark(name: str) -> None:
+    """フェーズの境界（モジュール読み込み完了など）の時刻を記録する"""
+    _marks[name] = time.perf_counter()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """ブロックの実行時間をフェーズに加算する（同じフェーズは累積）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _durations[name] = _durations.get(name, 0.0) + time.perf_counter() - start
+
+
+def elapsed() -> float:
+    """プロセス開始からの経過秒数（起動時間が不明な場合はパッケージ読み込みから）"""
+    return (_startup or 0.0) + time.perf_counter() - _T0
+
+
+def get_timings() -> Dict[str, float]:
+    """
+    フェーズごとの時間（秒）を返す
+
+    - startup: プロセス開始 → src パッケージの読み込み
+    - imports: src パッケージの読み込み → main.py の読み込み完了
+    - logic: main.py の読み込み完了以降から、計測済みフェーズを除いた残り
+    - total: プロセス開始からの合計
+    """
+    now = time.perf_counter()
+    imported = _marks.get("imports", _T0)
+    timings = dict(_durations)
+    if _startup is not None:
+        timings["startup"] = _startup
+    timings["imports"] = imported - _T0
+    measured = sum(v for k, v in _durations.items() if k in PHASES)
+    timings["logic"] = max(0.0, now - imported - measured)
+    timings["total"] = elapsed()
+    return timings
+
+
+# ===== ログ =====
+
+def _rotate(path: Any, max_bytes: int) -> None:
+    """ログが上限サイズを超えていたら .1 に退避する"""
+    try:
+        if path.stat().st_size >= max_bytes:
+            os.replace(path, path.with_name(path.name + ".1"))
+    except OSError:
+        pass
+
+
+def finish() -> None:
+    """実行終了時に呼ぶ。記録が有効ならログに1行追記する"""
+    if not is_enabled():
+        return
+
+    import json
+    from .config import DATA_DIR, PROFILE_LOG, PROFILE_LOG_MAX_BYTES
+
+    record = {
+        "ts": int(time.time()),
+        "cmd": _command or "-",
+        "ms": {k: round(v * 1000, 3) for k, v in get_timings().items()},
+    }
+    try:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _rotate(PROFILE_LOG, PROFILE_LOG_MAX_BYTES)
+        with open(PROFILE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except OSError:
+        pass  # 計測の失敗で本体の処理を妨げない
+
+
+def read_records(last: int) -> List[Dict[str, Any]]:
+    """ログ（ローテーション済みを含む）から直近 last 件の記録を読む"""
+    import json
+    from .config import PROFILE_LOG
+
+    lines: List[str] = []
+    for path in (PROFILE_LOG.with_name(PROFILE_LOG.name + ".1"), PROFILE_LOG):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines.extend(f.readlines())
+        except OSError:
+            continue
+
+    records = []
+    for line in lines[-last:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # 書き込み途中の行などは無視
+    return records
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def build_report(records: List[Dict[str, Any]], command: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    サブコマンド・フェーズごとの p50 / p95 / p99 を集計する
+
+    Returns:
+        [{"command", "phase", "count", "p50", "p95", "p99"}, ...]（ミリ秒）
+    """
+    grouped: Dict[str, Dict[str, List[float]]] = {}
+    for record in records:
+        if command and record.get("cmd") != command:
+            continue
+        phases = grouped.setdefault(record.get("cmd", "-"), {})
+        for name, value in record.get("ms", {}).items():
+            phases.setdefault(name, []).append(value)
+
+    order = {name: i for i, name in enumerate(PHASES + ("total",))}
+    rows = []
+    for cmd in sorted(grouped):
+        for name in sorted(grouped[cmd], key=lambda n: order.get(n, len(order))):
+            values = grouped[cmd][name]
+            rows.append({
+                "command": cmd,
+                "phase": name,
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            })
+    return rows
@@ -0,0 +1,398 @@
+"""
+Shell-Gotchi 表示バックエンド
+Richを使うバックエンドと、Richを読み込まない軽量なプレーンテキストバックエンドを提供する
+
+表示関数（ui.py）はこのモジュールの部品（text / panel / table / grid）だけを使って
+出力を組み立てる。部品の実体はバックエンドごとに異なる。
+"""
+import os
+import re
+import sys
+import unicodedata
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+from .config import RENDERER
+from .profiler import phase
+
+# 列定義: 見出し文字列、または {"header", "style", "justify"} の辞書
+ColumnSpec = Union[str, Dict[str, Any]]
+
+# Richのマークアップタグと同じ判定（小文字・#・/・@ で始まる [...]）
+_MARKUP_TAG = re.compile(r"\[([a-z#/@][^\[]*?)\]")
+
+# スタイル名 → ANSIエスケープのパラメータ
+_ANSI_CODES = {
+    "bold": "1",
+    "dim": "2",
+    "italic": "3",
+    "underline": "4",
+    "red": "31",
+    "green": "32",
+    "yellow": "33",
+    "blue": "34",
+    "magenta": "35",
+    "cyan": "36",
+    "white": "37",
+}
+
+
+def _normalize_column(column: ColumnSpec) -> Dict[str, Any]:
+    """列定義を辞書形式にそろえる"""
+    if isinstance(column, str):
+        return {"header": column}
+    return column
+
+
+def select_backend() -> str:
+    """
+    使用するバックエンド名を決める
+
+    優先順位:
+    1. 環境変数 SG_RENDERER（"rich" / "plain"）
+    2. config.RENDERER（"auto" 以外が指定されていればそれを使う）
+    3. 自動判定: TERM=dumb または標準出力が端末でなければ "plain"
+    """
+    name = os.environ.get("SG_RENDERER", "").strip().lower() or RENDERER
+    if name in ("rich", "plain"):
+        return name
+
+    if os.environ.get("TERM") == "dumb" or not sys.stdout.isatty():
+        return "plain"
+    return "rich"
+
+
+# ===== プレーンテキストバックエンド =====
+
+class _Block:
+    """プレーンバックエンドの描画済みブロック（行のリスト）"""
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+
+
+def display_width(text: str) -> int:
+    """端末上での表示幅を返す（全角文字は2、結合文字は0として数える）"""
+    width = 0
+    for ch in text:
+        if unicodedata.combining(ch) or ch in "‍︎️":
+            continue
+        width += 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+    return width
+
+
+class PlainRenderer:
+    """
+    Richを使わずに整形済み文字列を書き出すバックエンド
+    色付けはANSIエスケープを直接出力する（端末でない場合やNO_COLOR指定時は無効）
+    """
+
+    name = "plain"
+    supports_live = False
+
+    def __init__(self, stream: Any = None, color: Optional[bool] = None):
+        self.stream = stream or sys.stdout
+        self.is_terminal = self.stream.isatty()
+        if color is None:
+            color = (
+                self.is_terminal
+                and os.environ.get("TERM") != "dumb"
+                and "NO_COLOR" not in os.environ
+            )
+        self.color = color
+
+    # ----- スタイル処理 -----
+
+    def _sgr(self, styles: Sequence[str]) -> str:
+        """スタイルのスタックからANSIエスケープを作る"""
+        codes = [
+            _ANSI_CODES[word]
+            for style in styles
+            for word in style.split()
+            if word in _ANSI_CODES
+        ]
+        return f"\033[{';'.join(codes)}m" if codes else ""
+
+    def _markup(self, text: str) -> str:
+        """Richマークアップを取り除く（色付け有効時はANSIエスケープに変換する）"""
+        if "[" not in text:
+            return text
+        if not self.color:
+            return _MARKUP_TAG.sub("", text)
+
+        stack: List[str] = []
+
+        def replace(match: "re.Match[str]") -> str:
+            tag = match.group(1)
+            if tag.startswith("/"):
+                if stack:
+                    stack.pop()
+                return "\033[0m" + self._sgr(stack)
+            stack.append(tag)
+            return self._sgr(stack)
+
+        result = _MARKUP_TAG.sub(replace, text)
+        return result + "\033[0m" if stack else result
+
+    def _styled(self, text: str, style: Optional[str]) -> str:
+        """文字列全体にスタイルを適用する"""
+        if not self.color or not style:
+            return text
+        sgr = self._sgr([style])
+        return f"{sgr}{text}\033[0m" if sgr else text
+
+    def _lines(self, obj: Any) -> List[str]:
+        """部品または文字列を行のリストに変換する"""
+        if isinstance(obj, _Block):
+            return obj.lines
+        return self._markup(str(obj)).split("\n")
+
+    # ----- 部品 -----
+
+    def text(self, text: str, style: Optional[str] = None, center: bool = False) -> _Block:
+        """マークアップとして解釈しない文字列（ASCIIアートなど）"""
+        lines = [self._styled(line, style) for line in text.split("\n")]
+        return _Block(lines)
+
+    def panel(self, content: Any, title: Optional[str] = None,
+              border_style: Optional[str] = None, double: bool = False) -> _Block:
+        """枠付きのパネル（右端の枠線は省略）"""
+        edge = "=" if double else "-"
+        head = f"+{edge * 2} {self._markup(title)} " if title else "+"
+        lines = [head + edge * 20]
+        lines += [f"| {line}" for line in self._lines(content)]
+        lines.append("+" + edge * 20)
+        return _Block(lines)
+
+    def table(self, columns: Sequence[ColumnSpec], rows: Sequence[Sequence[Any]],
+              title: Optional[str] = None, box: Optional[str] = "rounded",
+              show_header: bool = True, padding: int = 1) -> _Block:
+        """列幅をそろえた表"""
+        specs = [_normalize_column(c) for c in columns]
+        cells = [[self._markup(str(cell)) for cell in row] for row in rows]
+        header = [self._markup(spec.get("header", "")) for spec in specs]
+
+        # 表示幅の計算にはエスケープシーケンスを含めない
+        def visible(cell: str) -> int:
+            return display_width(re.sub(r"\033\[[0-9;]*m", "", cell))
+
+        measured = ([header] if show_header else []) + cells
+        widths = [
+            max((visible(row[i]) for row in measured if i < len(row)), default=0)
+            for i in range(len(specs))
+        ]
+
+        def format_row(row: List[str]) -> str:
+            parts = []
+            for i, width in enumerate(widths):
+                cell = row[i] if i < len(row) else ""
+                pad = " " * (width - visible(cell))
+                if specs[i].get("justify") == "right":
+                    parts.append(pad + cell)
+                elif specs[i].get("justify") == "center":
+                    left = len(pad) // 2
+                    parts.append(pad[:left] + cell + pad[left:])
+                else:
+                    parts.append(cell + pad)
+            return (" " * padding).join(parts).rstrip()
+
+        lines = []
+        if title:
+            lines.append(self._markup(title))
+        if show_header:
+            lines.append(format_row(header))
+            lines.append("-" * (sum(widths) + padding * (len(widths) - 1)))
+        lines += [format_row(row) for row in cells]
+        return _Block(lines)
+
+    def grid(self, rows: Sequence[Sequence[Any]], padding: int = 0) -> _Block:
+        """部品の配置（プレーン表示では縦に並べる）"""
+        lines: List[str] = []
+        for row in rows:
+            for cell in row:
+                lines += self._lines(cell)
+        return _Block(lines)
+
+    # ----- 出力 -----
+
+    def print(self, obj: Any = "") -> None:
+        """部品またはマークアップ文字列を出力する"""
+        with phase("render"):
+            self.stream.write("\n".join(self._lines(obj)) + "\n")
+            self.stream.flush()
+
+    def clear(self) -> None:
+        """画面クリア（プレーン表示では何もしない）"""
+
+    @contextmanager
+    def live(self, initial: Any, transient: bool = True) -> Iterator[Callable[[Any], None]]:
+        """ライブ表示（プレーン表示では書き換えができないため、最後の内容だけを出力する）"""
+        latest = [initial]
+
+        def update(obj: Any) -> None:
+            latest[0] = obj
+
+        yield update
+        if not transient:
+            self.print(latest[0])
+
+    @contextmanager
+    def progress(self, total: int, description: str) -> Iterator[Callable[[int], None]]:
+        """進捗表示（端末では1行を書き換えてパーセントを表示し、それ以外では完了時に1行だけ出力する）"""
+        label = self._markup(description)
+        state = {"done": 0, "shown": -1}
+
+        def advance(amount: int) -> None:
+            state["done"] += amount
+            percent = min(100, state["done"] * 100 // total) if total else 100
+            if self.is_terminal and percent != state["shown"]:
+                state["shown"] = percent
+                self.stream.write(f"\r{label} {percent:3d}%")
+                self.stream.flush()
+
+        yield advance
+        self.stream.write(f"\r{label} 100%\n" if self.is_terminal else f"{label} 100%\n")
+        self.stream.flush()
+
+
+# ===== Richバックエンド =====
+
+class RichRenderer:
+    """Richを使うバックエンド（これまでの表示と同じ見た目）"""
+
+    name = "rich"
+    supports_live = True
+
+    def __init__(self):
+        from rich import box
+        from rich.align import Align
+        from rich.console import Console
+        from rich.live import Live
+        from rich.panel import Panel
+        from rich.table import Table
+        from rich.text import Text
+
+        self._box = box
+        self._Align = Align
+        self._Live = Live
+        self._Panel = Panel
+        self._Table = Table
+        self._Text = Text
+        self.console = Console()
+        self.is_terminal = self.console.is_terminal
+
+    # ----- 部品 -----
+
+    def text(self, text: str, style: Optional[str] = None, center: bool = False) -> Any:
+        """マークアップとして解釈しない文字列（ASCIIアートなど）"""
+        renderable = self._Text(text, style=style or "")
+        return self._Align.center(renderable) if center else renderable
+
+    def panel(self, content: Any, title: Optional[str] = None,
+              border_style: Optional[str] = None, double: bool = False) -> Any:
+        """枠付きのパネル"""
+        return self._Panel(
+            content,
+            title=title,
+            border_style=border_style or "none",
+            box=self._box.DOUBLE if double else self._box.ROUNDED,
+        )
+
+    def table(self, columns: Sequence[ColumnSpec], rows: Sequence[Sequence[Any]],
+              title: Optional[str] = None, box: Optional[str] = "rounded",
+              show_header: bool = True, padding: int = 1) -> Any:
+        """表"""
+        boxes = {"rounded": self._box.ROUNDED, "simple": self._box.SIMPLE, None: None}
+        table = self._Table(
+            title=title,
+            box=boxes[box],
+            show_header=show_header,
+            padding=(0, padding),
+        )
+        for column in columns:
+            spec = _normalize_column(column)
+            table.add_column(
+                spec.get("header", ""),
+                style=spec.get("style"),
+                justify=spec.get("justify", "left"),
+            )
+        for row in rows:
+            table.add_row(*row)
+        return table
+
+    def grid(self, rows: Sequence[Sequence[Any]], padding: int = 0) -> Any:
+        """部品を格子状に配置する"""
+        grid = self._Table.grid(padding=padding)
+        for _ in range(max((len(row) for row in rows), default=0)):
+            grid.add_column()
+        for row in rows:
+            grid.add_row(*row)
+        return grid
+
+    # ----- 出力 -----
+
+    def print(self, obj: Any = "") -> None:
+        """部品またはマークアップ文字列を出力する"""
+        with phase("render"):
+            self.console.print(obj)
+
+    def clear(self) -> None:
+        """画面をクリアする"""
+        self.console.clear()
+
+    @contextmanager
+    def live(self, initial: Any, transient: bool = True) -> Iterator[Callable[[Any], None]]:
+        """
+        rich.live.Live で同じ領域を書き換える
+
+        Yields:
+            表示内容を差し替えて即座に再描画する関数
+        """
+        with self._Live(initial, console=self.console, auto_refresh=False,
+                        transient=transient) as live:
+            yield lambda obj: live.update(obj, refresh=True)
+
+    @contextmanager
+    def progress(self, total: int, description: str) -> Iterator[Callable[[int], None]]:
+        """
+        rich.progress による進捗バー
+
+        Yields:
+            進んだ量を渡して表示を進める関数
+        """
+        from rich.progress import BarColumn, Progress, TaskProgressColumn, TimeRemainingColumn
+
+        with Progress(
+            "{task.description}", BarColumn(), TaskProgressColumn(), TimeRemainingColumn(),
+            console=self.console,
+        ) as progress:
+            task = progress.add_task(description, total=total)
+            yield lambda amount: progress.update(task, advance=amount)
+
+
+# ===== バックエンドの取得 =====
+
+_renderer: Optional[Any] = None
+
+
+def get_renderer() -> Any:
+    """選択されたバックエンドを返す（初回呼び出し時に生成）"""
+    global _renderer
+    if _renderer is None:
+        # Richの読み込みも表示時間に含める
+        with phase("render"):
+            _renderer = RichRenderer() if select_backend() == "rich" else PlainRenderer()
+    return _renderer
+
+
+class _RendererProxy:
+    """
+    実際に表示するまでバックエンドを生成しないための代理オブジェクト
+    表示を行わないコマンド（hookなど）ではRichが読み込まれない
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_renderer(), name)
+
+
+renderer = _RendererProxy()
@@ -0,0 +1,329 @@
+"""
+Shell-Gotchi 複数マシンでの同期（SG_SYNC_DIR）
+rsync / syncthing / NFS などで共有したディレクトリを介して、同じプレイヤーのデータを複数のマシンでそろえる
+
+- 各マシンは自分のファイル（<マシン名>.jsonl）にだけ追記する。1行が1回分の差分
+  {"t": UNIXタイム, "d": {項目: 値}}。1行目は {"log": ID, "machine": マシン名} の見出し
+- 差分は前回書き出した（取り込んだ）ときの値 data["sync"]["base"] との比較で作る。
+  ドキュメント全体は書き出さない。書き出しは SYNC_EXPORT_INTERVAL 秒に1度まで
+- 他のマシンのファイルは前回読んだ位置から続きだけを読んで取り込む
+  （大きさが変わっていないファイルは開かない。取り込む量は前回からの差分の量だけ）
+- 取り込みの規則は項目ごとに DEFAULT_DATA の型から決める（RULE_OVERRIDES が例外）
+  - sum:   数値。差分（増減）を足し合わせる（エサ・チケット・統計など）
+  - max:   大きい方を採る（レベル・最終ログイン日など）
+  - last:  最後に変更したマシンの値を採る（名前・スキン・満腹度など）
+  - union: リスト。追加された要素を合わせる（コレクション・実績）
+  - daily: デイリーミッション。同じ日付なら進捗を足し合わせ、新しい日付が来たらそちらに切り替える
+  - local: 同期しない
+- ペットのレベルは同期せず、取り込んだ後の累計経験値（sum）から決め直す（レベルと経験値を別々に
+  取り込むと、Lv.5 で経験値 -80 のようなありえない組み合わせになるため）。
+  経験値が負になる差分は 0 で止める（止めた分は base もずらし、書き出し直さない）。
+  それぞれのマシンの経験値を合わせて初めて越えたレベルの報酬（チケット）は出ない
+"""
+import json
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import DEFAULT_DATA, SYNC_DIR, SYNC_MACHINE_ID, SYNC_EXPORT_INTERVAL
+
+# 同期するセクション
+SYNC_SECTIONS = ("user", "stats", "pet", "collection", "achievements", "daily")
+
+# DEFAULT_DATA の型から決まる規則の例外
+RULE_OVERRIDES: Dict[str, str] = {
+    "user.last_login": "max",
+    "user.login_streak": "last",
+    "stats.max_login_streak": "max",
+    "stats.commands_since_drop": "local",
+    "pet.level": "local",  # 経験値から決め直す（_sync_level）
+    "pet.hunger": "last",
+    "daily": "daily",
+}
+
+DAILY_LISTS = ("completed", "claimed")
+
+
+def _default_rule(value: Any) -> str:
+    if isinstance(value, bool):
+        return "last"
+    if isinstance(value, (int, float)):
+        return "sum"
+    if isinstance(value, list):
+        return "union"
+    return "last"
+
+
+def field_rules() -> Dict[str, Tuple[str, Any]]:
+    """項目 → (規則, 既定値)。項目は "セクション.キー"（セクション単位の規則ならセクション名）"""
+    rules: Dict[str, Tuple[str, Any]] = {}
+    for section in SYNC_SECTIONS:
+        default = DEFAULT_DATA[section]
+        if section in RULE_OVERRIDES or not isinstance(default, dict):
+            rules[section] = (RULE_OVERRIDES.get(section) or _default_rule(default), default)
+            continue
+        for key, value in default.items():
+            field = f"{section}.{key}"
+            rule = RULE_OVERRIDES.get(field) or _default_rule(value)
+            if rule != "local":
+                rules[field] = (rule, value)
+    return rules
+
+
+RULES = field_rules()
+
+
+def sync_dir() -> Optional[Path]:
+    """共有ディレクトリ（未設定ならNone = 同期しない）"""
+    path = os.environ.get("SG_SYNC_DIR", "").strip()
+    if path:
+        return Path(path)
+    return Path(SYNC_DIR) if SYNC_DIR else None
+
+
+def enabled() -> bool:
+    return sync_dir() is not None
+
+
+def machine_id() -> str:
+    """このマシンの名前（ファイル名に使えない文字は _ にする）"""
+    name = os.environ.get("SG_MACHINE_ID", "").strip() or SYNC_MACHINE_ID or socket.gethostname()
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name) or "machine"
+
+
+def _get(data: Dict[str, Any], field: str) -> Any:
+    if "." not in field:
+        return data[field]
+    section, key = field.split(".", 1)
+    return data[section].get(key, RULES[field][1])
+
+
+def _set(data: Dict[str, Any], field: str, value: Any) -> None:
+    if "." not in field:
+        data[field] = value
+    else:
+        section, key = field.split(".", 1)
+        data[section][key] = value
+
+
+def _copy(value: Any) -> Any:
+    return json.loads(json.dumps(value)) if isinstance(value, (dict, list)) else value
+
+
+def _daily(value: Optional[Dict[str, Any]], date: Optional[str] = None) -> Dict[str, Any]:
+    """デイリーミッションの状態をそろえた形にする（date を渡すとその日の空の状態）"""
+    if value is None or (date is not None and value.get("date") != date):
+        return {"date": date, "progress": {}, "completed": [], "claimed": []}
+    return {
+        "date": value.get("date"),
+        "progress": dict(value.get("progress", {})),
+        "completed": list(value.get("completed", [])),
+        "claimed": list(value.get("claimed", [])),
+    }
+
+
+def _state(data: Dict[str, Any]) -> Dict[str, Any]:
+    return data.setdefault("sync", {"base": {}, "stamps": {}, "seen": {}, "exported_at": 0})
+
+
+def _base(state: Dict[str, Any], field: str) -> Any:
+    if field in state["base"]:
+        return state["base"][field]
+    return _copy(RULES[field][1])
+
+
+def diff(data: Dict[str, Any], now: float) -> Dict[str, Any]:
+    """前回の書き出し・取り込みからの差分を求め、base を今の値に進める"""
+    state = _state(data)
+    delta: Dict[str, Any] = {}
+    for field, (rule, _) in RULES.items():
+        current = _get(data, field)
+        base = _base(state, field)
+        if rule == "sum":
+            if current != base:
+                delta[field] = current - base
+        elif rule == "max":
+            if current != base and (base is None or (current is not None and current > base)):
+                delta[field] = current
+        elif rule == "last":
+            if current != base:
+                delta[field] = current
+                state["stamps"][field] = now
+        elif rule == "union":
+            seen = set(base)
+            added = [item for item in current if item not in seen]
+            if added:
+                delta[field] = added
+        elif rule == "daily":
+            current = _daily(current)
+            base = _daily(base, current["date"])
+            change = {
+                "progress": {k: v - base["progress"].get(k, 0) for k, v in current["progress"].items()
+                             if v != base["progress"].get(k, 0)},
+            }
+            for key in DAILY_LISTS:
+                change[key] = [item for item in current[key] if item not in base[key]]
+            if current["date"] != base["date"] or any(change.values()):
+                delta[field] = {"date": current["date"], **change}
+        state["base"][field] = _copy(current)
+    return delta
+
+
+def apply(data: Dict[str, Any], t: float, delta: Dict[str, Any]) -> None:
+    """他のマシンの差分を取り込む（base にも同じだけ加えるので、書き出し直すことはない）"""
+    state = _state(data)
+    for field, value in delta.items():
+        if field not in RULES:
+            continue
+        rule = RULES[field][0]
+        current = _get(data, field)
+        base = _base(state, field)
+        if rule == "sum":
+            _set(data, field, current + value)
+            state["base"][field] = base + value
+        elif rule == "max":
+            if value is not None and (current is None or value > current):
+                _set(data, field, value)
+            if value is not None and (base is None or value > base):
+                state["base"][field] = value
+        elif rule == "last":
+            # このマシンに書き出していない変更があれば、そちらが後の変更なので残す
+            if current == base and t >= state["stamps"].get(field, 0):
+                _set(data, field, _copy(value))
+                state["base"][field] = _copy(value)
+                state["stamps"][field] = t
+        elif rule == "union":
+            for target in (current, base):
+                seen = set(target)
+                target.extend(item for item in value if item not in seen)
+            state["base"][field] = base
+        elif rule == "daily":
+            current = _daily(current)
+            base = _daily(base, current["date"])
+            date = value.get("date")
+            if date is None or (current["date"] is not None and date < current["date"]):
+                continue  # 古い日付の進捗
+            if date != current["date"]:
+                current, base = _daily(None, date), _daily(None, date)
+            for key, amount in value.get("progress", {}).items():
+                current["progress"][key] = current["progress"].get(key, 0) + amount
+                base["progress"][key] = base["progress"].get(key, 0) + amount
+            for key in DAILY_LISTS:
+                for item in value.get(key, []):
+                    for target in (current, base):
+                        if item not in target[key]:
+                            target[key].append(item)
+            _set(data, field, current)
+            state["base"][field] = base
+    if "pet.exp" in delta:
+        _sync_level(data, state)
+
+
+def _sync_level(data: Dict[str, Any], state: Dict[str, Any]) -> None:
+    """取り込んだ累計経験値に合わせてペットのレベルを決め直す"""
+    from .game_logic import level_for_exp
+    pet = data["pet"]
+    if pet["exp"] < 0:
+        shift = -pet["exp"]
+        pet["exp"] = 0
+        state["base"]["pet.exp"] = _base(state, "pet.exp") + shift
+    pet["level"] = level_for_exp(pet["exp"])
+
+
+def push(data: Dict[str, Any], now: Optional[float] = None, force: bool = False) -> bool:
+    """
+    差分を自分のファイルに書き出す（SYNC_EXPORT_INTERVAL 秒に1度まで。失敗しても本体の処理を妨げない）
+    data["sync"] を更新するので、呼び出し側で保存すること
+
+    Returns:
+        書き出したか
+    """
+    directory = sync_dir()
+    if directory is None:
+        return False
+    now = time.time() if now is None else now
+    state = _state(data)
+    if not force and now - state.get("exported_at", 0) < SYNC_EXPORT_INTERVAL:
+        return False
+    base_before = _copy(state["base"])
+    stamps_before = dict(state["stamps"])
+    delta = diff(data, now)
+    state["exported_at"] = now
+    if not delta:
+        return False
+    path = directory / f"{machine_id()}.jsonl"
+    line = json.dumps({"t": now, "d": delta}, ensure_ascii=False, separators=(",", ":")) + "\n"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                header = {"log": uuid.uuid4().hex, "machine": machine_id()}
+                f.write(json.dumps(header, separators=(",", ":")) + "\n")
+            f.write(line)
+    except OSError:
+        # 書き出せなかった差分は次の機会に書き出す
+        state["base"], state["stamps"] = base_before, stamps_before
+        return False
+    return True
+
+
+def _read_new(path: Path, size: int, seen: Optional[List[Any]]) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """ファイルの前回の続きを読む。(差分の行, 新しい [ログID, 読んだ位置])"""
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        if not header_line.endswith(b"\n"):
+            return [], seen or ["", 0]
+        log_id = json.loads(header_line).get("log", "")
+        offset = seen[1] if seen and seen[0] == log_id else len(header_line)
+        if size <= offset:
+            return [], [log_id, offset]
+        f.seek(offset)
+        chunk = f.read(size - offset)
+    # 書き込み途中の最後の行は次回に回す
+    end = chunk.rfind(b"\n") + 1
+    lines = []
+    for raw in chunk[:end].splitlines():
+        try:
+            lines.append(json.loads(raw))
+        except ValueError:
+            continue
+    return lines, [log_id, offset + end]
+
+
+def pull(data: Dict[str, Any]) -> bool:
+    """
+    他のマシンの新しい差分を取り込む（失敗しても本体の処理を妨げない）
+
+    Returns:
+        取り込んだか（data を変更したので保存すること）
+    """
+    directory = sync_dir()
+    if directory is None:
+        return False
+    state = _state(data)
+    own = f"{machine_id()}.jsonl"
+    changed = False
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(".jsonl") and e.name != own]
+    except OSError:
+        return False
+    for entry in sorted(entries, key=lambda e: e.name):
+        seen = state["seen"].get(entry.name)
+        try:
+            size = entry.stat().st_size
+            if seen and seen[1] == size:
+                continue
+            lines, position = _read_new(Path(entry.path), size, seen)
+        except (OSError, ValueError):
+            continue
+        for line in lines:
+            if isinstance(line, dict) and isinstance(line.get("d"), dict):
+                apply(data, line.get("t", 0), line["d"])
+        if position != seen:
+            state["seen"][entry.name] = position
+            changed = True
+    return changed
@@ -0,0 +1,213 @@
+"""
+Shell-Gotchi 利用状況レポート（sg admin report）
+多数のホームディレクトリのセーブデータを集計し、レベル分布・SSR獲得数・連続ログインのヒストグラムを出す
+
+- ファイルは glob で順に列挙し、REPORT_CHUNK_FILES 件ずつプロセスプールに渡す
+  （実行中の塊はワーカー数の2倍まで。ファイル一覧も全体を持たない）
+- ワーカーは塊の中のファイルを1つずつ読んで migrate_data で最新形式にそろえ、
+  塊ごとの小さな集計（ヒストグラムと件数）だけを返す。親はそれを順に合算する
+- 壊れたファイル・読めないファイルは件数だけ数えて飛ばす。ファイルには書き込まない
+  （レベルが1未満・SSR獲得数が負のようなありえない値のファイルも壊れたファイルとして数える）
+"""
+import csv
+import glob
+import io
+import json
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .config import DEFAULT_DATA, REPORT_CHUNK_FILES, REPORT_ACTIVE_DAYS
+
+# ヒストグラム: 名前 → 説明
+HISTOGRAMS: Dict[str, str] = {
+    "level": "ペットのレベル",
+    "ssr": "SSR獲得数",
+    "login_streak": "現在の連続ログイン日数（2の累乗ごと）",
+    "max_login_streak": "最大連続ログイン日数（2の累乗ごと）",
+    "total_commands": "総コマンド数（2の累乗ごと）",
+}
+
+# 件数: 名前 → 説明
+COUNTS: Dict[str, str] = {
+    "files": "見つかったファイル",
+    "valid": "集計したファイル",
+    "corrupt": "壊れていたファイル",
+    "unreadable": "読めなかったファイル",
+    "old_schema": "古い形式だったファイル",
+    "active": f"直近{REPORT_ACTIVE_DAYS}日にログインしたプレイヤー",
+}
+
+
+def _empty() -> Dict[str, Any]:
+    return {"counts": {name: 0 for name in COUNTS}, "histograms": {name: {} for name in HISTOGRAMS}}
+
+
+def log2_bucket(value: int) -> str:
+    """0, 1, 2-3, 4-7, ... の区間名"""
+    if value <= 1:
+        return str(max(value, 0))
+    low = 1 << (value.bit_length() - 1)
+    return f"{low}-{low * 2 - 1}"
+
+
+def _is_old_schema(data: Dict[str, Any]) -> bool:
+    for section, default in DEFAULT_DATA.items():
+        if section not in data:
+            return True
+        if isinstance(default, dict) and isinstance(data[section], dict):
+            if any(key not in data[section] for key in default):
+                return True
+    return False
+
+
+def aggregate_files(paths: List[str], today: Optional[str] = None) -> Dict[str, Any]:
+    """ファイルの塊を集計する（ワーカープロセスで実行する）"""
+    from .storage import migrate_data
+
+    result = _empty()
+    counts = result["counts"]
+    hist = result["histograms"]
+    since = (date.fromisoformat(today) if today else date.today()) - timedelta(days=REPORT_ACTIVE_DAYS)
+
+    def add(name: str, bucket: Any) -> None:
+        key = str(bucket)
+        hist[name][key] = hist[name].get(key, 0) + 1
+
+    def at_least(value: Any, low: int) -> int:
+        value = int(value)
+        if value < low:
+            raise ValueError(f"{value} < {low}")
+        return value
+
+    for path in paths:
+        counts["files"] += 1
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except OSError:
+            counts["unreadable"] += 1
+            continue
+        except ValueError:
+            counts["corrupt"] += 1
+            continue
+        if not isinstance(data, dict):
+            counts["corrupt"] += 1
+            continue
+        try:
+            if _is_old_schema(data):
+                counts["old_schema"] += 1
+            data = migrate_data(data)
+            pet, stats, user = data["pet"], data["stats"], data["user"]
+            level = at_least(pet.get("level", 1), 1)
+            ssr = at_least(stats.get("ssr_count", 0), 0)
+            add("level", level)
+            add("ssr", ssr)
+            add("login_streak", log2_bucket(int(user.get("login_streak", 0))))
+            add("max_login_streak", log2_bucket(int(stats.get("max_login_streak", 0))))
+            add("total_commands", log2_bucket(int(stats.get("total_commands", 0))))
+            last_login = user.get("last_login")
+            if last_login and date.fromisoformat(last_login) >= since:
+                counts["active"] += 1
+        except (TypeError, ValueError, AttributeError, KeyError):
+            counts["corrupt"] += 1
+            continue
+        counts["valid"] += 1
+    return result
+
+
+def merge(total: Dict[str, Any], part: Dict[str, Any]) -> None:
+    """塊の集計を合算する"""
+    for name, value in part["counts"].items():
+        total["counts"][name] += value
+    for name, buckets in part["histograms"].items():
+        target = total["histograms"][name]
+        for bucket, count in buckets.items():
+            target[bucket] = target.get(bucket, 0) + count
+
+
+def iter_paths(patterns: Iterable[str]) -> Iterator[str]:
+    """glob パターンに一致するファイルを順に返す（同じファイルは1度だけ）"""
+    seen = set()
+    for pattern in patterns:
+        for path in glob.iglob(os.path.expanduser(pattern)):
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                yield path
+
+
+def _chunks(paths: Iterator[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_report(patterns: Iterable[str], workers: Optional[int] = None,
+                 chunk_size: int = REPORT_CHUNK_FILES) -> Dict[str, Any]:
+    """
+    全ファイルを集計する
+
+    Returns:
+        {"counts": {名前: 件数}, "histograms": {名前: {区間: 件数}}}
+    """
+    total = _empty()
+    today = date.today().isoformat()
+    chunks = _chunks(iter_paths(patterns), chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            merge(total, aggregate_files(chunk, today))
+        return total
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(aggregate_files, chunk, today))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(total, future.result())
+        for future in pending:
+            merge(total, future.result())
+    return total
+
+
+_BUCKET_START = re.compile(r"-?\d+")
+
+
+def _bucket_key(bucket: str) -> tuple:
+    """区間の並べ順（"4-7" は 4、"-1" は -1 として比べる。数値で始まらない区間は最後に名前の順）"""
+    match = _BUCKET_START.match(bucket)
+    return (0, int(match.group()), "") if match else (1, 0, bucket)
+
+
+def _sorted_buckets(buckets: Dict[str, int]) -> List[tuple]:
+    """区間を数値の順に並べる"""
+    return sorted(buckets.items(), key=lambda item: _bucket_key(item[0]))
+
+
+def to_json(report: Dict[str, Any]) -> str:
+    return json.dumps({
+        "counts": report["counts"],
+        "histograms": {name: dict(_sorted_buckets(buckets)) for name, buckets in report["histograms"].items()},
+    }, ensure_ascii=False, indent=2)
+
+
+def to_csv(report: Dict[str, Any]) -> str:
+    """section,bucket,count の3列"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["section", "bucket", "count"])
+    for name, value in report["counts"].items():
+        writer.writerow(["counts", name, value])
+    for name, buckets in report["histograms"].items():
+        for bucket, count in _sorted_buckets(buckets):
+            writer.writerow([name, bucket, count])
+    return out.getvalue()
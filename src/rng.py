@@ -0,0 +1,104 @@
+"""
+Shell-Gotchi 乱数ストリーム
+ゲームの抽選（ドロップ・ガチャ）に使う、種と位置だけで再現できる乱数
+
+- カウンタ方式の SplitMix64: n 番目の乱数は (種, n) だけから計算できる
+- 種と位置はセーブデータ（data["rng"]）に保存するので、
+  同じ状態から同じ操作をやり直せば同じドロップ・同じガチャ結果になる
+- random_block でまとめて引くと、1回ずつ呼ぶより速い（結果は1回ずつ引いた場合と同じ）
+"""
+import secrets
+from typing import Any, Dict, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_SCALE = 2.0 ** -53
+
+
+def _mix(z: int) -> int:
+    """SplitMix64 の出力関数"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+def new_seed() -> int:
+    """新しい種（63ビット、JSONにそのまま保存できる）"""
+    return secrets.randbits(63)
+
+
+class GameRNG:
+    """
+    種と位置で決まる乱数ストリーム
+
+    state には {"seed", "position"} の辞書を渡す。
+    乱数を引くたびに state["position"] を進めるので、
+    セーブデータの辞書を渡せば保存するだけで位置も永続化される
+    """
+
+    def __init__(self, state: Dict[str, Any]):
+        if state.get("seed") is None:
+            state["seed"] = new_seed()
+        state.setdefault("position", 0)
+        self.state = state
+        self._base = state["seed"] & _MASK
+
+    @classmethod
+    def from_seed(cls, seed: int, position: int = 0) -> "GameRNG":
+        """セーブデータと結びつかない独立したストリームを作る"""
+        return cls({"seed": seed, "position": position})
+
+    @property
+    def position(self) -> int:
+        """次に引く乱数の番号"""
+        return self.state["position"]
+
+    def seek(self, position: int) -> None:
+        """位置を移動する（まとめて引いた乱数の未使用分を戻す場合など）"""
+        self.state["position"] = position
+
+    def _value(self, index: int) -> float:
+        return (_mix((self._base + (index + 1) * _GOLDEN) & _MASK) >> 11) * _SCALE
+
+    def random(self) -> float:
+        """[0, 1) の一様乱数"""
+        index = self.state["position"]
+        self.state["position"] = index + 1
+        return self._value(index)
+
+    def random_block(self, n: int) -> List[float]:
+        """[0, 1) の一様乱数を n 個まとめて引く"""
+        start = self.state["position"]
+        self.state["position"] = start + n
+        base = self._base
+        return [
+            (_mix((base + (i + 1) * _GOLDEN) & _MASK) >> 11) * _SCALE
+            for i in range(start, start + n)
+        ]
+
+    def randrange(self, n: int) -> int:
+        """0 以上 n 未満の整数"""
+        return int(self.random() * n)
+
+    def choice(self, seq: Sequence[T]) -> T:
+        """列から1つ選ぶ"""
+        return seq[self.randrange(len(seq))]
+
+
+# セーブデータを持たない呼び出し用（種は起動ごとに変わる）
+_default: Optional[GameRNG] = None
+
+
+def default_rng() -> GameRNG:
+    """セーブデータと結びつかない共有ストリーム"""
+    global _default
+    if _default is None:
+        _default = GameRNG.from_seed(new_seed())
+    return _default
+
+
+def get_rng(data: Dict[str, Any]) -> GameRNG:
+    """セーブデータの乱数ストリーム（種がなければ作ってデータに書き込む）"""
+    return GameRNG(data.setdefault("rng", {"seed": None, "position": 0}))
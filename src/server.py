@@ -0,0 +1,469 @@
+"""
+Shell-Gotchi ホスト共有サービス（sg serve）
+共有のビルドサーバーなどで、全ユーザーのシェルフックを1つのプロセスで処理する
+
+- 1つの Unix ソケット（SERVE_SOCKET / SG_SERVE_SOCKET）で待ち受け、接続元のユーザーは SO_PEERCRED で識別する
+- root で動いている場合、ユーザーのファイルの読み書きはその間だけ実効ユーザー・グループをそのユーザーに
+  切り替えて行う（ホームにシンボリックリンクを置かれても、ユーザー自身が書けないファイルには触れない。
+  作ったファイルは最初からユーザーの所有になる）。root 以外で動いている場合は自分の要求だけを処理する
+- ユーザーごとのセーブデータ（<ホーム>/.local/share/shell-gotchi/data.json）は読み込んだ状態のまま
+  LRU キャッシュに保持する。大きさはJSONのバイト数で数え、SERVE_CACHE_MAX_BYTES を超えたら
+  最後に使われたのが古いユーザーから書き戻して捨てる
+- 変更したデータはイベントループの空き時間に SERVE_WRITEBACK_SECONDS ごとに書き戻す。
+  活動の時系列とディレクトリ別の集計もキャッシュに貯めて、その時にまとめて書く
+- ファイルがほかのプロセスに書き換えられていたら読み直す。sg の各コマンドは実行前に "release" を送り、
+  サービス側の変更を書き戻させてからファイルを読む
+- 1スレッドの selectors イベントループ。1回のフックは1行のJSONの要求と応答
+
+クライアント側（send_hook / release）はサービスが動いていなければ None / False を返すだけなので、
+フックはそのまま自分のプロセスで処理を続けられる
+"""
+import errno
+import fcntl  # noqa: F401  ユーザーの権限でファイルを読み書きする処理が中で読み込むので、root のうちに読み込んでおく
+import json
+import mmap  # noqa: F401  同上（Python の置き場所がユーザーから読めないと、切り替えた後では読み込めない）
+import os
+import pwd
+import selectors
+import socket
+import stat
+import struct
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import (
+    DATA_DIR, SERVE_SOCKET, SERVE_CACHE_MAX_BYTES, SERVE_WRITEBACK_SECONDS, SERVE_CLIENT_TIMEOUT,
+)
+
+# 要求1行の最大バイト数（コマンドは COMMAND_MAX_LENGTH 文字に切り詰めて送られる）
+MAX_REQUEST_BYTES = 16 * 1024
+
+# SO_PEERCRED で得られる struct ucred（pid, uid, gid）
+_UCRED = struct.Struct("3i")
+
+
+def socket_path() -> Optional[str]:
+    """サービスのソケットのパス（未設定ならNone = 使わない）"""
+    path = os.environ.get("SG_SERVE_SOCKET", "").strip()
+    if path:
+        return path
+    return str(SERVE_SOCKET) if SERVE_SOCKET else None
+
+
+# ===== クライアント =====
+
+def _request(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """要求を1行送り、応答を1行受け取る（サービスがない・応答しない場合はNone）"""
+    path = socket_path()
+    if not path:
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(SERVE_CLIENT_TIMEOUT)
+            sock.connect(path)
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            buffer = b""
+            while not buffer.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                buffer += chunk
+        reply = json.loads(buffer)
+    except (OSError, ValueError):
+        return None
+    return reply if reply.get("ok") else None
+
+
+def send_hook(command: str, exit_code: Optional[int] = None, duration_ms: Optional[float] = None,
+              cwd: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """フックの処理をサービスに任せる。結果は game_logic.handle_hook_event と同じ形（失敗したらNone）"""
+    return _request({
+        "op": "hook",
+        "command": command,
+        "exit_code": exit_code,
+        "duration_ms": duration_ms,
+        "cwd": cwd,
+    })
+
+
+def release() -> bool:
+    """サービスが保持している自分のデータを書き戻させ、キャッシュから外させる"""
+    return _request({"op": "release"}) is not None
+
+
+# ===== サービス =====
+
+def user_data_dir(home: str) -> Path:
+    """ユーザーのデータディレクトリ（自分の DATA_DIR と同じホームからの位置）"""
+    try:
+        return Path(home) / DATA_DIR.relative_to(Path.home())
+    except ValueError:
+        return Path(home) / ".local" / "share" / "shell-gotchi"
+
+
+def _user_groups(uid: int, gid: int, user: str) -> List[int]:
+    """ユーザーの補助グループ（root で動いているときだけ引く。NSS の問い合わせなので、ユーザーごとに1度だけ）"""
+    if os.geteuid() != 0 or uid == 0:
+        return []
+    try:
+        return os.getgrouplist(user, gid)
+    except OSError:
+        return [gid]
+
+
+@contextmanager
+def _as_user(uid: int, gid: int, groups: List[int]) -> Iterator[None]:
+    """
+    root で動いている場合、ブロックの間だけ実効ユーザー・グループ（補助グループも）をユーザーのものにする
+    groups は _user_groups で引いておいたもの
+    """
+    if os.geteuid() != 0 or uid == 0:
+        yield
+        return
+    saved, egid = os.getgroups(), os.getegid()
+    try:
+        os.setgroups(groups)
+        os.setegid(gid)
+        os.seteuid(uid)
+        yield
+    finally:
+        os.seteuid(0)
+        os.setegid(egid)
+        os.setgroups(saved)
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """ほかのプロセスによる書き換えを検出するための (mtime_ns, size)"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class PlayerState:
+    """キャッシュしている1ユーザーの状態"""
+
+    __slots__ = ("uid", "gid", "user", "groups", "home", "data_dir", "data", "size", "signature", "dirty_since",
+                 "dirs", "activity")
+
+    def __init__(self, uid: int, gid: int, user: str, home: str):
+        self.uid = uid
+        self.gid = gid
+        self.user = user
+        self.groups = _user_groups(uid, gid, user)
+        self.home = home
+        self.data_dir = user_data_dir(home)
+        self.data: Dict[str, Any] = {}
+        self.size = 0
+        self.signature: Optional[Tuple[int, int]] = None
+        self.dirty_since: Optional[float] = None
+        self.dirs: Optional[Dict[str, Any]] = None  # ディレクトリ別の集計（使うときに読む）
+        self.activity: Dict[Tuple[str, int], list] = {}  # (系列, 通算時間) → [回数, 時刻]
+
+    @property
+    def data_file(self) -> Path:
+        return self.data_dir / "data.json"
+
+    def as_owner(self):
+        """ブロックの間、このユーザーの権限でファイルを読み書きする"""
+        return _as_user(self.uid, self.gid, self.groups)
+
+    def load(self) -> None:
+        from .storage import load_data
+        with self.as_owner():
+            self.data = load_data(self.data_file)
+            self.signature = _file_signature(self.data_file)
+        self.size = self.signature[1] if self.signature else 0
+        self.dirty_since = None
+
+    def mark_dirty(self, now: float) -> None:
+        if self.dirty_since is None:
+            self.dirty_since = now
+
+    def write_back(self) -> None:
+        """変更を書き戻す（活動の時系列とディレクトリ別の集計も）"""
+        from . import activity, directories
+        from .storage import save_data
+        with self.as_owner():
+            if self.dirty_since is not None:
+                save_data(self.data, self.data_file)
+                self.signature = _file_signature(self.data_file)
+                self.size = self.signature[1] if self.signature else self.size
+                self.dirty_since = None
+            if self.activity:
+                path = self.data_dir / activity.ACTIVITY_FILE.name
+                for (series, _), (count, ts) in self.activity.items():
+                    activity.record(series, count, ts, path)
+                self.activity.clear()
+            if self.dirs is not None:
+                directories.save(self.dirs, self.data_dir / directories.DIRS_FILE.name)
+                self.dirs = None
+
+
+class PlayerCache:
+    """ユーザーごとの状態の LRU キャッシュ"""
+
+    def __init__(self, max_bytes: int = SERVE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[int, PlayerState]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"events": 0, "hits": 0, "misses": 0, "reloads": 0, "evictions": 0, "writebacks": 0}
+
+    def get(self, uid: int, gid: int) -> PlayerState:
+        """ユーザーの状態を返す（なければ読み込み、ファイルが書き換えられていれば読み直す）"""
+        entry = self.entries.get(uid)
+        if entry is not None:
+            self.entries.move_to_end(uid)
+            with entry.as_owner():
+                signature = _file_signature(entry.data_file)
+            if signature == entry.signature:
+                self.stats["hits"] += 1
+                return entry
+            # ほかのプロセスが書いた内容を優先する（こちらの未保存の変更は捨てる）
+            self.stats["reloads"] += 1
+            self.total_bytes -= entry.size
+            entry.load()
+            self.total_bytes += entry.size
+            return entry
+
+        self.stats["misses"] += 1
+        passwd = pwd.getpwuid(uid)
+        entry = PlayerState(uid, gid, passwd.pw_name, passwd.pw_dir)
+        entry.load()
+        self.entries[uid] = entry
+        self.total_bytes += entry.size
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self._write_back(entry)
+            self.total_bytes -= entry.size
+            self.stats["evictions"] += 1
+
+    def _write_back(self, entry: PlayerState) -> None:
+        try:
+            entry.write_back()
+            self.stats["writebacks"] += 1
+        except OSError:
+            pass  # 書けなかった分は失われるが、サービスは止めない
+
+    def release(self, uid: int) -> None:
+        """書き戻してキャッシュから外す"""
+        entry = self.entries.pop(uid, None)
+        if entry is not None:
+            self._write_back(entry)
+            self.total_bytes -= entry.size
+
+    def write_back_due(self, now: float, max_age: float = SERVE_WRITEBACK_SECONDS) -> None:
+        """変更してから max_age 秒以上たった状態を書き戻す"""
+        for entry in self.entries.values():
+            if entry.dirty_since is not None and now - entry.dirty_since >= max_age:
+                self._write_back(entry)
+
+    def write_back_all(self) -> None:
+        for entry in self.entries.values():
+            if entry.dirty_since is not None or entry.activity or entry.dirs is not None:
+                self._write_back(entry)
+
+
+def handle_request(cache: PlayerCache, uid: int, gid: int, request: Dict[str, Any],
+                   now: Optional[float] = None) -> Dict[str, Any]:
+    """1件の要求を処理して応答を返す"""
+    from . import activity, directories, leaderboard
+    from .game_logic import classify_command, handle_hook_event
+
+    now = time.time() if now is None else now
+    op = request.get("op")
+    if op == "release":
+        cache.release(uid)
+        return {"ok": True}
+    if op != "hook":
+        return {"ok": False, "error": f"unknown op: {op}"}
+    if os.geteuid() not in (0, uid):
+        # root でなければ他のユーザーのファイルには書けない（クライアントは自分のプロセスで処理する）
+        return {"ok": False, "error": "not serving other users"}
+
+    command = str(request.get("command") or "")
+    info = classify_command(command)
+    if info.ignored:
+        login = {"is_new_day": False, "reward_type": None, "streak": 0}
+        return {"ok": True, "login": login, "rewarded": False, "dropped": False, "food_count": 0}
+
+    cache.stats["events"] += 1
+    entry = cache.get(uid, gid)
+    with entry.as_owner():
+        result = handle_hook_event(entry.data, info, command,
+                                   request.get("exit_code"), request.get("duration_ms"), now)
+        leaderboard.maybe_publish(entry.data, entry.user, entry.data_dir / activity.ACTIVITY_FILE.name, now)
+        entry.mark_dirty(now)
+        if result["rewarded"]:
+            key = ("commands", activity.hour_index(now))
+            pending = entry.activity.setdefault(key, [0, now])
+            pending[0] += 1
+            cwd = request.get("cwd")
+            if cwd:
+                if entry.dirs is None:
+                    entry.dirs = directories.fold(entry.data_dir / directories.DIRS_FILE.name,
+                                                  entry.data_dir / directories.DIRS_LOG_FILE.name, entry.home)
+                directories.record(entry.dirs, cwd, now=now, home=entry.home)
+    return {"ok": True, **result}
+
+
+def _bind(path: str) -> Tuple[socket.socket, int]:
+    """
+    path に Unix ソケットを作る（どのユーザーからも接続できるモード 0666。誰かは SO_PEERCRED で判別する）
+    既にあるものは、前回のサービスが残した自分のソケット（接続できない）だけを消して作り直す。
+    ソケットでない・他のユーザーのもの・動いているサービスのものは消さずに OSError
+
+    Returns:
+        (ソケット, 作ったソケットファイルの inode)
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.geteuid():
+            raise FileExistsError(errno.EEXIST, "ソケットでないか、他のユーザーのファイルです", path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+            except ConnectionRefusedError:
+                os.unlink(path)
+            else:
+                raise OSError(errno.EADDRINUSE, "サービスが既に動いています", path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # パスを指定した chmod はせず、作るときのモードを umask で決める
+    previous = os.umask(0o111)
+    try:
+        listener.bind(path)
+    except OSError:
+        listener.close()
+        raise
+    finally:
+        os.umask(previous)
+    return listener, os.lstat(path).st_ino
+
+
+def _unlink_own_socket(path: str, inode: int) -> None:
+    """serve が作ったソケットファイルが残っていれば消す（別のものに置き換わっていれば消さない）"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return
+    if stat.S_ISSOCK(st.st_mode) and st.st_ino == inode:
+        os.unlink(path)
+
+
+class _Connection:
+    __slots__ = ("sock", "uid", "gid", "inbox", "outbox")
+
+    def __init__(self, sock: socket.socket, uid: int, gid: int):
+        self.sock = sock
+        self.uid = uid
+        self.gid = gid
+        self.inbox = b""
+        self.outbox = b""
+
+
+def serve(path: str, cache: Optional[PlayerCache] = None,
+          on_ready: Optional[Callable[[], None]] = None,
+          should_stop: Optional[Callable[[], bool]] = None) -> PlayerCache:
+    """
+    イベントループを実行する（should_stop() が真を返すか、SIGINT / SIGTERM で終了）
+    終了時には変更をすべて書き戻す
+    """
+    import signal
+
+    from .config_compiler import get_compiled_config
+    from .events import bus
+
+    cache = cache or PlayerCache()
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    # 設定とプラグインはユーザーの権限に切り替える前に、サービス自身の権限で読んでおく
+    get_compiled_config()
+    bus.plugin_status()
+
+    listener, inode = _bind(path)
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    listener.listen(512)
+    listener.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, None)
+    if on_ready:
+        on_ready()
+
+    def close(conn: _Connection) -> None:
+        selector.unregister(conn.sock)
+        conn.sock.close()
+
+    try:
+        while not stopping and not (should_stop and should_stop()):
+            for key, mask in selector.select(timeout=SERVE_WRITEBACK_SECONDS / 2):
+                if key.data is None:
+                    # 新しい接続
+                    while True:
+                        try:
+                            sock, _ = listener.accept()
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        _, uid, gid = _UCRED.unpack(
+                            sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _UCRED.size))
+                        sock.setblocking(False)
+                        selector.register(sock, selectors.EVENT_READ, _Connection(sock, uid, gid))
+                    continue
+
+                conn: _Connection = key.data
+                if mask & selectors.EVENT_READ:
+                    try:
+                        chunk = conn.sock.recv(4096)
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    except OSError:
+                        close(conn)
+                        continue
+                    if not chunk or len(conn.inbox) + len(chunk) > MAX_REQUEST_BYTES:
+                        close(conn)
+                        continue
+                    conn.inbox += chunk
+                    if not conn.inbox.endswith(b"\n"):
+                        continue
+                    try:
+                        reply = handle_request(cache, conn.uid, conn.gid, json.loads(conn.inbox))
+                    except Exception as e:  # 1ユーザーの不正なデータでサービス全体を止めない
+                        reply = {"ok": False, "error": str(e)}
+                    conn.outbox = json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n"
+                    selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+                if mask & selectors.EVENT_WRITE:
+                    try:
+                        sent = conn.sock.send(conn.outbox)
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    except OSError:
+                        close(conn)
+                        continue
+                    conn.outbox = conn.outbox[sent:]
+                    if not conn.outbox:
+                        close(conn)
+            cache.write_back_due(time.time())
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        _unlink_own_socket(path, inode)
+        cache.write_back_all()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return cache
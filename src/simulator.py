@@ -0,0 +1,539 @@
+"""
+Shell-Gotchi 経済シミュレーター
+合成プレイヤーにコマンド実行・エサやり・ガチャ・ログインを繰り返させ、
+ドロップ率・ガチャ確率・ショップ価格・レベル閾値などの調整の効果を見積もる
+
+- ゲームの規則は game_logic と同じ（コンパイル済み設定の値をそのまま使う）。純Pythonでの計算は
+  ドロップ・コイン・レベル・ガチャ・ログイン報酬に game_logic の関数をそのまま使い、NumPy版は同じ規則を配列で計算する
+- 1日単位で進める。ドロップは「次のドロップまでのコマンド数」を
+  幾何分布（確定ドロップの回数で打ち切り）から引くので、コマンド1回ずつは回さない
+- NumPy があれば全プレイヤーを配列でまとめて計算する（推奨）。なければ純Pythonで1人ずつ計算する
+- パラメータスイープは (シナリオ, プレイヤーの塊) ごとにプロセスプールで並列実行する
+
+プレイヤーの行動モデル:
+- 1日ごとに active_rate の確率でシェルを使う（使った日はログインボーナスを受け取る）
+- 1日のコマンド数はポアソン分布。平均はプレイヤーごとに対数正規分布でばらつく
+- 満腹度が100未満でエサがあればエサをあげる
+- コインが貯まったら shop_item を買えるだけ買う（Noneなら買わない）
+- チケットはその日のうちにすべてガチャに使う
+- 達成したデイリーミッションの報酬はその日のうちに受け取る
+"""
+import math
+import random
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, islice, product
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .config import (
+    DEFAULT_DATA, HUNGER_DECREASE_PER_COMMAND, MAX_HUNGER, MIN_HUNGER, FEED_HUNGER_GAIN, FEED_EXP_GAIN,
+    TICKET_FRAGMENTS_FOR_TICKET, LOGIN_STREAK_FOR_TICKET, COMMANDS_PER_COIN,
+    SIM_PLAYERS, SIM_DAYS, SIM_COMMANDS_PER_DAY, SIM_ACTIVITY_SPREAD,
+    SIM_ACTIVE_DAY_RATE, SIM_SHOP_ITEM, SIM_TARGET_LEVEL, SIM_CHUNK_PLAYERS, SIM_PYTHON_CHUNK_PLAYERS,
+)
+from .config_compiler import CompiledConfig, ConfigError, compile_sources, load_sources, validate_sources
+from .game_logic import (
+    calculate_level_up_reward, coins_for_commands, drop_gaps, grant_login_reward,
+    item_for_roll, level_for_exp, rarity_for_roll,
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy がなければ純Pythonで計算する
+    np = None
+
+# 報酬として増減するユーザーの資源（ミッション・実績・ショップの reward のキー）
+RESOURCES = ("food", "tickets", "ticket_fragments", "coins", "exp_boost")
+
+# 純Pythonでの計算でドロップの間隔をまとめて引く個数
+DROP_GAP_BATCH = 256
+
+# 未到達を表す日数（パーセンタイルの計算では無限大として扱う）
+NOT_REACHED = -1
+
+
+class SimParams(NamedTuple):
+    """プレイヤーの行動モデルのパラメータ"""
+    players: int = SIM_PLAYERS
+    days: int = SIM_DAYS
+    commands_per_day: float = SIM_COMMANDS_PER_DAY
+    activity_spread: float = SIM_ACTIVITY_SPREAD
+    active_rate: float = SIM_ACTIVE_DAY_RATE
+    shop_item: Optional[str] = SIM_SHOP_ITEM
+    target_level: int = SIM_TARGET_LEVEL
+    seed: int = 0
+
+
+# ===== パラメータ =====
+
+def _parse_value(text: str) -> Any:
+    """スイープ値の文字列を数値（可能なら）に変換する"""
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            continue
+    return None if text.lower() == "none" else text
+
+
+def parse_assignments(specs: Iterable[str]) -> List[Tuple[str, List[Any]]]:
+    """
+    "キー=値1,値2,..." の並びを解析する
+
+    キーは SimParams のフィールド名、または設定テーブルのドット区切りのパス
+    （例: drop_chance, gacha_rates.SSR, shop_items.ticket_single.price, level_thresholds.10）
+    """
+    parsed = []
+    for spec in specs:
+        key, sep, values = spec.partition("=")
+        if not sep or not key.strip() or not values.strip():
+            raise ConfigError(f"パラメータの形式が不正です（キー=値1,値2,...）: {spec}")
+        parsed.append((key.strip(), [_parse_value(v.strip()) for v in values.split(",")]))
+    return parsed
+
+
+def _set_path(sources: Dict[str, Any], path: str, value: Any) -> None:
+    """設定テーブルのドット区切りのパスに値を設定する"""
+    keys = path.split(".")
+    if keys[0] not in sources:
+        raise ConfigError(f"不明なパラメータです: {path}")
+
+    if len(keys) == 1:
+        sources[keys[0]] = value
+        return
+
+    # 変更するテーブルだけを複製する（元の config.py の値は変更しない）
+    table = sources[keys[0]] = dict(sources[keys[0]])
+    for key in keys[1:-1]:
+        key = int(key) if isinstance(next(iter(table), ""), int) else key
+        if key not in table:
+            raise ConfigError(f"不明なパラメータです: {path}")
+        table[key] = dict(table[key])
+        table = table[key]
+    last = keys[-1]
+    table[int(last) if isinstance(next(iter(table), ""), int) else last] = value
+
+
+def build_scenarios(sweeps: Sequence[Tuple[str, List[Any]]],
+                    base_params: SimParams) -> List[Tuple[Dict[str, Any], CompiledConfig, SimParams]]:
+    """
+    スイープの全組み合わせについて設定をコンパイルする
+
+    Returns:
+        [(変更したパラメータ, コンパイル済み設定, 行動モデル), ...]
+    """
+    keys = [key for key, _ in sweeps]
+    scenarios = []
+    for values in product(*(values for _, values in sweeps)):
+        assignment = dict(zip(keys, values))
+        sources = load_sources()
+        params = base_params
+        for key, value in assignment.items():
+            if key in SimParams._fields:
+                params = params._replace(**{key: value})
+            else:
+                _set_path(sources, key, value)
+        validate_sources(sources)
+        if params.shop_item is not None and params.shop_item not in sources["shop_items"]:
+            raise ConfigError(f"ショップに存在しない商品です: {params.shop_item}")
+        scenarios.append((assignment, compile_sources(sources), params))
+    return scenarios
+
+
+def _reward_vector(reward: Dict[str, Any]) -> Tuple[int, ...]:
+    """報酬の辞書を RESOURCES の順の増分にする"""
+    return tuple(int(reward.get(key, 0)) for key in RESOURCES)
+
+
+def _reward_items(reward: Dict[str, Any]) -> Tuple[Tuple[str, int], ...]:
+    """報酬の辞書を (資源, 増分) の並びにする（増減しない資源は除く）"""
+    return tuple((key, int(reward[key])) for key in RESOURCES if reward.get(key))
+
+
+# ===== 純Pythonでの計算 =====
+
+def _poisson_cdf(lam: float) -> List[float]:
+    """
+    平均 lam のポアソン分布の累積確率（k 番目が P(X <= k)）
+    bisect_right(cdf, [0, 1) の一様乱数) がポアソン分布の乱数になる（平均はプレイヤーごとに固定なので表を1度だけ作る）
+    """
+    if lam <= 0:
+        return [1.0]
+    log_lam = math.log(lam)
+    cdf = []
+    total = 0.0
+    for k in range(int(lam + 12 * math.sqrt(lam)) + 12):
+        total += math.exp(k * log_lam - lam - math.lgamma(k + 1))
+        cdf.append(total)
+    return cdf
+
+
+# 純Pythonでの計算で1日ごとに集計する値（デイリーミッション・実績の条件の種類の順）
+MISSION_PROGRESS = ("commands", "feed", "gacha")
+ACHIEVEMENT_PROGRESS = ("total_commands", "level", "total_gacha", "ssr_count", "login_streak", "collection_count")
+
+
+def _achievement_queues(cfg: CompiledConfig) -> List[Tuple[int, List[Tuple[int, Tuple[Tuple[str, int], ...]]]]]:
+    """
+    実績を条件の種類ごとに目標値の大きい順に並べる（末尾の1件だけ調べればよい）
+
+    Returns:
+        [(ACHIEVEMENT_PROGRESS の位置, [(目標値, 報酬), ...]), ...]
+    """
+    queues: Dict[int, List[Tuple[int, Tuple[Tuple[str, int], ...]]]] = {}
+    for ach in cfg.achievements.values():
+        condition = ach["condition"]
+        if condition["type"] in ACHIEVEMENT_PROGRESS:
+            queues.setdefault(ACHIEVEMENT_PROGRESS.index(condition["type"]), []).append(
+                (condition["target"], _reward_items(ach["reward"])))
+    for queue in queues.values():
+        queue.sort(key=lambda entry: entry[0], reverse=True)
+    return list(queues.items())
+
+
+def _simulate_python(cfg: CompiledConfig, params: SimParams, players: int,
+                     seed: int) -> Dict[str, List[float]]:
+    """1人ずつ日を進めて計算する（ドロップ・コイン・レベル・ガチャ・ログインの規則は game_logic の関数を使う）"""
+    rng = random.Random(seed)
+    rand = rng.random
+    max_level = len(cfg.level_thresholds)
+    missions = [(MISSION_PROGRESS.index(m["type"]), m["target"], _reward_items(m["reward"]))
+                for m in cfg.daily_missions.values() if m["type"] in MISSION_PROGRESS]
+    achievements = _achievement_queues(cfg)
+    shop = cfg.shop_items.get(params.shop_item) if params.shop_item else None
+    shop_reward = _reward_items(shop["reward"]) if shop else ()
+    price = shop["price"] if shop else 0
+    # 対数正規分布の平均が commands_per_day になるように補正する
+    spread = params.activity_spread
+    mean_factor = math.exp(-spread * spread / 2)
+
+    results: Dict[str, List[float]] = {"level_day": [], "ssr_day": [], "coins": [], "level": [], "pulls": []}
+    for _ in range(players):
+        user = dict(DEFAULT_DATA["user"])
+        collection = set(DEFAULT_DATA["collection"])
+        hunger = float(DEFAULT_DATA["pet"]["hunger"])
+        exp = 0
+        level = 1
+        total_commands = total_gacha = ssr_count = 0
+        drop_at = [0]  # ドロップした時点の累計コマンド数（先に引いておく。先頭は番兵）
+        dropped = 1  # drop_at のうち数え終わった位置
+        max_streak = 0
+        last_active = None
+        queues = [(index, list(queue)) for index, queue in achievements if queue]
+        level_day = ssr_day = NOT_REACHED
+        commands_cdf = _poisson_cdf(params.commands_per_day * mean_factor * math.exp(rng.gauss(0, spread)))
+
+        for day in range(params.days):
+            if rand() >= params.active_rate:
+                continue
+
+            # ログインボーナス
+            user["login_streak"] = user["login_streak"] + 1 if last_active == day - 1 else 1
+            last_active = day
+            if user["login_streak"] > max_streak:
+                max_streak = user["login_streak"]
+            grant_login_reward(user)
+
+            # コマンド実行: ドロップの間隔をまとめて引いておき、今日までに起きた分を数える
+            commands = bisect_right(commands_cdf, rand())
+            user["coins"] += coins_for_commands(total_commands, commands)
+            total_commands += commands
+            while drop_at[-1] <= total_commands:
+                drop_at.extend(islice(accumulate(drop_gaps(DROP_GAP_BATCH, rng, cfg), initial=drop_at[-1]), 1, None))
+            reached = bisect_right(drop_at, total_commands, dropped)
+            user["food"] += reached - dropped
+            dropped = reached
+            hunger = max(float(MIN_HUNGER), hunger - commands * HUNGER_DECREASE_PER_COMMAND)
+
+            # ショップ
+            if price and user["coins"] >= price:
+                count = user["coins"] // price
+                user["coins"] -= count * price
+                for key, value in shop_reward:
+                    user[key] += value * count
+
+            # エサやり（満腹度が100に届くまで）
+            feeds = 0
+            if hunger < MAX_HUNGER:
+                feeds = min(user["food"], math.ceil((MAX_HUNGER - hunger) / FEED_HUNGER_GAIN))
+            if feeds:
+                user["food"] -= feeds
+                hunger = min(float(MAX_HUNGER), hunger + feeds * FEED_HUNGER_GAIN)
+                boosted = min(user["exp_boost"], feeds)
+                user["exp_boost"] -= boosted
+                exp += FEED_EXP_GAIN * (feeds + boosted)
+                if level < max_level:
+                    new_level = level_for_exp(exp, cfg)
+                    if new_level > level:
+                        user["tickets"] += calculate_level_up_reward(level, new_level, cfg)
+                        level = new_level
+
+            # ガチャ（チケットをすべて使う）
+            pulls = user["tickets"]
+            if pulls:
+                user["tickets"] = 0
+                for _ in range(pulls):
+                    rarity = rarity_for_roll(rand(), cfg)
+                    collection.add(item_for_roll(rarity, rand(), cfg)["id"])
+                    if rarity == "SSR":
+                        ssr_count += 1
+                total_gacha += pulls
+
+            # デイリーミッション
+            progress = (commands, feeds, pulls)
+            for index, target, reward in missions:
+                if progress[index] >= target:
+                    for key, value in reward:
+                        user[key] += value
+
+            # 実績（条件の種類ごとに、目標値の小さいものから達成を調べる）
+            if queues:
+                current = (total_commands, level, total_gacha, ssr_count, max_streak, len(collection))
+                for index, queue in queues:
+                    while current[index] >= queue[-1][0]:
+                        for key, amount in queue.pop()[1]:
+                            user[key] += amount
+                        if not queue:  # この種類はすべて達成した
+                            queues = [entry for entry in queues if entry[1]]
+                            break
+
+            if level_day == NOT_REACHED and level >= params.target_level:
+                level_day = day + 1
+            if ssr_day == NOT_REACHED and ssr_count:
+                ssr_day = day + 1
+
+        results["level_day"].append(level_day)
+        results["ssr_day"].append(ssr_day)
+        results["coins"].append(user["coins"])
+        results["level"].append(level)
+        results["pulls"].append(total_gacha)
+    return results
+
+
+# ===== NumPyでの計算 =====
+
+def _simulate_numpy(cfg: CompiledConfig, params: SimParams, players: int,
+                    seed: int) -> Dict[str, List[float]]:
+    """全プレイヤーを配列でまとめて1日ずつ進める"""
+    rng = np.random.default_rng(seed)
+    thresholds = np.array(cfg.level_thresholds)
+    max_level = len(thresholds)
+    guaranteed = cfg.guaranteed_drop_commands
+    p = cfg.drop_chance
+    rarity_items = np.array([len(cfg.gacha_items[r]) for r in cfg.rarities])
+    rarity_offsets = np.concatenate(([0], np.cumsum(rarity_items)[:-1]))
+    cumulative = np.array(cfg.cumulative_rates)
+    ssr = cfg.rarities.index("SSR") if "SSR" in cfg.rarities else -1
+    level_rewards = np.zeros(max_level + 1, dtype=np.int64)
+    for lv, tickets in cfg.level_up_ticket_rewards.items():
+        if lv <= max_level:
+            level_rewards[lv] = tickets
+    level_rewards = np.cumsum(level_rewards)  # Lv.1 から Lv.n までの累計チケット
+    missions = [(m["type"], m["target"], np.array(_reward_vector(m["reward"])))
+                for m in cfg.daily_missions.values()]
+    achievements = [(a["condition"]["type"], a["condition"]["target"], np.array(_reward_vector(a["reward"])))
+                    for a in cfg.achievements.values()]
+    shop = cfg.shop_items.get(params.shop_item) if params.shop_item else None
+    shop_reward = np.array(_reward_vector(shop["reward"])) if shop else None
+    spread = params.activity_spread
+
+    n = players
+    res = np.zeros((len(RESOURCES), n), dtype=np.int64)
+    res[0], res[1] = 5, 1  # DEFAULT_DATA と同じ初期値
+    hunger = np.full(n, float(MAX_HUNGER))
+    exp = np.zeros(n, dtype=np.int64)
+    level = np.ones(n, dtype=np.int64)
+    total_commands = np.zeros(n, dtype=np.int64)
+    since_drop = np.zeros(n, dtype=np.int64)
+    total_gacha = np.zeros(n, dtype=np.int64)
+    ssr_count = np.zeros(n, dtype=np.int64)
+    streak = np.zeros(n, dtype=np.int64)
+    max_streak = np.zeros(n, dtype=np.int64)
+    last_active = np.full(n, -2, dtype=np.int64)
+    collection = np.zeros((n, int(rarity_items.sum())), dtype=bool)
+    achieved = np.zeros((n, len(achievements)), dtype=bool)
+    level_day = np.full(n, NOT_REACHED, dtype=np.int64)
+    ssr_day = np.full(n, NOT_REACHED, dtype=np.int64)
+    lam = params.commands_per_day * np.exp(rng.normal(-spread * spread / 2, spread, n))
+
+    for day in range(params.days):
+        active = rng.random(n) < params.active_rate
+
+        # ログインボーナス
+        streak = np.where(active, np.where(last_active == day - 1, streak + 1, 1), streak)
+        last_active = np.where(active, day, last_active)
+        max_streak = np.maximum(max_streak, streak)
+        ticket_day = active & (streak % LOGIN_STREAK_FOR_TICKET == 0)
+        fragment_day = active & ~ticket_day
+        res[1] += ticket_day
+        res[2] += fragment_day
+        converted = fragment_day & (res[2] >= TICKET_FRAGMENTS_FOR_TICKET)
+        res[2] -= converted * TICKET_FRAGMENTS_FOR_TICKET
+        res[1] += converted
+
+        # コマンド実行: ドロップが残っているプレイヤーだけで次のドロップまでの間隔を引く
+        commands = np.where(active, rng.poisson(lam), 0)
+        remaining = commands.copy()
+        idx = np.flatnonzero(remaining)
+        while idx.size:
+            gap = guaranteed - since_drop[idx]
+            if 0 < p < 1:
+                gap = np.minimum(gap, rng.geometric(p, idx.size))
+            elif p >= 1:
+                gap = np.ones_like(gap)
+            hit = gap <= remaining[idx]
+            miss_idx = idx[~hit]
+            since_drop[miss_idx] += remaining[miss_idx]
+            remaining[miss_idx] = 0
+            hit_idx = idx[hit]
+            remaining[hit_idx] -= gap[hit]
+            since_drop[hit_idx] = 0
+            res[0, hit_idx] += 1
+            idx = hit_idx[remaining[hit_idx] > 0]
+        res[3] += (total_commands + commands) // COMMANDS_PER_COIN - total_commands // COMMANDS_PER_COIN
+        total_commands += commands
+        hunger = np.maximum(0.0, hunger - commands * HUNGER_DECREASE_PER_COMMAND)
+
+        # ショップ
+        if shop:
+            count = np.where(active, res[3] // shop["price"], 0)
+            res[3] -= count * shop["price"]
+            res += shop_reward[:, None] * count
+
+        # エサやり（満腹度が100に届くまで）
+        feeds = np.where(active & (hunger < MAX_HUNGER),
+                         np.minimum(res[0], np.ceil((MAX_HUNGER - hunger) / FEED_HUNGER_GAIN)), 0).astype(np.int64)
+        res[0] -= feeds
+        hunger = np.minimum(float(MAX_HUNGER), hunger + feeds * FEED_HUNGER_GAIN)
+        boosted = np.minimum(res[4], feeds)
+        res[4] -= boosted
+        exp += FEED_EXP_GAIN * (feeds + boosted)
+        new_level = np.minimum(np.searchsorted(thresholds, exp, side="right"), max_level)
+        res[1] += level_rewards[new_level] - level_rewards[level]
+        level = np.maximum(level, new_level)
+
+        # ガチャ（チケットをすべて使う）
+        pulls = np.where(active, res[1], 0)
+        res[1] -= pulls
+        total = int(pulls.sum())
+        if total:
+            owner = np.repeat(np.arange(n), pulls)
+            rarity = np.minimum(np.searchsorted(cumulative, rng.random(total), side="right"), len(cumulative) - 1)
+            item = rarity_offsets[rarity] + (rng.random(total) * rarity_items[rarity]).astype(np.int64)
+            collection[owner, item] = True
+            if ssr >= 0:
+                ssr_count += np.bincount(owner[rarity == ssr], minlength=n)
+        total_gacha += pulls
+
+        # デイリーミッション
+        progress = {"commands": commands, "feed": feeds, "gacha": pulls}
+        for mission_type, target, reward in missions:
+            done = active & (progress.get(mission_type, 0) >= target)
+            res += reward[:, None] * done
+
+        # 実績
+        current = {
+            "total_commands": total_commands,
+            "level": level,
+            "total_gacha": total_gacha,
+            "ssr_count": ssr_count,
+            "login_streak": max_streak,
+            "collection_count": 1 + collection.sum(axis=1),
+        }
+        for i, (condition_type, target, reward) in enumerate(achievements):
+            value = current.get(condition_type)
+            if value is None:
+                continue
+            unlocked = ~achieved[:, i] & (value >= target)
+            achieved[:, i] |= unlocked
+            res += reward[:, None] * unlocked
+
+        level_day[(level_day == NOT_REACHED) & (level >= params.target_level)] = day + 1
+        ssr_day[(ssr_day == NOT_REACHED) & (ssr_count > 0)] = day + 1
+
+    return {
+        "level_day": level_day.tolist(),
+        "ssr_day": ssr_day.tolist(),
+        "coins": res[3].tolist(),
+        "level": level.tolist(),
+        "pulls": total_gacha.tolist(),
+    }
+
+
+# ===== 実行 =====
+
+def backend_name() -> str:
+    """使用する計算方法"""
+    return "numpy" if np is not None else "python"
+
+
+def simulate_chunk(cfg: CompiledConfig, params: SimParams, players: int, seed: int) -> Dict[str, List[float]]:
+    """プレイヤーの塊1つ分を計算する（プロセスプールのワーカーで実行される）"""
+    if np is not None:
+        return _simulate_numpy(cfg, params, players, seed)
+    return _simulate_python(cfg, params, players, seed)
+
+
+def _percentiles(values: List[float], qs: Sequence[float] = (10, 50, 90)) -> List[Optional[float]]:
+    """最近傍順位法によるパーセンタイル（未到達は無限大とみなし、Noneで返す）"""
+    ordered = sorted(math.inf if v == NOT_REACHED else v for v in values)
+    result = []
+    for q in qs:
+        value = ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+        result.append(None if value == math.inf else value)
+    return result
+
+
+def summarize(results: Dict[str, List[float]]) -> Dict[str, Any]:
+    """シナリオ1つ分の結果を分布の要約にする"""
+    players = len(results["coins"])
+    reached = sum(1 for d in results["level_day"] if d != NOT_REACHED)
+    got_ssr = sum(1 for d in results["ssr_day"] if d != NOT_REACHED)
+    return {
+        "players": players,
+        "level_days": _percentiles(results["level_day"]),
+        "level_reached": reached / players,
+        "ssr_days": _percentiles(results["ssr_day"]),
+        "ssr_reached": got_ssr / players,
+        "coins": _percentiles(results["coins"]),
+        "final_level": _percentiles(results["level"]),
+        "pulls_mean": sum(results["pulls"]) / players,
+    }
+
+
+def run(scenarios: List[Tuple[Dict[str, Any], CompiledConfig, SimParams]],
+        workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    全シナリオを実行して要約を返す
+
+    プレイヤーを SIM_CHUNK_PLAYERS 人（純Pythonなら SIM_PYTHON_CHUNK_PLAYERS 人）ずつの塊に分けて
+    プロセスプールで並列に計算する
+    塊ごとの乱数の種はシナリオによらず同じにする（シナリオ間の差が乱数のばらつきに埋もれにくい）
+    """
+    chunk = SIM_CHUNK_PLAYERS if np is not None else SIM_PYTHON_CHUNK_PLAYERS
+    jobs = []
+    for index, (_, cfg, params) in enumerate(scenarios):
+        for start in range(0, params.players, chunk):
+            size = min(chunk, params.players - start)
+            jobs.append((index, cfg, params, size, params.seed * 1_000_003 + start))
+
+    merged: List[Dict[str, List[float]]] = [
+        {"level_day": [], "ssr_day": [], "coins": [], "level": [], "pulls": []} for _ in scenarios
+    ]
+    if workers == 1 or len(jobs) == 1:
+        outputs = [simulate_chunk(cfg, params, size, seed) for _, cfg, params, size, seed in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(
+                simulate_chunk,
+                *zip(*[(cfg, params, size, seed) for _, cfg, params, size, seed in jobs]),
+            ))
+
+    for (index, *_), output in zip(jobs, outputs):
+        for key, values in output.items():
+            merged[index][key].extend(values)
+
+    return [
+        {"assignment": assignment, "params": params._asdict(), **summarize(merged[i])}
+        for i, (assignment, _, params) in enumerate(scenarios)
+    ]
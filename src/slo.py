@@ -0,0 +1,255 @@
+"""
+Shell-Gotchi フックの遅延予算（SLO）
+シェルフック1回がプロンプトを遅らせる時間を、プロセス開始から HOOK_LATENCY_BUDGET_MS 以内に抑える
+
+- フックの各段階の前に、プロセス開始からの経過時間（profiler.elapsed）で残りの予算を確かめる
+  - startup: 読み込みの前に予算を使い切っている → フック1回分をそのまま後回しキューに積んで終わる
+  - load:    読み込みの後で、ロジックと保存に必要な時間が残っていない → 同上（読んだデータは捨てる）
+  - logic:   処理中に期限を過ぎた → 後回しにできるイベントのハンドラ（デイリーミッション・実績・統計）を積む
+  - save:    保存が予算を超えると見込まれる → フック1回分を積み、保存しない
+             （保存時間は、同じ場所にあるファイルの読み込み時間の移動平均で見込む。保存時間そのものは
+             保存した後でしか測れず、data.json に残せないため）
+  - rollup:  活動の時系列・ディレクトリの集計・ランキングの公開を積む
+- 後回しキュー（DEFERRED_QUEUE_FILE）は1行1件の JSON。次の sg の実行（フック以外）で全て、
+  次のフックでは予算の残りの範囲で、記録された時刻の出来事として処理する
+- 予算を超えた回数は段階ごとに data["slo"] に数える（処理したときに数える）
+- キューが HOOK_DEFER_MAX_BYTES を超えたら、予算に関係なくその場で処理する
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import events, profiler
+from .config import (
+    HOOK_LATENCY_BUDGET_MS, HOOK_DEFER_MAX_BYTES, HOOK_LOGIC_RESERVE_MS, DEFERRED_QUEUE_FILE,
+)
+
+STAGES = ("startup", "load", "logic", "save", "rollup")
+_IO_EMA_WEIGHT = 0.2  # 読み込み時間の移動平均で新しい値に掛ける重み
+
+
+def budget_ms() -> Optional[float]:
+    """遅延予算（ミリ秒。環境変数 SG_HOOK_BUDGET_MS が優先。0 なら無効 = None）"""
+    value = os.environ.get("SG_HOOK_BUDGET_MS", "").strip()
+    try:
+        budget = float(value) if value else HOOK_LATENCY_BUDGET_MS
+    except ValueError:
+        budget = HOOK_LATENCY_BUDGET_MS
+    return budget if budget else None
+
+
+def _state(data: Dict[str, Any]) -> Dict[str, Any]:
+    state = data.setdefault("slo", {})
+    state.setdefault("over_budget", {stage: 0 for stage in STAGES})
+    state.setdefault("replayed", 0)
+    state.setdefault("io_ms", 0.0)
+    return state
+
+
+# ===== 後回しキュー =====
+
+def queue_file() -> Path:
+    """キューの置き場所（ローカルキャッシュが有効ならキャッシュディレクトリ）"""
+    from .storage import side_file
+    return side_file(DEFERRED_QUEUE_FILE)
+
+
+def pending(path: Optional[Path] = None) -> bool:
+    """後回しにした処理があるか（ファイルの大きさを見るだけ）"""
+    path = path or queue_file()
+    try:
+        return os.stat(path).st_size > 0
+    except OSError:
+        return False
+
+
+def _queue_bytes(path: Optional[Path] = None) -> int:
+    path = path or queue_file()
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def defer(entries: List[Dict[str, Any]], path: Optional[Path] = None) -> bool:
+    """
+    キューに積む（失敗したら False。呼び出し側はその場で処理する）
+    drain と同じ排他ロックを取ってから追記する（drain が読んでから切り詰めるまでの間に
+    追記すると消えてしまうため。startup・load の段階ではデータのロックを持たずに呼ばれる）
+    """
+    import fcntl
+    from .storage import ensure_data_dir
+    path = path or queue_file()
+    lines = "".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in entries)
+    try:
+        ensure_data_dir(path.parent)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, lines.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+    return True
+
+
+def _replay_entry(data: Dict[str, Any], entry: Dict[str, Any], done: Dict[str, Any]) -> None:
+    from . import activity, directories, leaderboard
+    from .game_logic import classify_command, handle_hook_event
+
+    kind = entry.get("k")
+    if kind == "hook":
+        command = entry.get("cmd", "")
+        info = classify_command(command)
+        if info.ignored:
+            return
+        result = handle_hook_event(data, info, command, entry.get("exit"), entry.get("dur"), entry.get("t"))
+        if result["login"]["is_new_day"]:
+            done["logins"].append(result["login"])
+        if result["rewarded"]:
+            activity.record("commands", ts=entry.get("t"))
+            if entry.get("cwd"):
+                directories.record_cwd(entry["cwd"], ts=entry.get("t"))
+    elif kind == "event":
+        results = events.bus.replay(data, entry["type"], entry["payload"], entry["handlers"])
+        done["unlocked"].extend(results.get("achievements", []))
+    elif kind == "rollup":
+        leaderboard.maybe_publish(data, now=entry.get("t"))
+        if entry.get("rewarded"):
+            activity.record("commands", ts=entry.get("t"))
+            if entry.get("cwd"):
+                directories.record_cwd(entry["cwd"], ts=entry.get("t"))
+
+
+def _process(data: Dict[str, Any], state: Dict[str, Any], entry: Dict[str, Any], done: Dict[str, Any]) -> None:
+    if entry.get("stage") in state["over_budget"]:
+        state["over_budget"][entry["stage"]] += 1
+    _replay_entry(data, entry, done)
+    done["replayed"] += 1
+
+
+def replay(data: Dict[str, Any], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """キューに積めなかった項目をその場で処理する（戻り値は drain と同じ）"""
+    done: Dict[str, Any] = {"replayed": 0, "logins": [], "unlocked": []}
+    state = _state(data)
+    for entry in entries:
+        _process(data, state, entry, done)
+    state["replayed"] += done["replayed"]
+    return done
+
+
+def drain(data: Dict[str, Any], deadline_ms: Optional[float] = None,
+          path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    後回しにした処理を古い順に済ませる（deadline_ms を渡すと、プロセス開始からその時間までで打ち切る）
+    data を変更するので、呼び出し側で保存すること
+
+    Returns:
+        {"replayed": 処理した件数, "logins": [表示していないログインボーナス], "unlocked": [新しく達成した実績]}
+    """
+    import fcntl
+    done: Dict[str, Any] = {"replayed": 0, "logins": [], "unlocked": []}
+    state = _state(data)
+    try:
+        fd = os.open(path or queue_file(), os.O_RDWR)
+    except OSError:
+        return done
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd), "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        index = 0
+        for index, line in enumerate(lines):
+            if deadline_ms is not None and profiler.elapsed() * 1000 >= deadline_ms:
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            _process(data, state, entry, done)
+        else:
+            index = len(lines)
+        rest = "".join(lines[index:])
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        if rest:
+            os.write(fd, rest.encode("utf-8"))
+    finally:
+        os.close(fd)
+    state["replayed"] += done["replayed"]
+    return done
+
+
+# ===== フックの見張り =====
+
+class HookGuard:
+    """フック1回分の遅延予算の見張り"""
+
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget_ms() if budget is None else budget
+        self.stage: Optional[str] = None  # 最初に予算を超えた段階
+
+    def remaining_ms(self) -> float:
+        if self.budget is None:
+            return float("inf")
+        return self.budget - profiler.elapsed() * 1000
+
+    def over(self, stage: str, need_ms: float = 0.0) -> bool:
+        """残りの予算が need_ms に足りなければ、その段階で予算を超えたことにする"""
+        if self.remaining_ms() >= need_ms:
+            return False
+        if self.stage is None:
+            if _queue_bytes() >= HOOK_DEFER_MAX_BYTES:
+                return False  # キューがあふれそうなら、遅くてもその場で処理する
+            self.stage = stage
+        return True
+
+    def need_save(self, data: Dict[str, Any]) -> float:
+        """保存に必要と見込む時間（読み込み時間の移動平均）"""
+        return _state(data)["io_ms"]
+
+    def need_after_load(self, data: Dict[str, Any]) -> float:
+        """読み込みの後、ロジックと保存に必要と見込む時間"""
+        return HOOK_LOGIC_RESERVE_MS + self.need_save(data)
+
+    def save_deadline_ms(self, data: Dict[str, Any]) -> Optional[float]:
+        """保存に必要な時間を残した期限（プロセス開始からのミリ秒。予算が無効ならNone）"""
+        if self.budget is None:
+            return None
+        return self.budget - self.need_save(data)
+
+    def begin_logic(self, data: Dict[str, Any]) -> None:
+        """ロジックの間、保存の分を残した期限を過ぎたら、後回しにできるハンドラを積ませる"""
+        events.bus.deferred.clear()
+        events.bus.deadline_ms = self.save_deadline_ms(data)
+
+    def end_logic(self) -> List[Dict[str, Any]]:
+        """ロジックの間に積まれたハンドラのキューの項目"""
+        events.bus.deadline_ms = None
+        now = time.time()
+        entries = [{"k": "event", "type": event_type, "payload": payload, "handlers": names, "t": now}
+                   for event_type, payload, names in events.bus.deferred]
+        events.bus.deferred.clear()
+        if entries and self.stage is None:
+            self.stage = "logic"
+        return entries
+
+    def record_load(self, data: Dict[str, Any], ms: float) -> None:
+        """読み込みにかかった時間を移動平均に加える（このフックの保存で残る）"""
+        state = _state(data)
+        state["io_ms"] = round(state["io_ms"] * (1 - _IO_EMA_WEIGHT) + ms * _IO_EMA_WEIGHT, 3)
+
+    def tag(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """フック1回分の項目の先頭に、予算を超えた段階を記録する（処理したときに数える）"""
+        if entries and self.stage:
+            entries[0]["stage"] = self.stage
+        return entries
+
+
+def hook_entry(command: str, exit_code: Optional[int], duration_ms: Optional[float],
+               cwd: Optional[str]) -> Dict[str, Any]:
+    """フック1回分をそのまま積む項目"""
+    return {"k": "hook", "cmd": command, "exit": exit_code, "dur": duration_ms, "cwd": cwd, "t": time.time()}
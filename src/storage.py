@@ -1,53 +1,176 @@
 """
 Shell-Gotchi JSONデータの読み書き
+
+- 保存は一時ファイルに書いてから os.replace で置き換える（読み込み中のプロセスが書きかけのファイルを見ない）
+- data.json を書き換えるプロセス（フック・データを変更するコマンド）は、読み込みから保存までの間
+  DATA_LOCK_FILE を flock する（SG_ASYNC_HOOK=1 でフックが同時に動いても変更を失わない）
+- ローカルキャッシュが有効なら、data.json と一緒にロックファイル・キュー・集計もローカルに置く（side_file）
 """
 import json
 import copy
+import os
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional
+
+from . import localcache, replica
+from .config import DATA_DIR, DATA_FILE, DATA_LOCK_FILE, DEFAULT_DATA
+from .profiler import phase
+
 
-from .config import DATA_DIR, DATA_FILE, DEFAULT_DATA
+_ensured_dirs: set = set()
+_lock_fd: Optional[int] = None
+_lock_depth = 0
+_LOCK_RETRY_SECONDS = 0.005  # 待ち時間を指定してロックを取るときの再試行の間隔
 
 
-def ensure_data_dir() -> None:
-    """データディレクトリが存在しない場合は作成する"""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+def ensure_data_dir(data_dir: Path = DATA_DIR) -> None:
+    """データディレクトリが存在しない場合は作成する（1プロセスにつき1度だけ確かめる）"""
+    if data_dir in _ensured_dirs:
+        return
+    data_dir.mkdir(parents=True, exist_ok=True)
+    _ensured_dirs.add(data_dir)
+
+
+def side_file(path: Path) -> Path:
+    """
+    データディレクトリのファイル（ロック・キュー・集計）の置き場所
+    ローカルキャッシュが有効ならキャッシュディレクトリ（使えなければホーム）
+    """
+    if path.parent == DATA_DIR and localcache.enabled():
+        try:
+            return localcache.side_path(DATA_FILE, path.name)
+        except OSError:
+            pass
+    return path
 
 
-def load_data() -> Dict[str, Any]:
+def acquire_lock(timeout: Optional[float] = None) -> bool:
+    """
+    data.json の読み込み〜保存の間の排他ロックを取る（同じプロセスで入れ子にしてもよい）
+    timeout 秒たっても取れなければ False（None なら取れるまで待つ）
+    """
+    import fcntl
+    global _lock_fd, _lock_depth
+    if _lock_fd is not None:
+        _lock_depth += 1
+        return True
+    lock_file = side_file(DATA_LOCK_FILE)
+    ensure_data_dir(lock_file.parent)
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if timeout is None or timeout == float("inf"):
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        return False
+                    time.sleep(_LOCK_RETRY_SECONDS)
+    except BaseException:
+        os.close(fd)
+        raise
+    _lock_fd, _lock_depth = fd, 1
+    return True
+
+
+def release_lock() -> None:
+    """acquire_lock で取ったロックを返す"""
+    global _lock_fd, _lock_depth
+    if _lock_fd is None:
+        return
+    _lock_depth -= 1
+    if _lock_depth == 0:
+        os.close(_lock_fd)
+        _lock_fd = None
+
+
+@contextmanager
+def data_lock() -> Iterator[None]:
+    """with の間 data.json の排他ロックを持つ"""
+    acquire_lock()
+    try:
+        yield
+    finally:
+        release_lock()
+
+
+def _read_text(path: Path) -> Optional[str]:
+    """data.json の中身（ファイルがなければNone）。ローカルキャッシュが有効ならそちらから読む"""
+    if path == DATA_FILE and localcache.enabled():
+        try:
+            return localcache.read(path)
+        except OSError:
+            pass  # キャッシュが使えなければホームを直接読む
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def load_data(path: Path = DATA_FILE) -> Dict[str, Any]:
     """
     JSONデータを読み込む
     ファイルが存在しない場合は初期データを生成して返す
+    path を指定すると別のユーザーのデータを読む（sg serve 用）
     """
-    ensure_data_dir()
-    
-    if not DATA_FILE.exists():
-        # 初期データを作成
-        data = copy.deepcopy(DEFAULT_DATA)
-        save_data(data)
-        return data
-    
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with phase("load_data"):
+            text = _read_text(path)
+        
+        if text is None:
+            # 初期データを作成
+            data = copy.deepcopy(DEFAULT_DATA)
+            save_data(data, path)
+            return data
         
         # データの整合性チェック・マイグレーション
-        data = migrate_data(data)
+        with phase("migrate_data"):
+            data = migrate_data(json.loads(text))
+        
+        # 他のマシンの差分を取り込んだら、読んだ位置ごとすぐに保存する（二重に取り込まないように）
+        if path == DATA_FILE and replica.enabled():
+            with phase("sync_pull"):
+                if replica.pull(data):
+                    save_data(data, path)
         return data
     except (json.JSONDecodeError, IOError) as e:
         # 読み込みエラー時は初期データで上書き
         print(f"[SG] Warning: Failed to load data, resetting... ({e})")
         data = copy.deepcopy(DEFAULT_DATA)
-        save_data(data)
+        save_data(data, path)
         return data
 
 
-def save_data(data: Dict[str, Any]) -> None:
-    """JSONデータを保存する"""
-    ensure_data_dir()
-    
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def save_data(data: Dict[str, Any], path: Path = DATA_FILE) -> None:
+    """JSONデータを保存する（ローカルキャッシュが有効ならローカルのコピーに書き込む）"""
+    with phase("save_data"):
+        if path == DATA_FILE and replica.enabled():
+            replica.push(data)
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if path == DATA_FILE and localcache.enabled():
+            try:
+                localcache.write(path, text)
+                return
+            except OSError:
+                pass  # キャッシュが使えなければホームに直接書き込む
+        
+        ensure_data_dir(path.parent)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
 
 
 def migrate_data(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -57,7 +180,7 @@ def migrate_data(data: Dict[str, Any]) -> Dict[str, Any]:
     default = copy.deepcopy(DEFAULT_DATA)
     
     # 各セクションが存在しない場合はデフォルト値で補完
-    for section in ["user", "stats", "pet"]:
+    for section in ["user", "stats", "pet", "rng", "history_import", "antispam", "latency", "leaderboard", "sync", "slo"]:
         if section not in data:
             data[section] = default[section]
         else:
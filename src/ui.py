@@ -1,39 +1,44 @@
 """
-Shell-Gotchi Richを使った表示処理
+Shell-Gotchi 表示処理
+実際の出力は renderer（Rich / プレーンテキスト）を経由して行う
 """
+import os
+import select
+import sys
 import time
-from typing import Any, Dict, List, Optional
-
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.text import Text
-from rich.progress import Progress, BarColumn, TextColumn
-from rich.align import Align
-from rich import box
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from .config import (
-    APP_NAME, VERSION, MAX_HUNGER, LEVEL_THRESHOLDS,
-    GACHA_ITEMS, SHOP_ITEMS, ACHIEVEMENTS
+    APP_NAME, VERSION, MAX_HUNGER,
+    GACHA_ANIMATION_BUDGET, GACHA_DRUMROLL_FRAMES, WATCH_FRAME_INTERVAL
 )
+from .config_compiler import get_compiled_config
+from .game_logic import get_level_threshold
 from .assets import (
-    LOGO, WELCOME_BANNER, get_pet_art, get_skin_name, get_skin_color,
+    LOGO, WELCOME_BANNER, get_pet_art, get_pet_mood, get_pet_frame_count, get_skin_name, get_skin_color,
     PET_SKINS, GACHA_ANIMATION_FRAMES, GACHA_RESULT_FRAMES,
     FOOD_ICON, TICKET_ICON, FRAGMENT_ICON, LEVEL_UP_ICON,
     HUNGER_FULL, HUNGER_LOW, HUNGER_EMPTY
 )
-
-console = Console()
+from .renderer import renderer
 
 
 def display_status(data: Dict[str, Any]) -> None:
     """ペットのステータスを表示する"""
+    renderer.print()
+    renderer.print(build_status(data))
+    renderer.print()
+
+
+def build_status(data: Dict[str, Any], frame: int = 0) -> Any:
+    """ステータス画面の表示内容（frame はペットのアニメーションのフレーム番号）"""
     pet = data["pet"]
     user = data["user"]
     stats = data["stats"]
     
     # ペットのASCIIアート
-    pet_art = get_pet_art(pet["skin_id"], pet["hunger"])
+    pet_art = get_pet_art(pet["skin_id"], pet["hunger"], frame)
     skin_color = get_skin_color(pet["skin_id"])
     
     # 満腹度バー
@@ -43,66 +48,115 @@ def display_status(data: Dict[str, Any]) -> None:
     exp_bar = create_exp_bar(pet["level"], pet["exp"])
     
     # ペット情報テーブル
-    pet_table = Table(show_header=False, box=None, padding=(0, 1))
-    pet_table.add_column("Key", style="cyan")
-    pet_table.add_column("Value")
-    
-    pet_table.add_row("名前", f"[bold]{pet['name']}[/bold]")
-    pet_table.add_row("スキン", get_skin_name(pet["skin_id"]))
-    pet_table.add_row("レベル", f"[yellow]Lv.{pet['level']}[/yellow]")
-    pet_table.add_row("経験値", exp_bar)
-    pet_table.add_row("満腹度", hunger_bar)
+    pet_table = renderer.table(
+        [{"header": "Key", "style": "cyan"}, "Value"],
+        [
+            ("名前", f"[bold]{pet['name']}[/bold]"),
+            ("スキン", get_skin_name(pet["skin_id"])),
+            ("レベル", f"[yellow]Lv.{pet['level']}[/yellow]"),
+            ("経験値", exp_bar),
+            ("満腹度", hunger_bar),
+        ],
+        box=None, show_header=False
+    )
     
     # 所持品テーブル
-    items_table = Table(show_header=False, box=None, padding=(0, 1))
-    items_table.add_column("Key", style="cyan")
-    items_table.add_column("Value")
-    
-    items_table.add_row(f"{FOOD_ICON} エサ", f"[green]{user['food']}[/green] 個")
-    items_table.add_row(f"{TICKET_ICON} チケット", f"[magenta]{user['tickets']}[/magenta] 枚")
-    items_table.add_row(f"{FRAGMENT_ICON} 破片", f"[blue]{user['ticket_fragments']}/7[/blue]")
-    items_table.add_row("🪙 コイン", f"[yellow]{user.get('coins', 0)}[/yellow]")
+    items_table = renderer.table(
+        [{"header": "Key", "style": "cyan"}, "Value"],
+        [
+            (f"{FOOD_ICON} エサ", f"[green]{user['food']}[/green] 個"),
+            (f"{TICKET_ICON} チケット", f"[magenta]{user['tickets']}[/magenta] 枚"),
+            (f"{FRAGMENT_ICON} 破片", f"[blue]{user['ticket_fragments']}/7[/blue]"),
+            ("🪙 コイン", f"[yellow]{user.get('coins', 0)}[/yellow]"),
+        ],
+        box=None, show_header=False
+    )
     
     # 統計テーブル
-    stats_table = Table(show_header=False, box=None, padding=(0, 1))
-    stats_table.add_column("Key", style="dim")
-    stats_table.add_column("Value", style="dim")
-    
-    stats_table.add_row("総コマンド数", f"{stats['total_commands']:,}")
-    stats_table.add_row("連続ログイン", f"{user['login_streak']} 日")
+    stats_table = renderer.table(
+        [{"header": "Key", "style": "dim"}, {"header": "Value", "style": "dim"}],
+        [
+            ("総コマンド数", f"{stats['total_commands']:,}"),
+            ("連続ログイン", f"{user['login_streak']} 日"),
+        ],
+        box=None, show_header=False
+    )
     
     # ASCIIアートパネル
-    art_panel = Panel(
-        Align.center(Text(pet_art, style=skin_color)),
+    art_panel = renderer.panel(
+        renderer.text(pet_art, style=skin_color, center=True),
         title=f"[bold]{pet['name']}[/bold]",
         border_style="green" if pet["hunger"] > 50 else "yellow" if pet["hunger"] > 20 else "red"
     )
     
-    # メインパネル
-    main_content = Table.grid(padding=1)
-    main_content.add_column()
-    main_content.add_column()
-    
     # 左側：ペット情報
-    left_content = Table.grid()
-    left_content.add_row(art_panel)
-    left_content.add_row(pet_table)
+    left_content = renderer.grid([[art_panel], [pet_table]])
     
     # 右側：所持品と統計
-    right_content = Table.grid()
-    right_content.add_row(Panel(items_table, title="所持品", border_style="cyan"))
-    right_content.add_row(Panel(stats_table, title="統計", border_style="dim"))
+    right_content = renderer.grid([
+        [renderer.panel(items_table, title="所持品", border_style="cyan")],
+        [renderer.panel(stats_table, title="統計", border_style="dim")],
+    ])
     
-    main_content.add_row(left_content, right_content)
+    # メインパネル
+    main_content = renderer.grid([[left_content, right_content]], padding=1)
     
-    console.print()
-    console.print(Panel(
+    return renderer.panel(
         main_content,
         title=f"[bold blue]{APP_NAME}[/bold blue] v{VERSION}",
         border_style="blue",
-        box=box.DOUBLE
-    ))
-    console.print()
+        double=True
+    )
+
+
+def status_key(data: Dict[str, Any]) -> Tuple[Any, ...]:
+    """ステータス画面に表示される値（これが変わったときだけ描き直す）"""
+    pet = data["pet"]
+    user = data["user"]
+    return (
+        pet["name"], pet["skin_id"], pet["level"], create_exp_bar(pet["level"], pet["exp"]),
+        create_hunger_bar(pet["hunger"]), get_pet_mood(pet["hunger"]),
+        user["food"], user["tickets"], user["ticket_fragments"], user.get("coins", 0),
+        data["stats"]["total_commands"], user["login_streak"],
+    )
+
+
+def display_status_live(load: Callable[[], Dict[str, Any]], wait: Callable[[], bool]) -> None:
+    """
+    ステータスを表示し続け、表示される値が変わったときだけ描き直す（sg watch。Ctrl-C で終わる）
+
+    Args:
+        load: データを読み込む関数
+        wait: データが変わるまで待つ関数
+
+    - 満腹度で表情が変わったときは、新しい表情のアニメーションを1巡だけ流してから止める
+    - 端末でない場合やプレーン表示の場合は、変わるたびに画面全体を出力する
+    """
+    data = load()
+    key = status_key(data)
+    mood = get_pet_mood(data["pet"]["hunger"])
+    live = renderer.supports_live and renderer.is_terminal
+    try:
+        with renderer.live(build_status(data), transient=False) if live else nullcontext(None) as update:
+            show = update or renderer.print
+            if not live:
+                show(build_status(data))
+            while True:
+                wait()
+                data = load()
+                new_key = status_key(data)
+                if new_key == key:
+                    continue
+                key = new_key
+                pet = data["pet"]
+                if live and get_pet_mood(pet["hunger"]) != mood:
+                    mood = get_pet_mood(pet["hunger"])
+                    for frame in range(1, get_pet_frame_count(pet["skin_id"], pet["hunger"])):
+                        show(build_status(data, frame))
+                        time.sleep(WATCH_FRAME_INTERVAL)
+                show(build_status(data))
+    except KeyboardInterrupt:
+        pass
 
 
 def create_hunger_bar(hunger: float) -> str:
@@ -124,8 +178,8 @@ def create_hunger_bar(hunger: float) -> str:
 
 def create_exp_bar(level: int, exp: int) -> str:
     """経験値バーを作成する"""
-    current_threshold = LEVEL_THRESHOLDS.get(level, 0)
-    next_threshold = LEVEL_THRESHOLDS.get(level + 1, current_threshold + 500)
+    current_threshold = get_level_threshold(level)
+    next_threshold = get_level_threshold(level + 1)
     
     exp_in_level = exp - current_threshold
     exp_needed = next_threshold - current_threshold
@@ -141,212 +195,350 @@ def create_exp_bar(level: int, exp: int) -> str:
     return f"{bar} {exp}/{next_threshold}"
 
 
-def display_drop_message(food_count: int) -> None:
-    """エサドロップ時のメッセージを表示する"""
-    console.print(f"[green][SG][/green] {FOOD_ICON} You found a Bit-Food! (Total: {food_count})")
+def display_drop_message(food_count: int, count: int = 1) -> None:
+    """エサドロップ時のメッセージを表示する（count は前回のプロンプトからのドロップ回数）"""
+    if count > 1:
+        renderer.print(f"[green][SG][/green] {FOOD_ICON} You found {count} Bit-Foods since the last prompt! (Total: {food_count})")
+        return
+    renderer.print(f"[green][SG][/green] {FOOD_ICON} You found a Bit-Food! (Total: {food_count})")
 
 
 def display_login_bonus(reward_type: str, streak: int) -> None:
     """ログインボーナスを表示する"""
-    console.print()
-    console.print(Panel(
-        Text(LOGO, style="bold cyan"),
+    renderer.print()
+    renderer.print(renderer.panel(
+        renderer.text(LOGO, style="bold cyan"),
         border_style="yellow"
     ))
-    console.print(WELCOME_BANNER)
+    renderer.print(WELCOME_BANNER)
     
     if reward_type == "ticket":
-        console.print(f"  ║  {TICKET_ICON} [bold yellow]7日連続ログインボーナス！[/bold yellow]     ║")
-        console.print(f"  ║  🎉 ガチャチケット x1 を獲得！        ║")
+        renderer.print(f"  ║  {TICKET_ICON} [bold yellow]7日連続ログインボーナス！[/bold yellow]     ║")
+        renderer.print(f"  ║  🎉 ガチャチケット x1 を獲得！        ║")
     else:
-        console.print(f"  ║  {FRAGMENT_ICON} [cyan]ログインボーナス！[/cyan]               ║")
-        console.print(f"  ║  💫 チケットの破片 x1 を獲得！        ║")
+        renderer.print(f"  ║  {FRAGMENT_ICON} [cyan]ログインボーナス！[/cyan]               ║")
+        renderer.print(f"  ║  💫 チケットの破片 x1 を獲得！        ║")
     
-    console.print(f"  ║  📅 連続ログイン: {streak} 日                 ║")
-    console.print("  ╚══════════════════════════════════════════════════════════╝")
-    console.print()
+    renderer.print(f"  ║  📅 連続ログイン: {streak} 日                 ║")
+    renderer.print("  ╚══════════════════════════════════════════════════════════╝")
+    renderer.print()
 
 
 def display_feed_result(pet_name: str, hunger: float, exp_gained: int, level_up: bool = False, new_level: int = 0) -> None:
     """エサやり結果を表示する"""
-    console.print()
-    console.print(f"[green][SG][/green] {FOOD_ICON} {pet_name}にエサをあげました！")
-    console.print(f"     満腹度: [green]+20%[/green] → {hunger:.0f}%")
-    console.print(f"     経験値: [cyan]+{exp_gained}[/cyan]")
+    renderer.print()
+    renderer.print(f"[green][SG][/green] {FOOD_ICON} {pet_name}にエサをあげました！")
+    renderer.print(f"     満腹度: [green]+20%[/green] → {hunger:.0f}%")
+    renderer.print(f"     経験値: [cyan]+{exp_gained}[/cyan]")
     
     if level_up:
-        console.print()
-        console.print(Panel(
+        renderer.print()
+        renderer.print(renderer.panel(
             f"{LEVEL_UP_ICON} [bold yellow]レベルアップ！[/bold yellow]\n"
             f"   {pet_name} は Lv.{new_level} になりました！",
             border_style="yellow"
         ))
-    console.print()
+    renderer.print()
 
 
 def display_no_food() -> None:
     """エサがない場合のメッセージを表示する"""
-    console.print("[red][SG][/red] エサがありません！コマンドを実行してエサを集めましょう。")
+    renderer.print("[red][SG][/red] エサがありません！コマンドを実行してエサを集めましょう。")
 
 
 def display_hunger_full() -> None:
     """満腹度がすでに最大の場合のメッセージを表示する"""
-    console.print("[yellow][SG][/yellow] ペットはもうお腹いっぱいです！")
+    renderer.print("[yellow][SG][/yellow] ペットはもうお腹いっぱいです！")
 
 
-def display_gacha_animation() -> None:
-    """ガチャ演出を表示する"""
-    console.clear()
-    
-    # アニメーションフレーム
-    for frame in GACHA_ANIMATION_FRAMES:
-        console.clear()
-        console.print(Align.center(Text(frame, style="bold cyan")))
-        time.sleep(0.3)
-    
-    # ドラムロール風の演出
-    for _ in range(5):
-        console.clear()
-        console.print(Align.center(Text("🎰 ガチャを回しています... 🎰", style="bold yellow")))
-        time.sleep(0.1)
-        console.clear()
-        console.print(Align.center(Text("🎰 ガチャを回しています... 🎰", style="bold magenta")))
-        time.sleep(0.1)
+# 事前レンダリング済みのガチャ演出フレーム（初回呼び出し時に生成）
+_gacha_frames: List[Any] = []
+
+
+def _get_gacha_frames() -> List[Any]:
+    """ガチャ演出のフレームを事前にレンダリングして返す"""
+    if not _gacha_frames:
+        for frame in GACHA_ANIMATION_FRAMES:
+            _gacha_frames.append(renderer.text(frame, style="bold cyan", center=True))
+        # ドラムロール風の演出（色を交互に切り替える）
+        for i in range(GACHA_DRUMROLL_FRAMES):
+            style = "bold yellow" if i % 2 == 0 else "bold magenta"
+            _gacha_frames.append(renderer.text("🎰 ガチャを回しています... 🎰", style=style, center=True))
+    return _gacha_frames
+
+
+@contextmanager
+def _keypress_watcher() -> Iterator[Any]:
+    """
+    キー入力でスキップできるように標準入力を監視する
+    端末であれば cbreak モードにして1文字単位で読めるようにする
+
+    Yields:
+        timeout秒だけ待機し、キー入力があればTrueを返す関数
+    """
+    stdin = sys.stdin
+    try:
+        import termios
+        import tty
+        fd = stdin.fileno()
+        old_attrs = termios.tcgetattr(fd) if stdin.isatty() else None
+    except (ImportError, AttributeError, OSError, ValueError):
+        old_attrs = None
+
+    if old_attrs is None:
+        # キー入力を監視できない環境では単純に待機する
+        def wait(timeout: float) -> bool:
+            time.sleep(timeout)
+            return False
+        yield wait
+        return
+
+    def wait(timeout: float) -> bool:
+        ready, _, _ = select.select([fd], [], [], max(timeout, 0))
+        if ready:
+            os.read(fd, 1024)  # 押されたキーを読み捨てる
+            return True
+        return False
+
+    tty.setcbreak(fd)
+    try:
+        yield wait
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_attrs)
+
+
+def display_gacha_animation(budget: float = GACHA_ANIMATION_BUDGET, fast: bool = False) -> None:
+    """
+    ガチャ演出を表示する
+
+    Args:
+        budget: 演出全体の時間予算（秒）。フレーム数に関係なくこの時間で終わる
+        fast: Trueの場合は演出をスキップする
+
+    - rich.live.Live で同じ領域を書き換えるため画面全体のクリアは行わない
+    - 何かキーを押すと即座にスキップ
+    - 標準出力が端末でない場合やプレーン表示の場合は演出なし
+    """
+    if fast or budget <= 0 or not renderer.supports_live or not renderer.is_terminal:
+        return
+
+    frames = _get_gacha_frames()
+    frame_time = budget / len(frames)
+    deadline = time.monotonic() + budget
+
+    with _keypress_watcher() as wait_for_key:
+        with renderer.live(frames[0]) as update:
+            for frame in frames:
+                update(frame)
+                # 予算を超えないように残り時間で待機時間を切り詰める
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait_for_key(min(frame_time, remaining)):
+                    break
+
+
+# レアリティに応じた色
+RARITY_STYLES = {"SSR": "bold yellow", "SR": "bold magenta", "R": "cyan"}
 
 
 def display_gacha_result(rarity: str, item: Dict[str, Any]) -> None:
     """ガチャ結果を表示する"""
     result_frame = GACHA_RESULT_FRAMES.get(rarity, GACHA_RESULT_FRAMES["R"])
+    color = RARITY_STYLES.get(rarity, "white")
     
-    # レアリティに応じた色
-    colors = {"SSR": "bold yellow", "SR": "bold magenta", "R": "cyan"}
-    color = colors.get(rarity, "white")
-    
-    console.print()
-    console.print(Text(result_frame, style=color))
-    console.print(f"║  獲得: [bold]{item['name']}[/bold]")
-    console.print(f"║  タイプ: {item['type']}")
-    console.print("╚══════════════════════════════════════╝")
+    renderer.print()
+    renderer.print(renderer.text(result_frame, style=color))
+    renderer.print(f"║  獲得: [bold]{item['name']}[/bold]")
+    renderer.print(f"║  タイプ: {item['type']}")
+    renderer.print("╚══════════════════════════════════════╝")
     
     # SSRの場合は特別な演出
     if rarity == "SSR":
-        console.print()
-        console.print(Align.center(Text("🎊 おめでとうございます！ 🎊", style="bold yellow")))
+        renderer.print()
+        renderer.print(renderer.text("🎊 おめでとうございます！ 🎊", style="bold yellow", center=True))
     
-    console.print()
+    renderer.print()
+
+
+def _dry_streak_line(history: Any, top_rarity: str) -> str:
+    return (f"{top_rarity}が出ていない連続回数: [bold]{history.dry:,}[/bold] 回"
+            f"（最長 {history.longest_dry:,} 回）")
+
+
+def display_gacha_history(history: Any, limit: int, top_rarity: str) -> None:
+    """直近のガチャの結果を新しい順に表示する（sg gacha history）"""
+    renderer.print()
+    if not history.total:
+        renderer.print("[yellow][SG][/yellow] まだガチャの記録がありません。")
+        renderer.print()
+        return
+    items = get_compiled_config().items
+    rows = []
+    for pull in history.recent(limit):
+        style = RARITY_STYLES.get(pull.rarity, "white")
+        name = items[pull.item_index]["name"] if pull.item_index < len(items) else "?"
+        rows.append((
+            time.strftime("%m/%d %H:%M", time.localtime(pull.ts)),
+            f"[{style}]{pull.rarity}[/{style}]",
+            name,
+        ))
+    renderer.print(renderer.table(
+        [{"header": "日時", "style": "dim"}, "レアリティ", "アイテム"],
+        rows,
+        title=f"🎰 ガチャの履歴（直近 {len(rows)} 回 / 通算 {history.total:,} 回）"
+    ))
+    renderer.print(_dry_streak_line(history, top_rarity))
+    renderer.print()
+
+
+def display_gacha_rates(history: Any, rows: List[Dict[str, Any]], top_rarity: str) -> None:
+    """記録したガチャの実際の確率と設定の確率を比べる（sg gacha rates）"""
+    renderer.print()
+    if not history.total:
+        renderer.print("[yellow][SG][/yellow] まだガチャの記録がありません。")
+        renderer.print()
+        return
+    table_rows = []
+    for row in rows:
+        style = RARITY_STYLES.get(row["rarity"], "white")
+        configured = "-" if row["configured"] is None else f"{row['configured']:.2%}"
+        verdict = "[green]範囲内[/green]" if row["within"] else "[red]範囲外[/red]"
+        table_rows.append((
+            f"[{style}]{row['rarity']}[/{style}]",
+            f"{row['count']:,}",
+            f"{row['observed']:.2%}",
+            f"{row['low']:.2%} 〜 {row['high']:.2%}",
+            configured,
+            verdict,
+        ))
+    renderer.print(renderer.table(
+        [
+            "レアリティ",
+            {"header": "回数", "justify": "right"},
+            {"header": "実際", "justify": "right"},
+            {"header": "95%区間", "justify": "right"},
+            {"header": "設定", "justify": "right"},
+            "判定",
+        ],
+        table_rows,
+        title=f"📊 ガチャの確率（通算 {history.total:,} 回）"
+    ))
+    renderer.print(_dry_streak_line(history, top_rarity))
+    renderer.print("[dim]区間はウィルソンのスコア区間。回数が少ないうちは広くなります。[/dim]")
+    renderer.print()
 
 
 def display_no_tickets() -> None:
     """チケットがない場合のメッセージを表示する"""
-    console.print("[red][SG][/red] ガチャチケットがありません！")
-    console.print("     レベルアップやログインボーナスでチケットを獲得しましょう。")
+    renderer.print("[red][SG][/red] ガチャチケットがありません！")
+    renderer.print("     レベルアップやログインボーナスでチケットを獲得しましょう。")
 
 
 def display_collection(collection: List[str], all_items: Dict[str, Any] = None) -> None:
     """コレクション一覧を表示する"""
-    console.print()
+    renderer.print()
     
     # スキンテーブル
-    skin_table = Table(title="🎨 スキンコレクション", box=box.ROUNDED)
-    skin_table.add_column("ID", style="dim")
-    skin_table.add_column("名前")
-    skin_table.add_column("レアリティ")
-    skin_table.add_column("状態")
-    
+    skin_rows = []
     for skin_id, skin_data in PET_SKINS.items():
         owned = "✅ 所持" if skin_id in collection else "❌ 未所持"
         rarity = skin_data.get("rarity", "N")
         rarity_style = {"SSR": "bold yellow", "SR": "magenta", "N": "white"}.get(rarity, "white")
         
-        skin_table.add_row(
+        skin_rows.append((
             skin_id,
             skin_data["name"],
             f"[{rarity_style}]{rarity}[/{rarity_style}]",
             owned if skin_id in collection else f"[dim]{owned}[/dim]"
-        )
+        ))
     
-    console.print(skin_table)
+    renderer.print(renderer.table(
+        [{"header": "ID", "style": "dim"}, "名前", "レアリティ", "状態"],
+        skin_rows,
+        title="🎨 スキンコレクション"
+    ))
     
     # アイテム/称号テーブル
-    item_table = Table(title="📦 アイテム・称号", box=box.ROUNDED)
-    item_table.add_column("名前")
-    item_table.add_column("タイプ")
-    item_table.add_column("状態")
-    
-    # 全ガチャアイテムをチェック
-    for rarity, items in GACHA_ITEMS.items():
-        for item in items:
-            if item["type"] in ["tip", "junk"]:
-                continue  # 豆知識とハズレは表示しない
-            owned = "✅ 所持" if item["id"] in collection else "❌ 未所持"
-            item_table.add_row(
-                item["name"],
-                item["type"],
-                owned if item["id"] in collection else f"[dim]{owned}[/dim]"
-            )
+    item_rows = []
     
-    console.print()
-    console.print(item_table)
-    console.print()
+    # 全ガチャアイテムをチェック（豆知識とハズレは表示しない）
+    collectibles = [
+        item for item in get_compiled_config().items
+        if item["type"] not in ["tip", "junk"]
+    ]
+    for item in collectibles:
+        owned = "✅ 所持" if item["id"] in collection else "❌ 未所持"
+        item_rows.append((
+            item["name"],
+            item["type"],
+            owned if item["id"] in collection else f"[dim]{owned}[/dim]"
+        ))
+    
+    renderer.print()
+    renderer.print(renderer.table(["名前", "タイプ", "状態"], item_rows, title="📦 アイテム・称号"))
+    renderer.print()
     
     # コレクション達成率
-    total_collectibles = len(PET_SKINS) + sum(
-        1 for items in GACHA_ITEMS.values() 
-        for item in items 
-        if item["type"] not in ["tip", "junk"]
-    )
-    owned_count = len([c for c in collection if c in PET_SKINS or any(
-        item["id"] == c for items in GACHA_ITEMS.values() for item in items if item["type"] not in ["tip", "junk"]
-    )])
+    collectible_ids = {item["id"] for item in collectibles}
+    total_collectibles = len(PET_SKINS) + len(collectible_ids)
+    owned_count = len([c for c in collection if c in PET_SKINS or c in collectible_ids])
     
-    console.print(f"コレクション達成率: [cyan]{owned_count}/{total_collectibles}[/cyan]")
-    console.print()
+    renderer.print(f"コレクション達成率: [cyan]{owned_count}/{total_collectibles}[/cyan]")
+    renderer.print()
 
 
 def display_ticket_reward(tickets: int) -> None:
     """チケット獲得を表示する"""
-    console.print(f"     {TICKET_ICON} ガチャチケット x{tickets} を獲得！")
+    renderer.print(f"     {TICKET_ICON} ガチャチケット x{tickets} を獲得！")
 
 
 def display_name_changed(old_name: str, new_name: str) -> None:
     """名前変更を表示する"""
-    console.print(f"[green][SG][/green] ペットの名前を [bold]{old_name}[/bold] から [bold]{new_name}[/bold] に変更しました！")
+    renderer.print(f"[green][SG][/green] ペットの名前を [bold]{old_name}[/bold] から [bold]{new_name}[/bold] に変更しました！")
 
 
 def display_skin_changed(old_skin: str, new_skin: str) -> None:
     """スキン変更を表示する"""
     old_name = get_skin_name(old_skin)
     new_name = get_skin_name(new_skin)
-    console.print(f"[green][SG][/green] スキンを [bold]{old_name}[/bold] から [bold]{new_name}[/bold] に変更しました！")
+    renderer.print(f"[green][SG][/green] スキンを [bold]{old_name}[/bold] から [bold]{new_name}[/bold] に変更しました！")
 
 
 def display_skin_list(collection: List[str], current_skin: str) -> None:
     """所持スキン一覧を表示する"""
-    console.print()
-    table = Table(title="🎨 所持スキン一覧", box=box.ROUNDED)
-    table.add_column("ID", style="dim")
-    table.add_column("名前")
-    table.add_column("装備中")
-    
+    renderer.print()
+    rows = []
     for skin_id in collection:
         if skin_id in PET_SKINS:
             skin = PET_SKINS[skin_id]
             equipped = "✅" if skin_id == current_skin else ""
-            table.add_row(skin_id, skin["name"], equipped)
+            rows.append((skin_id, skin["name"], equipped))
     
-    console.print(table)
-    console.print()
-    console.print("[dim]使い方: sg skin <スキンID>[/dim]")
-    console.print()
+    renderer.print(renderer.table(
+        [{"header": "ID", "style": "dim"}, "名前", "装備中"],
+        rows,
+        title="🎨 所持スキン一覧"
+    ))
+    renderer.print()
+    renderer.print("[dim]使い方: sg skin <スキンID>[/dim]")
+    renderer.print()
 
 
 def display_skin_not_owned() -> None:
     """スキン未所持メッセージを表示する"""
-    console.print("[red][SG][/red] このスキンは所持していません！")
+    renderer.print("[red][SG][/red] このスキンは所持していません！")
 
 
 # ===== 詳細統計 =====
 
+def _stats_table(title: str, rows: List[tuple]) -> Any:
+    """項目と値の2列からなる統計テーブルを作成する"""
+    return renderer.table(
+        [{"header": "項目", "style": "cyan"}, {"header": "値", "justify": "right"}],
+        rows,
+        title=title
+    )
+
+
 def display_stats(data: Dict[str, Any]) -> None:
     """詳細な統計情報を表示する"""
     stats = data["stats"]
@@ -354,118 +546,260 @@ def display_stats(data: Dict[str, Any]) -> None:
     pet = data["pet"]
     collection = data["collection"]
     
-    console.print()
+    renderer.print()
     
     # コマンド統計
-    cmd_table = Table(title="⌨️ コマンド統計", box=box.ROUNDED)
-    cmd_table.add_column("項目", style="cyan")
-    cmd_table.add_column("値", justify="right")
-    
-    cmd_table.add_row("総コマンド数", f"{stats.get('total_commands', 0):,}")
-    cmd_table.add_row("次のドロップまで", f"{30 - stats.get('commands_since_drop', 0)} コマンド")
-    
-    console.print(cmd_table)
+    renderer.print(_stats_table("⌨️ コマンド統計", [
+        ("総コマンド数", f"{stats.get('total_commands', 0):,}"),
+        ("次のドロップまで", f"{get_compiled_config().guaranteed_drop_commands - stats.get('commands_since_drop', 0)} コマンド"),
+        ("速く成功したビルド", f"{stats.get('fast_builds', 0):,} 回"),
+    ]))
     
     # ペット統計
-    pet_table = Table(title="🐱 ペット統計", box=box.ROUNDED)
-    pet_table.add_column("項目", style="cyan")
-    pet_table.add_column("値", justify="right")
-    
-    pet_table.add_row("名前", pet["name"])
-    pet_table.add_row("レベル", f"Lv.{pet['level']}")
-    pet_table.add_row("累計経験値", f"{pet['exp']:,}")
-    pet_table.add_row("エサやり回数", f"{stats.get('total_feed', 0):,}")
-    
-    console.print()
-    console.print(pet_table)
+    renderer.print()
+    renderer.print(_stats_table("🐱 ペット統計", [
+        ("名前", pet["name"]),
+        ("レベル", f"Lv.{pet['level']}"),
+        ("累計経験値", f"{pet['exp']:,}"),
+        ("エサやり回数", f"{stats.get('total_feed', 0):,}"),
+    ]))
     
     # ガチャ統計
-    gacha_table = Table(title="🎰 ガチャ統計", box=box.ROUNDED)
-    gacha_table.add_column("項目", style="cyan")
-    gacha_table.add_column("値", justify="right")
-    
-    gacha_table.add_row("ガチャ回数", f"{stats.get('total_gacha', 0):,}")
-    gacha_table.add_row("SSR獲得数", f"{stats.get('ssr_count', 0)}")
-    gacha_table.add_row("コレクション数", f"{len(collection)}")
-    
-    console.print()
-    console.print(gacha_table)
+    renderer.print()
+    renderer.print(_stats_table("🎰 ガチャ統計", [
+        ("ガチャ回数", f"{stats.get('total_gacha', 0):,}"),
+        ("SSR獲得数", f"{stats.get('ssr_count', 0)}"),
+        ("コレクション数", f"{len(collection)}"),
+    ]))
     
     # ログイン統計
-    login_table = Table(title="📅 ログイン統計", box=box.ROUNDED)
-    login_table.add_column("項目", style="cyan")
-    login_table.add_column("値", justify="right")
-    
-    login_table.add_row("現在の連続ログイン", f"{user.get('login_streak', 0)} 日")
-    login_table.add_row("最大連続ログイン", f"{stats.get('max_login_streak', 0)} 日")
-    login_table.add_row("最終ログイン", user.get("last_login", "なし"))
-    
-    console.print()
-    console.print(login_table)
-    console.print()
+    renderer.print()
+    renderer.print(_stats_table("📅 ログイン統計", [
+        ("現在の連続ログイン", f"{user.get('login_streak', 0)} 日"),
+        ("最大連続ログイン", f"{stats.get('max_login_streak', 0)} 日"),
+        ("最終ログイン", user.get("last_login") or "なし"),
+    ]))
+    
+    # フックの遅延予算（超えたことがあるときだけ）
+    slo = data.get("slo", {})
+    over_budget = {stage: count for stage, count in slo.get("over_budget", {}).items() if count}
+    if over_budget:
+        renderer.print()
+        renderer.print(_stats_table("⏱️ フックの遅延予算", [
+            ("予算を超えた回数", " / ".join(f"{stage} {count:,}" for stage, count in over_budget.items())),
+            ("後回しにして済ませた処理", f"{slo.get('replayed', 0):,} 件"),
+            ("data.json の読み込み時間（移動平均）", f"{slo.get('io_ms', 0.0):.1f} ms"),
+        ]))
+    renderer.print()
+
+
+HEATMAP_SHADES = " ░▒▓█"
+SPARK_BARS = "▁▂▃▄▅▆▇█"
+WEEKDAY_NAMES = ("月", "火", "水", "木", "金", "土", "日")
+
+
+def _sparkline(values: List[int]) -> str:
+    """値の列を棒グラフの文字列にする"""
+    peak = max(values) if values else 0
+    if not peak:
+        return SPARK_BARS[0] * len(values)
+    return "".join(SPARK_BARS[min(len(SPARK_BARS) - 1, v * len(SPARK_BARS) // (peak + 1))] for v in values)
+
+
+def display_activity_heatmap(grid: List[List[int]]) -> None:
+    """曜日×時間帯ごとのコマンド数を表示する（sg stats --heatmap）"""
+    peak = max(max(row) for row in grid)
+    renderer.print()
+    renderer.print("[bold]🗓️ コマンドのヒートマップ（直近30日）[/bold]")
+    renderer.print()
+    renderer.print("    " + "".join(f"{h:<3}" if h % 3 == 0 else "" for h in range(24)).rstrip())
+    for weekday, row in enumerate(grid):
+        cells = "".join(
+            HEATMAP_SHADES[0 if not v else 1 + (v * (len(HEATMAP_SHADES) - 1) - 1) // peak]
+            for v in row
+        ) if peak else HEATMAP_SHADES[0] * 24
+        renderer.print(f"{WEEKDAY_NAMES[weekday]}  [green]{cells}[/green]  {sum(row):,}")
+    renderer.print()
+    renderer.print(f"[dim]濃さ: {HEATMAP_SHADES[1:]}（最大 {peak:,} コマンド/時）[/dim]")
+    renderer.print()
+
+
+def display_activity_trend(trend: Dict[str, Dict[str, List[int]]]) -> None:
+    """時間・日・週ごとの活動の推移を表示する（sg stats --trend）"""
+    labels = {"hour": "直近24時間", "day": "直近30日", "week": "直近52週"}
+    renderer.print()
+    renderer.print(renderer.table(
+        [
+            {"header": "期間", "style": "cyan"},
+            {"header": "コマンド数の推移", "style": "green"},
+            {"header": "コマンド", "justify": "right"},
+            {"header": "エサやり", "justify": "right"},
+            {"header": "ガチャ", "justify": "right"},
+        ],
+        [
+            (
+                labels[tier],
+                _sparkline(series["commands"]),
+                f"{sum(series['commands']):,}",
+                f"{sum(series['feeds']):,}",
+                f"{sum(series['gacha']):,}",
+            )
+            for tier, series in trend.items()
+        ],
+        title="📈 活動の推移"
+    ))
+    renderer.print()
+
+
+def display_directory_report(rows: List[Dict[str, Any]]) -> None:
+    """ディレクトリごとのコマンド数を木の形で表示する（sg stats --by-dir）"""
+    renderer.print()
+    if not rows:
+        renderer.print(renderer.panel(
+            "[bold]📁 ディレクトリ別のコマンド数[/bold]\n\n"
+            "まだ記録がありません。\n"
+            "最新の hooks/shell_hook.sh を読み込むと、コマンドを実行したディレクトリが記録されます。",
+            border_style="yellow"
+        ))
+        renderer.print()
+        return
+    
+    renderer.print(renderer.table(
+        [
+            {"header": "ディレクトリ", "style": "cyan"},
+            {"header": "コマンド", "justify": "right"},
+            {"header": "割合", "justify": "right"},
+            {"header": "最終実行", "justify": "right"},
+        ],
+        [
+            (
+                "  " * row["depth"] + row["label"],
+                f"{row['total']:,}",
+                f"{row['share']:.0%}",
+                time.strftime("%Y-%m-%d", time.localtime(row["last"])),
+            )
+            for row in rows
+        ],
+        title="📁 ディレクトリ別のコマンド数"
+    ))
+    renderer.print()
+
+
+def _format_ms(ms: Optional[float]) -> str:
+    """ミリ秒を読みやすい単位で表示する"""
+    if ms is None:
+        return "-"
+    if ms < 1000:
+        return f"{ms:.0f}ms"
+    if ms < 60_000:
+        return f"{ms / 1000:.1f}s"
+    return f"{ms / 60_000:.1f}m"
+
+
+def display_latency_report(rows: List[Dict[str, Any]], kind: str) -> None:
+    """コマンドごとの実行時間・失敗率を表示する（sg stats --slow / --failing）"""
+    title = "🐢 実行時間の長いコマンド" if kind == "slow" else "💥 失敗の多いコマンド"
+    renderer.print()
+    if not rows:
+        renderer.print(renderer.panel(
+            f"[bold]{title}[/bold]\n\n"
+            "まだ記録がありません。\n"
+            "最新の hooks/shell_hook.sh を読み込むと、実行時間と終了コードが記録されます。",
+            border_style="yellow"
+        ))
+        renderer.print()
+        return
+    
+    renderer.print(renderer.table(
+        [
+            {"header": "コマンド", "style": "cyan"},
+            {"header": "回数", "justify": "right"},
+            {"header": "p50", "justify": "right"},
+            {"header": "p95", "justify": "right"},
+            {"header": "p99", "justify": "right"},
+            {"header": "最大", "justify": "right"},
+            {"header": "失敗", "justify": "right"},
+        ],
+        [
+            (
+                row["tool"],
+                f"{row['runs']:,}",
+                _format_ms(row["p50"]),
+                _format_ms(row["p95"]),
+                _format_ms(row["p99"]),
+                _format_ms(row["max"]),
+                f"{row['failures']:,} ({row['failure_rate']:.0%})",
+            )
+            for row in rows
+        ],
+        title=title
+    ))
+    renderer.print()
 
 
 # ===== ショップ =====
 
 def display_shop(coins: int) -> None:
     """ショップを表示する"""
-    console.print()
-    console.print(Panel(
+    renderer.print()
+    renderer.print(renderer.panel(
         "[bold]🏪 Shell-Gotchi ショップ[/bold]",
         border_style="yellow"
     ))
-    console.print(f"所持コイン: [yellow]{coins}[/yellow] 🪙")
-    console.print()
-    
-    table = Table(box=box.ROUNDED)
-    table.add_column("ID", style="dim")
-    table.add_column("商品名")
-    table.add_column("説明")
-    table.add_column("価格", justify="right")
+    renderer.print(f"所持コイン: [yellow]{coins}[/yellow] 🪙")
+    renderer.print()
     
-    for item_id, item in SHOP_ITEMS.items():
+    rows = []
+    for item_id, item in get_compiled_config().shop_items.items():
         price_style = "green" if coins >= item["price"] else "red"
-        table.add_row(
+        rows.append((
             item_id,
             item["name"],
             item["description"],
             f"[{price_style}]{item['price']}[/{price_style}] 🪙"
-        )
+        ))
     
-    console.print(table)
-    console.print()
-    console.print("[dim]使い方: sg shop buy <商品ID>[/dim]")
-    console.print()
+    renderer.print(renderer.table(
+        [{"header": "ID", "style": "dim"}, "商品名", "説明", {"header": "価格", "justify": "right"}],
+        rows
+    ))
+    renderer.print()
+    renderer.print("[dim]使い方: sg shop buy <商品ID>[/dim]")
+    renderer.print()
 
 
 def display_shop_purchase(item_name: str, remaining_coins: int) -> None:
     """ショップ購入成功を表示する"""
-    console.print(f"[green][SG][/green] 🛒 {item_name}を購入しました！")
-    console.print(f"     残りコイン: [yellow]{remaining_coins}[/yellow] 🪙")
+    renderer.print(f"[green][SG][/green] 🛒 {item_name}を購入しました！")
+    renderer.print(f"     残りコイン: [yellow]{remaining_coins}[/yellow] 🪙")
 
 
 def display_shop_error(message: str) -> None:
     """ショップエラーを表示する"""
-    console.print(f"[red][SG][/red] {message}")
+    renderer.print(f"[red][SG][/red] {message}")
+
+
+def display_error(message: str) -> None:
+    """汎用のエラーメッセージを表示する"""
+    renderer.print(f"[red][SG][/red] {message}")
+
+
+def display_message(message: str) -> None:
+    """汎用のメッセージを表示する（Richマークアップ可）"""
+    renderer.print(message)
 
 
 # ===== デイリーミッション =====
 
 def display_daily_missions(daily_status: Dict[str, Any]) -> None:
     """デイリーミッションを表示する"""
-    console.print()
-    console.print(Panel(
+    renderer.print()
+    renderer.print(renderer.panel(
         f"[bold]📋 デイリーミッション[/bold]\n[dim]{daily_status.get('date', '不明')}[/dim]",
         border_style="green"
     ))
     
-    table = Table(box=box.ROUNDED)
-    table.add_column("ID", style="dim")
-    table.add_column("ミッション")
-    table.add_column("進捗", justify="center")
-    table.add_column("報酬")
-    table.add_column("状態", justify="center")
-    
+    rows = []
     for mission in daily_status["missions"]:
         # 進捗バー
         progress = mission["progress"]
@@ -491,19 +825,28 @@ def display_daily_missions(daily_status: Dict[str, Any]) -> None:
         else:
             status = "[yellow]進行中[/yellow]"
         
-        table.add_row(
+        rows.append((
             mission["id"],
             mission["name"],
             progress_text,
             reward_text,
             status
-        )
+        ))
     
-    console.print(table)
-    console.print()
-    console.print("[dim]報酬受取: sg daily claim <ミッションID>[/dim]")
-    console.print("[dim]例: sg daily claim commands_10[/dim]")
-    console.print()
+    renderer.print(renderer.table(
+        [
+            {"header": "ID", "style": "dim"},
+            "ミッション",
+            {"header": "進捗", "justify": "center"},
+            "報酬",
+            {"header": "状態", "justify": "center"},
+        ],
+        rows
+    ))
+    renderer.print()
+    renderer.print("[dim]報酬受取: sg daily claim <ミッションID>[/dim]")
+    renderer.print("[dim]例: sg daily claim commands_10[/dim]")
+    renderer.print()
 
 
 def display_daily_reward_claimed(reward: Dict[str, Any]) -> None:
@@ -517,17 +860,17 @@ def display_daily_reward_claimed(reward: Dict[str, Any]) -> None:
         elif key == "ticket_fragments":
             reward_parts.append(f"💎 破片 x{value}")
     
-    console.print(f"[green][SG][/green] 報酬を受け取りました！")
+    renderer.print(f"[green][SG][/green] 報酬を受け取りました！")
     for part in reward_parts:
-        console.print(f"     {part}")
+        renderer.print(f"     {part}")
 
 
 # ===== 実績 =====
 
 def display_achievements(achievements: List[Dict[str, Any]]) -> None:
     """実績一覧を表示する"""
-    console.print()
-    console.print(Panel(
+    renderer.print()
+    renderer.print(renderer.panel(
         "[bold]🏆 実績[/bold]",
         border_style="yellow"
     ))
@@ -537,11 +880,7 @@ def display_achievements(achievements: List[Dict[str, Any]]) -> None:
     incomplete = [a for a in achievements if not a["completed"]]
     
     if completed:
-        table = Table(title="✅ 達成済み", box=box.ROUNDED)
-        table.add_column("実績名")
-        table.add_column("説明")
-        table.add_column("報酬")
-        
+        rows = []
         for ach in completed:
             reward_parts = []
             for key, value in ach["reward"].items():
@@ -551,22 +890,17 @@ def display_achievements(achievements: List[Dict[str, Any]]) -> None:
                     reward_parts.append(f"{value} 🎟️")
             reward_text = ", ".join(reward_parts)
             
-            table.add_row(
+            rows.append((
                 f"[green]{ach['name']}[/green]",
                 ach["description"],
                 reward_text
-            )
+            ))
         
-        console.print(table)
+        renderer.print(renderer.table(["実績名", "説明", "報酬"], rows, title="✅ 達成済み"))
     
     if incomplete:
-        console.print()
-        table = Table(title="🔒 未達成", box=box.ROUNDED)
-        table.add_column("実績名")
-        table.add_column("説明")
-        table.add_column("進捗", justify="center")
-        table.add_column("報酬")
-        
+        renderer.print()
+        rows = []
         for ach in incomplete:
             progress_text = f"{ach['progress']}/{ach['target']}"
             
@@ -578,24 +912,28 @@ def display_achievements(achievements: List[Dict[str, Any]]) -> None:
                     reward_parts.append(f"{value} 🎟️")
             reward_text = ", ".join(reward_parts)
             
-            table.add_row(
+            rows.append((
                 f"[dim]{ach['name']}[/dim]",
                 ach["description"],
                 progress_text,
                 reward_text
-            )
+            ))
         
-        console.print(table)
+        renderer.print(renderer.table(
+            ["実績名", "説明", {"header": "進捗", "justify": "center"}, "報酬"],
+            rows,
+            title="🔒 未達成"
+        ))
     
-    console.print()
-    console.print(f"達成率: [cyan]{len(completed)}/{len(achievements)}[/cyan]")
-    console.print()
+    renderer.print()
+    renderer.print(f"達成率: [cyan]{len(completed)}/{len(achievements)}[/cyan]")
+    renderer.print()
 
 
 def display_achievement_unlocked(achievement: Dict[str, Any]) -> None:
     """実績解除を表示する"""
-    console.print()
-    console.print(Panel(
+    renderer.print()
+    renderer.print(renderer.panel(
         f"🏆 [bold yellow]実績解除！[/bold yellow]\n\n"
         f"   [bold]{achievement['name']}[/bold]\n"
         f"   {achievement['description']}",
@@ -610,5 +948,288 @@ def display_achievement_unlocked(achievement: Dict[str, Any]) -> None:
             reward_parts.append(f"🎟️ チケット x{value}")
     
     for part in reward_parts:
-        console.print(f"     {part}")
-    console.print()
+        renderer.print(f"     {part}")
+    renderer.print()
+
+
+def display_notices(notices: List[Dict[str, Any]]) -> None:
+    """通知キュー（notify.coalesce でまとめたもの）を表示する"""
+    for notice in notices:
+        kind = notice.get("k")
+        if kind == "login":
+            display_login_bonus(notice["reward_type"], notice["streak"])
+        elif kind == "achievement":
+            display_achievement_unlocked(notice["achievement"])
+        elif kind == "drop":
+            display_drop_message(notice["food_count"], notice.get("count", 1))
+
+
+# ===== シェル履歴の取り込み =====
+
+def display_history_import(results: List[Dict[str, Any]], dry_run: bool = False) -> None:
+    """履歴の取り込み結果を表示する"""
+    renderer.print()
+    rows = [
+        (
+            result["path"],
+            result["format"],
+            f"{result['commands']:,}",
+            f"{result['skipped']:,}",
+            f"{result['days']:,}",
+            f"{result['drops']:,}",
+            f"{result['coins']:,}",
+        )
+        for result in results
+    ]
+    renderer.print(renderer.table(
+        [
+            {"header": "ファイル", "style": "cyan"},
+            "形式",
+            {"header": "コマンド", "justify": "right"},
+            {"header": "除外", "justify": "right"},
+            {"header": "日数", "justify": "right"},
+            {"header": f"{FOOD_ICON} エサ", "justify": "right"},
+            {"header": "🪙 コイン", "justify": "right"},
+        ],
+        rows,
+        title="📜 履歴の取り込み（確認のみ）" if dry_run else "📜 履歴の取り込み"
+    ))
+    if dry_run:
+        renderer.print("[dim]--dry-run のためデータは変更していません。[/dim]")
+    renderer.print()
+
+
+# ===== ベンチマーク =====
+
+def display_bench_results(report: Dict[str, Any], comparison: Optional[List[Dict[str, Any]]] = None,
+                          threshold: float = 0) -> None:
+    """ベンチマーク結果（とベースラインとの比較）を表示する"""
+    renderer.print()
+    rows = []
+    for name, result in sorted(report["results"].items()):
+        extra = ""
+        if "ops_per_sec" in result:
+            extra = f"{result['ops_per_sec']:,.0f} ops/s"
+        rows.append((name, f"{result['median_ms']:.3f}", f"{result['p95_ms']:.3f}", extra))
+    
+    renderer.print(renderer.table(
+        [
+            {"header": "項目", "style": "cyan"},
+            {"header": "中央値 (ms)", "justify": "right"},
+            {"header": "p95 (ms)", "justify": "right"},
+            {"header": "備考", "justify": "right"},
+        ],
+        rows,
+        title="⏱️ ベンチマーク結果"
+    ))
+    
+    if comparison is None:
+        renderer.print()
+        return
+    
+    rows = []
+    for row in comparison:
+        if row["regression"]:
+            status = "[red]❌ 劣化[/red]"
+        elif row["change_pct"] < -threshold:
+            status = "[green]改善[/green]"
+        else:
+            status = "[dim]変化なし[/dim]"
+        sign = "+" if row["change_pct"] > 0 else ""
+        rows.append((
+            row["name"],
+            f"{row['baseline_ms']:.3f}",
+            f"{row['current_ms']:.3f}",
+            f"{sign}{row['change_pct']:.1f}%",
+            status
+        ))
+    
+    renderer.print()
+    renderer.print(renderer.table(
+        [
+            {"header": "項目", "style": "cyan"},
+            {"header": "ベースライン", "justify": "right"},
+            {"header": "今回", "justify": "right"},
+            {"header": "変化", "justify": "right"},
+            {"header": "判定", "justify": "center"},
+        ],
+        rows,
+        title=f"📊 ベースラインとの比較（しきい値 {threshold:.0f}%）"
+    ))
+    renderer.print()
+
+
+# ===== 経済シミュレーター =====
+
+def _format_days(values: List[Optional[float]], days: int) -> str:
+    """日数のパーセンタイルを表示用にする（期間内に未到達なら >日数）"""
+    return " / ".join(f"{v:.0f}" if v is not None else f">{days}" for v in values)
+
+
+def display_leaderboard(metric_label: str, rows: List[Dict[str, Any]],
+                        my_rank: Optional[tuple], user: str) -> None:
+    """ホスト内ランキングを表示する（sg leaderboard）"""
+    renderer.print()
+    if not rows:
+        renderer.print(renderer.panel(
+            f"[bold]🏆 ランキング（{metric_label}）[/bold]\n\n"
+            "まだ誰もスコアを公開していません。",
+            border_style="yellow"
+        ))
+        renderer.print()
+        return
+    
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    renderer.print(renderer.table(
+        [
+            {"header": "順位", "justify": "right"},
+            {"header": "ユーザー", "style": "cyan"},
+            {"header": "ペット"},
+            {"header": metric_label, "justify": "right"},
+        ],
+        [
+            (
+                f"{medals.get(row['rank'], '')}{row['rank']}",
+                f"[bold]{row['user']}[/bold]" if row["user"] == user else row["user"],
+                row["name"],
+                f"{row['score']:,}",
+            )
+            for row in rows
+        ],
+        title=f"🏆 ランキング（{metric_label}）"
+    ))
+    if my_rank:
+        renderer.print(f"あなたの順位: [bold]{my_rank[0]:,}[/bold] 位 / {my_rank[1]:,} 人")
+    else:
+        renderer.print("[dim]あなたはまだこの指標のランキングに載っていません。[/dim]")
+    renderer.print()
+
+
+def display_serve_summary(stats: Dict[str, int], cached_users: int) -> None:
+    """共有サービスの終了時に処理の統計を表示する（sg serve）"""
+    renderer.print()
+    renderer.print(_stats_table("🖥️ 共有サービスの統計", [
+        ("処理したフック", f"{stats['events']:,}"),
+        ("キャッシュヒット", f"{stats['hits']:,}"),
+        ("読み込み", f"{stats['misses']:,}"),
+        ("外部の変更による読み直し", f"{stats['reloads']:,}"),
+        ("キャッシュから追い出し", f"{stats['evictions']:,}"),
+        ("書き戻し", f"{stats['writebacks']:,}"),
+        ("終了時のキャッシュ", f"{cached_users:,} ユーザー"),
+    ]))
+    renderer.print()
+
+
+def display_simulation(summaries: List[Dict[str, Any]], backend: str, elapsed: float) -> None:
+    """経済シミュレーションの結果（シナリオごとの分布の要約）を表示する"""
+    renderer.print()
+    params = summaries[0]["params"]
+    rows = []
+    for summary in summaries:
+        days = summary["params"]["days"]
+        label = ", ".join(f"{k}={v}" for k, v in summary["assignment"].items()) or "現在の設定"
+        rows.append((
+            label,
+            f"{_format_days(summary['level_days'], days)} ({summary['level_reached']:.0%})",
+            f"{_format_days(summary['ssr_days'], days)} ({summary['ssr_reached']:.0%})",
+            " / ".join(f"{v:,.0f}" for v in summary["coins"]),
+            " / ".join(f"{v:.0f}" for v in summary["final_level"]),
+            f"{summary['pulls_mean']:.1f}",
+        ))
+    
+    renderer.print(renderer.table(
+        [
+            {"header": "シナリオ", "style": "cyan"},
+            {"header": f"Lv.{params['target_level']} 到達日数", "justify": "right"},
+            {"header": "初SSRまでの日数", "justify": "right"},
+            {"header": "最終コイン", "justify": "right"},
+            {"header": "最終Lv", "justify": "right"},
+            {"header": "ガチャ回数", "justify": "right"},
+        ],
+        rows,
+        title=f"📈 経済シミュレーション（{params['players']:,}人 × {params['days']}日）"
+    ))
+    renderer.print(
+        f"[dim]各列は p10 / p50 / p90、括弧内は期間内に到達した割合、ガチャ回数は平均。"
+        f"計算: {backend}、{elapsed:.1f}秒[/dim]"
+    )
+    if backend == "python":
+        renderer.print("[dim]NumPy をインストールすると全プレイヤーを配列でまとめて計算します（pip install numpy）[/dim]")
+    renderer.print()
+
+
+# ===== 実行時間の計測 =====
+
+def display_profile_report(rows: List[Dict[str, Any]], run_count: int) -> None:
+    """フェーズ・サブコマンドごとの実行時間のパーセンタイルを表示する"""
+    renderer.print()
+    table_rows = []
+    previous = None
+    for row in rows:
+        # 同じサブコマンドの2行目以降はコマンド名を省略
+        command = row["command"] if row["command"] != previous else ""
+        previous = row["command"]
+        style = "bold" if row["phase"] == "total" else ""
+        table_rows.append((
+            command,
+            f"[{style}]{row['phase']}[/{style}]" if style else row["phase"],
+            f"{row['count']}",
+            f"{row['p50']:.2f}",
+            f"{row['p95']:.2f}",
+            f"{row['p99']:.2f}",
+        ))
+    
+    renderer.print(renderer.table(
+        [
+            {"header": "コマンド", "style": "cyan"},
+            "フェーズ",
+            {"header": "回数", "justify": "right"},
+            {"header": "p50 (ms)", "justify": "right"},
+            {"header": "p95 (ms)", "justify": "right"},
+            {"header": "p99 (ms)", "justify": "right"},
+        ],
+        table_rows,
+        title=f"⏱️ 実行時間（直近 {run_count} 回）"
+    ))
+    renderer.print()
+
+
+def display_plugins(rows: List[Dict[str, Any]], load_errors: Dict[str, str], plugin_dir: str) -> None:
+    """プラグインのハンドラの一覧を表示する（sg plugins）"""
+    renderer.print()
+    if not rows and not load_errors:
+        renderer.print(renderer.panel(
+            f"[bold]🔌 プラグイン[/bold]\n\n{plugin_dir} にプラグインがありません。",
+            border_style="yellow"
+        ))
+        renderer.print()
+        return
+    
+    now = time.time()
+    table_rows = []
+    for row in rows:
+        if row["disabled_until"] > now:
+            status = "[red]停止中[/red] " + time.strftime("%m/%d %H:%M まで", time.localtime(row["disabled_until"]))
+        elif row["strikes"]:
+            status = f"[yellow]超過 {row['strikes']} 回[/yellow]"
+        else:
+            status = "[green]有効[/green]"
+        table_rows.append((
+            row["name"],
+            ", ".join(row["events"]),
+            f"{row['budget_ms']:g} ms" if row["budget_ms"] is not None else "-",
+            status,
+        ))
+    renderer.print(renderer.table(
+        [
+            {"header": "ハンドラ", "style": "cyan"},
+            {"header": "イベント"},
+            {"header": "持ち時間", "justify": "right"},
+            {"header": "状態"},
+        ],
+        table_rows,
+        title="🔌 プラグイン"
+    ))
+    for name, error in load_errors.items():
+        renderer.print(f"[red]読み込めませんでした: {name}[/red] [dim]{error}[/dim]")
+    renderer.print()
@@ -0,0 +1,151 @@
+"""
+Shell-Gotchi ファイルの変更の待ち合わせ（sg watch）
+データファイルが書き換わるまで眠って待つ
+
+- Linux では inotify（ctypes で libc を直接呼ぶ）。ファイルそのものではなく親ディレクトリを見るので、
+  一時ファイルからの置き換え（os.replace）や、ファイルが作り直された場合も取りこぼさない
+- inotify が使えない環境（Linux 以外・上限に達した・NFS 上で別のホストの変更を見たい）では、
+  WATCH_POLL_INTERVAL 秒ごとに stat して (mtime, size, inode) を比べる
+- 書き込みが続けて起きても WATCH_DEBOUNCE_SECONDS の間はまとめて1回の変更とする
+"""
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import WATCH_POLL_INTERVAL, WATCH_DEBOUNCE_SECONDS
+
+# inotify の定数（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """inotify で親ディレクトリを見る"""
+
+    kind = "inotify"
+
+    def __init__(self, files: Iterable[Path], dirs: Iterable[Path] = ()):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # wd → 見る名前の集合（None なら中の全てのファイル）
+        self._names: Dict[int, Optional[Set[str]]] = {}
+        try:
+            targets: Dict[Path, Optional[Set[str]]] = {}
+            for path in files:
+                names = targets.setdefault(path.parent, set())
+                if names is not None:
+                    names.add(path.name)
+            for path in dirs:
+                targets[path] = None
+            for directory, names in targets.items():
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+                self._names[wd] = names
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _drain(self) -> bool:
+        """届いているイベントを全て読み、見ているファイルのものがあったか"""
+        changed = False
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                wd, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace")
+                offset += length
+                names = self._names.get(wd)
+                if names is None or name in names:
+                    changed = True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """変更があるまで待つ（timeout 秒たっても変更がなければ False）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._drain():
+                # 続けて起きる書き込みをまとめる
+                while select.select([self.fd], [], [], WATCH_DEBOUNCE_SECONDS)[0]:
+                    self._drain()
+                return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollWatcher:
+    """stat を一定間隔で比べる"""
+
+    kind = "poll"
+
+    def __init__(self, files: Iterable[Path], dirs: Iterable[Path] = (), interval: float = WATCH_POLL_INTERVAL):
+        self.files = list(files)
+        self.dirs = list(dirs)
+        self.interval = interval
+        self._last = self._signature()
+
+    def _signature(self) -> List[Tuple[str, Optional[Tuple[int, int, int]]]]:
+        paths = list(self.files)
+        for directory in self.dirs:
+            try:
+                paths.extend(Path(entry.path) for entry in os.scandir(directory) if entry.is_file())
+            except OSError:
+                pass
+        signature = []
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+                signature.append((str(path), (st.st_mtime_ns, st.st_size, st.st_ino)))
+            except OSError:
+                signature.append((str(path), None))
+        return signature
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            step = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if step <= 0:
+                return False
+            time.sleep(step)
+            current = self._signature()
+            if current != self._last:
+                self._last = current
+                return True
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(files: Iterable[Path], dirs: Iterable[Path] = (), poll: bool = False):
+    """inotify が使えればそれを、使えなければ stat の比較で待つ監視を返す"""
+    files, dirs = list(files), list(dirs)
+    if not poll:
+        try:
+            return InotifyWatcher(files, dirs)
+        except (OSError, AttributeError):
+            pass  # Linux 以外（inotify_init1 がない）・監視数の上限など
+    return PollWatcher(files, dirs)
@@ -0,0 +1,34 @@
+"""
+テスト共通の設定
+src の読み込み前に HOME を一時ディレクトリに向け、実際のセーブデータに触れないようにする
+（DATA_DIR などのパスは src.config の読み込み時に決まる）
+"""
+import os
+import shutil
+import tempfile
+
+os.environ["HOME"] = tempfile.mkdtemp(prefix="shell-gotchi-test-")
+for _name in ("XDG_CONFIG_HOME", "XDG_RUNTIME_DIR", "SG_CONFIG"):
+    os.environ.pop(_name, None)
+
+import pytest  # noqa: E402
+
+from src import storage  # noqa: E402
+from src.config import DATA_DIR  # noqa: E402
+
+_ENV = (
+    "SG_HOOK_BUDGET_MS", "SG_SERVE_SOCKET", "SG_LOCAL_CACHE", "SG_SYNC_DIR", "SG_LEADERBOARD_DIR",
+    "SG_METRICS_TEXTFILE", "SG_PROFILE",
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_data_dir(monkeypatch):
+    """テストごとに空のデータディレクトリから始める"""
+    for name in _ENV:
+        monkeypatch.delenv(name, raising=False)
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    storage._ensured_dirs.clear()
+    yield
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    storage._ensured_dirs.clear()
@@ -0,0 +1,88 @@
+"""
+スパム対策（antispam）のテスト
+連打の (時刻, コマンド) の列を順に判定し、時間窓の上限と連続実行の減衰を確かめる
+"""
+import copy
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+from src import antispam, game_logic
+from src.config import DEFAULT_DATA, SPAM_REPEAT_DECAY, SPAM_REPEAT_FREE, SPAM_REPEAT_RESET, SPAM_WINDOW_CAPS
+
+T0 = 1_700_000_000
+
+
+def replay(events: List[Tuple[float, str]], data: Optional[Dict] = None) -> List[antispam.SpamVerdict]:
+    """(時刻, コマンド) の列を順に判定する"""
+    data = data if data is not None else {}
+    return [antispam.check_and_record(data, command, ts) for ts, command in events]
+
+
+def test_distinct_commands_are_not_limited():
+    verdicts = replay([(T0 + i * 5, f"ls dir{i}") for i in range(10)])
+    assert all(v.allowed and v.factor == 1.0 for v in verdicts)
+
+
+def test_repeated_command_decays():
+    # 同じコマンドを1秒おきに連打（1行目全体で判定するので、make a と make b は別のコマンドになる）
+    verdicts = replay([(T0 + i, "make") for i in range(SPAM_REPEAT_FREE + 3)])
+    factors = [v.factor for v in verdicts]
+    assert factors == [1.0] * SPAM_REPEAT_FREE + [SPAM_REPEAT_DECAY ** n for n in (1, 2, 3)]
+    assert [v.reason for v in verdicts[SPAM_REPEAT_FREE:]] == ["repeat"] * 3
+
+
+def test_repeat_resets_after_pause():
+    events = [(T0 + i, "make") for i in range(SPAM_REPEAT_FREE + 1)]
+    events.append((events[-1][0] + SPAM_REPEAT_RESET, "make"))
+    verdicts = replay(events)
+    assert verdicts[-2].factor == SPAM_REPEAT_DECAY
+    assert verdicts[-1].factor == 1.0
+
+
+def test_other_command_resets_repeat():
+    events = [(T0 + i, "make") for i in range(SPAM_REPEAT_FREE + 1)]
+    events += [(T0 + 10, "git status"), (T0 + 11, "make")]
+    verdicts = replay(events)
+    assert verdicts[SPAM_REPEAT_FREE].factor == SPAM_REPEAT_DECAY
+    assert verdicts[-1].factor == 1.0
+
+
+def test_window_cap_blocks_burst():
+    window, cap = SPAM_WINDOW_CAPS[0]
+    # 窓の中に上限を超える件数（コマンドは全て違うので減衰はしない）
+    data: Dict = {}
+    verdicts = replay([(T0, f"echo {i}") for i in range(cap + 5)], data)
+    assert all(v.allowed for v in verdicts[:cap])
+    assert [v.reason for v in verdicts[cap:]] == [f"window:{window}"] * 5
+    assert all(v.factor == 0.0 for v in verdicts[cap:])
+    assert data["antispam"]["blocked"] == 5
+
+    # 窓を過ぎれば再び報酬の対象
+    assert antispam.check_and_record(data, "echo later", T0 + window).allowed
+
+
+class FixedRNG:
+    """random() が決まった値を返す乱数"""
+
+    def __init__(self, value: float):
+        self.value = value
+
+    def random(self) -> float:
+        return self.value
+
+
+@pytest.mark.parametrize("credit, roll, rewarded", [(1.0, 0.99, True), (0.25, 0.99, False), (0.25, 0.1, True)])
+def test_decay_applies_to_guaranteed_drop_and_coin(credit, roll, rewarded):
+    data = copy.deepcopy(DEFAULT_DATA)
+    data["stats"]["total_commands"] = 9  # 次が10コマンド目（コイン）
+    guaranteed = game_logic.get_compiled_config().guaranteed_drop_commands
+    data["stats"]["commands_since_drop"] = guaranteed - 1
+
+    result = game_logic.process_command(data, FixedRNG(roll), credit=credit)
+
+    assert result["dropped"] is rewarded
+    assert result["coins_earned"] == (1 if rewarded else 0)
+    # 出なかった確定ドロップは次の回に持ち越す
+    assert data["stats"]["commands_since_drop"] == (0 if rewarded else guaranteed)
+
@@ -0,0 +1,47 @@
+"""
+設定のコンパイル（config_compiler）のテスト
+型の違う値を含むユーザー設定ファイルは ConfigError になり、既定値に戻ることを確かめる
+"""
+import pytest
+
+from src import config_compiler
+from src.config_compiler import ConfigError, compile_config
+
+INVALID_TOMLS = [
+    'drop_chance = "high"\n',
+    "gacha_rates = 5\n",
+    "guaranteed_drop_commands = 1.5\n",
+    '[gacha_rates]\nN = "half"\n',
+    '[level_thresholds]\n2 = "lots"\n',
+    '[level_thresholds]\nten = 100\n',
+    '[command_rules.make]\nprefix = "make"\nmultiplier = "x2"\n',
+    '[command_rules.make]\npattern = 3\n',
+    '[achievements.first_gacha]\ncondition = "gacha"\n',
+]
+
+
+@pytest.mark.parametrize("text", INVALID_TOMLS)
+def test_type_invalid_config_is_rejected(tmp_path, text):
+    path = tmp_path / "config.toml"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ConfigError):
+        compile_config(path)
+
+
+def test_valid_override_compiles(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text("drop_chance = 0.5\n", encoding="utf-8")
+    assert compile_config(path).drop_chance == 0.5
+
+
+def test_invalid_config_falls_back_to_defaults(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "config.toml"
+    path.write_text('drop_chance = "high"\ngacha_rates = 5\n', encoding="utf-8")
+    monkeypatch.setattr(config_compiler, "CONFIG_FILE", path)
+    monkeypatch.setattr(config_compiler, "CONFIG_CACHE_FILE", tmp_path / "compiled.pickle")
+    monkeypatch.setattr(config_compiler, "_compiled", None)
+
+    compiled = config_compiler.get_compiled_config()
+
+    assert compiled.drop_chance == compile_config(use_overrides=False).drop_chance
+    assert "設定ファイルを無視します" in capsys.readouterr().err
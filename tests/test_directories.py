@@ -0,0 +1,41 @@
+"""
+ディレクトリごとの集計（directories）のテスト
+フックはログに追記するだけで、sg stats --by-dir がトライ木に畳み込むことを確かめる
+"""
+from src import directories
+from src.config import DIRS_FILE, DIRS_LOG_FILE
+
+
+def _total(state):
+    return sum(row["own"] for row in directories.top_subtrees(state, 100, home="/home/user"))
+
+
+def test_record_cwd_only_appends():
+    directories.record_cwd("/srv/app", ts=100)
+    directories.record_cwd("/srv/app", ts=200)
+
+    assert not DIRS_FILE.exists()
+    assert len(DIRS_LOG_FILE.read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_fold_moves_log_into_trie():
+    directories.record_cwd("/srv/app", ts=100)
+    directories.record_cwd("/srv/web", ts=200)
+    DIRS_LOG_FILE.write_text(DIRS_LOG_FILE.read_text(encoding="utf-8") + "broken\n", encoding="utf-8")
+
+    state = directories.fold(home="/home/user")
+
+    assert _total(state) == 2
+    assert DIRS_LOG_FILE.stat().st_size == 0
+    # 畳み込んだ集計は保存され、次の畳み込みに足される
+    directories.record_cwd("/srv/app", ts=300)
+    assert _total(directories.fold(home="/home/user")) == 3
+    assert _total(directories.load()) == 3
+
+
+def test_full_log_is_folded_by_the_hook(monkeypatch):
+    monkeypatch.setattr(directories, "DIRS_LOG_MAX_BYTES", 1)
+    directories.record_cwd("/srv/app", ts=100)
+
+    assert DIRS_LOG_FILE.stat().st_size == 0
+    assert DIRS_FILE.exists()
@@ -0,0 +1,57 @@
+"""
+ガチャの履歴（gacha_history）のテスト
+レアリティの欄の上限を知らせること、表示ではファイルを書き換えないことを確かめる
+"""
+import pytest
+
+from src import gacha_history
+from src.config import GACHA_HISTORY_FILE
+from src.config_compiler import ConfigError, compile_config
+
+
+def _pull(rarity):
+    return {"rarity": rarity, "item": {"id": "unknown"}}
+
+
+def test_long_rarity_name_is_rejected_by_config(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text('[gacha_rates]\nN = 0.0\nLEGENDARY = 0.6\n'
+                    '[[gacha_items.LEGENDARY]]\nid = "dragon"\nname = "Dragon"\ntype = "skin"\n', encoding="utf-8")
+    with pytest.raises(ConfigError, match="バイトまで"):
+        compile_config(path)
+
+
+def test_rarity_beyond_slots_is_surfaced_without_recording():
+    names = [f"R{i}" for i in range(gacha_history.RARITY_SLOTS)]
+    gacha_history.record([_pull(name) for name in names], ts=1)
+
+    with pytest.raises(gacha_history.HistoryLimitError):
+        gacha_history.record([_pull("R0"), _pull("EXTRA")], ts=2)
+
+    history = gacha_history.load()
+    assert history.total == len(names)
+    assert history.rarities == names
+
+
+def test_long_rarity_name_is_not_truncated():
+    with pytest.raises(gacha_history.HistoryLimitError):
+        gacha_history.record([_pull("LEGENDARY")], ts=1)
+    assert gacha_history.load().total == 0
+
+
+def test_load_does_not_rewrite_mismatched_file():
+    GACHA_HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    GACHA_HISTORY_FILE.write_bytes(b"old format")
+
+    history = gacha_history.load()
+
+    assert history.total == 0
+    assert GACHA_HISTORY_FILE.read_bytes() == b"old format"
+    # 記録するときに作り直す
+    gacha_history.record([_pull("N")], ts=1)
+    assert gacha_history.load().total == 1
+
+
+def test_load_without_file_does_not_create_it():
+    assert gacha_history.load().total == 0
+    assert not GACHA_HISTORY_FILE.exists()
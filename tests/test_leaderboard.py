@@ -0,0 +1,95 @@
+"""
+ホスト内ランキング（leaderboard）のテスト
+共有ディレクトリの中身が壊れていてもフックが止まらないこと、公開した記録が索引に取り込まれることを確かめる
+"""
+import copy
+import json
+import os
+
+import pytest
+
+from src import leaderboard
+from src.config import DEFAULT_DATA
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SG_LEADERBOARD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _data(level=1, ssr=0):
+    data = copy.deepcopy(DEFAULT_DATA)
+    data["pet"]["level"] = level
+    data["stats"]["ssr_count"] = ssr
+    return data
+
+
+def _record(level=1, updated=NOW):
+    return leaderboard.build_record(_data(level), 0, updated)
+
+
+@pytest.mark.parametrize("content", [
+    "[]",
+    "{}",
+    '{"players": []}',
+    '{"players": {"alice": {"name": "x", "scores": {}}}, "ranks": {}}',
+    '{"players": {"alice": 1}, "ranks": {"level": [[1, 2]]}}',
+])
+def test_malformed_index_is_ignored(shared_dir, content):
+    (shared_dir / "index.json").write_text(content)
+    index = leaderboard.load_index(shared_dir)
+    assert index["players"] == {}
+    assert all(index["ranks"][metric] == [] for metric in leaderboard.METRICS)
+
+    # 壊れた索引があってもフックの公開は失敗しない
+    assert leaderboard.maybe_publish(_data(level=3), user="alice", now=NOW)
+
+
+def test_malformed_player_is_skipped(shared_dir):
+    good = _record(level=4)
+    bad = _record(level=9)
+    del bad["updated"]
+    (shared_dir / "index.json").write_text(json.dumps({"players": {"alice": good, "bob": bad}}))
+
+    index = leaderboard.load_index(shared_dir)
+    assert list(index["players"]) == ["alice"]
+    assert leaderboard.top(index, "level", 10, now=NOW)[0]["user"] == "alice"
+
+
+def test_publish_writes_only_own_record(shared_dir):
+    user = leaderboard.current_user()
+    assert leaderboard.maybe_publish(_data(level=5), user=user, now=NOW)
+
+    players = shared_dir / leaderboard.PLAYERS_DIR
+    assert [p.name for p in players.iterdir()] == [f"{user}.json"]
+    assert not (shared_dir / "index.json").exists()
+    assert json.loads((players / f"{user}.json").read_text())["scores"]["level"] == [5, 0]
+
+
+def test_refresh_index_folds_changed_records(shared_dir):
+    user = leaderboard.current_user()
+    leaderboard.publish(shared_dir, user, _record(level=5), NOW)
+    index = leaderboard.refresh_index(shared_dir, NOW)
+    assert leaderboard.rank_of(index, "level", user, now=NOW) == (1, 1)
+
+    leaderboard.publish(shared_dir, user, _record(level=7), NOW + 10)
+    os.utime(shared_dir / leaderboard.PLAYERS_DIR / f"{user}.json", ns=(1, 1))  # mtime が確実に変わるように
+    index = leaderboard.refresh_index(shared_dir, NOW + 10)
+    assert leaderboard.top(index, "level", 10, now=NOW + 10)[0]["score"] == 7
+    assert leaderboard.load_index(shared_dir)["players"][user]["scores"]["level"] == [7, 0]
+
+    (shared_dir / leaderboard.PLAYERS_DIR / f"{user}.json").unlink()
+    assert leaderboard.refresh_index(shared_dir, NOW + 20)["players"] == {}
+
+
+def test_refresh_index_skips_records_of_other_owners(shared_dir):
+    players = shared_dir / leaderboard.PLAYERS_DIR
+    players.mkdir()
+    other = "nobody" if leaderboard.current_user() != "nobody" else "root"
+    (players / f"{other}.json").write_text(json.dumps(_record(level=99)))
+    (players / "broken.json").write_text("[]")
+
+    assert leaderboard.refresh_index(shared_dir, NOW)["players"] == {}
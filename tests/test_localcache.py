@@ -0,0 +1,108 @@
+"""
+ローカル書き戻しキャッシュ（localcache）のテスト
+安全に使えないキャッシュディレクトリでは、ホームを直接読み書きすることを確かめる
+"""
+import json
+import os
+
+import pytest
+
+from src import activity, directories, localcache, notify, slo, storage
+from src.config import DATA_DIR, DATA_FILE
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    """キャッシュの置き場所を tmp_path/shell-gotchi にする"""
+    monkeypatch.setenv("SG_LOCAL_CACHE", "1")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setattr(localcache, "_prepared", set())
+    return tmp_path / "shell-gotchi"
+
+
+def _save_and_load():
+    data = storage.load_data()
+    data["pet"]["name"] = "Cached"
+    storage.save_data(data)
+    return storage.load_data()
+
+
+def test_private_cache_dir_is_used(runtime_dir):
+    assert _save_and_load()["pet"]["name"] == "Cached"
+    cache = localcache.cache_dir(DATA_FILE)
+    assert json.loads(localcache.copy_path(DATA_FILE).read_text(encoding="utf-8"))["pet"]["name"] == "Cached"
+    for path in (runtime_dir, cache):
+        st = os.lstat(path)
+        assert st.st_uid == os.getuid()
+        assert st.st_mode & 0o777 == 0o700
+
+
+def test_symlinked_cache_dir_falls_back_to_home(runtime_dir, tmp_path):
+    target = tmp_path / "elsewhere"
+    target.mkdir(mode=0o700)
+    runtime_dir.symlink_to(target)
+
+    assert _save_and_load()["pet"]["name"] == "Cached"
+    assert list(target.iterdir()) == []
+    assert json.loads(DATA_FILE.read_text(encoding="utf-8"))["pet"]["name"] == "Cached"
+
+
+def test_shared_writable_cache_dir_falls_back_to_home(runtime_dir):
+    runtime_dir.mkdir()
+    os.chmod(runtime_dir, 0o777)
+
+    assert _save_and_load()["pet"]["name"] == "Cached"
+    assert list(runtime_dir.iterdir()) == []
+    assert json.loads(DATA_FILE.read_text(encoding="utf-8"))["pet"]["name"] == "Cached"
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason="他のユーザーの所有にするには root が必要")
+def test_cache_dir_owned_by_other_user_falls_back_to_home(runtime_dir):
+    runtime_dir.mkdir(mode=0o700)
+    os.chown(runtime_dir, 65534, 65534)
+    os.chmod(runtime_dir, 0o700)
+
+    assert _save_and_load()["pet"]["name"] == "Cached"
+    assert list(runtime_dir.iterdir()) == []
+    assert json.loads(DATA_FILE.read_text(encoding="utf-8"))["pet"]["name"] == "Cached"
+
+
+SIDE_FILES = ("activity.bin", "dirs.jsonl", "deferred.jsonl", "notify.jsonl", "data.lock")
+
+
+def test_side_files_stay_local(runtime_dir):
+    activity.record("commands")
+    directories.record_cwd("/tmp")
+    assert slo.defer([{"k": "rollup", "t": 1}])
+    assert notify.push([{"k": "drop", "count": 1, "food_count": 1}])
+    with storage.data_lock():
+        pass
+
+    cache = localcache.cache_dir(DATA_FILE)
+    for name in SIDE_FILES:
+        assert (cache / name).exists(), name
+        assert not (DATA_DIR / name).exists(), name
+
+
+def test_flush_mirrors_changed_side_files(runtime_dir):
+    activity.record("commands")
+    assert notify.push([{"k": "drop", "count": 1, "food_count": 1}])
+
+    assert localcache.flush(DATA_FILE)["files"] == 1
+    cache = localcache.cache_dir(DATA_FILE)
+    assert (DATA_DIR / "activity.bin").read_bytes() == (cache / "activity.bin").read_bytes()
+    # 通知キューはホームに書き戻さない
+    assert not (DATA_DIR / "notify.jsonl").exists()
+    # 変わっていなければ書き戻さない
+    assert localcache.flush(DATA_FILE)["files"] == 0
+
+
+def test_missing_side_file_is_fetched_from_home(runtime_dir):
+    DATA_DIR.mkdir(parents=True)
+    (DATA_DIR / "deferred.jsonl").write_text('{"k":"rollup","t":1}\n', encoding="utf-8")
+
+    assert slo.pending()
+    cache = localcache.cache_dir(DATA_FILE)
+    assert (cache / "deferred.jsonl").read_text(encoding="utf-8") == '{"k":"rollup","t":1}\n'
+    # 取り込んだままの版は書き戻さない
+    assert localcache.flush(DATA_FILE)["files"] == 0
@@ -0,0 +1,81 @@
+"""
+複数マシンでの同期（replica）のテスト
+ペットのレベルと経験値を取り込んでも、ありえない組み合わせにならないことを確かめる
+"""
+import copy
+
+import pytest
+
+from src import replica
+from src.config import DEFAULT_DATA
+
+
+@pytest.fixture
+def sync_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SG_SYNC_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _machine(monkeypatch, name):
+    monkeypatch.setenv("SG_MACHINE_ID", name)
+
+
+def _new_data():
+    data = copy.deepcopy(DEFAULT_DATA)
+    replica.diff(data, 0)  # 既定値を書き出し済みの状態にする
+    return data
+
+
+def _push(monkeypatch, name, data, now):
+    _machine(monkeypatch, name)
+    assert replica.push(data, now=now, force=True)
+
+
+def _pull(monkeypatch, name, data):
+    _machine(monkeypatch, name)
+    return replica.pull(data)
+
+
+def test_level_follows_pulled_exp(sync_dir, monkeypatch):
+    a, b = _new_data(), _new_data()
+    a["pet"].update(level=3, exp=130)
+    _push(monkeypatch, "a", a, 1)
+
+    assert _pull(monkeypatch, "b", b)
+    assert (b["pet"]["level"], b["pet"]["exp"]) == (3, 130)
+
+
+def test_exp_from_both_machines_is_summed(sync_dir, monkeypatch):
+    a, b = _new_data(), _new_data()
+    a["pet"]["exp"] = 30
+    b["pet"]["exp"] = 40
+    _push(monkeypatch, "a", a, 1)
+    _push(monkeypatch, "b", b, 2)
+
+    _pull(monkeypatch, "a", a)
+    _pull(monkeypatch, "b", b)
+    # 合わせて Lv.2 の閾値（50）を越える
+    assert (a["pet"]["level"], a["pet"]["exp"]) == (2, 70)
+    assert (b["pet"]["level"], b["pet"]["exp"]) == (2, 70)
+
+
+def test_level_delta_alone_is_ignored():
+    data = _new_data()
+    data["pet"].update(level=2, exp=60)
+    replica.diff(data, 0)
+
+    # 以前の形式の差分（レベルだけ）では組み合わせを崩さない
+    replica.apply(data, 1, {"pet.level": 5})
+    assert (data["pet"]["level"], data["pet"]["exp"]) == (2, 60)
+
+
+def test_negative_exp_is_clamped_without_reexport():
+    data = _new_data()
+    data["pet"].update(level=5, exp=320)
+    replica.diff(data, 0)
+    data["pet"]["exp"] += 10  # まだ書き出していない変更
+
+    replica.apply(data, 1, {"pet.exp": -400})
+    assert (data["pet"]["level"], data["pet"]["exp"]) == (1, 0)
+    # 止めた分は書き出さず、まだ書き出していない変更だけが残る
+    assert replica.diff(data, 2) == {"pet.exp": 10}
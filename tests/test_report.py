@@ -0,0 +1,55 @@
+"""
+利用状況レポート（report）のテスト
+ありえない値のセーブデータを壊れたファイルとして数え、区間を数値の順に並べることを確かめる
+"""
+import copy
+import json
+
+from src import report
+from src.config import DEFAULT_DATA
+
+
+def _write(directory, name, pet=None, stats=None):
+    data = copy.deepcopy(DEFAULT_DATA)
+    data["pet"].update(pet or {})
+    data["stats"].update(stats or {})
+    (directory / name).write_text(json.dumps(data), encoding="utf-8")
+
+
+def _build(directory):
+    return report.build_report([str(directory / "*.json")], workers=1)
+
+
+def test_impossible_values_are_counted_as_corrupt(tmp_path):
+    _write(tmp_path, "ok.json", pet={"level": 3}, stats={"ssr_count": 2})
+    _write(tmp_path, "negative_level.json", pet={"level": -1})
+    _write(tmp_path, "zero_level.json", pet={"level": 0})
+    _write(tmp_path, "negative_ssr.json", stats={"ssr_count": -4})
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+
+    result = _build(tmp_path)
+
+    assert result["counts"]["files"] == 5
+    assert result["counts"]["valid"] == 1
+    assert result["counts"]["corrupt"] == 4
+    assert result["histograms"]["level"] == {"3": 1}
+    assert result["histograms"]["ssr"] == {"2": 1}
+
+
+def test_outputs_sort_buckets_numerically(tmp_path):
+    for index, commands in enumerate((0, 1, 5, 12, 300)):
+        _write(tmp_path, f"{index}.json", pet={"level": 10 - index}, stats={"total_commands": commands})
+
+    result = _build(tmp_path)
+
+    histograms = json.loads(report.to_json(result))["histograms"]
+    assert list(histograms["level"]) == ["6", "7", "8", "9", "10"]
+    assert list(histograms["total_commands"]) == ["0", "1", "4-7", "8-15", "256-511"]
+    rows = [line.split(",") for line in report.to_csv(result).splitlines()]
+    assert [row[1] for row in rows if row[0] == "level"] == ["6", "7", "8", "9", "10"]
+
+
+def test_sorted_buckets_accept_negative_and_named_buckets():
+    buckets = {"4-7": 1, "-1": 1, "other": 1, "0": 1, "-8--5": 1, "2-3": 1}
+    assert [bucket for bucket, _ in report._sorted_buckets(buckets)] == \
+        ["-8--5", "-1", "0", "2-3", "4-7", "other"]
@@ -0,0 +1,124 @@
+"""
+ホスト共有サービス（server）のテスト
+root で動くサービスが、ユーザーのホームに置かれたシンボリックリンクで他のファイルを書き換えないこと、
+ソケットのパスにある他のファイルを消さないことを確かめる
+"""
+import json
+import os
+import pwd
+import shutil
+import socket
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from src import server
+
+NOBODY = 65534
+
+needs_root = pytest.mark.skipif(os.geteuid() != 0, reason="ユーザーを切り替えるには root が必要")
+
+
+@pytest.fixture
+def user_home(monkeypatch):
+    """nobody のホーム（ほかのユーザーがたどれるように tmp_path ではなく /tmp の直下に作る）"""
+    home = Path(tempfile.mkdtemp(prefix="sg-home-"))
+    os.chmod(home, 0o755)
+    data_dir = server.user_data_dir(str(home))
+    data_dir.mkdir(parents=True)
+    for path in [home, *[p for p in data_dir.parents if home in p.parents], data_dir]:
+        os.chown(path, NOBODY, NOBODY)
+    real = pwd.getpwuid(NOBODY)
+    monkeypatch.setattr(server.pwd, "getpwuid", lambda uid: pwd.struct_passwd(
+        (real.pw_name, "x", NOBODY, NOBODY, "", str(home), "/bin/sh")))
+    yield data_dir
+    shutil.rmtree(home)
+
+
+def _hook(cache, command="ls"):
+    return server.handle_request(cache, NOBODY, NOBODY, {"op": "hook", "command": command, "cwd": "/srv"})
+
+
+@needs_root
+def test_files_are_written_as_the_user(user_home):
+    cache = server.PlayerCache()
+    assert _hook(cache)["ok"]
+    cache.write_back_all()
+
+    data_file = user_home / "data.json"
+    assert os.stat(data_file).st_uid == NOBODY
+    assert json.loads(data_file.read_text(encoding="utf-8"))["stats"]["total_commands"] == 1
+    assert os.geteuid() == 0 and os.getegid() == 0
+
+
+@needs_root
+def test_group_list_is_resolved_once_per_player(user_home, monkeypatch):
+    calls = []
+    getgrouplist = os.getgrouplist
+    monkeypatch.setattr(server.os, "getgrouplist", lambda user, gid: calls.append(user) or getgrouplist(user, gid))
+    cache = server.PlayerCache()
+    for command in ("ls", "git status", "make"):
+        assert _hook(cache, command)["ok"]
+    cache.write_back_all()
+
+    assert len(calls) == 1
+
+
+@needs_root
+def test_symlinks_in_user_home_do_not_reach_root_files(user_home, tmp_path):
+    victims = {}
+    for name in ("data.json", "activity.bin", "dirs.json"):
+        victim = tmp_path / f"victim-{name}"
+        victim.write_text("root only\n")
+        os.chmod(victim, 0o600)
+        (user_home / name).symlink_to(victim)
+        victims[name] = victim
+
+    cache = server.PlayerCache()
+    _hook(cache)
+    cache.write_back_all()
+    cache.release(NOBODY)
+
+    for victim in victims.values():
+        assert victim.read_text() == "root only\n"
+        st = os.stat(victim)
+        assert (st.st_uid, st.st_mode & 0o777) == (0, 0o600)
+    assert os.geteuid() == 0 and os.getegid() == 0
+
+
+def test_bind_keeps_non_socket_file(tmp_path):
+    path = tmp_path / "sg.sock"
+    path.write_text("not a socket")
+    with pytest.raises(FileExistsError):
+        server._bind(str(path))
+    assert path.read_text() == "not a socket"
+
+
+def test_bind_replaces_stale_socket(tmp_path):
+    path = str(tmp_path / "sg.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    listener, inode = server._bind(path)
+    try:
+        assert os.lstat(path).st_ino == inode
+        assert os.lstat(path).st_mode & 0o777 == 0o666
+    finally:
+        listener.close()
+        server._unlink_own_socket(path, inode)
+    assert not os.path.exists(path)
+
+
+def test_bind_refuses_running_service(tmp_path):
+    path = str(tmp_path / "sg.sock")
+    running = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    running.bind(path)
+    running.listen(1)
+    try:
+        with pytest.raises(OSError):
+            server._bind(path)
+        assert os.path.exists(path)
+    finally:
+        running.close()
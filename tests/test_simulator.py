@@ -0,0 +1,49 @@
+"""
+経済シミュレーター（simulator）のテスト
+純Pythonでの計算がゲーム本体（game_logic）と同じ規則でドロップ・コインを数えることを確かめる
+"""
+import copy
+import random
+
+from src import game_logic, simulator
+from src.config import DEFAULT_DATA
+from src.config_compiler import compile_config
+
+
+def test_drop_gaps_match_calculate_drop():
+    cfg = compile_config(use_overrides=False)
+    rng = random.Random(1)
+    commands = 200_000
+
+    since = drops = 0
+    for _ in range(commands):
+        since += 1
+        if game_logic.calculate_drop(since, rng):
+            drops += 1
+            since = 0
+    gaps = game_logic.drop_gaps(drops, rng, cfg)
+
+    assert max(gaps) == cfg.guaranteed_drop_commands
+    assert abs(sum(gaps) / len(gaps) - commands / drops) < 0.02 * commands / drops
+
+
+def test_drop_gaps_without_chance_are_guaranteed():
+    cfg = compile_config(use_overrides=False)._replace(drop_chance=0.0)
+    assert game_logic.drop_gaps(3, random.Random(0), cfg) == [cfg.guaranteed_drop_commands] * 3
+
+
+def test_coins_match_process_commands():
+    data = copy.deepcopy(DEFAULT_DATA)
+    data["stats"]["total_commands"] = 7
+    result = game_logic.process_commands(data, 25, update_daily=False)
+    assert result["coins_earned"] == game_logic.coins_for_commands(7, 25) == 3
+
+
+def test_python_backend_is_reproducible():
+    cfg = compile_config(use_overrides=False)
+    params = simulator.SimParams(players=20, days=60)
+
+    first = simulator._simulate_python(cfg, params, params.players, seed=3)
+
+    assert first == simulator._simulate_python(cfg, params, params.players, seed=3)
+    assert all(1 <= level <= len(cfg.level_thresholds) for level in first["level"])
@@ -0,0 +1,131 @@
+"""
+フックの遅延予算（slo）のテスト
+読み込み・保存が遅いときにフックが処理を後回しキューに積み、次の sg の実行で済ませることを確かめる
+"""
+import json
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from src import main, profiler, slo, storage
+from src.config import DEFERRED_QUEUE_FILE
+
+BUDGET_MS = 50
+SLOW_IO_SECONDS = 0.1  # 予算を超える読み込み・保存の時間
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    フックの経過時間を、返す関数を呼んだ時点から数える（フック1回ごとのプロセスの起動の代わり。
+    pytest のプロセスの起動時間を含めない）
+    """
+    start = [time.perf_counter()]
+
+    def restart():
+        start[0] = time.perf_counter()
+
+    monkeypatch.setattr(profiler, "elapsed", lambda: time.perf_counter() - start[0])
+    monkeypatch.setenv("SG_HOOK_BUDGET_MS", str(BUDGET_MS))
+    return restart
+
+
+@pytest.fixture
+def slow_io(monkeypatch):
+    """storage.load_data / save_data を予算を超えて遅くする（呼ばれた回数を返す）"""
+    storage.load_data()  # 初期データを作っておく（作るときの保存を数えない）
+    calls = {"load": 0, "save": 0}
+    load_data, save_data = storage.load_data, storage.save_data
+
+    def slow_load(*args, **kwargs):
+        calls["load"] += 1
+        time.sleep(SLOW_IO_SECONDS)
+        return load_data(*args, **kwargs)
+
+    def slow_save(*args, **kwargs):
+        calls["save"] += 1
+        time.sleep(SLOW_IO_SECONDS)
+        return save_data(*args, **kwargs)
+
+    for module in (storage, main):
+        monkeypatch.setattr(module, "load_data", slow_load)
+        monkeypatch.setattr(module, "save_data", slow_save)
+    return calls
+
+
+def _queued():
+    with open(DEFERRED_QUEUE_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _hook(command):
+    return main._hook_locally(main.classify_command(command), command, 0, 12.0, "/tmp")
+
+
+def test_slow_load_defers_hook(clock, slow_io):
+    clock()
+    assert _hook("ls -la") is None
+
+    entries = _queued()
+    assert len(entries) == 1
+    assert entries[0]["k"] == "hook"
+    assert entries[0]["cmd"] == "ls -la"
+    assert entries[0]["stage"] == "load"
+    assert slow_io["load"] == 1
+    # 読んだデータは捨てるので保存もしない
+    assert slow_io["save"] == 0
+    assert storage.load_data()["stats"]["total_commands"] == 0
+
+
+def test_exhausted_budget_defers_before_load(monkeypatch, slow_io):
+    monkeypatch.setenv("SG_HOOK_BUDGET_MS", str(BUDGET_MS))
+    monkeypatch.setattr(profiler, "elapsed", lambda: BUDGET_MS / 1000 + 1)
+
+    assert _hook("git status") is None
+
+    entries = _queued()
+    assert [entry["stage"] for entry in entries] == ["startup"]
+    assert slow_io["load"] == 0
+
+
+def test_cli_drains_deferred_work(clock, slow_io, monkeypatch):
+    for command in ("ls", "git status", "make"):
+        clock()
+        assert _hook(command) is None
+    assert len(_queued()) == 3
+    assert slo.pending()
+
+    # 次の sg の実行（フック以外）では予算に関係なく全て済ませる
+    monkeypatch.undo()
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ["status"])
+    assert result.exit_code == 0, result.output
+
+    assert not slo.pending()
+    data = storage.load_data()
+    assert data["stats"]["total_commands"] == 3
+    assert data["slo"]["replayed"] == 3
+    assert data["slo"]["over_budget"]["load"] == 3
+
+
+def test_defer_during_drain_is_kept(monkeypatch):
+    """drain が処理している間に積まれた項目は、切り詰めで消えずに次に回る"""
+    assert slo.defer([{"k": "rollup", "t": 1}])
+    late = {"k": "rollup", "t": 2}
+    writers = []
+
+    def replay_entry(data, entry, done):
+        if not writers:
+            writer = threading.Thread(target=slo.defer, args=([late],))
+            writer.start()
+            writer.join(0.2)  # drain がロックを持っている間は追記を待たされる
+            writers.append(writer)
+
+    monkeypatch.setattr(slo, "_replay_entry", replay_entry)
+    done = slo.drain(storage.load_data())
+    writers[0].join()
+
+    assert done["replayed"] == 1
+    assert _queued() == [late]